@@ -1,5 +1,6 @@
 import eventlet
 eventlet.monkey_patch()
+from eventlet import tpool
 
 import time
 import sys
@@ -11,13 +12,42 @@ import re
 import subprocess
 import logging
 import random
+import threading
+import json
+import queue
+import hashlib
+from collections import namedtuple
 from datetime import datetime, timedelta
 from flask import Flask, render_template, request, redirect, url_for, jsonify, make_response, session, send_file
-from flask_socketio import SocketIO, emit
+from flask_socketio import SocketIO, emit, join_room, leave_room, rooms
+from itsdangerous import URLSafeTimedSerializer, BadSignature
 from meshtastic.serial_interface import SerialInterface
 from pubsub import pub
 import config
 from config import SEND_INTERVAL_SECOND, BOARD_MESSAGE_CHANNELS
+from app_noteboard_db import get_db_connection, batch_transaction, optimize_database
+from app_noteboard_send_queue import (
+    SendQueue, AirtimeBucket, estimate_airtime,
+    pack_lora_messages, unpack_lora_messages, LORA_MAX_TEXT_BYTES,
+    PRIORITY_PINNED, PRIORITY_REPLY, PRIORITY_NEW, PRIORITY_UPDATE, PRIORITY_RESEND,
+    KIND_SEND, KIND_UPDATE, KIND_RESEND, DeadlineHeap
+)
+from app_noteboard_resend import (
+    compute_channel_ack_stats, resend_backoff_second, resend_target_nodes,
+    RESEND_STATS_WINDOW_SECOND, RESEND_STATS_REFRESH_SECOND
+)
+from app_noteboard_lora_codec import encode_command, decode_command, COMPACT_PORTNUM, COMPACT_PORTNUM_NAME
+from app_noteboard_lora_commands import (
+    parse_lora_command, NewNote, ResendNote, NewReply, ResendReply, SetColor, SetAuthor,
+    ArchiveNote, PinNote, UserAck, PackedCommands, InvalidCommand, UnknownCommand, RecentKeys
+)
+from app_noteboard_tiles import read_tile, configure_tile_cache, get_tileset_entry, scan_tilesets, TileBlob
+import app_noteboard_tiles
+from app_noteboard_sheet_cells import (
+    SHEET_DELETE_RE, SHEET_TITLE_RE, TABLE_CELL_RE,
+    ensure_table_note_schema, backfill_table_note_columns,
+    ensure_sheet_cells_schema, apply_pending_sheet_cells, get_sheet_cells, rebuild_sheet_cells
+)
 
 print(f"[系統] 使用多頻道設定: {[ch['name'] for ch in BOARD_MESSAGE_CHANNELS]}")
 
@@ -25,6 +55,13 @@ print(f"[系統] 使用多頻道設定: {[ch['name'] for ch in BOARD_MESSAGE_CHA
 CONFIGURED_CHANNEL_NAMES = [ch['name'] for ch in BOARD_MESSAGE_CHANNELS]
 NOTEBOARD_MBTILES_FOLDER = getattr(config, 'NOTEBOARD_MBTILES_FOLDER', './maps')
 NOTEBOARD_MBTILES_LAYER_MODE = getattr(config, 'NOTEBOARD_MBTILES_LAYER_MODE', 'auto')
+# 地圖 tile 記憶體快取大小（MB），0 代表停用
+NOTEBOARD_TILE_CACHE_MB = getattr(config, 'NOTEBOARD_TILE_CACHE_MB', 16)
+configure_tile_cache(NOTEBOARD_TILE_CACHE_MB * 1024 * 1024)
+# style.json / tilejson 的 tile URL 附帶 tileset 版本（?v=），版本相符的 tile 回應 immutable 長效快取
+NOTEBOARD_TILE_IMMUTABLE_CACHE = getattr(config, 'NOTEBOARD_TILE_IMMUTABLE_CACHE', True)
+# style.json / tilejson 依 Host 快取時，每種回應最多快取的 Host 數量（Host 由 client 提供，避免快取無限增長）
+MAP_JSON_CACHE_MAX_HOSTS = 4
 APP_VERSION = "v0.7.1"
 APP_PROJECT_NAME = "meshBridge/meshNoteboard"
 NOTEBOARD_SERVICE_NAME = getattr(
@@ -36,8 +73,27 @@ EPAPER_CONNECT_NOTE = getattr(config, 'EPAPER_CONNECT_NOTE', '即可檢視更多
 REAUTH_ON_CHANNEL_SWITCH = getattr(config, 'REAUTH_ON_CHANNEL_SWITCH', False)
 UPDATE_LORA_DEVICE_TIME_FROM_LOCAL = getattr(config, 'UPDATE_LORA_DEVICE_TIME_FROM_LOCAL', False)
 ACK_TIMEOUT_SECONDS = 60
+# 同時等待設備 ACK 的訊息數量上限（整個設備 / 每個頻道），達到上限時排程器暫停發送
+LORA_MAX_INFLIGHT = max(1, int(getattr(config, 'LORA_MAX_INFLIGHT', 1)))
+LORA_MAX_INFLIGHT_PER_CHANNEL = max(1, int(getattr(config, 'LORA_MAX_INFLIGHT_PER_CHANNEL', 1)))
+
+# LoRa 發送 airtime 預算：整個無線電的 duty cycle（%）平均分配給各頻道，
+# 每個頻道最多可累積 LORA_AIRTIME_BURST_SECOND 秒的 airtime 供突發發送使用
+# LORA_DUTY_CYCLE_PERCENT 設為 0（或負值）代表不限制 airtime，超過 100 以 100 計
+LORA_DUTY_CYCLE_PERCENT = min(100.0, max(0.0, float(getattr(config, 'LORA_DUTY_CYCLE_PERCENT', 10))))
+LORA_AIRTIME_BURST_SECOND = float(getattr(config, 'LORA_AIRTIME_BURST_SECOND', 5))
+# 定期更新查詢規劃器統計資訊（PRAGMA optimize）的間隔（秒）
+DB_OPTIMIZE_INTERVAL_SECOND = 6 * 60 * 60
+# 排程器最長等待時間（秒），用於定期檢查 ACK 超時
+SEND_QUEUE_MAX_WAIT_SECOND = 5
+# 將同頻道多筆待發送 notes 合併為一則 /pack 訊息發送（舊版節點無法解讀，需所有節點都支援時才啟用）
+LORA_PACK_NOTES = bool(getattr(config, 'LORA_PACK_NOTES', False))
+LORA_PACK_MAX_NOTES = 8
 ACK_DELAY_SECONDS = max(10, SEND_INTERVAL_SECOND // 2)
 ACK_JITTER = True
+ACK_JITTER_SECONDS = 3
+# 將延遲期間內同頻道的 USER ACK 合併為一則 /ack id1,id2,... 發送（舊版節點無法解讀，需所有節點都支援時才啟用）
+LORA_AGGREGATE_ACKS = bool(getattr(config, 'LORA_AGGREGATE_ACKS', False))
 
 # 自動重送機制參數
 _auto_resend_node_raw = getattr(config, 'AUTO_RESEND_NODE', 0)
@@ -63,10 +119,14 @@ AUTO_RESEND_BACKOFF_SECOND = 100
 # AUTO_RESEND_MAX_MINUTE=60 => 7 次
 # AUTO_RESEND_MAX_MINUTE=120 => 10 次
 
+# 依各頻道觀察到的 ACK 往返時間與可達節點數，自動調整退避時間與需要的 ACK 數量
+AUTO_RESEND_ADAPTIVE = bool(getattr(config, 'AUTO_RESEND_ADAPTIVE', False))
+
 if AUTO_RESEND_NODE > 0:
     AUTO_RESEND_MIN_MINUTE = float(getattr(config, 'AUTO_RESEND_MIN_MINUTE', 6))
     AUTO_RESEND_MAX_MINUTE = float(getattr(config, 'AUTO_RESEND_MAX_MINUTE', 720))
-    print(f"[自動重送] 功能已啟用: 需要 {AUTO_RESEND_NODE} 個節點 ACK, 時間範圍 {AUTO_RESEND_MIN_MINUTE}~{AUTO_RESEND_MAX_MINUTE} 分鐘, 退避基數 {AUTO_RESEND_BACKOFF_SECOND}s")
+    print(f"[自動重送] 功能已啟用: 需要 {AUTO_RESEND_NODE} 個節點 ACK, 時間範圍 {AUTO_RESEND_MIN_MINUTE}~{AUTO_RESEND_MAX_MINUTE} 分鐘, 退避基數 {AUTO_RESEND_BACKOFF_SECOND}s"
+          f"{', 自適應模式' if AUTO_RESEND_ADAPTIVE else ''}")
 else:
     AUTO_RESEND_MIN_MINUTE = 0
     AUTO_RESEND_MAX_MINUTE = 0
@@ -148,12 +208,35 @@ lora_connected = False
 channel_validated = False
 active_channels = []  # 連線後實際可用的頻道清單 (從 BOARD_MESSAGE_CHANNELS 中篩選出設備上存在的頻道)
 pending_ack = {}
-FLAG_DEVICE_WAITING_ACK = False
+pending_ack_deadlines = DeadlineHeap()  # 等待設備 ACK 的超時時間，由 ack_timeout_loop 在到期時處理
+inflight_slots = {}  # key: request_id -> board_id，佔用發送視窗的 pending_ack 項目
+# 收到的 LoRa 封包先放入佇列，由 receive_worker_loop 批次寫入資料庫，避免 SD 卡寫入延遲阻塞 serial 讀取
+RECEIVE_QUEUE_MAX = 256
+RECEIVE_BATCH_MAX = 32
+RECEIVE_PORTNUMS = ('ROUTING_APP', 'TEXT_MESSAGE_APP', COMPACT_PORTNUM_NAME)
+receive_queue = queue.Queue(maxsize=RECEIVE_QUEUE_MAX)
+receive_stats = {
+    'received': 0, 'dropped': 0, 'processed': 0, 'batches': 0,
+    'max_depth': 0, 'last_batch_size': 0, 'last_batch_ms': 0.0, 'max_batch_ms': 0.0,
+    'duplicate_packets': 0, 'duplicate_msgs': 0, 'reacks_suppressed': 0
+}
+# 重複封包過濾：mesh 轉發與重發的訊息在記憶體中判斷，不需查詢資料庫
+RECEIVE_SEEN_MAX = 4096
+# 同一則已存在的訊息，在此時間內（秒）只重送一次 USER ACK，避免重複訊息造成 ACK 風暴
+RECEIVE_REACK_INTERVAL_SECOND = 60
+seen_packet_ids = RecentKeys(RECEIVE_SEEN_MAX)  # (from, packet id) -> 收到時間
+received_lora_msg_ids = RecentKeys(RECEIVE_SEEN_MAX)  # (channel_name, lora_msg_id) -> 最後發送 USER ACK 的時間
+# 接收批次在原生執行緒中執行時的狀態：deferred 為提交後要回到 eventlet hub 執行的呼叫 {(func, args): None}，
+# device_acks 為批次開始前已在 hub 上認領的設備 ACK {request_id: pending_ack 項目}
+_receive_local = threading.local()
 send_interval = max(SEND_INTERVAL_SECOND, 30)
+send_queue = SendQueue()
+send_airtime_buckets = {}
+_pending_user_acks = {}  # key: channel_name -> 等待合併發送的 lora_msg_id 清單
+_pending_user_acks_lock = threading.Lock()
 deviceLastPosition = {'lat': 0.0, 'lng': 0.0}
 isDeviceProvideLocation = False
 
-DB_PATH = 'noteboard.db'
 MAX_NOTES = 200
 
 user_last_locations = {}
@@ -248,7 +331,7 @@ EPAPER_CANVAS_SPECS = {
 
 def init_database():
     """初始化 SQLite 資料庫"""
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS notes (
@@ -274,6 +357,12 @@ def init_database():
             grid_y INTEGER NOT NULL DEFAULT 0,
             lora_node_id TEXT,
             transmit_st_at INTEGER,
+            sync_seq INTEGER NOT NULL DEFAULT 0,
+            is_table INTEGER NOT NULL DEFAULT 0,
+            sheet_id TEXT,
+            cell_id TEXT,
+            ack_count INTEGER NOT NULL DEFAULT 0,
+            last_ack_at INTEGER,
             FOREIGN KEY (reply_lora_msg_id) REFERENCES notes(note_id)
         )
     ''')
@@ -290,19 +379,137 @@ def init_database():
             lora_node_id TEXT NOT NULL,
             hop_limit INTEGER,
             hop_start INTEGER,
+            latency_ms INTEGER,
             FOREIGN KEY (note_id) REFERENCES notes(note_id)
         )
     ''')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_ack_note_id ON ack_records(note_id)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_ack_created_at ON ack_records(created_at DESC)')
     
+    # 已發送、等待設備 ACK 的訊息（pending_ack 的持久化副本，重新啟動後可繼續等待或處理超時）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS pending_acks (
+            request_id INTEGER PRIMARY KEY,
+            board_id TEXT NOT NULL,
+            info TEXT NOT NULL,
+            deadline REAL NOT NULL
+        )
+    ''')
+    
     conn.commit()
     conn.close()
     print("資料庫初始化完成")
 
+# notes 異動序號（delta sync 用）
+# 由 trigger 在 INSERT 或前端可見欄位 UPDATE 時，從 notes_sync_state 取得遞增序號寫入 sync_seq，
+# 不需要修改各個更新 notes 的函式，也不受系統時間回撥影響。
+# ack_records 新增或更新時同樣更新所屬 note 的 sync_seq，重新連線的 client 才會取得離線期間收到的 ACK。
+NOTES_SYNC_TRACKED_COLUMNS = (
+    'board_id', 'reply_lora_msg_id', 'body', 'bg_color', 'status', 'author_key', 'rev',
+    'deleted', 'lora_msg_id', 'is_temp_parent_note', 'is_pined_note', 'lora_node_id'
+)
+
+def ensure_notes_sync_schema(cursor):
+    """建立 delta sync 所需的序號表、trigger 與索引（可重複執行）"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS notes_sync_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            seq INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        INSERT OR IGNORE INTO notes_sync_state (id, seq)
+        VALUES (1, (SELECT COALESCE(MAX(sync_seq), 0) FROM notes))
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_notes_sync_insert AFTER INSERT ON notes
+        BEGIN
+            UPDATE notes_sync_state SET seq = seq + 1 WHERE id = 1;
+            UPDATE notes SET sync_seq = (SELECT seq FROM notes_sync_state WHERE id = 1)
+            WHERE rowid = NEW.rowid;
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_notes_sync_update
+        AFTER UPDATE OF {', '.join(NOTES_SYNC_TRACKED_COLUMNS)} ON notes
+        BEGIN
+            UPDATE notes_sync_state SET seq = seq + 1 WHERE id = 1;
+            UPDATE notes SET sync_seq = (SELECT seq FROM notes_sync_state WHERE id = 1)
+            WHERE rowid = NEW.rowid;
+        END
+    ''')
+    for event in ('INSERT', 'UPDATE'):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_ack_records_sync_{event.lower()} AFTER {event} ON ack_records
+            BEGIN
+                UPDATE notes_sync_state SET seq = seq + 1 WHERE id = 1;
+                UPDATE notes SET sync_seq = (SELECT seq FROM notes_sync_state WHERE id = 1)
+                WHERE note_id = NEW.note_id;
+            END
+        ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_notes_board_sync_seq ON notes(board_id, sync_seq)')
+
+# 熱門查詢使用的複合索引（建立於 init_database 之後，由 migrate_database 補上，可重複執行）
+# 欄位順序：等值條件在前、範圍條件 / 排序欄位在後，讓查詢可直接利用索引完成篩選與排序。
+NOTES_QUERY_INDEXES = (
+    # lora_msg_id_exists / get_note_id_by_lora_msg_id / 收到 LoRa 回覆、更新、刪除命令時的查詢
+    ('idx_notes_lora_msg_id', 'notes', 'lora_msg_id, author_key'),
+    # 回覆暫存父留言查詢（reply_lora_msg_id = ? AND is_temp_parent_note = 1）
+    ('idx_notes_reply_lora_msg_id', 'notes', 'reply_lora_msg_id, is_temp_parent_note'),
+    # 發送佇列校正、LAN only 數量、自動補發候選（board_id + status + deleted，依 created_at 排序）
+    ('idx_notes_board_status', 'notes', 'board_id, status, deleted, created_at'),
+    ('idx_notes_status_deleted', 'notes', 'status, deleted'),
+    # 待更新至 LoRa 的留言（board_id = ? AND is_need_update_lora = 1 ORDER BY updated_at）
+    ('idx_notes_need_update', 'notes', 'board_id, is_need_update_lora, updated_at'),
+    # 置頂留言查詢（board_id = ? AND is_pined_note = 1）
+    ('idx_notes_board_pined', 'notes', 'board_id, is_pined_note'),
+    # 自動補發候選：依頻道與 created_at 區間掃描，ACK 數量與退避條件直接在索引中判斷
+    ('idx_notes_resend', 'notes', 'board_id, status, deleted, created_at, ack_count, resent_count, updated_at'),
+    # ACK 記錄：同一 note 同一節點的查詢與更新
+    ('idx_ack_note_node', 'ack_records', 'note_id, lora_node_id'),
+)
+
+def backfill_note_ack_columns(cursor):
+    """依 ack_records 重新計算 notes.ack_count / last_ack_at，回傳有 ACK 的 note 數量"""
+    cursor.execute('UPDATE notes SET ack_count = 0, last_ack_at = NULL')
+    cursor.execute('''
+        UPDATE notes SET
+            ack_count = (SELECT COUNT(*) FROM ack_records ar WHERE ar.note_id = notes.note_id),
+            last_ack_at = (SELECT MAX(ar.updated_at) FROM ack_records ar WHERE ar.note_id = notes.note_id)
+        WHERE note_id IN (SELECT note_id FROM ack_records)
+    ''')
+    return cursor.rowcount
+
+def ensure_query_indexes(cursor):
+    """建立熱門查詢使用的複合索引（可重複執行）"""
+    for index_name, table_name, index_columns in NOTES_QUERY_INDEXES:
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS {index_name} ON {table_name}({index_columns})')
+
+def get_notes_sync_cursor():
+    """取得目前的 notes 異動序號（delta sync 的 cursor）"""
+    try:
+        conn = get_db_connection()
+        row = conn.execute('SELECT seq FROM notes_sync_state WHERE id = 1').fetchone()
+        conn.close()
+        return row[0] if row else 0
+    except Exception as e:
+        print(f"取得 notes sync cursor 失敗: {e}")
+        return 0
+
+def get_changed_note_ids(board_id, since_cursor):
+    """取得 sync_seq 大於 since_cursor 的 note_id 集合"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT note_id FROM notes WHERE board_id = ? AND sync_seq > ?
+    ''', (board_id, since_cursor))
+    changed_ids = {row[0] for row in cursor.fetchall()}
+    conn.close()
+    return changed_ids
+
 def migrate_database():
     """檢查並執行資料庫遷移"""
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db_connection()
     cursor = conn.cursor()
     
     try:
@@ -330,11 +537,54 @@ def migrate_database():
             conn.commit()
             print("[資料庫遷移] 已成功新增 hop_start 欄位")
         
+        if 'latency_ms' not in ack_columns:
+            print("[資料庫遷移] 偵測到 ack_records 表缺少 latency_ms 欄位，開始遷移...")
+            cursor.execute('ALTER TABLE ack_records ADD COLUMN latency_ms INTEGER')
+            conn.commit()
+            print("[資料庫遷移] 已成功新增 latency_ms 欄位")
+        
         if 'transmit_st_at' not in columns:
             print("[資料庫遷移] 偵測到 notes 表缺少 transmit_st_at 欄位，開始遷移...")
             cursor.execute('ALTER TABLE notes ADD COLUMN transmit_st_at INTEGER')
             conn.commit()
             print("[資料庫遷移] 已成功新增 transmit_st_at 欄位")
+        
+        if 'sync_seq' not in columns:
+            print("[資料庫遷移] 偵測到 notes 表缺少 sync_seq 欄位，開始遷移...")
+            cursor.execute('ALTER TABLE notes ADD COLUMN sync_seq INTEGER NOT NULL DEFAULT 0')
+            conn.commit()
+            print("[資料庫遷移] 已成功新增 sync_seq 欄位")
+        
+        ensure_notes_sync_schema(cursor)
+        conn.commit()
+        
+        if 'is_table' not in columns:
+            print("[資料庫遷移] 偵測到 notes 表缺少 is_table / sheet_id / cell_id 欄位，開始遷移...")
+            cursor.execute('ALTER TABLE notes ADD COLUMN is_table INTEGER NOT NULL DEFAULT 0')
+            cursor.execute('ALTER TABLE notes ADD COLUMN sheet_id TEXT')
+            cursor.execute('ALTER TABLE notes ADD COLUMN cell_id TEXT')
+            table_count = backfill_table_note_columns(cursor)
+            conn.commit()
+            print(f"[資料庫遷移] 已成功新增 is_table / sheet_id / cell_id 欄位，共 {table_count} 筆 table note")
+        ensure_table_note_schema(cursor)
+        conn.commit()
+        
+        if 'ack_count' not in columns:
+            print("[資料庫遷移] 偵測到 notes 表缺少 ack_count / last_ack_at 欄位，開始遷移...")
+            cursor.execute('ALTER TABLE notes ADD COLUMN ack_count INTEGER NOT NULL DEFAULT 0')
+            cursor.execute('ALTER TABLE notes ADD COLUMN last_ack_at INTEGER')
+            acked_count = backfill_note_ack_columns(cursor)
+            conn.commit()
+            print(f"[資料庫遷移] 已成功新增 ack_count / last_ack_at 欄位，共 {acked_count} 筆 note 有 ACK 記錄")
+        
+        ensure_query_indexes(cursor)
+        conn.commit()
+        
+        if ensure_sheet_cells_schema(cursor):
+            print("[資料庫遷移] 已建立 sheet_cells 表，開始重建試算表資料...")
+            cell_count = rebuild_sheet_cells(cursor)
+            print(f"[資料庫遷移] 已重建 {cell_count} 格試算表資料")
+        conn.commit()
     except Exception as e:
         print(f"[資料庫遷移] 遷移失敗: {e}")
     finally:
@@ -380,9 +630,6 @@ def generate_user_uuid():
     return ''.join(random.choice(alphabet) for _ in range(8))
 
 MAC_RE = re.compile(r"lladdr\s+([0-9a-f:]{17})", re.I)
-SHEET_DELETE_RE = re.compile(r'^\{([a-z0-9]{6}):delete\}$')
-SHEET_TITLE_RE = re.compile(r'^\{([a-z0-9]{6}):title\}([\s\S]*)$')
-TABLE_CELL_RE = re.compile(r'^\{([a-z0-9]{6}):((?:[A-Z][1-9]\d{0,2})|title)\}([\s\S]*)$', re.DOTALL)
 
 def _is_table_format_note(body):
     """判斷 note body 是否為 table 資料格式（TABLE_CELL_RE 或 SHEET_DELETE_RE）"""
@@ -398,12 +645,10 @@ def auto_archive_old_notes(cursor, board_id, ch_max_notes):
     """
     timestamp = int(time.time() * 1000)
     
-    # 計算非 table 指令、非置頂、未刪除的 notes 數量
-    # 使用 NOT 排除 table 格式的 body（匹配 {xxxxxx:...} 開頭）
+    # 計算非 table 指令、非置頂、未刪除的 notes 數量（is_table 由 trigger 依 body 是否為 {xxxxxx:...} 開頭填入）
     cursor.execute('''
         SELECT COUNT(*) FROM notes 
-        WHERE board_id = ? AND deleted = 0 AND is_pined_note = 0
-          AND body NOT GLOB '{[a-z0-9][a-z0-9][a-z0-9][a-z0-9][a-z0-9][a-z0-9]:*'
+        WHERE board_id = ? AND deleted = 0 AND is_table = 0 AND is_pined_note = 0
     ''', (board_id,))
     count = cursor.fetchone()[0]
     
@@ -414,8 +659,7 @@ def auto_archive_old_notes(cursor, board_id, ch_max_notes):
             SET deleted = 1, updated_at = ?
             WHERE note_id IN (
                 SELECT note_id FROM notes 
-                WHERE board_id = ? AND deleted = 0 AND is_pined_note = 0
-                  AND body NOT GLOB '{[a-z0-9][a-z0-9][a-z0-9][a-z0-9][a-z0-9][a-z0-9]:*'
+                WHERE board_id = ? AND deleted = 0 AND is_table = 0 AND is_pined_note = 0
                 ORDER BY created_at ASC 
                 LIMIT ?
             )
@@ -427,10 +671,9 @@ def auto_archive_old_notes(cursor, board_id, ch_max_notes):
 def sheet_id_exists_in_db(sheet_id):
     """檢查 sheet_id 是否已存在於資料庫的任何 note body 中（包含 deleted 及所有指令類型）"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db_connection()
         cursor = conn.cursor()
-        pattern = '{' + sheet_id + ':%'
-        cursor.execute('SELECT COUNT(*) FROM notes WHERE body LIKE ?', (pattern,))
+        cursor.execute('SELECT COUNT(*) FROM notes WHERE sheet_id = ?', (sheet_id,))
         count = cursor.fetchone()[0]
         conn.close()
         return count > 0
@@ -528,7 +771,7 @@ def get_color_from_palette(color_index):
 def note_exists(note_id):
     """檢查 note_id 是否存在"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db_connection()
         cursor = conn.cursor()
         cursor.execute('SELECT COUNT(*) FROM notes WHERE note_id = ?', (note_id,))
         count = cursor.fetchone()[0]
@@ -541,7 +784,7 @@ def note_exists(note_id):
 def lora_msg_id_exists(lora_msg_id):
     """檢查 lora_msg_id 是否存在"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db_connection()
         cursor = conn.cursor()
         cursor.execute('SELECT COUNT(*) FROM notes WHERE lora_msg_id = ?', (lora_msg_id,))
         count = cursor.fetchone()[0]
@@ -551,10 +794,30 @@ def lora_msg_id_exists(lora_msg_id):
         print(f"檢查 lora_msg_id 是否存在失敗: {e}")
         return False
 
+def get_note_ids_by_lora_msg_ids(lora_msg_ids):
+    """批次透過 lora_msg_id 取得 note_id，回傳 {lora_msg_id: note_id}（找不到的不包含在內）"""
+    try:
+        lora_msg_ids = list(dict.fromkeys(lora_msg_ids))
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        note_ids = {}
+        batch_size = 500
+        for i in range(0, len(lora_msg_ids), batch_size):
+            batch = lora_msg_ids[i:i + batch_size]
+            placeholders = ','.join('?' * len(batch))
+            cursor.execute(f'SELECT lora_msg_id, note_id FROM notes WHERE lora_msg_id IN ({placeholders})', batch)
+            for lora_msg_id, note_id in cursor.fetchall():
+                note_ids.setdefault(lora_msg_id, note_id)
+        conn.close()
+        return note_ids
+    except Exception as e:
+        print(f"透過 lora_msg_id 取得 note_id 失敗: {e}")
+        return {}
+
 def get_note_id_by_lora_msg_id(lora_msg_id):
     """透過 lora_msg_id 取得 note_id"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db_connection()
         cursor = conn.cursor()
         cursor.execute('SELECT note_id FROM notes WHERE lora_msg_id = ?', (lora_msg_id,))
         row = cursor.fetchone()
@@ -564,48 +827,148 @@ def get_note_id_by_lora_msg_id(lora_msg_id):
         print(f"透過 lora_msg_id 取得 note_id 失敗: {e}")
         return None
 
-def save_or_update_ack_record(note_id, lora_node_id, hop_limit=None, hop_start=None):
-    """儲存或更新 ACK 記錄"""
+def _get_note_board_id(note_id):
+    """取得 note 所屬的 board_id，找不到時回傳 None"""
+    try:
+        conn = get_db_connection()
+        row = conn.execute('SELECT board_id FROM notes WHERE note_id = ?', (note_id,)).fetchone()
+        conn.close()
+        return row[0] if row else None
+    except Exception as e:
+        print(f"取得 note board_id 失敗: {e}")
+        return None
+
+def format_ack_record(row):
+    """將 ack_records 資料列轉換為前端使用的格式"""
+    lora_node_id = row['lora_node_id']
+    display_id = lora_node_id
+    if lora_node_id.startswith('lora-'):
+        raw_id = lora_node_id.replace('lora-', '')
+        display_id = f"LoRa-{raw_id[-4:]}" if len(raw_id) > 4 else raw_id
+    
+    return {
+        'ackId': row['ack_id'],
+        'loraNodeId': lora_node_id,
+        'displayId': display_id,
+        'createdAt': row['created_at'],
+        'updatedAt': row['updated_at']
+    }
+
+def get_acks_grouped_by_note(board_id, note_ids=None):
+    """以單一查詢取得多筆 note 的 ACK 記錄，回傳 {note_id: [ack, ...]}（依 created_at 由新到舊）
+
+    note_ids 為 None 時取得該 board 所有 note 的 ACK 記錄。
+    """
+    conn = get_db_connection()
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    
+    acks_by_note = {}
+    if note_ids is None:
+        cursor.execute('''
+            SELECT a.ack_id, a.note_id, a.lora_node_id, a.created_at, a.updated_at
+            FROM ack_records a
+            JOIN notes n ON n.note_id = a.note_id
+            WHERE n.board_id = ?
+            ORDER BY a.created_at DESC
+        ''', (board_id,))
+        for row in cursor.fetchall():
+            acks_by_note.setdefault(row['note_id'], []).append(format_ack_record(row))
+    else:
+        note_ids = list(dict.fromkeys(note_ids))
+        # 分批查詢，避免超過 SQLite 參數數量上限
+        batch_size = 500
+        for i in range(0, len(note_ids), batch_size):
+            batch = note_ids[i:i + batch_size]
+            placeholders = ','.join('?' * len(batch))
+            cursor.execute(f'''
+                SELECT a.ack_id, a.note_id, a.lora_node_id, a.created_at, a.updated_at
+                FROM ack_records a
+                JOIN notes n ON n.note_id = a.note_id
+                WHERE n.board_id = ? AND a.note_id IN ({placeholders})
+                ORDER BY a.created_at DESC
+            ''', [board_id] + batch)
+            for row in cursor.fetchall():
+                acks_by_note.setdefault(row['note_id'], []).append(format_ack_record(row))
+    
+    conn.close()
+    return acks_by_note
+
+def save_ack_records(note_ids, lora_node_id, hop_limit=None, hop_start=None):
+    """批次儲存或更新同一節點對多筆 note 的 USER ACK 記錄（單一交易）"""
+    note_ids = list(dict.fromkeys(note_ids))
+    if not note_ids:
+        return False
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db_connection()
         cursor = conn.cursor()
         timestamp = int(time.time() * 1000)
         
-        cursor.execute('''
-            SELECT ack_id FROM ack_records 
+        existing_note_ids = set()
+        board_ids = set()
+        # 分批查詢，避免超過 SQLite 參數數量上限
+        batch_size = 500
+        for i in range(0, len(note_ids), batch_size):
+            batch = note_ids[i:i + batch_size]
+            placeholders = ','.join('?' * len(batch))
+            cursor.execute(f'''
+                SELECT note_id FROM ack_records 
+                WHERE lora_node_id = ? AND note_id IN ({placeholders})
+            ''', [lora_node_id] + batch)
+            existing_note_ids.update(row[0] for row in cursor.fetchall())
+            cursor.execute(f'SELECT DISTINCT board_id FROM notes WHERE note_id IN ({placeholders})', batch)
+            board_ids.update(row[0] for row in cursor.fetchall())
+        
+        update_note_ids = [note_id for note_id in note_ids if note_id in existing_note_ids]
+        insert_note_ids = [note_id for note_id in note_ids if note_id not in existing_note_ids]
+        
+        cursor.executemany('''
+            UPDATE ack_records 
+            SET updated_at = ?, hop_limit = ?, hop_start = ?
             WHERE note_id = ? AND lora_node_id = ?
-        ''', (note_id, lora_node_id))
-        
-        existing_record = cursor.fetchone()
+        ''', [(timestamp, hop_limit, hop_start, note_id, lora_node_id) for note_id in update_note_ids])
+        # 往返時間在第一次收到 ACK 時計算並保存，之後的重送不會改寫；
+        # 扣除對方延遲發送 ACK 的時間（ACK_DELAY_SECONDS），最後一次傳輸距今不足最短延遲時，
+        # 此 ACK 回應的是更早的傳輸（時間已被覆寫），不列入樣本
+        min_ack_delay_ms = int(max(0, ACK_DELAY_SECONDS - ACK_JITTER_SECONDS) * 1000)
+        ack_delay_ms = int(ACK_DELAY_SECONDS * 1000)
+        cursor.executemany('''
+            INSERT INTO ack_records (ack_id, note_id, created_at, updated_at, lora_node_id, hop_limit, hop_start, latency_ms)
+            VALUES (?, ?, ?, ?, ?, ?, ?, (
+                SELECT MAX(0, ? - transmit_st_at - ?) FROM notes
+                WHERE note_id = ? AND status = 'LoRa sent' AND ? - transmit_st_at >= ?
+            ))
+        ''', [(str(uuid.uuid4()), note_id, timestamp, timestamp, lora_node_id, hop_limit, hop_start,
+               timestamp, ack_delay_ms, note_id, timestamp, min_ack_delay_ms)
+              for note_id in insert_note_ids])
+        # 同一交易內維護 notes.ack_count / last_ack_at（自動補發候選查詢使用）
+        cursor.executemany('''
+            UPDATE notes SET ack_count = ack_count + ?, last_ack_at = ?
+            WHERE note_id = ?
+        ''', [(0 if note_id in existing_note_ids else 1, timestamp, note_id) for note_id in note_ids])
+        conn.commit()
+        conn.close()
         
-        if existing_record:
-            cursor.execute('''
-                UPDATE ack_records 
-                SET updated_at = ?, hop_limit = ?, hop_start = ?
-                WHERE note_id = ? AND lora_node_id = ?
-            ''', (timestamp, hop_limit, hop_start, note_id, lora_node_id))
-            conn.commit()
-            conn.close()
-            print(f"  -> 已更新 ACK 記錄 (note_id={note_id}, lora_node_id={lora_node_id}, hop_limit={hop_limit}, hop_start={hop_start})")
-            return True
+        if board_ids:
+            for board_id in board_ids:
+                invalidate_notes_cache(board_id)
         else:
-            ack_id = str(uuid.uuid4())
-            cursor.execute('''
-                INSERT INTO ack_records (ack_id, note_id, created_at, updated_at, lora_node_id, hop_limit, hop_start)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (ack_id, note_id, timestamp, timestamp, lora_node_id, hop_limit, hop_start))
-            conn.commit()
-            conn.close()
-            print(f"  -> 已新建 USER ACK 記錄 (ack_id={ack_id}, note_id={note_id}, lora_node_id={lora_node_id}, hop_limit={hop_limit}, hop_start={hop_start})")
-            return True
+            invalidate_notes_cache()
+        print(f"  -> 已儲存 USER ACK 記錄 (新建 {len(insert_note_ids)} 筆, 更新 {len(update_note_ids)} 筆, "
+              f"lora_node_id={lora_node_id}, hop_limit={hop_limit}, hop_start={hop_start})")
+        return True
     except Exception as e:
         print(f"儲存或更新 USER ACK 記錄失敗: {e}")
         return False
 
+def save_or_update_ack_record(note_id, lora_node_id, hop_limit=None, hop_start=None):
+    """儲存或更新 ACK 記錄"""
+    return save_ack_records([note_id], lora_node_id, hop_limit=hop_limit, hop_start=hop_start)
+
 def update_note_color(lora_msg_id, author_key, color_index, need_lora_update=False):
     """透過 lora_msg_id 更新 note 的背景顏色，需驗證 author_key"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db_connection()
         cursor = conn.cursor()
         bg_color = get_color_from_palette(color_index)
         timestamp = int(time.time() * 1000)
@@ -626,6 +989,8 @@ def update_note_color(lora_msg_id, author_key, color_index, need_lora_update=Fal
         affected_rows = cursor.rowcount
         conn.commit()
         conn.close()
+        if affected_rows > 0:
+            invalidate_notes_cache()
         return affected_rows > 0
     except Exception as e:
         print(f"更新 note 顏色失敗: {e}")
@@ -634,7 +999,7 @@ def update_note_color(lora_msg_id, author_key, color_index, need_lora_update=Fal
 def update_note_color_by_note_id(note_id, author_key, color_index, need_lora_update=False):
     """透過 note_id 更新 note 的背景顏色，需驗證 author_key"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db_connection()
         cursor = conn.cursor()
         bg_color = get_color_from_palette(color_index)
         timestamp = int(time.time() * 1000)
@@ -655,6 +1020,8 @@ def update_note_color_by_note_id(note_id, author_key, color_index, need_lora_upd
         affected_rows = cursor.rowcount
         conn.commit()
         conn.close()
+        if affected_rows > 0:
+            invalidate_notes_cache()
         return affected_rows > 0
     except Exception as e:
         print(f"更新 note 顏色失敗: {e}")
@@ -663,7 +1030,7 @@ def update_note_color_by_note_id(note_id, author_key, color_index, need_lora_upd
 def update_note_author(lora_msg_id, author_key):
     """更新 note 的 author_key"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db_connection()
         cursor = conn.cursor()
         timestamp = int(time.time() * 1000)
         
@@ -676,6 +1043,8 @@ def update_note_author(lora_msg_id, author_key):
         affected_rows = cursor.rowcount
         conn.commit()
         conn.close()
+        if affected_rows > 0:
+            invalidate_notes_cache()
         return affected_rows > 0
     except Exception as e:
         print(f"更新 note author_key 失敗: {e}")
@@ -684,7 +1053,7 @@ def update_note_author(lora_msg_id, author_key):
 def archive_note(note_id, author_key, need_lora_update=False):
     """將 note 標記為已刪除 (deleted=1)，需驗證 author_key"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db_connection()
         cursor = conn.cursor()
         timestamp = int(time.time() * 1000)
         
@@ -704,6 +1073,8 @@ def archive_note(note_id, author_key, need_lora_update=False):
         affected_rows = cursor.rowcount
         conn.commit()
         conn.close()
+        if affected_rows > 0:
+            invalidate_notes_cache()
         return affected_rows > 0
     except Exception as e:
         print(f"封存 note 失敗: {e}")
@@ -712,7 +1083,7 @@ def archive_note(note_id, author_key, need_lora_update=False):
 def archive_note_by_lora_msg_id(lora_msg_id, author_key):
     """透過 lora_msg_id 將 note 標記為已刪除 (deleted=1)，需驗證 author_key"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db_connection()
         cursor = conn.cursor()
         timestamp = int(time.time() * 1000)
         
@@ -725,6 +1096,8 @@ def archive_note_by_lora_msg_id(lora_msg_id, author_key):
         affected_rows = cursor.rowcount
         conn.commit()
         conn.close()
+        if affected_rows > 0:
+            invalidate_notes_cache()
         return affected_rows > 0
     except Exception as e:
         print(f"封存 note 失敗: {e}")
@@ -733,27 +1106,29 @@ def archive_note_by_lora_msg_id(lora_msg_id, author_key):
 def mark_sheet_notes_deleted(board_id, sheet_id, exclude_note_id=None):
     """將指定 sheetId 的所有 notes 標記為 deleted（排除指定的 note_id）"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db_connection()
         cursor = conn.cursor()
         timestamp = int(time.time() * 1000)
-        pattern = '{' + sheet_id + ':%'
 
         if exclude_note_id:
             cursor.execute('''
                 UPDATE notes 
                 SET deleted = 1, updated_at = ?
-                WHERE board_id = ? AND body LIKE ? AND note_id != ? AND deleted = 0
-            ''', (timestamp, board_id, pattern, exclude_note_id))
+                WHERE sheet_id = ? AND board_id = ? AND note_id != ? AND deleted = 0
+            ''', (timestamp, sheet_id, board_id, exclude_note_id))
         else:
             cursor.execute('''
                 UPDATE notes 
                 SET deleted = 1, updated_at = ?
-                WHERE board_id = ? AND body LIKE ? AND deleted = 0
-            ''', (timestamp, board_id, pattern))
+                WHERE sheet_id = ? AND board_id = ? AND deleted = 0
+            ''', (timestamp, sheet_id, board_id))
 
         affected_rows = cursor.rowcount
+        apply_pending_sheet_cells(cursor, board_id)
         conn.commit()
         conn.close()
+        if affected_rows > 0:
+            invalidate_notes_cache(board_id)
         print(f"[刪除工作表] 已將 {affected_rows} 筆 sheetId={sheet_id} 的 notes 標記為 deleted (board_id={board_id})")
         return affected_rows
     except Exception as e:
@@ -763,7 +1138,7 @@ def mark_sheet_notes_deleted(board_id, sheet_id, exclude_note_id=None):
 def pin_note_by_lora_msg_id(lora_msg_id, author_key):
     """透過 lora_msg_id 將 note 標記為置頂 (is_pined_note=1)，需驗證 author_key 和 lora_msg_id 存在"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db_connection()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         timestamp = int(time.time() * 1000)
@@ -814,6 +1189,7 @@ def pin_note_by_lora_msg_id(lora_msg_id, author_key):
         affected_rows = cursor.rowcount
         conn.commit()
         conn.close()
+        invalidate_notes_cache(board_id)
         return affected_rows > 0
     except Exception as e:
         print(f"置頂 note 失敗: {e}")
@@ -822,7 +1198,7 @@ def pin_note_by_lora_msg_id(lora_msg_id, author_key):
 def save_lora_note(lora_msg_id, board_id, body, bg_color='', author_key='', reply_lora_msg_id=None, lora_node_id=''):
     """儲存 LoRa 接收的 note"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db_connection()
         cursor = conn.cursor()
         timestamp = int(time.time() * 1000)
         status = 'LoRa received'
@@ -837,28 +1213,73 @@ def save_lora_note(lora_msg_id, board_id, body, bg_color='', author_key='', repl
         ch_cfg = get_channel_config(board_id)
         ch_max_notes = ch_cfg.get('max_notes', MAX_NOTES)
         auto_archive_old_notes(cursor, board_id, ch_max_notes)
+        apply_pending_sheet_cells(cursor, board_id)
         
         conn.commit()
         conn.close()
+        invalidate_notes_cache(board_id)
         return True
     except Exception as e:
         print(f"儲存 LoRa note 失敗: {e}")
         return False
 
-def get_oldest_lan_only_note(board_id):
-    """取得最舊的 LAN only 狀態的 note"""
+def save_lora_reply(lora_msg_id, board_id, reply_lora_msg_id, body, bg_color='', author_key='', is_temp_parent_note=0, lora_node_id=''):
+    """儲存 LoRa 接收的回覆 note，父訊息不存在本機時 is_temp_parent_note=1"""
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        timestamp = int(time.time() * 1000)
+        status = 'LoRa received'
+        note_id = generate_note_id()
+        
+        cursor.execute('''
+            INSERT INTO notes (note_id, reply_lora_msg_id, board_id, body, bg_color, status, 
+                             created_at, updated_at, author_key, rev, deleted, lora_msg_id, is_temp_parent_note, lora_node_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 1, 0, ?, ?, ?)
+        ''', (note_id, reply_lora_msg_id, board_id, body, bg_color, status, 
+              timestamp, timestamp, author_key, lora_msg_id, is_temp_parent_note, lora_node_id))
+        
+        ch_cfg = get_channel_config(board_id)
+        auto_archive_old_notes(cursor, board_id, ch_cfg.get('max_notes', MAX_NOTES))
+        
+        conn.commit()
+        conn.close()
+        return True
+    except Exception as e:
+        print(f"  -> 儲存回覆訊息失敗: {e}")
+        return False
+
+def clear_temp_parent_flag(parent_lora_msg_id):
+    """父訊息已存在本機後，將以其為父訊息的回覆 is_temp_parent_note 設為 0"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE notes SET is_temp_parent_note = 0
+            WHERE reply_lora_msg_id = ? AND is_temp_parent_note = 1
+        ''', (parent_lora_msg_id,))
+        updated_count = cursor.rowcount
+        conn.commit()
+        conn.close()
+        if updated_count > 0:
+            print(f"  -> 已更新 {updated_count} 筆回覆的 is_temp_parent_note 為 0")
+        return updated_count
+    except Exception as e:
+        print(f"  -> 更新 is_temp_parent_note 失敗: {e}")
+        return 0
+
+def get_lan_only_note(board_id, note_id):
+    """取得指定的待發送 note（LAN only 或 Sending 且未刪除），不符合時回傳 None"""
+    try:
+        conn = get_db_connection()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
         cursor.execute('''
             SELECT note_id, body, bg_color, author_key, created_at, reply_lora_msg_id
             FROM notes 
-            WHERE board_id = ? AND (status = 'LAN only' OR status = 'Sending') AND deleted = 0
-            ORDER BY created_at ASC
-            LIMIT 1
-        ''', (board_id,))
+            WHERE note_id = ? AND board_id = ? AND (status = 'LAN only' OR status = 'Sending') AND deleted = 0
+        ''', (note_id, board_id))
         
         row = cursor.fetchone()
         conn.close()
@@ -874,23 +1295,33 @@ def get_oldest_lan_only_note(board_id):
             }
         return None
     except Exception as e:
-        print(f"取得最舊 LAN only note 失敗: {e}")
+        print(f"取得待發送 note 失敗: {e}")
         return None
 
-def get_note_need_update_lora(board_id):
-    """取得一個需要更新到 LoRa 的 note (is_need_update_lora=1)"""
+def get_note_need_update_lora(board_id, note_id=None):
+    """取得一個需要更新到 LoRa 的 note (is_need_update_lora=1)，並清除其更新標記
+
+    指定 note_id 時只取得該 note（不需更新時回傳 None）。
+    """
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db_connection()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
-        cursor.execute('''
-            SELECT note_id, body, bg_color, author_key, deleted, lora_msg_id
-            FROM notes 
-            WHERE board_id = ? AND is_need_update_lora = 1
-            ORDER BY updated_at ASC
-            LIMIT 1
-        ''', (board_id,))
+        if note_id:
+            cursor.execute('''
+                SELECT note_id, body, bg_color, author_key, deleted, lora_msg_id
+                FROM notes 
+                WHERE board_id = ? AND note_id = ? AND is_need_update_lora = 1
+            ''', (board_id, note_id))
+        else:
+            cursor.execute('''
+                SELECT note_id, body, bg_color, author_key, deleted, lora_msg_id
+                FROM notes 
+                WHERE board_id = ? AND is_need_update_lora = 1
+                ORDER BY updated_at ASC
+                LIMIT 1
+            ''', (board_id,))
         
         row = cursor.fetchone()
         
@@ -924,7 +1355,7 @@ def get_note_need_update_lora(board_id):
 def update_note_status(note_id, status):
     """更新 note 的 status"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db_connection()
         cursor = conn.cursor()
         timestamp = int(time.time() * 1000)
         
@@ -937,6 +1368,8 @@ def update_note_status(note_id, status):
         affected_rows = cursor.rowcount
         conn.commit()
         conn.close()
+        if affected_rows > 0:
+            invalidate_notes_cache()
         return affected_rows > 0
     except Exception as e:
         print(f"更新 note status 失敗: {e}")
@@ -945,7 +1378,7 @@ def update_note_status(note_id, status):
 def update_note_lora_msg_id(note_id, lora_msg_id):
     """更新 note 的 lora_msg_id"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db_connection()
         cursor = conn.cursor()
         timestamp = int(time.time() * 1000)
         
@@ -958,6 +1391,8 @@ def update_note_lora_msg_id(note_id, lora_msg_id):
         affected_rows = cursor.rowcount
         conn.commit()
         conn.close()
+        if affected_rows > 0:
+            invalidate_notes_cache()
         return affected_rows > 0
     except Exception as e:
         print(f"更新 note lora_msg_id 失敗: {e}")
@@ -966,7 +1401,7 @@ def update_note_lora_msg_id(note_id, lora_msg_id):
 def update_note_transmit_st_at(note_id):
     """記錄 note 開始傳輸的時間"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db_connection()
         cursor = conn.cursor()
         timestamp = int(time.time() * 1000)
         
@@ -984,10 +1419,151 @@ def update_note_transmit_st_at(note_id):
         print(f"更新 note transmit_st_at 失敗: {e}")
         return False
 
+# GET /api/boards/<board_id>/notes 的回應快取
+# 每次 refresh_notes 廣播後，所有連線中的手機會同時重新讀取 notes，
+# 因此將組好的 JSON 回應依 (board_id, is_include_deleted, include_acks) 保存在記憶體中，
+# 只有在資料異動（invalidate_notes_cache）或跨日（相對時間文字改變）後才重建一次。
+_notes_cache = {}           # key: (board_id, is_include_deleted, include_acks) -> {'version', 'date', 'data'}
+_notes_cache_versions = {}  # key: board_id -> 異動版本號
+_notes_cache_global_version = 0
+_notes_cache_lock = threading.Lock()
+_notes_cache_build_locks = {}  # key: 同 _notes_cache -> 重建用的 lock，各頻道獨立重建（快取失效時與快取一併移除）
+
+def invalidate_notes_cache(board_id=None):
+    """標記 notes 快取失效；board_id 為 None 時（不確定異動哪個頻道）清除所有頻道
+
+    接收批次中呼叫時延後到交易提交後，避免提交前重建的快取內容仍是舊資料。
+    """
+    if defer_in_receive_batch(invalidate_notes_cache, board_id):
+        return
+    global _notes_cache_global_version
+    with _notes_cache_lock:
+        if board_id is None:
+            _notes_cache_global_version += 1
+            _notes_cache.clear()
+        else:
+            _notes_cache_versions[board_id] = _notes_cache_versions.get(board_id, 0) + 1
+            for key in [k for k in _notes_cache if k[0] == board_id]:
+                del _notes_cache[key]
+        # 重建中的 lock 保留給等待中的請求，其餘與快取一併移除
+        for key in [k for k, lock in _notes_cache_build_locks.items()
+                    if (board_id is None or k[0] == board_id) and not lock.locked()]:
+            del _notes_cache_build_locks[key]
+
+def _get_notes_cache_version(board_id):
+    with _notes_cache_lock:
+        return (_notes_cache_global_version, _notes_cache_versions.get(board_id, 0))
+
+def get_cached_notes_response(board_id, is_include_deleted, include_acks, builder):
+    """取得快取的 notes JSON 回應內容（bytes），快取失效時呼叫 builder() 重建
+
+    同一個 key 同一時間只會有一個請求進行重建，其他請求等待後直接使用重建結果；
+    不同頻道各自重建，互不阻塞。
+    """
+    key = (board_id, is_include_deleted, include_acks)
+    today = datetime.now().date()
+
+    entry = _notes_cache.get(key)
+    if entry and entry['version'] == _get_notes_cache_version(board_id) and entry['date'] == today:
+        return entry['data']
+
+    with _notes_cache_lock:
+        build_lock = _notes_cache_build_locks.get(key)
+        if build_lock is None:
+            build_lock = _notes_cache_build_locks[key] = threading.Lock()
+
+    with build_lock:
+        # 等待期間可能已由其他請求重建完成
+        version = _get_notes_cache_version(board_id)
+        entry = _notes_cache.get(key)
+        if entry and entry['version'] == version and entry['date'] == today:
+            return entry['data']
+
+        data = builder()
+        with _notes_cache_lock:
+            # 重建期間若資料又有異動，不寫入快取，下次請求再重建
+            if version == (_notes_cache_global_version, _notes_cache_versions.get(board_id, 0)):
+                _notes_cache[key] = {'version': version, 'date': today, 'data': data}
+        return data
+
+# notes 異動推播
+# 各頻道的 client 加入 Socket.IO room（board:<board_id>），異動時只推播給該頻道，
+# 並在 NOTES_EVENT_COALESCE_SECONDS 內合併多次異動（例如大量 LoRa table cell 訊息），
+# 以 notes_delta 事件一次送出 cursor 之後異動的討論串。
+# 未送出 join_board 的舊版前端留在 NOTES_LEGACY_ROOM，照舊收到不含內容的 refresh_notes。
+NOTES_EVENT_COALESCE_SECONDS = 0.3
+NOTES_LEGACY_ROOM = 'notes_legacy'
+_notes_event_pending = set()
+_notes_event_scheduled = False
+_notes_event_cursors = {}   # key: board_id -> 上次推播 notes_delta 時的 cursor
+_notes_event_lock = threading.Lock()
+
+def get_board_room(board_id):
+    return f'board:{board_id}'
+
+def notify_notes_changed(board_id):
+    """通知前端指定頻道的 notes 有異動（延遲合併後推播，接收批次中呼叫時於交易提交後才推播）"""
+    if defer_in_receive_batch(notify_notes_changed, board_id):
+        return
+    global _notes_event_scheduled
+    with _notes_event_lock:
+        _notes_event_pending.add(board_id)
+        if _notes_event_scheduled:
+            return
+        _notes_event_scheduled = True
+    socketio.start_background_task(_flush_notes_events)
+
+def _flush_notes_events():
+    """等待合併時間後，為每個有異動的頻道推播一次事件"""
+    global _notes_event_pending, _notes_event_scheduled
+    socketio.sleep(NOTES_EVENT_COALESCE_SECONDS)
+    with _notes_event_lock:
+        board_ids = _notes_event_pending
+        _notes_event_pending = set()
+        _notes_event_scheduled = False
+    
+    for board_id in board_ids:
+        socketio.emit('refresh_notes', {'board_id': board_id}, to=NOTES_LEGACY_ROOM)
+        try:
+            since_cursor = _notes_event_cursors.get(board_id)
+            if since_cursor is None:
+                # 尚無基準 cursor，只通知 client 自行以 HTTP delta 查詢
+                _notes_event_cursors[board_id] = get_notes_sync_cursor()
+                socketio.emit('notes_delta', {'board_id': board_id}, to=get_board_room(board_id))
+                continue
+            delta = build_board_notes_delta(board_id, since_cursor, False, include_acks=True)
+            _notes_event_cursors[board_id] = delta['cursor']
+            if delta['notes'] or delta['removed']:
+                socketio.emit('notes_delta', delta, to=get_board_room(board_id))
+        except Exception as e:
+            print(f"[推播] 推播 notes 異動失敗 ({board_id}): {e}")
+            socketio.emit('notes_delta', {'board_id': board_id}, to=get_board_room(board_id))
+    
+    # LAN only 數量跨頻道顯示，推播給所有 client（含停留在其他頻道 room 者）
+    if board_ids:
+        try:
+            socketio.emit('lan_only_count', {'count': count_global_lan_only_notes()})
+        except Exception as e:
+            print(f"[推播] 推播 LAN only 數量失敗: {e}")
+
+def notify_ack_received(note_id, lora_node_id):
+    """推播 ACK 更新（附帶該 note 最新的 ACK 清單）給 note 所屬頻道"""
+    payload = {'note_id': note_id, 'lora_node_id': lora_node_id}
+    socketio.emit('ack_received', payload, to=NOTES_LEGACY_ROOM)
+    board_id = _get_note_board_id(note_id)
+    if not board_id:
+        return
+    try:
+        payload = dict(payload, board_id=board_id,
+                       acks=get_acks_grouped_by_note(board_id, [note_id]).get(note_id, []))
+    except Exception as e:
+        print(f"[推播] 取得 ACK 清單失敗: {e}")
+    socketio.emit('ack_received', payload, to=get_board_room(board_id))
+
 def get_notes_from_db(board_id, include_deleted=False):
     """從資料庫取得 notes"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db_connection()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -995,10 +1571,7 @@ def get_notes_from_db(board_id, include_deleted=False):
         max_notes = ch_cfg.get('max_notes', 200)
         max_archived = ch_cfg.get('max_archived_notes', 200)
         
-        # 分開查詢：非 table 指令的 notes 與 table 指令的 notes
-        # table 指令的 body 匹配 {xxxxxx:...} 格式
-        table_glob = '{[a-z0-9][a-z0-9][a-z0-9][a-z0-9][a-z0-9][a-z0-9]:*'
-        
+        # 分開查詢：非 table 指令的 notes 與 table 指令的 notes（is_table: body 匹配 {xxxxxx:...} 格式）
         if include_deleted:
             non_table_limit = max_notes + max_archived
             table_limit = max_notes + max_archived
@@ -1007,20 +1580,20 @@ def get_notes_from_db(board_id, include_deleted=False):
                 SELECT note_id, reply_lora_msg_id, body, bg_color, status, 
                        created_at, updated_at, author_key, rev, deleted, lora_msg_id, is_temp_parent_note, is_pined_note, lora_node_id
                 FROM notes 
-                WHERE board_id = ? AND body NOT GLOB ?
+                WHERE board_id = ? AND is_table = 0
                 ORDER BY is_pined_note DESC, created_at DESC
                 LIMIT ?
-            ''', (board_id, table_glob, non_table_limit))
+            ''', (board_id, non_table_limit))
             non_table_rows = cursor.fetchall()
             # table 指令 notes
             cursor.execute('''
                 SELECT note_id, reply_lora_msg_id, body, bg_color, status, 
                        created_at, updated_at, author_key, rev, deleted, lora_msg_id, is_temp_parent_note, is_pined_note, lora_node_id
                 FROM notes 
-                WHERE board_id = ? AND body GLOB ?
+                WHERE board_id = ? AND is_table = 1
                 ORDER BY created_at DESC
                 LIMIT ?
-            ''', (board_id, table_glob, table_limit))
+            ''', (board_id, table_limit))
             table_rows = cursor.fetchall()
         else:
             # 非 table 指令 notes（未刪除）
@@ -1028,20 +1601,20 @@ def get_notes_from_db(board_id, include_deleted=False):
                 SELECT note_id, reply_lora_msg_id, body, bg_color, status, 
                        created_at, updated_at, author_key, rev, deleted, lora_msg_id, is_temp_parent_note, is_pined_note, lora_node_id
                 FROM notes 
-                WHERE board_id = ? AND deleted = 0 AND body NOT GLOB ?
+                WHERE board_id = ? AND deleted = 0 AND is_table = 0
                 ORDER BY is_pined_note DESC, created_at DESC
                 LIMIT ?
-            ''', (board_id, table_glob, max_notes))
+            ''', (board_id, max_notes))
             non_table_rows = cursor.fetchall()
             # table 指令 notes（未刪除）
             cursor.execute('''
                 SELECT note_id, reply_lora_msg_id, body, bg_color, status, 
                        created_at, updated_at, author_key, rev, deleted, lora_msg_id, is_temp_parent_note, is_pined_note, lora_node_id
                 FROM notes 
-                WHERE board_id = ? AND deleted = 0 AND body GLOB ?
+                WHERE board_id = ? AND deleted = 0 AND is_table = 1
                 ORDER BY created_at DESC
                 LIMIT ?
-            ''', (board_id, table_glob, max_notes))
+            ''', (board_id, max_notes))
             table_rows = cursor.fetchall()
         
         rows = list(non_table_rows) + list(table_rows)
@@ -1117,6 +1690,36 @@ def get_channel_index(interface, channel_name):
     except Exception as e:
         return 0
 
+def is_compact_channel(channel_name):
+    """頻道是否啟用精簡二進位編碼（頻道設定 compact_protocol）"""
+    return bool(get_channel_config(channel_name).get('compact_protocol', False))
+
+def encode_lora_command(channel_name, msg):
+    """依頻道設定將命令編碼為實際發送的 payload
+
+    啟用 compact_protocol 且可編碼、編碼後較小時回傳 bytes，否則回傳原本的文字。
+    """
+    if is_compact_channel(channel_name):
+        data = encode_command(msg, unpack=unpack_lora_messages)
+        if data is not None and len(data) < len(msg.encode('utf-8')):
+            return data
+    return msg
+
+def send_lora_command(interface_obj, channel_name, msg, wantAck=False):
+    """發送命令至指定頻道，啟用 compact_protocol 的頻道改以 PRIVATE_APP 二進位格式發送
+
+    回傳值與 sendText 相同（發送的 MeshPacket）。
+    """
+    channel_index = get_channel_index(interface_obj, channel_name)
+    payload = encode_lora_command(channel_name, msg)
+    if isinstance(payload, bytes):
+        return interface_obj.sendData(payload, portNum=COMPACT_PORTNUM, channelIndex=channel_index, wantAck=wantAck)
+    return interface_obj.sendText(msg, channelIndex=channel_index, wantAck=wantAck)
+
+def estimate_lora_airtime(channel_name, msg):
+    """估算命令在指定頻道實際發送時的 airtime（秒）"""
+    return estimate_airtime(encode_lora_command(channel_name, msg))
+
 def get_color_index_from_palette(bg_color):
     """從背景顏色取得調色盤索引"""
     try:
@@ -1127,9 +1730,45 @@ def get_color_index_from_palette(bg_color):
         return 0
 
 def _spawn_ack_delayed(lora_msg_id, interface_obj, channel_name):
-    """排程延遲發送 ACK（30 ± 3 秒）"""
-    delay = ACK_DELAY_SECONDS + (random.uniform(-3, 3) if ACK_JITTER else 0)
-    eventlet.spawn_after(delay, send_ack_delayed, lora_msg_id, interface_obj, channel_name)
+    """排程延遲發送 ACK（30 ± 3 秒）
+
+    啟用 LORA_AGGREGATE_ACKS 時，延遲期間內同頻道收到的其他訊息併入同一批，
+    到期後以 /ack id1,id2,... 一次發送。接收批次中呼叫時延後到交易提交後才排程。
+    """
+    if defer_in_receive_batch(_spawn_ack_delayed, lora_msg_id, interface_obj, channel_name):
+        return
+    delay = ACK_DELAY_SECONDS + (random.uniform(-ACK_JITTER_SECONDS, ACK_JITTER_SECONDS) if ACK_JITTER else 0)
+    if not LORA_AGGREGATE_ACKS:
+        eventlet.spawn_after(delay, send_ack_delayed, lora_msg_id, interface_obj, channel_name)
+        return
+    with _pending_user_acks_lock:
+        pending = _pending_user_acks.get(channel_name)
+        if pending is not None:
+            if lora_msg_id not in pending:
+                pending.append(lora_msg_id)
+            return
+        _pending_user_acks[channel_name] = [lora_msg_id]
+    eventlet.spawn_after(delay, _flush_user_acks, interface_obj, channel_name)
+
+def split_ack_ids(lora_msg_ids):
+    """將 lora_msg_id 分組，每組組成的 /ack id1,id2,... 不超過 LORA_MAX_TEXT_BYTES"""
+    groups = []
+    current = []
+    for lora_msg_id in lora_msg_ids:
+        if current and len(f"/ack {','.join(current + [lora_msg_id])}".encode('utf-8')) > LORA_MAX_TEXT_BYTES:
+            groups.append(current)
+            current = []
+        current.append(lora_msg_id)
+    if current:
+        groups.append(current)
+    return groups
+
+def _flush_user_acks(interface_obj, channel_name):
+    """發送頻道累積的 USER ACK"""
+    with _pending_user_acks_lock:
+        lora_msg_ids = _pending_user_acks.pop(channel_name, [])
+    for group in split_ack_ids(lora_msg_ids):
+        send_ack_delayed(','.join(group), interface_obj, channel_name)
 
 def send_ack_delayed(lora_msg_id, interface_obj, channel_name, retry_count=0, max_retries=3):
     """延遲發送 USER ACK 命令（含重試機制）"""
@@ -1147,7 +1786,7 @@ def send_ack_delayed(lora_msg_id, interface_obj, channel_name, retry_count=0, ma
             return
         
         ack_cmd = f"/ack {lora_msg_id}"
-        interface_obj.sendText(ack_cmd, channelIndex=get_channel_index(interface_obj, channel_name))
+        send_lora_command(interface_obj, channel_name, ack_cmd)
         print(f"  -> [延遲 ~30 秒後] 已發送 USER ACK 命令: {ack_cmd}")
     except Exception as e:
         print(f"  -> [延遲 ~30 秒後] 發送 USER ACK 命令失敗 (嘗試 {retry_count + 1}/{max_retries + 1}): {e}")
@@ -1159,13 +1798,359 @@ def send_ack_delayed(lora_msg_id, interface_obj, channel_name, retry_count=0, ma
         else:
             print(f"  -> 已達最大重試次數，放棄發送 ACK 命令")
 
+def mark_note_lora_sent(note_id, lora_msg_id):
+    """收到設備 ACK 後，將 note 標記為 LoRa sent 並記錄 lora_msg_id"""
+    if not update_note_status(note_id, 'LoRa sent'):
+        return False
+    print(f"  -> 已更新 note {note_id} 狀態為 'LoRa sent'")
+    
+    # table view 格式的 note，發送成功時同步更新 created_at（以發送時間為基準）
+    try:
+        _conn = get_db_connection()
+        _conn.row_factory = sqlite3.Row
+        _cur = _conn.cursor()
+        _cur.execute('SELECT body, updated_at FROM notes WHERE note_id = ?', (note_id,))
+        _row = _cur.fetchone()
+        if _row and _is_table_format_note(_row['body']):
+            _cur.execute('UPDATE notes SET created_at = ? WHERE note_id = ?', (_row['updated_at'], note_id))
+            _conn.commit()
+            print(f"  -> [table note] 已同步更新 created_at = updated_at ({_row['updated_at']})")
+        _conn.close()
+    except Exception as e:
+        print(f"  -> [table note] 更新 created_at 失敗: {e}")
+    
+    try:
+        update_note_lora_msg_id(note_id, lora_msg_id)
+        print(f"  -> 已儲存 lora_msg_id: {lora_msg_id}")
+        print(f"  -> color_id 與 author_key 已在訊息中一併發送")
+    except Exception as e:
+        print(f"  -> 更新 lora_msg_id 失敗: {e}")
+    return True
+
+def run_after_receive_batch(func, *args):
+    """批次處理收到的封包時，將 UI 更新與記憶體狀態的更新延後到交易提交後執行（相同呼叫只執行一次）
+
+    整批 rollback 時不執行，避免記錄或通知未寫入資料庫的內容。
+    """
+    if not defer_in_receive_batch(func, *args):
+        func(*args)
+
+def defer_in_receive_batch(func, *args):
+    """目前在接收批次中時，將 func(*args) 延後到提交後於 eventlet hub 執行並回傳 True
+
+    批次在原生執行緒中執行，快取、推播、計時器等 eventlet 端的狀態不可在批次中直接操作。
+    """
+    deferred = getattr(_receive_local, 'deferred', None)
+    if deferred is None:
+        return False
+    deferred.setdefault((func, args), None)
+    return True
+
+def _process_receive_batch(batch, device_acks):
+    """在原生執行緒中以單一交易處理一批封包，回傳提交後要執行的延後呼叫"""
+    _receive_local.deferred = {}
+    _receive_local.device_acks = device_acks
+    try:
+        with batch_transaction():
+            for packet, packet_interface in batch:
+                onReceive(packet, packet_interface)
+        return _receive_local.deferred
+    finally:
+        _receive_local.deferred = None
+        _receive_local.device_acks = None
+
+def enqueue_received_packet(packet, interface):
+    """Meshtastic 收到封包時的 callback：只將封包放入接收佇列，不進行資料庫存取"""
+    decoded = packet.get('decoded') if isinstance(packet, dict) else None
+    if not decoded or decoded.get('portnum') not in RECEIVE_PORTNUMS:
+        return
+    receive_stats['received'] += 1
+    packet_key = (packet.get('from'), packet.get('id'))
+    if packet_key[1] is not None and packet_key in seen_packet_ids:
+        receive_stats['duplicate_packets'] += 1
+        return
+    try:
+        receive_queue.put_nowait((packet, interface))
+    except queue.Full:
+        receive_stats['dropped'] += 1
+        print(f"[接收佇列] 佇列已滿 ({RECEIVE_QUEUE_MAX})，捨棄封包 id={packet.get('id', 'N/A')}")
+        return
+    if packet_key[1] is not None:
+        seen_packet_ids.add(packet_key, time.time())
+    receive_stats['max_depth'] = max(receive_stats['max_depth'], receive_queue.qsize())
+
+def receive_worker_loop():
+    """接收佇列的處理迴圈：每次取出最多 RECEIVE_BATCH_MAX 個封包，在同一個交易內處理
+
+    sqlite 呼叫會阻塞整個 eventlet hub，因此批次交由 tpool 的原生執行緒處理，
+    UI 更新與記憶體狀態的更新於交易提交後回到 hub 執行。
+    """
+    print(f"啟動接收處理 (佇列上限: {RECEIVE_QUEUE_MAX}, 每批最多 {RECEIVE_BATCH_MAX} 筆)...")
+    while True:
+        batch = [receive_queue.get()]
+        while len(batch) < RECEIVE_BATCH_MAX:
+            try:
+                batch.append(receive_queue.get_nowait())
+            except queue.Empty:
+                break
+        
+        started_at = time.time()
+        device_acks = dict(filter(None, (claim_device_ack(packet) for packet, _ in batch)))
+        try:
+            deferred = tpool.execute(_process_receive_batch, batch, device_acks)
+            is_committed = True
+        except Exception as e:
+            # 整批已 rollback，延後的更新一併捨棄（對方重發時會重新處理並回覆 ACK）
+            print(f"[接收佇列] 批次處理失敗: {e}")
+            deferred = {}
+            is_committed = False
+        
+        for request_id in device_acks:
+            if is_committed:
+                forget_pending_ack(request_id)
+            else:
+                # 未能標記為已發送，移除等待項目後由排程器重新發送
+                release_pending_ack(request_id)
+        
+        for func, args in deferred:
+            try:
+                func(*args)
+            except Exception as e:
+                print(f"[接收佇列] 更新 UI 失敗: {e}")
+        
+        batch_ms = (time.time() - started_at) * 1000
+        receive_stats['processed'] += len(batch)
+        receive_stats['batches'] += 1
+        receive_stats['last_batch_size'] = len(batch)
+        receive_stats['last_batch_ms'] = round(batch_ms, 1)
+        receive_stats['max_batch_ms'] = round(max(receive_stats['max_batch_ms'], batch_ms), 1)
+
+LoraReceiveContext = namedtuple('LoraReceiveContext', 'packet interface channel_name lora_msg_id lora_uuid')
+
+def _color_from_id(color_id):
+    """將命令中的 color_id 轉為背景顏色，舊版格式（None）或非數字時回傳空字串"""
+    return get_color_from_palette(int(color_id)) if color_id and color_id.isdigit() else ''
+
+def _params_text(command):
+    """日誌用的 color_id / author_key 參數文字，舊版格式回傳空字串"""
+    if command.color_id is None:
+        return ''
+    return f", color_id={command.color_id}, author_key={command.author_key}"
+
+def _is_duplicate_lora_msg(ctx, lora_msg_id):
+    """重發的訊息已存在時回傳 True，並在 RECEIVE_REACK_INTERVAL_SECOND 內只重送一次 USER ACK
+
+    先查詢記憶體中的 received_lora_msg_ids，沒有記錄時才查詢資料庫。
+    """
+    key = (ctx.channel_name, lora_msg_id)
+    last_ack_at = received_lora_msg_ids.get(key)
+    if last_ack_at is None and not lora_msg_id_exists(lora_msg_id):
+        return False
+    
+    receive_stats['duplicate_msgs'] += 1
+    now = time.time()
+    if last_ack_at is not None and now - last_ack_at < RECEIVE_REACK_INTERVAL_SECOND:
+        receive_stats['reacks_suppressed'] += 1
+        print(f"[重複訊息] lora_msg_id={lora_msg_id} 已存在，{RECEIVE_REACK_INTERVAL_SECOND} 秒內已發送過 USER ACK，略過")
+        return True
+    
+    print(f"[重複訊息] lora_msg_id={lora_msg_id} 已存在，略過建立資料，但仍將在 ~30 秒後發送 USER ACK 命令")
+    run_after_receive_batch(received_lora_msg_ids.add, key, now)
+    _spawn_ack_delayed(lora_msg_id, ctx.interface, ctx.channel_name)
+    return True
+
+def _handle_note_command(command, ctx):
+    """處理 /msg 新訊息與重發訊息，回傳 (是否需要更新畫面, 是否為表格留言)"""
+    is_resend = isinstance(command, ResendNote)
+    lora_msg_id = command.lora_msg_id if is_resend else ctx.lora_msg_id
+    if is_resend and _is_duplicate_lora_msg(ctx, lora_msg_id):
+        return False, False
+    
+    title = '重發訊息' if is_resend else '新訊息'
+    has_params = command.color_id is not None
+    print(f"[{title}{' with params' if has_params else ''}] lora_msg_id={lora_msg_id}{_params_text(command)}, body={command.body}")
+    
+    if not save_lora_note(
+        lora_msg_id=lora_msg_id,
+        board_id=ctx.channel_name,
+        body=command.body,
+        bg_color=_color_from_id(command.color_id),
+        author_key=command.author_key,
+        lora_node_id=ctx.lora_uuid
+    ):
+        return False, False
+    
+    if is_resend:
+        print(f"[重發訊息寫入資料庫成功] lora_msg_id={lora_msg_id}, body={command.body}")
+    saved_params = f" (含 color_id={command.color_id}, author_key={command.author_key})" if has_params else ''
+    print(f"  -> 已儲存訊息{saved_params}，將在 ~30 秒後發送 USER ACK 命令")
+    run_after_receive_batch(received_lora_msg_ids.add, (ctx.channel_name, lora_msg_id), time.time())
+    _spawn_ack_delayed(lora_msg_id, ctx.interface, ctx.channel_name)
+    # 偵測工作表刪除指令
+    _sd_m = SHEET_DELETE_RE.match(command.body)
+    if _sd_m:
+        _sd_nid = get_note_id_by_lora_msg_id(lora_msg_id)
+        mark_sheet_notes_deleted(ctx.channel_name, _sd_m.group(1), exclude_note_id=_sd_nid)
+    if is_resend:
+        clear_temp_parent_flag(lora_msg_id)
+    return True, _is_table_format_note(command.body)
+
+def _handle_reply_command(command, ctx):
+    """處理 /reply 新回覆與重發回覆"""
+    is_resend = isinstance(command, ResendReply)
+    lora_msg_id = command.lora_msg_id if is_resend else ctx.lora_msg_id
+    # 檢查此回覆是否已存在
+    if is_resend and _is_duplicate_lora_msg(ctx, lora_msg_id):
+        return False, False
+    
+    parent_lora_msg_id = command.parent_lora_msg_id
+    has_params = command.color_id is not None
+    if is_resend:
+        print(f"[重發回覆訊息{' with params' if has_params else ''}] resend_lora_msg_id={lora_msg_id}, parent_lora_msg_id={parent_lora_msg_id}{_params_text(command)}, body={command.body}")
+    else:
+        print(f"[新回覆訊息{' with params' if has_params else ''}] parent_lora_msg_id={parent_lora_msg_id}{_params_text(command)}, body={command.body}")
+    
+    if lora_msg_id_exists(parent_lora_msg_id):
+        is_temp_parent = 0
+        print(f"  -> 找到父訊息 lora_msg_id: {parent_lora_msg_id}")
+    else:
+        is_temp_parent = 1
+        print(f"  -> 父訊息 lora_msg_id {parent_lora_msg_id} 不存在本機，仍將 reply_lora_msg_id 設為 {parent_lora_msg_id}，並設定 is_temp_parent_note=1")
+    
+    if not save_lora_reply(
+        lora_msg_id=lora_msg_id,
+        board_id=ctx.channel_name,
+        reply_lora_msg_id=parent_lora_msg_id,
+        body=command.body,
+        bg_color=_color_from_id(command.color_id),
+        author_key=command.author_key,
+        is_temp_parent_note=is_temp_parent,
+        lora_node_id=ctx.lora_uuid
+    ):
+        return False, False
+    
+    saved_params = f" (含 color_id={command.color_id}, author_key={command.author_key})" if has_params else ''
+    if is_resend:
+        print(f"[重發回覆寫入資料庫成功] lora_msg_id={lora_msg_id}, body={command.body}")
+        print(f"  -> 已儲存訊息{saved_params}，將在 ~30 秒後發送 USER ACK 命令")
+    else:
+        print(f"  -> 成功儲存回覆訊息{saved_params}，將在 ~30 秒後發送 USER ACK 命令")
+    run_after_receive_batch(received_lora_msg_ids.add, (ctx.channel_name, lora_msg_id), time.time())
+    _spawn_ack_delayed(lora_msg_id, ctx.interface, ctx.channel_name)
+    if is_resend:
+        # 更新以此回覆為父訊息的其他回覆
+        clear_temp_parent_flag(lora_msg_id)
+    return True, False
+
+def _handle_color_command(command, ctx):
+    print(f"[設定顏色] lora_msg_id={command.lora_msg_id}, author_key={command.author_key}, color_id={command.color_id}")
+    if update_note_color(command.lora_msg_id, command.author_key, command.color_id):
+        print(f"  -> 成功更新 note (lora_msg_id={command.lora_msg_id}) 的顏色")
+        return True, False
+    print(f"  -> 更新失敗，lora_msg_id {command.lora_msg_id} 不存在或 author_key 不符")
+    return False, False
+
+def _handle_author_command(command, ctx):
+    print(f"[更新作者] lora_msg_id={command.lora_msg_id}, author_key={command.author_key}")
+    if update_note_author(command.lora_msg_id, command.author_key):
+        print(f"  -> 成功更新 note (lora_msg_id={command.lora_msg_id}) 的 author_key 為 {command.author_key}")
+        return True, False
+    print(f"  -> 更新失敗，lora_msg_id {command.lora_msg_id} 可能不存在")
+    return False, False
+
+def _handle_archive_command(command, ctx):
+    print(f"[封存訊息] lora_msg_id={command.lora_msg_id}, author_key={command.author_key}")
+    if archive_note_by_lora_msg_id(command.lora_msg_id, command.author_key):
+        print(f"  -> 成功封存 note (lora_msg_id={command.lora_msg_id})")
+        return True, False
+    print(f"  -> 封存失敗，lora_msg_id {command.lora_msg_id} 不存在或 author_key 不符")
+    return False, False
+
+def _handle_pin_command(command, ctx):
+    print(f"[置頂訊息] lora_msg_id={command.lora_msg_id}, author_key={command.author_key}")
+    if pin_note_by_lora_msg_id(command.lora_msg_id, command.author_key):
+        print(f"  -> 成功置頂 note (lora_msg_id={command.lora_msg_id})")
+        return True, False
+    print(f"  -> 置頂失敗，lora_msg_id {command.lora_msg_id} 不存在或 author_key 不符")
+    return False, False
+
+def _handle_user_ack_command(command, ctx):
+    """處理單筆 /ack id 或合併的 /ack id1,id2,..."""
+    ack_lora_msg_ids = command.lora_msg_ids
+    ack_hop_limit = ctx.packet.get('hopLimit')
+    ack_hop_start = ctx.packet.get('hopStart')
+    print(f"[收到 ACK] lora_msg_id={','.join(ack_lora_msg_ids)}, from={ctx.lora_uuid}, hop_limit={ack_hop_limit}, hop_start={ack_hop_start}")
+    
+    ack_note_ids = get_note_ids_by_lora_msg_ids(ack_lora_msg_ids)
+    for ack_lora_msg_id in ack_lora_msg_ids:
+        if ack_lora_msg_id not in ack_note_ids:
+            print(f"  -> 錯誤：找不到 lora_msg_id={ack_lora_msg_id} 對應的 note")
+    if ack_note_ids:
+        note_ids = list(dict.fromkeys(ack_note_ids.values()))
+        if save_ack_records(note_ids, ctx.lora_uuid, hop_limit=ack_hop_limit, hop_start=ack_hop_start):
+            print(f"  -> 成功處理 USER ACK (note_id={','.join(note_ids)})")
+            for note_id in note_ids:
+                run_after_receive_batch(notify_ack_received, note_id, ctx.lora_uuid)
+        else:
+            print(f"  -> 處理 USER ACK 失敗")
+    return False, False
+
+def _handle_packed_commands(command, ctx):
+    """合併訊息：拆開後逐一以原本的命令處理（各自更新畫面）"""
+    print(f"[合併訊息] lora_msg_id={ctx.lora_msg_id}, 共 {len(command.msgs)} 則命令")
+    packet = ctx.packet
+    for sub_msg in command.msgs:
+        onReceive(dict(packet, decoded=dict(packet['decoded'], text=sub_msg)), ctx.interface)
+    return False, False
+
+def _handle_invalid_command(command, ctx):
+    print(command.error)
+    return False, False
+
+def _handle_unknown_command(command, ctx):
+    if not command.msg.startswith('/'):
+        print(f"[非 noteboard 格式，已忽略] {command.msg}")
+    else:
+        print(f"[未知命令格式，已忽略] {command.msg}")
+    return False, False
+
+# LoRa 命令分派表：命令型別 -> 處理函式，處理函式回傳 (是否需要更新畫面, 是否為表格留言)
+LORA_COMMAND_HANDLERS = {
+    NewNote: _handle_note_command,
+    ResendNote: _handle_note_command,
+    NewReply: _handle_reply_command,
+    ResendReply: _handle_reply_command,
+    SetColor: _handle_color_command,
+    SetAuthor: _handle_author_command,
+    ArchiveNote: _handle_archive_command,
+    PinNote: _handle_pin_command,
+    UserAck: _handle_user_ack_command,
+    PackedCommands: _handle_packed_commands,
+    InvalidCommand: _handle_invalid_command,
+    UnknownCommand: _handle_unknown_command,
+}
+
+def claim_device_ack(packet):
+    """在 eventlet hub 上認領設備 ACK（ROUTING_APP）：取消超時計時並釋放發送視窗
+
+    回傳 (request_id, pending_ack 項目)，不是等待中的 ACK 時回傳 None；資料庫的更新由 onReceive 在批次中處理。
+    """
+    decoded = packet.get('decoded') or {}
+    if decoded.get('portnum') != 'ROUTING_APP':
+        return None
+    request_id = decoded.get('requestId')
+    # 先取消超時計時，避免處理期間 ack_timeout_loop 將同一筆視為超時（已被視為超時的 ACK 不再處理）
+    if not request_id or request_id not in pending_ack or not pending_ack_deadlines.cancel(request_id):
+        return None
+    release_inflight_slot(request_id)
+    return request_id, pending_ack[request_id]
+
 def onReceive(packet, interface):
-    global pending_ack, FLAG_DEVICE_WAITING_ACK
     try:
         if 'decoded' in packet and packet['decoded'].get('portnum') == 'ROUTING_APP':
             request_id = packet['decoded'].get('requestId')
-            if request_id and request_id in pending_ack:
-                note_info = pending_ack[request_id]
+            note_info = (getattr(_receive_local, 'device_acks', None) or {}).get(request_id)
+            if note_info:
                 ack_packet_id = packet.get('id')
                 lora_msg_id = str(request_id)
                 
@@ -1185,36 +2170,25 @@ def onReceive(packet, interface):
                 else:
                     print(f"[收到 設備與Mesh網路 ACK] request_id={request_id}, lora_msg_id={ack_packet_id}")
                 
-                FLAG_DEVICE_WAITING_ACK = False
-                
-                if update_note_status(note_info['note_id'], 'LoRa sent'):
-                    print(f"  -> 已更新 note {note_info['note_id']} 狀態為 'LoRa sent'")
-                    
-                    # table view 格式的 note，發送成功時同步更新 created_at（以發送時間為基準）
-                    try:
-                        _conn = sqlite3.connect(DB_PATH)
-                        _conn.row_factory = sqlite3.Row
-                        _cur = _conn.cursor()
-                        _cur.execute('SELECT body, updated_at FROM notes WHERE note_id = ?', (note_info['note_id'],))
-                        _row = _cur.fetchone()
-                        if _row and _is_table_format_note(_row['body']):
-                            _cur.execute('UPDATE notes SET created_at = ? WHERE note_id = ?', (_row['updated_at'], note_info['note_id']))
-                            _conn.commit()
-                            print(f"  -> [table note] 已同步更新 created_at = updated_at ({_row['updated_at']})")
-                        _conn.close()
-                    except Exception as e:
-                        print(f"  -> [table note] 更新 created_at 失敗: {e}")
-                    
-                    try:
-                        update_note_lora_msg_id(note_info['note_id'], lora_msg_id)
-                        print(f"  -> 已儲存 lora_msg_id: {lora_msg_id} (使用 request_id)")
-                        print(f"  -> color_id 與 author_key 已在訊息中一併發送")
-                    except Exception as e:
-                        print(f"  -> 更新 lora_msg_id 失敗: {e}")
-                    
-                    socketio.emit('refresh_notes', {'board_id': note_info.get('board_id', BOARD_MESSAGE_CHANNELS[0]['name'])})
+                # 合併發送時，每筆 note 使用發送前指定的 lora_msg_id
+                packed_notes = note_info.get('packed_notes') or [{'note_id': note_info['note_id'], 'lora_msg_id': lora_msg_id}]
+                sent_results = [mark_note_lora_sent(packed['note_id'], packed['lora_msg_id']) for packed in packed_notes]
+                if any(sent_results):
+                    notify_notes_changed(note_info.get('board_id', BOARD_MESSAGE_CHANNELS[0]['name']))
                 
-                del pending_ack[request_id]
+                # 記憶體中的 pending_ack 項目於提交後由 receive_worker_loop 移除
+                delete_pending_ack_record(request_id)
+        
+        if 'decoded' in packet and packet['decoded'].get('portnum') == COMPACT_PORTNUM_NAME:
+            # 精簡二進位編碼：解碼回文字命令後以 TEXT_MESSAGE_APP 流程處理
+            # 不論本機頻道是否啟用 compact_protocol 都接受，讓各節點可逐步切換
+            msg = decode_command(packet['decoded'].get('payload', b''), pack=pack_lora_messages)
+            if msg is None:
+                if IS_PRINT_LORA_PACKAGE:
+                    print(f"[略過] 無法解碼的 {COMPACT_PORTNUM_NAME} 封包: {packet.get('id', 'N/A')}")
+                return
+            onReceive(dict(packet, decoded=dict(packet['decoded'], portnum='TEXT_MESSAGE_APP', text=msg)), interface)
+            return
         
         if 'decoded' in packet and packet['decoded']['portnum'] == 'TEXT_MESSAGE_APP':
             msg = packet['decoded']['text']
@@ -1256,486 +2230,15 @@ def onReceive(packet, interface):
                 print(f"  - 原始封包: {packet}")
                 print("-" * 60)
             
-            should_refresh = False
-            is_table_note = False
+            ctx = LoraReceiveContext(packet, interface, channel_name, lora_msg_id, lora_uuid)
+            command = parse_lora_command(msg)
+            should_refresh, is_table_note = LORA_COMMAND_HANDLERS[type(command)](command, ctx)
             
-            if msg.startswith('/msg [new,') and ']' in msg:
-                # 新格式: /msg [new,color_id,author_key]body
-                end_bracket = msg.index(']')
-                params = msg[10:end_bracket]
-                body = msg[end_bracket + 1:]
-                parts = params.split(',')
-                
-                if len(parts) == 2:
-                    color_id = parts[0].strip()
-                    author_key = parts[1].strip()
-                    print(f"[新訊息 with params] lora_msg_id={lora_msg_id}, color_id={color_id}, author_key={author_key}, body={body}")
-                    
-                    bg_color = get_color_from_palette(int(color_id)) if color_id.isdigit() else ''
-                    
-                    if save_lora_note(
-                        lora_msg_id=lora_msg_id,
-                        board_id=channel_name,
-                        body=body,
-                        bg_color=bg_color,
-                        author_key=author_key,
-                        lora_node_id=lora_uuid
-                    ):
-                        should_refresh = True
-                        if _is_table_format_note(body):
-                            is_table_note = True
-                        print(f"  -> 已儲存訊息 (含 color_id={color_id}, author_key={author_key})，將在 ~30 秒後發送 USER ACK 命令")
-                        _spawn_ack_delayed(lora_msg_id, interface, channel_name)
-                        # 偵測工作表刪除指令
-                        _sd_m = SHEET_DELETE_RE.match(body)
-                        if _sd_m:
-                            _sd_nid = get_note_id_by_lora_msg_id(lora_msg_id)
-                            mark_sheet_notes_deleted(channel_name, _sd_m.group(1), exclude_note_id=_sd_nid)
-                else:
-                    print(f"  -> 格式錯誤，應為 /msg [new,color_id,author_key]body")
-                    
-            elif msg.startswith('/msg [new]'):
-                body = msg[10:]
-                print(f"[新訊息] lora_msg_id={lora_msg_id}, body={body}")
-                if save_lora_note(
-                    lora_msg_id=lora_msg_id,
-                    board_id=channel_name,
-                    body=body,
-                    bg_color='',
-                    author_key='',
-                    lora_node_id=lora_uuid
-                ):
-                    should_refresh = True
-                    if _is_table_format_note(body):
-                        is_table_note = True
-                    print(f"  -> 已儲存訊息，將在 ~30 秒後發送 USER ACK 命令")
-                    _spawn_ack_delayed(lora_msg_id, interface, channel_name)
-                    # 偵測工作表刪除指令
-                    _sd_m = SHEET_DELETE_RE.match(body)
-                    if _sd_m:
-                        _sd_nid = get_note_id_by_lora_msg_id(lora_msg_id)
-                        mark_sheet_notes_deleted(channel_name, _sd_m.group(1), exclude_note_id=_sd_nid)
-                    
-            elif msg.startswith('/msg [') and ']' in msg:
-                end_bracket = msg.index(']')
-                bracket_content = msg[6:end_bracket]
-                body = msg[end_bracket + 1:]
-                
-                # 檢查是否為新格式: /msg [lora_msg_id,color_id,author_key]body
-                if ',' in bracket_content:
-                    parts = bracket_content.split(',')
-                    if len(parts) == 3:
-                        resend_lora_msg_id = parts[0].strip()
-                        color_id = parts[1].strip()
-                        author_key = parts[2].strip()
-                        print(f"[重發訊息 with params] lora_msg_id={resend_lora_msg_id}, color_id={color_id}, author_key={author_key}, body={body}")
-                        
-                        bg_color = get_color_from_palette(int(color_id)) if color_id.isdigit() else ''
-                        
-                        if not lora_msg_id_exists(resend_lora_msg_id):
-                            if save_lora_note(
-                                lora_msg_id=resend_lora_msg_id,
-                                board_id=channel_name,
-                                body=body,
-                                bg_color=bg_color,
-                                author_key=author_key,
-                                lora_node_id=lora_uuid
-                            ):
-                                should_refresh = True
-                                if _is_table_format_note(body):
-                                    is_table_note = True
-                                print(f"[重發訊息寫入資料庫成功] lora_msg_id={resend_lora_msg_id}, body={body}")
-                                print(f"  -> 已儲存訊息 (含 color_id={color_id}, author_key={author_key})，將在 ~30 秒後發送 USER ACK 命令")
-                                _spawn_ack_delayed(resend_lora_msg_id, interface, channel_name)
-                                # 偵測工作表刪除指令
-                                _sd_m = SHEET_DELETE_RE.match(body)
-                                if _sd_m:
-                                    _sd_nid = get_note_id_by_lora_msg_id(resend_lora_msg_id)
-                                    mark_sheet_notes_deleted(channel_name, _sd_m.group(1), exclude_note_id=_sd_nid)
-                                # 更新以此訊息為父訊息的回覆，將 is_temp_parent_note 設為 0
-                                try:
-                                    conn = sqlite3.connect(DB_PATH)
-                                    cursor = conn.cursor()
-                                    cursor.execute('''
-                                        UPDATE notes SET is_temp_parent_note = 0
-                                        WHERE reply_lora_msg_id = ? AND is_temp_parent_note = 1
-                                    ''', (resend_lora_msg_id,))
-                                    updated_count = cursor.rowcount
-                                    conn.commit()
-                                    conn.close()
-                                    if updated_count > 0:
-                                        print(f"  -> 已更新 {updated_count} 筆回覆的 is_temp_parent_note 為 0")
-                                except Exception as e:
-                                    print(f"  -> 更新 is_temp_parent_note 失敗: {e}")
-                        else:
-                            print(f"  -> lora_msg_id {resend_lora_msg_id} 已存在，略過建立資料")
-                            print(f"  -> 但仍將在 ~30 秒後發送 USER ACK 命令")
-                            _spawn_ack_delayed(resend_lora_msg_id, interface, channel_name)
-                    else:
-                        print(f"  -> 格式錯誤，應為 /msg [lora_msg_id,color_id,author_key]body")
-                else:
-                    # 原本格式: /msg [lora_msg_id]body
-                    resend_lora_msg_id = bracket_content
-                    print(f"[重發訊息] lora_msg_id={resend_lora_msg_id}, body={body}")
-                    
-                    if not lora_msg_id_exists(resend_lora_msg_id):
-                        if save_lora_note(
-                            lora_msg_id=resend_lora_msg_id,
-                            board_id=channel_name,
-                            body=body,
-                            bg_color='',
-                            author_key='',
-                            lora_node_id=lora_uuid
-                        ):
-                            should_refresh = True
-                            if _is_table_format_note(body):
-                                is_table_note = True
-                            print(f"[重發訊息寫入資料庫成功] lora_msg_id={resend_lora_msg_id}, body={body}")
-                            print(f"  -> 已儲存訊息，將在 ~30 秒後發送 USER ACK 命令")
-                            _spawn_ack_delayed(resend_lora_msg_id, interface, channel_name)
-                            # 偵測工作表刪除指令
-                            _sd_m = SHEET_DELETE_RE.match(body)
-                            if _sd_m:
-                                _sd_nid = get_note_id_by_lora_msg_id(resend_lora_msg_id)
-                                mark_sheet_notes_deleted(channel_name, _sd_m.group(1), exclude_note_id=_sd_nid)
-                            # 更新以此訊息為父訊息的回覆，將 is_temp_parent_note 設為 0
-                            try:
-                                conn = sqlite3.connect(DB_PATH)
-                                cursor = conn.cursor()
-                                cursor.execute('''
-                                    UPDATE notes SET is_temp_parent_note = 0
-                                    WHERE reply_lora_msg_id = ? AND is_temp_parent_note = 1
-                                ''', (resend_lora_msg_id,))
-                                updated_count = cursor.rowcount
-                                conn.commit()
-                                conn.close()
-                                if updated_count > 0:
-                                    print(f"  -> 已更新 {updated_count} 筆回覆的 is_temp_parent_note 為 0")
-                            except Exception as e:
-                                print(f"  -> 更新 is_temp_parent_note 失敗: {e}")
-                    else:
-                        print(f"  -> lora_msg_id {resend_lora_msg_id} 已存在，略過建立資料")
-                        print(f"  -> 但仍將在 ~30 秒後發送 USER ACK 命令")
-                        _spawn_ack_delayed(resend_lora_msg_id, interface, channel_name)
-                    
-            elif msg.startswith('/color [') and ']' in msg:
-                end_bracket = msg.index(']')
-                lora_msg_id = msg[8:end_bracket]
-                params = msg[end_bracket + 1:].strip()
-                
-                if ',' in params:
-                    parts = params.split(',', 1)
-                    author_key = parts[0].strip()
-                    color_id = parts[1].strip()
-                    print(f"[設定顏色] lora_msg_id={lora_msg_id}, author_key={author_key}, color_id={color_id}")
-                    
-                    if update_note_color(lora_msg_id, author_key, color_id):
-                        print(f"  -> 成功更新 note (lora_msg_id={lora_msg_id}) 的顏色")
-                        should_refresh = True
-                    else:
-                        print(f"  -> 更新失敗，lora_msg_id {lora_msg_id} 不存在或 author_key 不符")
-                else:
-                    print(f"  -> 格式錯誤，應為 /color [lora_msg_id]author_key,color_id")
-                    
-            elif msg.startswith('/author [') and ']' in msg:
-                end_bracket = msg.index(']')
-                lora_msg_id = msg[9:end_bracket]
-                author_key = msg[end_bracket + 1:].strip()
-                print(f"[更新作者] lora_msg_id={lora_msg_id}, author_key={author_key}")
-                
-                if update_note_author(lora_msg_id, author_key):
-                    print(f"  -> 成功更新 note (lora_msg_id={lora_msg_id}) 的 author_key 為 {author_key}")
-                    should_refresh = True
-                else:
-                    print(f"  -> 更新失敗，lora_msg_id {lora_msg_id} 可能不存在")
-                    
-            elif msg.startswith('/archive [') and ']' in msg:
-                end_bracket = msg.index(']')
-                lora_msg_id = msg[10:end_bracket]
-                author_key = msg[end_bracket + 1:].strip()
-                print(f"[封存訊息] lora_msg_id={lora_msg_id}, author_key={author_key}")
-                
-                if archive_note_by_lora_msg_id(lora_msg_id, author_key):
-                    print(f"  -> 成功封存 note (lora_msg_id={lora_msg_id})")
-                    should_refresh = True
-                else:
-                    print(f"  -> 封存失敗，lora_msg_id {lora_msg_id} 不存在或 author_key 不符")
-                    
-            elif msg.startswith('/pin [') and ']' in msg:
-                end_bracket = msg.index(']')
-                lora_msg_id = msg[6:end_bracket]
-                author_key = msg[end_bracket + 1:].strip()
-                print(f"[置頂訊息] lora_msg_id={lora_msg_id}, author_key={author_key}")
-                
-                if pin_note_by_lora_msg_id(lora_msg_id, author_key):
-                    print(f"  -> 成功置頂 note (lora_msg_id={lora_msg_id})")
-                    should_refresh = True
-                else:
-                    print(f"  -> 置頂失敗，lora_msg_id {lora_msg_id} 不存在或 author_key 不符")
-                    
-            elif msg.startswith('/ack '):
-                ack_lora_msg_id = msg[5:].strip()
-                ack_hop_limit = packet.get('hopLimit')
-                ack_hop_start = packet.get('hopStart')
-                print(f"[收到 ACK] lora_msg_id={ack_lora_msg_id}, from={lora_uuid}, hop_limit={ack_hop_limit}, hop_start={ack_hop_start}")
-                
-                note_id = get_note_id_by_lora_msg_id(ack_lora_msg_id)
-                if not note_id:
-                    print(f"  -> 錯誤：找不到 lora_msg_id={ack_lora_msg_id} 對應的 note")
-                else:
-                    if save_or_update_ack_record(note_id, lora_uuid, hop_limit=ack_hop_limit, hop_start=ack_hop_start):
-                        print(f"  -> 成功處理 USER ACK (note_id={note_id})")
-                        socketio.emit('ack_received', {
-                            'note_id': note_id,
-                            'lora_node_id': lora_uuid
-                        })
-                    else:
-                        print(f"  -> 處理 USER ACK 失敗")
-                    
-            elif msg.startswith('/reply <new,') and ']' in msg:
-                # 新格式: /reply <new,color_id,author_key>[parent_lora_msg_id]body
-                angle_start = msg.index('<') + 1
-                angle_end = msg.index('>')
-                angle_content = msg[angle_start:angle_end]
-                parts = angle_content.split(',')
-                
-                if len(parts) == 3 and msg[angle_end + 1] == '[':
-                    color_id = parts[1].strip()
-                    author_key = parts[2].strip()
-                    
-                    start_bracket = angle_end + 1
-                    end_bracket = msg.index(']', start_bracket)
-                    parent_lora_msg_id = msg[start_bracket + 1:end_bracket]
-                    body = msg[end_bracket + 1:]
-                    print(f"[新回覆訊息 with params] parent_lora_msg_id={parent_lora_msg_id}, color_id={color_id}, author_key={author_key}, body={body}")
-                    
-                    is_temp_parent = 0
-                    
-                    if lora_msg_id_exists(parent_lora_msg_id):
-                        reply_lora_msg_id = parent_lora_msg_id
-                        print(f"  -> 找到父訊息 lora_msg_id: {parent_lora_msg_id}")
-                    else:
-                        reply_lora_msg_id = parent_lora_msg_id
-                        is_temp_parent = 1
-                        print(f"  -> 父訊息 lora_msg_id {parent_lora_msg_id} 不存在本機，仍將 reply_lora_msg_id 設為 {parent_lora_msg_id}，並設定 is_temp_parent_note=1")
-                    
-                    bg_color = get_color_from_palette(int(color_id)) if color_id.isdigit() else ''
-                    
-                    try:
-                        conn = sqlite3.connect(DB_PATH)
-                        cursor = conn.cursor()
-                        timestamp = int(time.time() * 1000)
-                        status = 'LoRa received'
-                        reply_note_id = generate_note_id()
-                        
-                        cursor.execute('''
-                            INSERT INTO notes (note_id, reply_lora_msg_id, board_id, body, bg_color, status, 
-                                             created_at, updated_at, author_key, rev, deleted, lora_msg_id, is_temp_parent_note, lora_node_id)
-                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 1, 0, ?, ?, ?)
-                        ''', (reply_note_id, reply_lora_msg_id, channel_name, body, bg_color, status, 
-                              timestamp, timestamp, author_key, lora_msg_id, is_temp_parent, lora_uuid))
-                        
-                        ch_cfg = get_channel_config(channel_name)
-                        auto_archive_old_notes(cursor, channel_name, ch_cfg.get('max_notes', MAX_NOTES))
-                        
-                        conn.commit()
-                        conn.close()
-                        should_refresh = True
-                        print(f"  -> 成功儲存回覆訊息 (含 color_id={color_id}, author_key={author_key})，將在 ~30 秒後發送 USER ACK 命令")
-                        _spawn_ack_delayed(lora_msg_id, interface, channel_name)
-                    except Exception as e:
-                        print(f"  -> 儲存回覆訊息失敗: {e}")
-                else:
-                    print(f"  -> 格式錯誤，應為 /reply <new,color_id,author_key>[parent_lora_msg_id]body")
-                    
-            elif msg.startswith('/reply <new>[') and ']' in msg:
-                end_bracket = msg.index(']', 13)
-                parent_lora_msg_id = msg[13:end_bracket]
-                body = msg[end_bracket + 1:]
-                print(f"[新回覆訊息] parent_lora_msg_id={parent_lora_msg_id}, body={body}")
-                
-                is_temp_parent = 0
-                
-                if lora_msg_id_exists(parent_lora_msg_id):
-                    reply_lora_msg_id = parent_lora_msg_id
-                    print(f"  -> 找到父訊息 lora_msg_id: {parent_lora_msg_id}")
-                else:
-                    reply_lora_msg_id = parent_lora_msg_id
-                    is_temp_parent = 1
-                    print(f"  -> 父訊息 lora_msg_id {parent_lora_msg_id} 不存在本機，仍將 reply_lora_msg_id 設為 {parent_lora_msg_id}，並設定 is_temp_parent_note=1")
-                
-                try:
-                    conn = sqlite3.connect(DB_PATH)
-                    cursor = conn.cursor()
-                    timestamp = int(time.time() * 1000)
-                    status = 'LoRa received'
-                    reply_note_id = generate_note_id()
-                    
-                    cursor.execute('''
-                        INSERT INTO notes (note_id, reply_lora_msg_id, board_id, body, bg_color, status, 
-                                         created_at, updated_at, author_key, rev, deleted, lora_msg_id, is_temp_parent_note, lora_node_id)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 1, 0, ?, ?, ?)
-                    ''', (reply_note_id, reply_lora_msg_id, channel_name, body, '', status, 
-                          timestamp, timestamp, '', lora_msg_id, is_temp_parent, lora_uuid))
-                    
-                    ch_cfg = get_channel_config(channel_name)
-                    auto_archive_old_notes(cursor, channel_name, ch_cfg.get('max_notes', MAX_NOTES))
-                    
-                    conn.commit()
-                    conn.close()
-                    should_refresh = True
-                    print(f"  -> 成功儲存回覆訊息，將在 ~30 秒後發送 USER ACK 命令")
-                    _spawn_ack_delayed(lora_msg_id, interface, channel_name)
-                except Exception as e:
-                    print(f"  -> 儲存回覆訊息失敗: {e}")
-                    
-            elif msg.startswith('/reply <') and '>[' in msg and ']' in msg:
-                # 重發回覆格式: /reply <resend_lora_msg_id>[parent_lora_msg_id]body
-                # 或新格式: /reply <resend_lora_msg_id,color_id,author_key>[parent_lora_msg_id]body
-                end_angle = msg.index('>')
-                angle_content = msg[8:end_angle]
-                
-                start_bracket = end_angle + 1
-                if msg[start_bracket] != '[':
-                    print(f"[格式錯誤] /reply 重發格式應為 /reply <lora_msg_id>[parent_lora_msg_id]body")
-                else:
-                    end_bracket = msg.index(']', start_bracket)
-                    parent_lora_msg_id = msg[start_bracket + 1:end_bracket]
-                    body = msg[end_bracket + 1:]
-                    
-                    # 檢查是否為新格式: /reply <resend_lora_msg_id,color_id,author_key>[parent_lora_msg_id]body
-                    if ',' in angle_content:
-                        parts = angle_content.split(',')
-                        if len(parts) == 3:
-                            resend_lora_msg_id = parts[0].strip()
-                            color_id = parts[1].strip()
-                            author_key = parts[2].strip()
-                            print(f"[重發回覆訊息 with params] resend_lora_msg_id={resend_lora_msg_id}, parent_lora_msg_id={parent_lora_msg_id}, color_id={color_id}, author_key={author_key}, body={body}")
-                            
-                            bg_color = get_color_from_palette(int(color_id)) if color_id.isdigit() else ''
-                            
-                            # 檢查此回覆是否已存在
-                            if not lora_msg_id_exists(resend_lora_msg_id):
-                                is_temp_parent = 0
-                                
-                                if lora_msg_id_exists(parent_lora_msg_id):
-                                    reply_lora_msg_id = parent_lora_msg_id
-                                    print(f"  -> 找到父訊息 lora_msg_id: {parent_lora_msg_id}")
-                                else:
-                                    reply_lora_msg_id = parent_lora_msg_id
-                                    is_temp_parent = 1
-                                    print(f"  -> 父訊息 lora_msg_id {parent_lora_msg_id} 不存在本機，仍將 reply_lora_msg_id 設為 {parent_lora_msg_id}，並設定 is_temp_parent_note=1")
-                                
-                                try:
-                                    conn = sqlite3.connect(DB_PATH)
-                                    cursor = conn.cursor()
-                                    timestamp = int(time.time() * 1000)
-                                    status = 'LoRa received'
-                                    reply_note_id = generate_note_id()
-                                    
-                                    cursor.execute('''
-                                        INSERT INTO notes (note_id, reply_lora_msg_id, board_id, body, bg_color, status, 
-                                                         created_at, updated_at, author_key, rev, deleted, lora_msg_id, is_temp_parent_note, lora_node_id)
-                                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 1, 0, ?, ?, ?)
-                                    ''', (reply_note_id, reply_lora_msg_id, channel_name, body, bg_color, status, 
-                                          timestamp, timestamp, author_key, resend_lora_msg_id, is_temp_parent, lora_uuid))
-                                    
-                                    ch_cfg = get_channel_config(channel_name)
-                                    auto_archive_old_notes(cursor, channel_name, ch_cfg.get('max_notes', MAX_NOTES))
-                                    
-                                    conn.commit()
-                                    
-                                    # 更新以此回覆為父訊息的其他回覆，將 is_temp_parent_note 設為 0
-                                    cursor.execute('''
-                                        UPDATE notes SET is_temp_parent_note = 0
-                                        WHERE reply_lora_msg_id = ? AND is_temp_parent_note = 1
-                                    ''', (resend_lora_msg_id,))
-                                    updated_count = cursor.rowcount
-                                    conn.commit()
-                                    conn.close()
-                                    
-                                    should_refresh = True
-                                    print(f"[重發回覆寫入資料庫成功] lora_msg_id={resend_lora_msg_id}, body={body}")
-                                    print(f"  -> 已儲存訊息 (含 color_id={color_id}, author_key={author_key})，將在 ~30 秒後發送 USER ACK 命令")
-                                    _spawn_ack_delayed(resend_lora_msg_id, interface, channel_name)
-                                    if updated_count > 0:
-                                        print(f"  -> 已更新 {updated_count} 筆回覆的 is_temp_parent_note 為 0")
-                                except Exception as e:
-                                    print(f"  -> 儲存重發回覆訊息失敗: {e}")
-                            else:
-                                print(f"  -> lora_msg_id {resend_lora_msg_id} 已存在，略過建立資料")
-                                print(f"  -> 但仍將在 ~30 秒後發送 USER ACK 命令")
-                                _spawn_ack_delayed(resend_lora_msg_id, interface, channel_name)
-                        else:
-                            print(f"  -> 格式錯誤，應為 /reply <lora_msg_id,color_id,author_key>[parent_lora_msg_id]body")
-                    else:
-                        # 原本格式: /reply <resend_lora_msg_id>[parent_lora_msg_id]body
-                        resend_lora_msg_id = angle_content
-                        print(f"[重發回覆訊息] resend_lora_msg_id={resend_lora_msg_id}, parent_lora_msg_id={parent_lora_msg_id}, body={body}")
-                        
-                        # 檢查此回覆是否已存在
-                        if not lora_msg_id_exists(resend_lora_msg_id):
-                            is_temp_parent = 0
-                            
-                            if lora_msg_id_exists(parent_lora_msg_id):
-                                reply_lora_msg_id = parent_lora_msg_id
-                                print(f"  -> 找到父訊息 lora_msg_id: {parent_lora_msg_id}")
-                            else:
-                                reply_lora_msg_id = parent_lora_msg_id
-                                is_temp_parent = 1
-                                print(f"  -> 父訊息 lora_msg_id {parent_lora_msg_id} 不存在本機，仍將 reply_lora_msg_id 設為 {parent_lora_msg_id}，並設定 is_temp_parent_note=1")
-                            
-                            try:
-                                conn = sqlite3.connect(DB_PATH)
-                                cursor = conn.cursor()
-                                timestamp = int(time.time() * 1000)
-                                status = 'LoRa received'
-                                reply_note_id = generate_note_id()
-                                
-                                cursor.execute('''
-                                    INSERT INTO notes (note_id, reply_lora_msg_id, board_id, body, bg_color, status, 
-                                                     created_at, updated_at, author_key, rev, deleted, lora_msg_id, is_temp_parent_note, lora_node_id)
-                                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 1, 0, ?, ?, ?)
-                                ''', (reply_note_id, reply_lora_msg_id, channel_name, body, '', status, 
-                                      timestamp, timestamp, '', resend_lora_msg_id, is_temp_parent, lora_uuid))
-                                
-                                ch_cfg = get_channel_config(channel_name)
-                                auto_archive_old_notes(cursor, channel_name, ch_cfg.get('max_notes', MAX_NOTES))
-                                
-                                conn.commit()
-                                
-                                # 更新以此回覆為父訊息的其他回覆，將 is_temp_parent_note 設為 0
-                                cursor.execute('''
-                                    UPDATE notes SET is_temp_parent_note = 0
-                                    WHERE reply_lora_msg_id = ? AND is_temp_parent_note = 1
-                                ''', (resend_lora_msg_id,))
-                                updated_count = cursor.rowcount
-                                conn.commit()
-                                conn.close()
-                                
-                                should_refresh = True
-                                print(f"[重發回覆寫入資料庫成功] lora_msg_id={resend_lora_msg_id}, body={body}")
-                                print(f"  -> 已儲存訊息，將在 ~30 秒後發送 USER ACK 命令")
-                                _spawn_ack_delayed(resend_lora_msg_id, interface, channel_name)
-                                if updated_count > 0:
-                                    print(f"  -> 已更新 {updated_count} 筆回覆的 is_temp_parent_note 為 0")
-                            except Exception as e:
-                                print(f"  -> 儲存重發回覆訊息失敗: {e}")
-                        else:
-                            print(f"  -> lora_msg_id {resend_lora_msg_id} 已存在，略過建立資料")
-                            print(f"  -> 但仍將在 ~30 秒後發送 USER ACK 命令")
-                            _spawn_ack_delayed(resend_lora_msg_id, interface, channel_name)
-                    
-            else:
-                if not msg.startswith('/'):
-                    print(f"[非 noteboard 格式，已忽略] {msg}")
-                else:
-                    print(f"[未知命令格式，已忽略] {msg}")
-            
-            if should_refresh:
-                socketio.emit('refresh_notes', {'board_id': channel_name})
-                if not is_table_note:
-                    update_epaper_display()
+            if should_refresh:
+                invalidate_notes_cache(channel_name)
+                notify_notes_changed(channel_name)
+                if not is_table_note:
+                    run_after_receive_batch(update_epaper_display)
                 
     except Exception as e:
         print(f"Packet Error: {e}")
@@ -1754,246 +2257,562 @@ def scan_for_meshtastic():
         found_ports.extend(glob.glob(p))
     return found_ports[0] if found_ports else None
 
-def check_ack_timeout():
-    """檢查並處理 ACK 超時的訊息"""
-    global pending_ack, FLAG_DEVICE_WAITING_ACK
-    current_time = int(time.time())
-    timeout_requests = []
-    
-    for request_id, info in pending_ack.items():
-        if current_time - info['timestamp'] > ACK_TIMEOUT_SECONDS:
-            timeout_requests.append(request_id)
+def get_pending_note_ids(info):
+    """取得 pending_ack 項目涵蓋的所有 note_id（合併發送時為多筆）"""
+    if info.get('packed_notes'):
+        return [packed['note_id'] for packed in info['packed_notes']]
+    return [info['note_id']]
+
+def register_pending_ack(request_id, info):
+    """記錄已發送、等待設備 ACK 的訊息，並排定超時時間（同時寫入資料庫）"""
+    deadline = time.time() + ACK_TIMEOUT_SECONDS
+    pending_ack[request_id] = info
+    inflight_slots[request_id] = info.get('board_id')
+    pending_ack_deadlines.push(request_id, deadline)
+    try:
+        conn = get_db_connection()
+        conn.execute('''
+            INSERT OR REPLACE INTO pending_acks (request_id, board_id, info, deadline)
+            VALUES (?, ?, ?, ?)
+        ''', (request_id, info.get('board_id', ''), json.dumps(info), deadline))
+        conn.commit()
+        conn.close()
+    except Exception as e:
+        print(f"[ACK 等待] 寫入 pending_acks 失敗: {e}")
+
+def release_pending_ack(request_id):
+    """移除等待設備 ACK 的訊息（收到 ACK 或超時），回傳原本的 info"""
+    info = forget_pending_ack(request_id)
+    delete_pending_ack_record(request_id)
+    return info
+
+def forget_pending_ack(request_id):
+    """移除記憶體中等待設備 ACK 的項目（不更新資料庫），回傳原本的 info"""
+    info = pending_ack.pop(request_id, None)
+    inflight_slots.pop(request_id, None)
+    pending_ack_deadlines.cancel(request_id)
+    return info
+
+def delete_pending_ack_record(request_id):
+    """刪除 pending_acks 中的持久化記錄"""
+    try:
+        conn = get_db_connection()
+        conn.execute('DELETE FROM pending_acks WHERE request_id = ?', (request_id,))
+        conn.commit()
+        conn.close()
+    except Exception as e:
+        print(f"[ACK 等待] 刪除 pending_acks 失敗: {e}")
+
+def release_inflight_slot(request_id):
+    """釋放 request_id 佔用的發送視窗並喚醒排程器（pending_ack 項目仍保留至處理完成）"""
+    inflight_slots.pop(request_id, None)
+    send_queue.wake()
+
+def release_all_inflight_slots():
+    """設備重新連線或 USB 異常時釋放所有發送視窗，等待中的項目仍由 ack_timeout_loop 處理超時"""
+    inflight_slots.clear()
+    send_queue.wake()
+
+def has_free_send_slot(board_id=None):
+    """是否還能再發送一則等待設備 ACK 的訊息（board_id 為 None 時只檢查整個設備的上限）"""
+    if len(inflight_slots) >= LORA_MAX_INFLIGHT:
+        return False
+    if board_id is None:
+        return True
+    return sum(1 for b in inflight_slots.values() if b == board_id) < LORA_MAX_INFLIGHT_PER_CHANNEL
+
+def restore_pending_acks():
+    """重新啟動時從資料庫載入等待設備 ACK 的訊息，已超時的項目由 ack_timeout_loop 立即處理
+
+    載入的項目不佔用發送視窗（設備已重新連線）。
+    """
+    try:
+        conn = get_db_connection()
+        rows = conn.execute('SELECT request_id, info, deadline FROM pending_acks').fetchall()
+        conn.close()
+        for request_id, info, deadline in rows:
+            pending_ack[request_id] = json.loads(info)
+            pending_ack_deadlines.push(request_id, deadline)
+        if rows:
+            print(f"[ACK 等待] 已載入 {len(rows)} 筆等待設備 ACK 的訊息")
+    except Exception as e:
+        print(f"[ACK 等待] 載入 pending_acks 失敗: {e}")
+
+def handle_ack_timeout(request_id):
+    """處理 ACK 超時的訊息：釋放設備並將 note 改回 LAN only 等待重送"""
+    info = pending_ack.get(request_id)
+    if info is None:
+        return
+    release_inflight_slot(request_id)
     
-    for request_id in timeout_requests:
-        info = pending_ack[request_id]
-        note_id = info['note_id']
+    resend_note_ids = []
+    for note_id in get_pending_note_ids(info):
         print(f"[ACK 超時] request_id={request_id}, note_id={note_id}")
         print(f"  -> 將狀態從 'Sending' 改回 'LAN only'，等待重送")
         
-        FLAG_DEVICE_WAITING_ACK = False
-        
         if update_note_status(note_id, 'LAN only'):
             print(f"  -> 更新 note {note_id} 狀態為 'LAN only'")
-            socketio.emit('refresh_notes', {'board_id': info.get('board_id', BOARD_MESSAGE_CHANNELS[0]['name'])})
+            notify_notes_changed(info.get('board_id', BOARD_MESSAGE_CHANNELS[0]['name']))
+            resend_note_ids.append(note_id)
+    
+    # 移除等待項目後才放回發送佇列，否則排程器會視為仍在等待 ACK 而略過
+    release_pending_ack(request_id)
+    for note_id in resend_note_ids:
+        enqueue_note_for_lora(note_id)
+
+def db_optimize_loop():
+    """定期執行 PRAGMA optimize（啟動時不執行，避免延遲開機；關閉時由 close_db_pool 執行）"""
+    while True:
+        socketio.sleep(DB_OPTIMIZE_INTERVAL_SECOND)
+        optimize_database()
+
+def ack_timeout_loop():
+    """ACK 超時處理：在每筆訊息的超時時間到達時立即處理，不需等待排程器週期"""
+    print(f"啟動 ACK 超時處理 (timeout: {ACK_TIMEOUT_SECONDS} 秒)...")
+    while True:
+        try:
+            pending_ack_deadlines.wait()
+            for request_id in pending_ack_deadlines.pop_expired(time.time()):
+                handle_ack_timeout(request_id)
+        except Exception as e:
+            print(f"[ACK 超時] 處理異常: {e}")
+            socketio.sleep(1)
+
+def get_send_airtime_bucket(board_id):
+    """取得頻道的 airtime token bucket（無線電 duty cycle 平均分配給所有設定中的頻道）"""
+    bucket = send_airtime_buckets.get(board_id)
+    if bucket is None:
+        rate = LORA_DUTY_CYCLE_PERCENT / 100 / max(len(BOARD_MESSAGE_CHANNELS), 1)
+        bucket = AirtimeBucket(rate, LORA_AIRTIME_BURST_SECOND)
+        send_airtime_buckets[board_id] = bucket
+    return bucket
+
+def _push_send_queue_row(row):
+    """依 notes 資料列將需要發送的項目放入發送佇列"""
+    if row['is_need_update_lora'] == 1:
+        send_queue.push(row['board_id'], row['note_id'], KIND_UPDATE, PRIORITY_UPDATE)
+    if row['status'] in ('LAN only', 'Sending') and row['deleted'] == 0:
+        if row['is_pined_note'] == 1:
+            priority = PRIORITY_PINNED
+        elif row['reply_lora_msg_id']:
+            priority = PRIORITY_REPLY
+        else:
+            priority = PRIORITY_NEW
+        send_queue.push(row['board_id'], row['note_id'], KIND_SEND, priority)
+
+def enqueue_note_for_lora(note_id):
+    """note 新增或異動後呼叫，若需要發送至 LoRa 則放入發送佇列"""
+    try:
+        conn = get_db_connection()
+        conn.row_factory = sqlite3.Row
+        row = conn.execute('''
+            SELECT note_id, board_id, status, deleted, reply_lora_msg_id, is_pined_note, is_need_update_lora
+            FROM notes WHERE note_id = ?
+        ''', (note_id,)).fetchone()
+        conn.close()
+        if row:
+            _push_send_queue_row(row)
+    except Exception as e:
+        print(f"[發送佇列] 加入佇列失敗 (note_id={note_id}): {e}")
+
+def refill_send_queue(board_ids):
+    """從資料庫載入所有待發送與待更新的 notes（啟動時及定期校正用）"""
+    if not board_ids:
+        return
+    try:
+        conn = get_db_connection()
+        conn.row_factory = sqlite3.Row
+        placeholders = ','.join(['?'] * len(board_ids))
+        rows = conn.execute(f'''
+            SELECT note_id, board_id, status, deleted, reply_lora_msg_id, is_pined_note, is_need_update_lora
+            FROM notes
+            WHERE board_id IN ({placeholders})
+              AND (((status = 'LAN only' OR status = 'Sending') AND deleted = 0) OR is_need_update_lora = 1)
+            ORDER BY created_at ASC
+        ''', list(board_ids)).fetchall()
+        conn.close()
+        for row in rows:
+            _push_send_queue_row(row)
+    except Exception as e:
+        print(f"[發送佇列] 從資料庫載入待發送 notes 失敗: {e}")
+
+def _handle_send_usb_error(error_str, log_prefix='[排程器]'):
+    """發送失敗時檢測 USB 連線異常，中斷時標記離線、釋放發送視窗並通知前端"""
+    global lora_connected
+    if "Timed out waiting for connection completion" in error_str or \
+       "device disconnected" in error_str or \
+       "裝置路徑" in error_str and "已消失" in error_str:
+        error_msg = "連線失敗：USB連線異常中斷，可能是 Pi 電力供應不足、更換線材、或 Mesh 裝置需要重啟"
+        print(f"{log_prefix} {error_msg}")
+        lora_connected = False
+        release_all_inflight_slots()
+        socketio.emit('usb_connection_error', {'message': error_msg})
+        socketio.emit('lora_status', {'online': False, 'channel_validated': False, 'error_message': None, 'power_issue': False})
+        update_epaper_display()
+
+def _send_note_update(ch_name, update_note):
+    """發送 color / archive 更新命令，回傳已發送的訊息（未發送時為 None）"""
+    print(f"[排程器] [{ch_name}] 處理需要更新的 note_id={update_note['note_id']}")
+    
+    if not update_note['lora_msg_id']:
+        print(f"  -> 跳過：此 note 尚未發送至 LoRa，無 lora_msg_id")
+        return None
+    
+    try:
+        if update_note['deleted'] == 1:
+            msg = f"/archive [{update_note['lora_msg_id']}]{update_note['author_key']}"
+            print(f"  -> 發送 archive 命令: {msg}")
+        else:
+            color_index = get_color_index_from_palette(update_note['bg_color'])
+            msg = f"/color [{update_note['lora_msg_id']}]{update_note['author_key']}, {color_index}"
+            print(f"  -> 發送 color 命令: {msg}")
+        
+        update_note_transmit_st_at(update_note['note_id'])
+        send_lora_command(interface, ch_name, msg)
+        print(f"  -> 已發送更新命令")
+        notify_notes_changed(ch_name)
+        update_epaper_display()
+        return msg
+        
+    except Exception as e:
+        print(f"[排程器] 發送更新命令失敗: {e}")
+        import traceback
+        traceback.print_exc()
+        _handle_send_usb_error(str(e))
+        return None
+
+def build_note_send_msg(note, lora_msg_id='new'):
+    """組出發送 note 的 /msg 或 /reply 命令；lora_msg_id 為 'new' 時由接收端使用封包 ID"""
+    author_key = note.get('author_key', '')
+    color_id = get_color_index_from_palette(note.get('bg_color', ''))
+    reply_lora_msg_id = note.get('reply_lora_msg_id')
+    if reply_lora_msg_id:
+        return f"/reply <{lora_msg_id},{color_id},{author_key}>[{reply_lora_msg_id}]{note['body']}"
+    return f"/msg [{lora_msg_id},{color_id},{author_key}]{note['body']}"
+
+def generate_lora_msg_id():
+    """產生合併發送時使用的 lora_msg_id（與 Meshtastic 封包 ID 相同的 32 位元數字）"""
+    while True:
+        lora_msg_id = str(random.randint(1, 0xFFFFFFFF))
+        if not lora_msg_id_exists(lora_msg_id):
+            return lora_msg_id
+
+def _send_packed_notes(ch_name, notes):
+    """將多筆 note 合併為一則 /pack 訊息發送並等待設備 ACK，回傳已發送的訊息（未發送時為 None）
+
+    notes 為 (note, lora_msg_id) 清單，lora_msg_id 於發送前指定，收到設備 ACK 後寫入資料庫。
+    """
+    note_ids = [note['note_id'] for note, _ in notes]
+    print(f"[排程器] [{ch_name}] 準備合併發送 {len(notes)} 筆 note: {note_ids}")
+    
+    try:
+        msg = pack_lora_messages([build_note_send_msg(note, lora_msg_id) for note, lora_msg_id in notes])
+        print(f"  -> 使用 /pack 指令 ({len(msg.encode('utf-8'))} bytes): {msg}")
+        
+        for note_id in note_ids:
+            update_note_transmit_st_at(note_id)
+        result = send_lora_command(interface, ch_name, msg, wantAck=True)
+        
+        if result:
+            request_id = result.id if hasattr(result, 'id') else None
+            if request_id:
+                first_note = notes[0][0]
+                register_pending_ack(request_id, {
+                    'note_id': first_note['note_id'],
+                    'author_key': first_note['author_key'],
+                    'bg_color': first_note['bg_color'],
+                    'board_id': ch_name,
+                    'timestamp': int(time.time()),
+                    'packed_notes': [{'note_id': note['note_id'], 'lora_msg_id': lora_msg_id} for note, lora_msg_id in notes]
+                })
+                for note_id in note_ids:
+                    update_note_status(note_id, 'Sending')
+                print(f"  -> 已發送合併訊息，等待 ACK (request_id={request_id})")
+                notify_notes_changed(ch_name)
+            else:
+                print(f"  -> 已發送訊息，但無 request_id")
+        else:
+            print(f"  -> 發送失敗")
+        return msg
+        
+    except Exception as e:
+        print(f"[排程器] 合併發送失敗: {e}")
+        import traceback
+        traceback.print_exc()
+        _handle_send_usb_error(str(e))
+        return None
+
+def _collect_packed_notes(board_id, first_note):
+    """從發送佇列取出同頻道的其他待發送 notes，與 first_note 合併至不超過 LORA_MAX_TEXT_BYTES
+
+    回傳 (note, lora_msg_id) 清單；無法合併時只包含 first_note。
+    """
+    notes = [(first_note, generate_lora_msg_id())]
+    while len(notes) < LORA_PACK_MAX_NOTES:
+        item = send_queue.pop(lambda b, kind: b == board_id and kind == KIND_SEND)
+        if not item:
+            break
+        note_id = item[1]
+        if is_note_pending_ack(note_id):
+            continue
+        note = get_lan_only_note(board_id, note_id)
+        if not note:
+            continue
+        candidate = notes + [(note, generate_lora_msg_id())]
+        packed_msg = pack_lora_messages([build_note_send_msg(n, lora_msg_id) for n, lora_msg_id in candidate])
+        if len(packed_msg.encode('utf-8')) > LORA_MAX_TEXT_BYTES:
+            send_queue.requeue(item)
+            break
+        notes = candidate
+    return notes
+
+def is_note_pending_ack(note_id):
+    """note 是否已發送、正在等待設備 ACK"""
+    return any(note_id in get_pending_note_ids(info) for info in pending_ack.values())
+
+def _send_lan_only_note(ch_name, note):
+    """以 /msg 或 /reply 發送 LAN only note 並等待設備 ACK，回傳已發送的訊息（未發送時為 None）"""
+    print(f"[排程器] [{ch_name}] 準備發送 note_id={note['note_id']}")
+    print(f"  -> note 完整資料: {note}")
+    
+    try:
+        reply_lora_msg_id = note.get('reply_lora_msg_id')
+        
+        print(f"  -> reply_lora_msg_id 值: {reply_lora_msg_id} (type: {type(reply_lora_msg_id)})")
+        print(f"  -> author_key: {note.get('author_key', '')}, color_id: {get_color_index_from_palette(note.get('bg_color', ''))}")
+        
+        msg = build_note_send_msg(note)
+        if reply_lora_msg_id:
+            print(f"  -> 使用 /reply 指令 (含 color_id 與 author_key): {msg}")
+        else:
+            print(f"  -> 使用 /msg 指令 (含 color_id 與 author_key): {msg}")
+        
+        update_note_transmit_st_at(note['note_id'])
+        result = send_lora_command(interface, ch_name, msg, wantAck=True)
+        
+        if result:
+            request_id = result.id if hasattr(result, 'id') else None
+            if request_id:
+                current_time = int(time.time())
+                register_pending_ack(request_id, {
+                    'note_id': note['note_id'],
+                    'author_key': note['author_key'],
+                    'bg_color': note['bg_color'],
+                    'board_id': ch_name,
+                    'timestamp': current_time
+                })
+                update_note_status(note['note_id'], 'Sending')
+                print(f"  -> 已發送訊息，等待 ACK (request_id={request_id})")
+                notify_notes_changed(ch_name)
+            else:
+                print(f"  -> 已發送訊息，但無 request_id")
+        else:
+            print(f"  -> 發送失敗")
+        return msg
         
-        del pending_ack[request_id]
+    except Exception as e:
+        print(f"[排程器] 發送失敗: {e}")
+        import traceback
+        traceback.print_exc()
+        _handle_send_usb_error(str(e))
+        return None
+
+# 各頻道 ACK 統計快取（自適應自動重送使用）
+_resend_ack_stats = {}
+_resend_ack_stats_at = 0
+
+def get_channel_ack_stats():
+    """取得各頻道近期 ACK 往返時間與可達節點統計（快取 RESEND_STATS_REFRESH_SECOND 秒）"""
+    global _resend_ack_stats, _resend_ack_stats_at
+    now = time.time()
+    if now - _resend_ack_stats_at < RESEND_STATS_REFRESH_SECOND:
+        return _resend_ack_stats
+    try:
+        since_ms = int((now - RESEND_STATS_WINDOW_SECOND) * 1000)
+        conn = get_db_connection()
+        rows = conn.execute('''
+            SELECT n.board_id, a.lora_node_id, a.latency_ms,
+                   a.hop_start - a.hop_limit AS hops
+            FROM ack_records a
+            JOIN notes n ON n.note_id = a.note_id
+            WHERE a.created_at > ?
+        ''', (since_ms,)).fetchall()
+        conn.close()
+        _resend_ack_stats = compute_channel_ack_stats(rows)
+        _resend_ack_stats_at = now
+        for board_id, stats in _resend_ack_stats.items():
+            p90 = f"{stats['latency_p90']:.1f}s" if stats['latency_p90'] is not None else '-'
+            print(f"[自動重送] 頻道 {board_id} ACK 統計: 樣本 {stats['samples']} 筆, p90 往返 {p90}, "
+                  f"可達節點 {len(stats['nodes'])} 個, 最大 hop {stats['max_hops']}")
+    except Exception as e:
+        print(f"[自動重送] 計算 ACK 統計失敗: {e}")
+    return _resend_ack_stats
+
+def find_auto_resend_candidate():
+    """找出一筆 ACK 數量不足、需要自動重送的 note，沒有時回傳 None
+
+    AUTO_RESEND_ADAPTIVE 啟用時，各頻道的退避基數與需要的 ACK 數量依近期 ACK 統計調整。
+    """
+    now_ms = int(time.time() * 1000)
+    min_created_at = now_ms - int(AUTO_RESEND_MAX_MINUTE * 60 * 1000)  # 不早於 MAX_MINUTE 前
+    max_created_at = now_ms - int(AUTO_RESEND_MIN_MINUTE * 60 * 1000)  # 不晚於 MIN_MINUTE 前
+    
+    # 取得所有 active channel 名稱
+    active_ch_names = [ch['name'] for ch in active_channels]
+    if not active_ch_names:
+        return None  # 無可用頻道，跳過
+    
+    channel_stats = get_channel_ack_stats() if AUTO_RESEND_ADAPTIVE else {}
+    
+    conn = get_db_connection()
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    
+    # ack_count 由 save_ack_records 維護，搭配 idx_notes_resend 只掃描 created_at 區間內的 note
+    query = '''
+        SELECT n.note_id, n.board_id, n.resent_count, n.created_at, n.updated_at, n.ack_count
+        FROM notes n
+        WHERE n.board_id = ?
+          AND n.status = 'LoRa sent'
+          AND n.deleted = 0
+          AND n.created_at > ?
+          AND n.updated_at < ?
+          AND n.ack_count < ?
+          AND (n.resent_count = 0 OR (? - n.updated_at) >= n.resent_count * ?)
+          AND n.lora_msg_id IS NOT NULL AND n.lora_msg_id != ''
+        ORDER BY n.resent_count ASC, n.created_at ASC
+        LIMIT 1
+    '''
+    
+    candidate = None
+    candidate_backoff_s = AUTO_RESEND_BACKOFF_SECOND
+    candidate_target = AUTO_RESEND_NODE
+    for ch_name in active_ch_names:
+        stats = channel_stats.get(ch_name)
+        backoff_s = resend_backoff_second(stats, AUTO_RESEND_BACKOFF_SECOND)
+        target = resend_target_nodes(stats, AUTO_RESEND_NODE)
+        cursor.execute(query, (ch_name, min_created_at, max_created_at, target, now_ms, int(backoff_s * 1000)))
+        row = cursor.fetchone()
+        if row and (candidate is None or
+                    (row['resent_count'], row['created_at']) < (candidate['resent_count'], candidate['created_at'])):
+            candidate = row
+            candidate_backoff_s = backoff_s
+            candidate_target = target
+    conn.close()
+    
+    if candidate:
+        c_resent_count = candidate['resent_count']
+        age_minutes = round((now_ms - candidate['created_at']) / (60 * 1000), 1)
+        since_last_update_s = round((now_ms - candidate['updated_at']) / 1000, 1)
+        next_backoff_s = round((c_resent_count + 1) * candidate_backoff_s, 1)
+        
+        print(f"[自動重送] 找到候選 note: note_id={candidate['note_id']}, board_id={candidate['board_id']}, "
+              f"resent_count={c_resent_count}, ack_count={candidate['ack_count']}/{candidate_target}, "
+              f"age={age_minutes}min, 距上次更新={since_last_update_s}s, 下次退避={next_backoff_s}s")
+    return candidate
+
+def _dispatch_send_item(board_id, note_id, kind):
+    """發送一個佇列項目，回傳估算的 airtime 秒數（項目已失效或發送失敗時為 None）"""
+    if kind == KIND_UPDATE:
+        update_note = get_note_need_update_lora(board_id, note_id)
+        if not update_note:
+            return None
+        msg = _send_note_update(board_id, update_note)
+        return estimate_lora_airtime(board_id, msg) if msg else None
+    
+    if kind == KIND_SEND:
+        if is_note_pending_ack(note_id):
+            # 已發送、正在等待設備 ACK
+            return None
+        note = get_lan_only_note(board_id, note_id)
+        if not note:
+            return None
+        packed_notes = _collect_packed_notes(board_id, note) if LORA_PACK_NOTES else []
+        if len(packed_notes) > 1:
+            msg = _send_packed_notes(board_id, packed_notes)
+        else:
+            msg = _send_lan_only_note(board_id, note)
+        return estimate_lora_airtime(board_id, msg) if msg else None
+    
+    if kind == KIND_RESEND:
+        success, message, new_resent_count = _execute_resend_note(board_id, note_id, triggered_by='auto')
+        if success:
+            print(f"[自動重送] 成功重送 note_id={note_id}, 新 resent_count={new_resent_count}")
+            return estimate_lora_airtime(board_id, message)
+        print(f"[自動重送] 重送失敗 note_id={note_id}: {message}")
+        return None
+    
+    return None
 
 def send_scheduler_loop():
-    """定期發送 LAN only notes 和處理需要更新的 notes 的排程器"""
-    global interface, lora_connected, pending_ack, FLAG_DEVICE_WAITING_ACK
-    print(f"啟動發送排程器 (間隔: {send_interval} 秒)...")
+    """發送排程器：依優先順序發送佇列中的 notes，並以各頻道的 airtime 預算控制發送速度
+
+    佇列由寫入事件即時填入；每隔 send_interval 秒另從資料庫校正一次佇列並檢查自動重送。
+    """
+    global interface, lora_connected, pending_ack
+    duty_cycle = f"{LORA_DUTY_CYCLE_PERCENT}%" if LORA_DUTY_CYCLE_PERCENT > 0 else "不限制"
+    print(f"啟動發送排程器 (duty cycle: {duty_cycle}, 資料庫校正間隔: {send_interval} 秒)...")
+    
+    next_rescan_at = 0
+    wait_seconds = 0
     
     while True:
         try:
-            jitter = send_interval * 0.1 * (2 * random.random() - 1)
-            eventlet.sleep(send_interval + jitter)
-            
-            check_ack_timeout()
+            send_queue.wait(wait_seconds)
+            wait_seconds = SEND_QUEUE_MAX_WAIT_SECOND
             
             if not interface or not lora_connected:
                 continue
             
-            if FLAG_DEVICE_WAITING_ACK:
-                print(f"[排程器] LoRa 設備正在等待 ACK，跳過此次處理")
-                continue
+            active_ch_names = [ch['name'] for ch in active_channels]
             
-            # 遍歷所有可用頻道，處理需要更新和待發送的 notes
-            processed_any = False
-            for ch_cfg in active_channels:
-                ch_name = ch_cfg['name']
-                
-                if FLAG_DEVICE_WAITING_ACK:
-                    break
+            now = time.time()
+            if now >= next_rescan_at:
+                jitter = send_interval * 0.1 * (2 * random.random() - 1)
+                next_rescan_at = now + send_interval + jitter
+                refill_send_queue(active_ch_names)
                 
-                update_note = get_note_need_update_lora(ch_name)
-                if update_note:
-                    processed_any = True
-                    print(f"[排程器] [{ch_name}] 處理需要更新的 note_id={update_note['note_id']}")
-                    
-                    if not update_note['lora_msg_id']:
-                        print(f"  -> 跳過：此 note 尚未發送至 LoRa，無 lora_msg_id")
-                        continue
-                    
+                # === 自動重送機制 ===
+                if AUTO_RESEND_NODE > 0:
                     try:
-                        channel_index = get_channel_index(interface, ch_name)
-                        
-                        if update_note['deleted'] == 1:
-                            msg = f"/archive [{update_note['lora_msg_id']}]{update_note['author_key']}"
-                            print(f"  -> 發送 archive 命令: {msg}")
-                        else:
-                            color_index = get_color_index_from_palette(update_note['bg_color'])
-                            msg = f"/color [{update_note['lora_msg_id']}]{update_note['author_key']}, {color_index}"
-                            print(f"  -> 發送 color 命令: {msg}")
-                        
-                        update_note_transmit_st_at(update_note['note_id'])
-                        interface.sendText(msg, channelIndex=channel_index)
-                        print(f"  -> 已發送更新命令")
-                        socketio.emit('refresh_notes', {'board_id': ch_name})
-                        update_epaper_display()
-                        
+                        candidate = find_auto_resend_candidate()
+                        if candidate:
+                            send_queue.push(candidate['board_id'], candidate['note_id'], KIND_RESEND, PRIORITY_RESEND)
                     except Exception as e:
-                        error_str = str(e)
-                        print(f"[排程器] 發送更新命令失敗: {e}")
+                        print(f"[自動重送] 處理異常: {e}")
                         import traceback
                         traceback.print_exc()
-                        
-                        # 檢測 USB 連線異常
-                        if "Timed out waiting for connection completion" in error_str or \
-                           "device disconnected" in error_str or \
-                           "裝置路徑" in error_str and "已消失" in error_str:
-                            error_msg = "連線失敗：USB連線異常中斷，可能是 Pi 電力供應不足、更換線材、或 Mesh 裝置需要重啟"
-                            print(f"[排程器] {error_msg}")
-                            lora_connected = False
-                            FLAG_DEVICE_WAITING_ACK = False
-                            socketio.emit('usb_connection_error', {'message': error_msg})
-                            socketio.emit('lora_status', {'online': False, 'channel_validated': False, 'error_message': None, 'power_issue': False})
-                            update_epaper_display()
-                    
-                    continue
-                
-                note = get_oldest_lan_only_note(ch_name)
-                if not note:
-                    continue
-                
-                processed_any = True
-                print(f"[排程器] [{ch_name}] 準備發送 note_id={note['note_id']}")
-                print(f"  -> note 完整資料: {note}")
-                
-                try:
-                    channel_index = get_channel_index(interface, ch_name)
-                    
-                    reply_lora_msg_id = note.get('reply_lora_msg_id')
-                    author_key = note.get('author_key', '')
-                    bg_color = note.get('bg_color', '')
-                    color_id = get_color_index_from_palette(bg_color)
-                    
-                    print(f"  -> reply_lora_msg_id 值: {reply_lora_msg_id} (type: {type(reply_lora_msg_id)})")
-                    print(f"  -> author_key: {author_key}, color_id: {color_id}")
-                    
-                    if reply_lora_msg_id:
-                        msg = f"/reply <new,{color_id},{author_key}>[{reply_lora_msg_id}]{note['body']}"
-                        print(f"  -> 使用 /reply 指令 (含 color_id 與 author_key): {msg}")
-                    else:
-                        msg = f"/msg [new,{color_id},{author_key}]{note['body']}"
-                        print(f"  -> 使用 /msg 指令 (含 color_id 與 author_key): {msg}")
-                    
-                    update_note_transmit_st_at(note['note_id'])
-                    result = interface.sendText(msg, channelIndex=channel_index, wantAck=True)
-                    
-                    if result:
-                        request_id = result.id if hasattr(result, 'id') else None
-                        if request_id:
-                            current_time = int(time.time())
-                            pending_ack[request_id] = {
-                                'note_id': note['note_id'],
-                                'author_key': note['author_key'],
-                                'bg_color': note['bg_color'],
-                                'board_id': ch_name,
-                                'timestamp': current_time
-                            }
-                            update_note_status(note['note_id'], 'Sending')
-                            print(f"  -> 已發送訊息，等待 ACK (request_id={request_id})")
-                            socketio.emit('refresh_notes', {'board_id': ch_name})
-                            FLAG_DEVICE_WAITING_ACK = True
-                        else:
-                            print(f"  -> 已發送訊息，但無 request_id")
-                    else:
-                        print(f"  -> 發送失敗")
-                    
-                except Exception as e:
-                    error_str = str(e)
-                    print(f"[排程器] 發送失敗: {e}")
-                    import traceback
-                    traceback.print_exc()
-                    
-                    # 檢測 USB 連線異常
-                    if "Timed out waiting for connection completion" in error_str or \
-                       "device disconnected" in error_str or \
-                       "裝置路徑" in error_str and "已消失" in error_str:
-                        error_msg = "連線失敗：USB連線異常中斷，可能是 Pi 電力供應不足、更換線材、或 Mesh 裝置需要重啟"
-                        print(f"[排程器] {error_msg}")
-                        lora_connected = False
-                        FLAG_DEVICE_WAITING_ACK = False
-                        socketio.emit('usb_connection_error', {'message': error_msg})
-                        socketio.emit('lora_status', {'online': False, 'channel_validated': False, 'error_message': None, 'power_issue': False})
-                        update_epaper_display()
             
-            # === 自動重送機制 ===
-            if AUTO_RESEND_NODE > 0 and not FLAG_DEVICE_WAITING_ACK and interface and lora_connected:
-                try:
-                    now_ms = int(time.time() * 1000)
-                    min_created_at = now_ms - int(AUTO_RESEND_MAX_MINUTE * 60 * 1000)  # 不早於 MAX_MINUTE 前
-                    max_created_at = now_ms - int(AUTO_RESEND_MIN_MINUTE * 60 * 1000)  # 不晚於 MIN_MINUTE 前
-                    
-                    # 取得所有 active channel 名稱
-                    active_ch_names = [ch['name'] for ch in active_channels]
-                    if not active_ch_names:
-                        pass  # 無可用頻道，跳過
-                    else:
-                        placeholders = ','.join(['?'] * len(active_ch_names))
-                        
-                        conn = sqlite3.connect(DB_PATH)
-                        conn.row_factory = sqlite3.Row
-                        cursor = conn.cursor()
-                        
-                        backoff_ms = AUTO_RESEND_BACKOFF_SECOND * 1000
-                        
-                        query = f'''
-                            SELECT n.note_id, n.board_id, n.resent_count, n.created_at, n.updated_at,
-                                   (SELECT COUNT(*) FROM ack_records ar WHERE ar.note_id = n.note_id) as ack_count
-                            FROM notes n
-                            WHERE n.status = 'LoRa sent'
-                              AND n.deleted = 0
-                              AND n.lora_msg_id IS NOT NULL AND n.lora_msg_id != ''
-                              AND n.created_at > ?
-                              AND n.updated_at < ?
-                              AND n.board_id IN ({placeholders})
-                              AND (SELECT COUNT(*) FROM ack_records ar WHERE ar.note_id = n.note_id) < ?
-                              AND (n.resent_count = 0 OR (? - n.updated_at) >= n.resent_count * ?)
-                            ORDER BY n.resent_count ASC, n.created_at ASC
-                            LIMIT 1
-                        '''
-                        
-                        params = [min_created_at, max_created_at] + active_ch_names + [AUTO_RESEND_NODE, now_ms, backoff_ms]
-                        cursor.execute(query, params)
-                        candidate = cursor.fetchone()
-                        conn.close()
-                        
-                        if candidate:
-                            c_note_id = candidate['note_id']
-                            c_board_id = candidate['board_id']
-                            c_resent_count = candidate['resent_count']
-                            c_ack_count = candidate['ack_count']
-                            c_created_at = candidate['created_at']
-                            c_updated_at = candidate['updated_at']
-                            age_minutes = round((now_ms - c_created_at) / (60 * 1000), 1)
-                            since_last_update_s = round((now_ms - c_updated_at) / 1000, 1)
-                            next_backoff_s = (c_resent_count + 1) * AUTO_RESEND_BACKOFF_SECOND
-                            
-                            print(f"[自動重送] 找到候選 note: note_id={c_note_id}, board_id={c_board_id}, "
-                                  f"resent_count={c_resent_count}, ack_count={c_ack_count}/{AUTO_RESEND_NODE}, "
-                                  f"age={age_minutes}min, 距上次更新={since_last_update_s}s, 下次退避={next_backoff_s}s")
-                            
-                            success, message, new_resent_count = _execute_resend_note(c_board_id, c_note_id, triggered_by='auto')
-                            
-                            if success:
-                                print(f"[自動重送] 成功重送 note_id={c_note_id}, 新 resent_count={new_resent_count}")
-                            else:
-                                print(f"[自動重送] 重送失敗 note_id={c_note_id}: {message}")
-                        else:
-                            # print(f"[自動重送] 本次無符合條件的 note 需要重送")
-                            pass
-                
-                except Exception as e:
-                    print(f"[自動重送] 處理異常: {e}")
-                    import traceback
-                    traceback.print_exc()
+            if not has_free_send_slot():
+                # 發送視窗已滿，收到設備 ACK 或 ACK 超時時會喚醒排程器
+                continue
+            
+            item = send_queue.pop(
+                lambda board_id, kind: board_id in active_ch_names and has_free_send_slot(board_id)
+                and get_send_airtime_bucket(board_id).is_ready()
+            )
+            if not item:
+                # 佇列中的頻道 airtime 不足時，等到最早可發送的時間（發送視窗已滿的頻道於釋放時會喚醒排程器）
+                waits = [get_send_airtime_bucket(b).wait_time() for b in send_queue.board_ids()
+                         if b in active_ch_names and has_free_send_slot(b)]
+                if waits:
+                    wait_seconds = min(SEND_QUEUE_MAX_WAIT_SECOND, min(waits))
+                continue
+            
+            board_id, note_id, kind, priority, _ = item
+            airtime = _dispatch_send_item(board_id, note_id, kind)
+            if airtime:
+                get_send_airtime_bucket(board_id).consume(airtime)
+                print(f"[排程器] [{board_id}] airtime 約 {airtime:.2f}s，佇列剩餘 {len(send_queue)} 筆")
+            # 繼續處理下一筆（發送視窗已滿時，下一輪會等待）
+            wait_seconds = 0
                 
         except Exception as e:
             error_str = str(e)
             print(f"[排程器] 錯誤: {e}")
             import traceback
             traceback.print_exc()
+            wait_seconds = SEND_QUEUE_MAX_WAIT_SECOND
 
 def validate_channel_name(interface):
     """驗證裝置的 channel name 是否與 config 中的設定一致（支援多頻道）"""
@@ -2070,7 +2889,7 @@ def set_device_time_from_local(iface):
         print(f"[設備時間] 設定設備時間失敗: {e}")
 
 def mesh_loop():
-    global interface, current_dev_path, lora_connected, channel_validated, active_channels, deviceLastPosition, isDeviceProvideLocation, FLAG_DEVICE_WAITING_ACK
+    global interface, current_dev_path, lora_connected, channel_validated, active_channels, deviceLastPosition, isDeviceProvideLocation
     print("啟動 Meshtastic 自動偵測與監聽 (NoteBoard 模式)...")
     
     while True:
@@ -2135,7 +2954,7 @@ def mesh_loop():
                             # 初始化 SerialInterface
                             interface = SerialInterface(devPath=target_port)
                             current_dev_path = target_port
-                            pub.subscribe(onReceive, "meshtastic.receive")
+                            pub.subscribe(enqueue_received_packet, "meshtastic.receive")
                             
                             print(f">>> 成功連線至 {target_port} <<<")
                             connection_success = True
@@ -2254,7 +3073,7 @@ def mesh_loop():
                     is_channel_valid, error_msg = validate_channel_name(interface)
                     
                     lora_connected = True
-                    FLAG_DEVICE_WAITING_ACK = False
+                    release_all_inflight_slots()
                     socketio.emit('lora_status', {
                         'online': True, 
                         'channel_validated': is_channel_valid,
@@ -2272,7 +3091,7 @@ def mesh_loop():
                 
                 if not lora_connected:
                     lora_connected = True
-                    FLAG_DEVICE_WAITING_ACK = False
+                    release_all_inflight_slots()
                     is_channel_valid, error_msg = validate_channel_name(interface)
                     socketio.emit('lora_status', {
                         'online': True, 
@@ -2334,8 +3153,8 @@ def get_features_config():
         # 檢查地圖功能是否啟用
         map_enabled = False
         if NOTEBOARD_MBTILES_FOLDER and os.path.exists(NOTEBOARD_MBTILES_FOLDER):
-            mbtiles_files = glob.glob(os.path.join(NOTEBOARD_MBTILES_FOLDER, '*.mbtiles'))
-            map_enabled = len(mbtiles_files) > 0
+            tileset_entries, _ = scan_tilesets(NOTEBOARD_MBTILES_FOLDER)
+            map_enabled = len(tileset_entries) > 0
         
         return jsonify({
             'success': True,
@@ -2352,23 +3171,36 @@ def get_features_config():
             'error': str(e)
         }), 500
 
-@app.route('/api/global/lan-only-count', methods=['GET'])
-def get_global_lan_only_count():
-    """取得所有 board 中 LAN only 狀態的 note 數量（未刪除）"""
+def count_global_lan_only_notes():
+    """計算所有 board 中 LAN only 狀態的 note 數量（未刪除）"""
+    conn = get_db_connection()
     try:
-        conn = sqlite3.connect(DB_PATH)
         cursor = conn.cursor()
         cursor.execute('''
             SELECT COUNT(*) FROM notes
             WHERE status = 'LAN only' AND deleted = 0
         ''')
-        count = cursor.fetchone()[0]
+        return cursor.fetchone()[0]
+    finally:
         conn.close()
-        return jsonify({'success': True, 'count': count})
+
+@app.route('/api/global/lan-only-count', methods=['GET'])
+def get_global_lan_only_count():
+    """取得所有 board 中 LAN only 狀態的 note 數量（未刪除）"""
+    try:
+        return jsonify({'success': True, 'count': count_global_lan_only_notes()})
     except Exception as e:
         print(f"取得全域 LAN only 數量失敗: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/global/receive-stats', methods=['GET'])
+def get_receive_stats():
+    """取得 LoRa 接收佇列的統計資料（目前深度、捨棄數量、批次處理時間）"""
+    return jsonify({
+        'success': True,
+        'stats': dict(receive_stats, depth=receive_queue.qsize(), capacity=RECEIVE_QUEUE_MAX)
+    })
+
 @app.route('/api/config/post_passcode_required', methods=['GET'])
 def get_post_passcode_required():
     """檢查各頻道是否需要張貼通關碼"""
@@ -2515,9 +3347,32 @@ def verify_channel_access(board_id):
     
     return True, None, None
 
-@app.route('/api/config/map_init_location', methods=['GET'])
-def get_map_init_location():
-    """取得地圖初始位置配置"""
+# join_board 的 token 有效秒數；client 於送出 join_board 前以 HTTP（帶目前的 cookie）取得
+JOIN_BOARD_TOKEN_MAX_AGE = 60
+
+def _get_join_board_serializer():
+    return URLSafeTimedSerializer(app.config['SECRET_KEY'], salt='join-board')
+
+def verify_join_board_token(token, board_id):
+    """確認 join token 由 /api/boards/<board_id>/join-token 簽發且未過期"""
+    if not token or not board_id:
+        return False
+    try:
+        return _get_join_board_serializer().loads(token, max_age=JOIN_BOARD_TOKEN_MAX_AGE) == board_id
+    except BadSignature:
+        return False
+
+@app.route('/api/boards/<board_id>/join-token', methods=['GET'])
+def get_join_board_token(board_id):
+    """簽發 socket join_board 用的短效 token（以 HTTP 請求當下的 session 驗證頻道權限）"""
+    has_access, error_response, status_code = verify_channel_access(board_id)
+    if not has_access:
+        return error_response, status_code
+    return jsonify({'success': True, 'token': _get_join_board_serializer().dumps(board_id)})
+
+@app.route('/api/config/map_init_location', methods=['GET'])
+def get_map_init_location():
+    """取得地圖初始位置配置"""
     global deviceLastPosition, isDeviceProvideLocation
     
     try:
@@ -2698,121 +3553,21 @@ def logout_admin():
 
 @app.route('/api/boards/<board_id>/table-base', methods=['GET'])
 def get_table_base(board_id):
-    """取得 max_notes 筆『有 table 指令』notes 之前的舊 table 資料，處理成資料表格式回傳（用於 TableView 基礎資料）"""
+    """取得頻道所有工作表目前的內容（用於 TableView 基礎資料）
+
+    由 sheet_cells 表直接讀取，前端再以 /notes 回傳的最新 table notes 覆蓋。
+    """
     has_access, error_response, status_code = verify_channel_access(board_id)
     if not has_access:
         return error_response, status_code
 
     try:
-        ch_cfg = get_channel_config(board_id)
-        max_notes = ch_cfg.get('max_notes', 200)
-        table_glob = '{[a-z0-9][a-z0-9][a-z0-9][a-z0-9][a-z0-9][a-z0-9]:*'
-
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-
-        # 取得最新 max_notes 筆『有 table 指令』的 note_id 集合（這些由 /notes API 回傳，需排除）
-        cursor.execute('''
-            SELECT note_id FROM notes
-            WHERE board_id = ? AND deleted = 0 AND body GLOB ?
-            ORDER BY created_at DESC
-            LIMIT ?
-        ''', (board_id, table_glob, max_notes))
-        recent_table_ids = set(r['note_id'] for r in cursor.fetchall())
-
-        # 計算需要處理的舊 table 資料總筆數
-        cursor.execute('''
-            SELECT COUNT(*) as cnt FROM notes 
-            WHERE board_id = ? AND deleted = 0 AND body GLOB ?
-        ''', (board_id, table_glob))
-        total_table_count = cursor.fetchone()['cnt']
-        old_count = total_table_count - len(recent_table_ids)
-
-        if old_count <= 0:
-            conn.close()
-            return jsonify({'success': True, 'cells': [], 'titles': {}, 'count': 0})
-
-        # 以 dict 累積每個 sheet 的 cell 資料，新資料覆蓋舊資料（同一格以較新的為準）
-        # key: (sheetId, cellId)  value: {content, bg_color}
-        sheet_cells = {}
-        sheet_titles = {}
-        deleted_sheets = set()
-
-        # 分段讀取舊的 table 指令資料，每次 1000 筆，避免一次載入過多資料
-        batch_size = 1000
-        batch_offset = 0
-
-        while True:
-            cursor.execute('''
-                SELECT note_id, body, bg_color, created_at FROM notes
-                WHERE board_id = ? AND deleted = 0 AND body GLOB ?
-                ORDER BY created_at ASC
-                LIMIT ? OFFSET ?
-            ''', (board_id, table_glob, batch_size, batch_offset))
-
-            rows = cursor.fetchall()
-            if not rows:
-                break
-
-            for row in rows:
-                # 跳過最新 max_notes 筆 table 指令（屬於前端 /notes 回傳範圍）
-                if row['note_id'] in recent_table_ids:
-                    continue
-
-                body = (row['body'] or '').strip()
-                bg_color = row['bg_color'] or ''
-
-                # 偵測工作表刪除指令
-                sd_m = SHEET_DELETE_RE.match(body)
-                if sd_m:
-                    sid = sd_m.group(1)
-                    deleted_sheets.add(sid)
-                    # 移除該 sheet 所有已累積的 cell 與 title
-                    keys_to_remove = [k for k in sheet_cells if k[0] == sid]
-                    for k in keys_to_remove:
-                        del sheet_cells[k]
-                    sheet_titles.pop(sid, None)
-                    continue
-
-                m = TABLE_CELL_RE.match(body)
-                if not m:
-                    continue
-
-                sheet_id = m.group(1)
-                cell_id = m.group(2)
-                content = m.group(3)
-
-                # 已被刪除的 sheetId 永久排除，不再接受任何資料
-                if sheet_id in deleted_sheets:
-                    continue
-
-                if cell_id == 'title':
-                    sheet_titles[sheet_id] = content.strip()
-                else:
-                    # cell_id 格式為 "A1"~"Z999"，拆分為 col index 與 row number
-                    col = ord(cell_id[0]) - 65  # A=0, B=1, ...
-                    row_num = int(cell_id[1:])
-                    sheet_cells[(sheet_id, cell_id)] = {
-                        's': sheet_id,
-                        'r': row_num,
-                        'c': col,
-                        't': content,
-                        'bg': bg_color
-                    }
-
-            # 如果本批次筆數不足 batch_size，代表已讀完全部
-            if len(rows) < batch_size:
-                break
-            batch_offset += batch_size
-
-        conn.close()
-        cells = list(sheet_cells.values())
+        cells, titles, deleted_sheets = get_sheet_cells(board_id)
         return jsonify({
             'success': True,
             'cells': cells,
-            'titles': sheet_titles,
-            'deleted_sheets': list(deleted_sheets),
+            'titles': titles,
+            'deleted_sheets': deleted_sheets,
             'count': len(cells)
         })
 
@@ -2825,81 +3580,242 @@ def get_table_base(board_id):
 
 @app.route('/api/boards/<board_id>/notes', methods=['GET'])
 def get_board_notes(board_id):
-    """取得指定 board 的所有 notes，包含 reply_notes 階層結構"""
+    """取得指定 board 的所有 notes，包含 reply_notes 階層結構
+
+    帶 ?since=<cursor> 時只回傳 cursor 之後有異動的討論串（delta: true），
+    回應中的 cursor 供下次查詢使用。
+    """
     # 驗證頻道訪問權限
     has_access, error_response, status_code = verify_channel_access(board_id)
     if not has_access:
         return error_response, status_code
     
     is_include_deleted = request.args.get('is_include_deleted', 'false').lower() == 'true'
+    include_acks = request.args.get('include_acks', 'false').lower() == 'true'
     
+    since = request.args.get('since')
+    if since is not None:
+        try:
+            since_cursor = int(since)
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'error': 'Invalid since cursor'
+            }), 400
+        # cursor 比目前序號還新（例如資料庫被重建），改回傳完整清單
+        if 0 <= since_cursor <= get_notes_sync_cursor():
+            try:
+                return jsonify(build_board_notes_delta(board_id, since_cursor, is_include_deleted, include_acks))
+            except Exception as e:
+                print(f"取得 notes 差異失敗: {e}")
+                return jsonify({
+                    'success': False,
+                    'error': str(e)
+                }), 500
+    
+    data = get_cached_notes_response(
+        board_id,
+        is_include_deleted,
+        include_acks,
+        lambda: build_board_notes_payload(board_id, is_include_deleted, include_acks)
+    )
+    response = make_response(data)
+    response.headers['Content-Type'] = 'application/json'
+    return response
+
+def resolve_visible_parent_ids(notes, deleted_lora_msg_ids):
+    """為每個指向已刪除 parent 的 reply，沿 reply chain 往上找到第一個未刪除的 parent
+
+    回傳 dict: 已刪除的 lora_msg_id -> 第一個未刪除 parent 的 lora_msg_id（找不到或遇到循環時為 None）。
+    沿途經過的節點都會記下結果（path compression），每個 lora_msg_id 只需走訪一次。
+    """
+    lora_msg_id_to_note = {}
+    for note in notes:
+        if note.get('loraMessageId'):
+            lora_msg_id_to_note[note['loraMessageId']] = note
+
+    resolved = {}
+    for start_id in deleted_lora_msg_ids:
+        if start_id in resolved:
+            continue
+        path = []
+        on_path = set()
+        current_id = start_id
+        while True:
+            if current_id in resolved:
+                result = resolved[current_id]
+                break
+            if current_id in on_path:
+                # 循環參照，整串都視為找不到 parent
+                result = None
+                break
+            if current_id not in deleted_lora_msg_ids:
+                # 指向的 parent 未刪除，即為結果
+                result = current_id
+                break
+            path.append(current_id)
+            on_path.add(current_id)
+            parent_note = lora_msg_id_to_note.get(current_id)
+            if not parent_note or not parent_note.get('replyLoraMessageId'):
+                # 已刪除的 parent 沒有更上層的 parent（成為獨立 note）
+                result = None
+                break
+            current_id = parent_note['replyLoraMessageId']
+        for node_id in path:
+            resolved[node_id] = result
+    return resolved
+
+def build_reply_index(reply_notes):
+    """建立 parent lora_msg_id -> 回覆 notes 清單（維持原順序）的索引"""
+    children_by_parent = {}
+    for note in reply_notes:
+        children_by_parent.setdefault(note.get('replyLoraMessageId'), []).append(note)
+    return children_by_parent
+
+def collect_reply_subtree(root_lora_msg_id, children_by_parent):
+    """以深度優先順序收集 root 底下所有層級的回覆（只透過 lora_msg_id 匹配）"""
+    replies = []
+    visited = {root_lora_msg_id}
+    stack = [iter(children_by_parent.get(root_lora_msg_id, ()))]
+    while stack:
+        reply_note = next(stack[-1], None)
+        if reply_note is None:
+            stack.pop()
+            continue
+        replies.append(reply_note)
+        child_lora_msg_id = reply_note.get('loraMessageId')
+        if child_lora_msg_id and child_lora_msg_id not in visited:
+            visited.add(child_lora_msg_id)
+            stack.append(iter(children_by_parent.get(child_lora_msg_id, ())))
+    return replies
+
+def build_board_notes_payload(board_id, is_include_deleted, include_acks=False):
+    """查詢資料庫並組出 notes 回應（含 reply_notes 階層結構），回傳 JSON bytes
+
+    include_acks=True 時，每筆 note 會附帶 acks 欄位（ACK 記錄清單）。
+    """
+    # 先取得 cursor 再查詢，查詢期間的異動會在下次 delta 重複送出，不會遺漏
+    sync_cursor = get_notes_sync_cursor()
+    parent_notes = build_board_notes_tree(board_id, is_include_deleted, include_acks)
+    
+    return jsonify({
+        'success': True,
+        'board_id': board_id,
+        'notes': parent_notes,
+        'count': len(parent_notes),
+        'cursor': sync_cursor
+    }).get_data()
+
+def build_board_notes_delta(board_id, since_cursor, is_include_deleted, include_acks=False):
+    """組出 since_cursor 之後的 notes 差異回應
+
+    notes 為含有異動 note 的完整討論串（parent 及其 replyNotes），
+    removed 為有異動但已不在清單中的 note_id（封存、超出顯示數量或改掛到其他討論串的 temp parent）。
+    前端以 noteId 取代或新增討論串，並移除 removed 與新討論串中出現的 note。
+    只組出異動 note 及其上層 parent 所在的討論串，不重建整個頻道的階層結構。
+    """
+    sync_cursor = get_notes_sync_cursor()
+    changed_ids = get_changed_note_ids(board_id, since_cursor)
+    
+    changed_threads = []
+    removed_ids = []
+    if changed_ids:
+        all_notes = get_visible_notes(board_id, is_include_deleted)
+        parent_notes, reply_notes_pool = split_parent_notes(all_notes)
+        
+        # 由異動的 note 沿 replyLoraMessageId 往上找出所有上層 note，其中的 parent 即為需要重送的討論串
+        notes_by_lora_msg_id = {}
+        for note in all_notes:
+            if note.get('loraMessageId'):
+                notes_by_lora_msg_id.setdefault(note['loraMessageId'], []).append(note)
+        related_ids = set()
+        pending = [note for note in all_notes if note['noteId'] in changed_ids]
+        while pending:
+            note = pending.pop()
+            if note['noteId'] in related_ids:
+                continue
+            related_ids.add(note['noteId'])
+            pending.extend(notes_by_lora_msg_id.get(note.get('replyLoraMessageId'), ()))
+        
+        changed_threads = [parent for parent in parent_notes if parent['noteId'] in related_ids]
+        attach_reply_notes(changed_threads, reply_notes_pool)
+        
+        thread_ids = set()
+        for parent in changed_threads:
+            thread_ids.add(parent['noteId'])
+            thread_ids.update(reply['noteId'] for reply in parent['replyNotes'])
+        # 討論串中的 temp parent 也帶有自己的 replyNotes，與完整清單一致
+        attach_reply_notes(
+            [parent for parent in parent_notes if parent['noteId'] in thread_ids and parent['noteId'] not in related_ids],
+            reply_notes_pool
+        )
+        if include_acks:
+            attach_acks(board_id, [note for note in all_notes if note['noteId'] in thread_ids])
+        removed_ids = sorted(changed_ids - thread_ids)
+    
+    return {
+        'success': True,
+        'board_id': board_id,
+        'delta': True,
+        'since': since_cursor,
+        'cursor': sync_cursor,
+        'notes': changed_threads,
+        'removed': removed_ids,
+        'count': len(changed_threads)
+    }
+
+def build_board_notes_tree(board_id, is_include_deleted, include_acks=False):
+    """查詢資料庫並組出 parent notes 清單（每筆含 replyNotes，已依置頂與時間排序）"""
+    all_notes = get_visible_notes(board_id, is_include_deleted)
+    
+    if include_acks:
+        attach_acks(board_id, all_notes)
+    
+    parent_notes, reply_notes_pool = split_parent_notes(all_notes)
+    attach_reply_notes(parent_notes, reply_notes_pool)
+    return parent_notes
+
+def get_visible_notes(board_id, is_include_deleted):
+    """查詢資料庫取得要顯示的 notes（指向已刪除 parent 的 reply 已改掛到第一個未刪除的 parent）"""
     # 當 is_include_deleted=False 時，仍需取得所有 notes 以正確處理 reply 關係
     # 因為 deleted=0 的 reply note 可能指向 deleted=1 的 parent note
     all_notes_raw = get_notes_from_db(board_id, include_deleted=True)
     
+    if is_include_deleted:
+        return all_notes_raw
+    
     # 如果不顯示已封存，需要進行智慧過濾
-    if not is_include_deleted:
-        # 建立 lora_msg_id 到 note 的映射（用於查找 parent chain）
-        lora_msg_id_to_note = {}
-        for note in all_notes_raw:
-            if note.get('loraMessageId'):
-                lora_msg_id_to_note[note['loraMessageId']] = note
-        
-        # 收集所有 deleted=1 的 lora_msg_id（這些 parent 不應顯示）
-        deleted_lora_msg_ids = set()
-        for note in all_notes_raw:
-            if note.get('archived') and note.get('loraMessageId'):
-                deleted_lora_msg_ids.add(note['loraMessageId'])
-        
-        # 輔助函數：沿著 reply chain 往上找到第一個未刪除的 parent 的 lora_msg_id
-        def find_valid_parent_lora_msg_id(reply_lora_msg_id, visited=None):
-            if visited is None:
-                visited = set()
-            
-            # 防止無限迴圈
-            if reply_lora_msg_id in visited:
-                return None
-            visited.add(reply_lora_msg_id)
-            
-            # 如果指向的 parent 未刪除，直接返回
-            if reply_lora_msg_id not in deleted_lora_msg_ids:
-                return reply_lora_msg_id
-            
-            # 指向的 parent 已刪除，往上找
-            parent_note = lora_msg_id_to_note.get(reply_lora_msg_id)
-            if parent_note and parent_note.get('replyLoraMessageId'):
-                # 繼續往上找
-                return find_valid_parent_lora_msg_id(parent_note['replyLoraMessageId'], visited)
-            
-            # 已刪除的 parent 沒有更上層的 parent，返回 None（成為獨立 note）
-            return None
-        
-        # 過濾 notes：只保留 deleted=0 的
-        # 對於 reply note，如果其 replyLoraMessageId 指向已刪除的 parent，沿 chain 往上找
-        # 如果 root 已刪除（valid_parent 為 None），則整串都不顯示
-        all_notes = []
-        for note in all_notes_raw:
-            if not note.get('archived'):
-                # deleted=0，保留
-                # 檢查其 replyLoraMessageId 是否指向已刪除的 parent
-                if note.get('replyLoraMessageId') in deleted_lora_msg_ids:
-                    # 沿著 reply chain 往上找到第一個未刪除的 parent
-                    valid_parent = find_valid_parent_lora_msg_id(note['replyLoraMessageId'])
-                    if valid_parent is None:
-                        # root 已刪除，整串都不顯示，跳過此 note
-                        continue
-                    note['replyLoraMessageId'] = valid_parent
-                all_notes.append(note)
-    else:
-        all_notes = all_notes_raw
+    # 收集所有 deleted=1 的 lora_msg_id（這些 parent 不應顯示）
+    deleted_lora_msg_ids = set()
+    for note in all_notes_raw:
+        if note.get('archived') and note.get('loraMessageId'):
+            deleted_lora_msg_ids.add(note['loraMessageId'])
     
-    # 建立 lora_msg_id 到 note 的映射
-    lora_msg_id_map = {}
-    for note in all_notes:
-        if note.get('loraMessageId'):
-            lora_msg_id_map[note['loraMessageId']] = note
+    visible_parent_ids = resolve_visible_parent_ids(all_notes_raw, deleted_lora_msg_ids)
     
-    # 分離 parent notes 和 reply notes
+    # 過濾 notes：只保留 deleted=0 的
+    # 對於 reply note，如果其 replyLoraMessageId 指向已刪除的 parent，改掛到第一個未刪除的 parent
+    # 如果 root 已刪除（valid_parent 為 None），則整串都不顯示
+    all_notes = []
+    for note in all_notes_raw:
+        if note.get('archived'):
+            continue
+        if note.get('replyLoraMessageId') in deleted_lora_msg_ids:
+            valid_parent = visible_parent_ids[note['replyLoraMessageId']]
+            if valid_parent is None:
+                continue
+            note['replyLoraMessageId'] = valid_parent
+        all_notes.append(note)
+    return all_notes
+
+def attach_acks(board_id, notes):
+    """為每筆 note 加上 acks 欄位（ACK 記錄清單）"""
+    acks_by_note = get_acks_grouped_by_note(board_id, [note['noteId'] for note in notes])
+    for note in notes:
+        note['acks'] = acks_by_note.get(note['noteId'], [])
+
+def split_parent_notes(all_notes):
+    """分離 parent notes 和 reply notes，回傳 (parent_notes, reply_notes_pool)，parent 已依置頂與時間排序"""
     parent_notes = []
     reply_notes_pool = []
     
@@ -2917,7 +3833,14 @@ def get_board_notes(board_id):
             # reply_lora_msg_id 不為 null 且 is_temp_parent_note=0，是 reply note
             reply_notes_pool.append(note)
     
-    # 為每個 parent note 建立 reply_notes
+    # 將置頂的 note 排到最前面
+    parent_notes.sort(key=lambda x: (not x.get('isPinedNote', False), -x.get('timestamp', 0)))
+    return parent_notes, reply_notes_pool
+
+def attach_reply_notes(parent_notes, reply_notes_pool):
+    """為每個 parent note 建立 replyNotes（所有層級的回覆，依時間由舊到新）"""
+    children_by_parent = build_reply_index(reply_notes_pool)
+    
     for parent in parent_notes:
         parent_lora_msg_id = parent.get('loraMessageId')
         
@@ -2925,47 +3848,12 @@ def get_board_notes(board_id):
         if not parent_lora_msg_id:
             continue
         
-        # 收集所有回覆此 parent 的 notes
-        replies = []
-        
-        # 遞迴函數：收集所有層級的回覆（只透過 lora_msg_id 匹配）
-        def collect_replies(target_lora_msg_id, collected_ids=None):
-            if collected_ids is None:
-                collected_ids = set()
-            
-            if target_lora_msg_id in collected_ids:
-                return []
-            
-            collected_ids.add(target_lora_msg_id)
-            found_replies = []
-            
-            for reply_note in reply_notes_pool:
-                if reply_note.get('replyLoraMessageId') == target_lora_msg_id:
-                    found_replies.append(reply_note)
-                    # 遞迴收集此 reply 的子回覆
-                    child_lora_msg_id = reply_note.get('loraMessageId')
-                    if child_lora_msg_id:
-                        child_replies = collect_replies(child_lora_msg_id, collected_ids)
-                        found_replies.extend(child_replies)
-            
-            return found_replies
-        
-        replies = collect_replies(parent_lora_msg_id)
+        replies = collect_reply_subtree(parent_lora_msg_id, children_by_parent)
         
         # 按時間排序（由舊到新）
         replies.sort(key=lambda x: x.get('timestamp', 0))
         
         parent['replyNotes'] = replies
-    
-    # 將置頂的 note 排到最前面
-    parent_notes.sort(key=lambda x: (not x.get('isPinedNote', False), -x.get('timestamp', 0)))
-    
-    return jsonify({
-        'success': True,
-        'board_id': board_id,
-        'notes': parent_notes,
-        'count': len(parent_notes)
-    })
 
 @app.route('/api/boards/<board_id>/notes', methods=['POST'])
 def create_board_note(board_id):
@@ -3022,7 +3910,7 @@ def create_board_note(board_id):
                 else:
                     final_sheet_id = original_sheet_id
         
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db_connection()
         cursor = conn.cursor()
         timestamp = int(time.time() * 1000)
         note_id = generate_note_id()
@@ -3053,8 +3941,8 @@ def create_board_note(board_id):
             cell_prefix = '{' + cell_m.group(1) + ':' + cell_m.group(2) + '}'
             cursor.execute('''
                 SELECT note_id FROM notes
-                WHERE board_id = ? AND body LIKE ? AND status = 'LAN only' AND deleted = 0
-            ''', (board_id, cell_prefix + '%'))
+                WHERE sheet_id = ? AND cell_id = ? AND board_id = ? AND status = 'LAN only' AND deleted = 0
+            ''', (cell_m.group(1), cell_m.group(2), board_id))
             old_rows = cursor.fetchall()
             if old_rows:
                 old_ids = [r[0] for r in old_rows]
@@ -3074,9 +3962,12 @@ def create_board_note(board_id):
         ch_cfg = get_channel_config(board_id)
         ch_max_notes = ch_cfg.get('max_notes', MAX_NOTES)
         auto_archive_old_notes(cursor, board_id, ch_max_notes)
+        apply_pending_sheet_cells(cursor, board_id)
         
         conn.commit()
         conn.close()
+        invalidate_notes_cache(board_id)
+        enqueue_note_for_lora(note_id)
         
         # 偵測工作表刪除指令：{sheetId:delete}
         sheet_delete_m = SHEET_DELETE_RE.match(text)
@@ -3112,7 +4003,7 @@ def create_board_note(board_id):
             'isTempParentNote': False
         }
         
-        socketio.emit('refresh_notes', {'board_id': board_id})
+        notify_notes_changed(board_id)
         if not _is_table_format_note(text):
             update_epaper_display()
         
@@ -3152,7 +4043,7 @@ def update_board_note(board_id, note_id):
                 'error': 'Text is required'
             }), 400
         
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db_connection()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -3195,8 +4086,9 @@ def update_board_note(board_id, note_id):
         
         conn.commit()
         conn.close()
+        invalidate_notes_cache(board_id)
         
-        socketio.emit('refresh_notes', {'board_id': board_id})
+        notify_notes_changed(board_id)
         if not _is_table_format_note(text):
             update_epaper_display()
         
@@ -3236,7 +4128,7 @@ def archive_board_note(board_id, note_id):
         # 驗證管理者身份
         is_verified_admin = is_admin_request and is_channel_admin(board_id)
         
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db_connection()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -3277,7 +4169,8 @@ def archive_board_note(board_id, note_id):
         conn.close()
         
         if archive_note(note_id, db_author_key, need_lora_update=True):
-            socketio.emit('refresh_notes', {'board_id': board_id})
+            notify_notes_changed(board_id)
+            enqueue_note_for_lora(note_id)
             update_epaper_display()
             return jsonify({
                 'success': True,
@@ -3313,7 +4206,7 @@ def change_note_color(board_id, note_id):
         # 檢查是否為管理者
         is_admin_user = is_channel_admin(board_id)
         
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db_connection()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -3353,7 +4246,8 @@ def change_note_color(board_id, note_id):
         conn.close()
         
         if update_note_color_by_note_id(note_id, effective_author_key, color_index, need_lora_update=True):
-            socketio.emit('refresh_notes', {'board_id': board_id})
+            notify_notes_changed(board_id)
+            enqueue_note_for_lora(note_id)
             update_epaper_display()
             return jsonify({
                 'success': True,
@@ -3381,9 +4275,9 @@ def pin_board_note(board_id, note_id):
     if not has_access:
         return error_response, status_code
     
-    global interface, lora_connected, FLAG_DEVICE_WAITING_ACK
+    global interface
     
-    if FLAG_DEVICE_WAITING_ACK:
+    if not has_free_send_slot(board_id):
         return jsonify({
             'success': False,
             'error': 'LoRa設備忙碌中'
@@ -3402,7 +4296,7 @@ def pin_board_note(board_id, note_id):
                 'error': 'Not authorized - admin only'
             }), 403
         
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db_connection()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -3463,27 +4357,18 @@ def pin_board_note(board_id, note_id):
         
         conn.commit()
         conn.close()
+        invalidate_notes_cache(board_id)
         
         if interface and lora_connected:
             try:
                 pin_cmd = f"/pin [{lora_msg_id}]{author_key}"
-                interface.sendText(pin_cmd, channelIndex=get_channel_index(interface, board_id))
+                send_lora_command(interface, board_id, pin_cmd)
                 print(f"已發送置頂命令: {pin_cmd}")
             except Exception as e:
-                error_str = str(e)
                 print(f"發送置頂命令失敗: {e}")
-                
-                # 檢測 USB 連線異常
-                if "Timed out waiting for connection completion" in error_str or \
-                   "device disconnected" in error_str or \
-                   "裝置路徑" in error_str and "已消失" in error_str:
-                    error_msg = "連線失敗：USB連線異常中斷，可能是 Pi 電力供應不足、更換線材、或 Mesh 裝置需要重啟"
-                    print(f"[pin_board_note] {error_msg}")
-                    lora_connected = False
-                    socketio.emit('usb_connection_error', {'message': error_msg})
-                    socketio.emit('lora_status', {'online': False, 'channel_validated': False, 'error_message': None, 'power_issue': False})
+                _handle_send_usb_error(str(e), '[pin_board_note]')
         
-        socketio.emit('refresh_notes', {'board_id': board_id})
+        notify_notes_changed(board_id)
         update_epaper_display()
         
         return jsonify({
@@ -3510,7 +4395,7 @@ def delete_board_note(board_id, note_id):
         data = request.get_json() or {}
         author_key = data.get('author_key', 'user-unknown')
         
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db_connection()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -3552,8 +4437,9 @@ def delete_board_note(board_id, note_id):
         
         conn.commit()
         conn.close()
+        invalidate_notes_cache(board_id)
         
-        socketio.emit('refresh_notes', {'board_id': board_id})
+        notify_notes_changed(board_id)
         update_epaper_display()
         
         return jsonify({
@@ -3579,12 +4465,13 @@ def _execute_resend_note(board_id, note_id, triggered_by='user'):
     
     Returns:
         (success: bool, message: str, resent_count: int or None)
+        成功時 message 為實際發送的訊息內容（供估算 airtime）
     """
-    global interface, lora_connected, pending_ack, FLAG_DEVICE_WAITING_ACK
+    global interface, pending_ack
     
     log_prefix = f"[重新發送][{triggered_by}]"
     
-    if FLAG_DEVICE_WAITING_ACK:
+    if not has_free_send_slot(board_id):
         print(f"{log_prefix} LoRa 設備忙碌中，跳過 note_id={note_id}")
         return (False, 'LoRa設備忙碌中', None)
     
@@ -3593,7 +4480,7 @@ def _execute_resend_note(board_id, note_id, triggered_by='user'):
         return (False, 'LoRa not connected', None)
     
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db_connection()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -3640,8 +4527,6 @@ def _execute_resend_note(board_id, note_id, triggered_by='user'):
         
         # 根據是否為回覆決定使用 /msg 或 /reply 指令
         try:
-            channel_index = get_channel_index(interface, board_id)
-            
             # 取得 color_id
             color_id = get_color_index_from_palette(bg_color)
             
@@ -3653,7 +4538,7 @@ def _execute_resend_note(board_id, note_id, triggered_by='user'):
                 print(f"{log_prefix} 使用 /msg 指令 (含 color_id 與 author_key): {msg}")
             
             update_note_transmit_st_at(note_id)
-            interface.sendText(msg, channelIndex=channel_index)
+            send_lora_command(interface, board_id, msg)
             print(f"  -> 已發送重新發送命令 (note_id={note_id}, resent_count={resent_count + 1}, triggered_by={triggered_by})")
             print(f"  -> color_id={color_id}, author_key={db_author_key} 已在訊息中一併發送")
             
@@ -3662,7 +4547,7 @@ def _execute_resend_note(board_id, note_id, triggered_by='user'):
                 def send_pin_command():
                     try:
                         pin_cmd = f"/pin [{lora_msg_id}]{db_author_key}"
-                        interface.sendText(pin_cmd, channelIndex=channel_index)
+                        send_lora_command(interface, board_id, pin_cmd)
                         print(f"  -> [延遲 15 秒後] 已發送 pin 命令: {pin_cmd}")
                     except Exception as e:
                         print(f"  -> [延遲 15 秒後] 發送 pin 命令失敗: {e}")
@@ -3670,27 +4555,17 @@ def _execute_resend_note(board_id, note_id, triggered_by='user'):
                 eventlet.spawn_after(15, send_pin_command)
                 print(f"  -> 已排程在 15 秒後發送 pin 命令")
             
-            socketio.emit('refresh_notes', {'board_id': board_id})
+            notify_notes_changed(board_id)
             # update_epaper_display()
             
-            return (True, 'OK', resent_count + 1)
+            return (True, msg, resent_count + 1)
             
         except Exception as e:
-            error_str = str(e)
             print(f"{log_prefix} 發送失敗: {e}")
             import traceback
             traceback.print_exc()
             
-            # 檢測 USB 連線異常
-            if "Timed out waiting for connection completion" in error_str or \
-               "device disconnected" in error_str or \
-               "裝置路徑" in error_str and "已消失" in error_str:
-                error_msg = "連線失敗：USB連線異常中斷，可能是 Pi 電力供應不足、更換線材、或 Mesh 裝置需要重啟"
-                print(f"{log_prefix} {error_msg}")
-                lora_connected = False
-                socketio.emit('usb_connection_error', {'message': error_msg})
-                socketio.emit('lora_status', {'online': False, 'channel_validated': False, 'error_message': None, 'power_issue': False})
-                update_epaper_display()
+            _handle_send_usb_error(str(e), log_prefix)
             
             return (False, f'Failed to send: {str(e)}', None)
         
@@ -3706,7 +4581,7 @@ def resend_board_note(board_id, note_id):
     if not has_access:
         return error_response, status_code
     
-    if FLAG_DEVICE_WAITING_ACK:
+    if not has_free_send_slot(board_id):
         return jsonify({
             'success': False,
             'error': 'LoRa設備忙碌中'
@@ -3733,7 +4608,7 @@ def resend_board_note(board_id, note_id):
         
         # 非管理者需驗證是否為作者本人
         if not is_admin:
-            conn = sqlite3.connect(DB_PATH)
+            conn = get_db_connection()
             conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             cursor.execute('SELECT author_key FROM notes WHERE note_id = ? AND board_id = ? AND deleted = 0', (note_id, board_id))
@@ -3747,6 +4622,7 @@ def resend_board_note(board_id, note_id):
         success, message, resent_count = _execute_resend_note(board_id, note_id, triggered_by='user')
         
         if success:
+            get_send_airtime_bucket(board_id).consume(estimate_lora_airtime(board_id, message))
             return jsonify({
                 'success': True,
                 'note_id': note_id,
@@ -3779,7 +4655,7 @@ def get_note_acks(board_id, note_id):
     if not has_access:
         return error_response, status_code
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db_connection()
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
@@ -3793,21 +4669,7 @@ def get_note_acks(board_id, note_id):
         rows = cursor.fetchall()
         conn.close()
         
-        acks = []
-        for row in rows:
-            lora_node_id = row['lora_node_id']
-            display_id = lora_node_id
-            if lora_node_id.startswith('lora-'):
-                raw_id = lora_node_id.replace('lora-', '')
-                display_id = f"LoRa-{raw_id[-4:]}" if len(raw_id) > 4 else raw_id
-            
-            acks.append({
-                'ackId': row['ack_id'],
-                'loraNodeId': lora_node_id,
-                'displayId': display_id,
-                'createdAt': row['created_at'],
-                'updatedAt': row['updated_at']
-            })
+        acks = [format_ack_record(row) for row in rows]
         
         return jsonify({
             'success': True,
@@ -3823,6 +4685,50 @@ def get_note_acks(board_id, note_id):
             'error': str(e)
         }), 500
 
+@app.route('/api/boards/<board_id>/acks', methods=['GET', 'POST'])
+def get_board_acks(board_id):
+    """批次取得 ACK 記錄，依 note_id 分組
+
+    GET: 不帶參數時回傳整個 board 的 ACK 記錄；可用 ?note_ids=id1,id2 指定 note
+    POST: JSON body {"note_ids": [...]}（note 數量多、網址過長時使用）
+    """
+    # 驗證頻道訪問權限
+    has_access, error_response, status_code = verify_channel_access(board_id)
+    if not has_access:
+        return error_response, status_code
+    try:
+        note_ids = None
+        if request.method == 'POST':
+            data = request.get_json() or {}
+            note_ids = data.get('note_ids')
+            if not isinstance(note_ids, list):
+                return jsonify({
+                    'success': False,
+                    'error': 'note_ids must be a list'
+                }), 400
+            note_ids = [str(nid) for nid in note_ids if nid]
+        elif request.args.get('note_ids'):
+            note_ids = [nid for nid in request.args.get('note_ids').split(',') if nid]
+        
+        acks_by_note = get_acks_grouped_by_note(board_id, note_ids)
+        if note_ids is not None:
+            for nid in note_ids:
+                acks_by_note.setdefault(nid, [])
+        
+        return jsonify({
+            'success': True,
+            'board_id': board_id,
+            'acks': acks_by_note,
+            'count': sum(len(acks) for acks in acks_by_note.values())
+        }), 200
+        
+    except Exception as e:
+        print(f"批次取得 ACK 記錄失敗: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @app.route('/api/user/<user_id>/last-location', methods=['GET'])
 def get_user_last_location(user_id):
     """取得使用者最後的地圖位置和縮放等級（從記憶體中）"""
@@ -3878,6 +4784,26 @@ def set_user_last_location(user_id):
             'error': str(e)
         }), 500
 
+def cached_json_response(cache, key, builder):
+    """以快取的 JSON 內容回應，並以內容雜湊作為 ETag，瀏覽器帶 If-None-Match 時回應 304
+
+    cache 為 tileset 登錄資料的衍生資料 dict，地圖檔案變更時會被清空並重新建立。
+    key 為 (回應種類, host)，同一種類最多快取 MAP_JSON_CACHE_MAX_HOSTS 個 host，超過時每次重新建立、不放入快取。
+    """
+    cached = cache.get(key)
+    if cached is None:
+        body = jsonify(builder()).get_data()
+        cached = (body, hashlib.sha1(body).hexdigest()[:20])
+        if sum(1 for cached_key in cache if cached_key[0] == key[0]) < MAP_JSON_CACHE_MAX_HOSTS:
+            cache[key] = cached
+    body, etag = cached
+    
+    response = make_response(body)
+    response.headers['Content-Type'] = 'application/json'
+    response.headers['Cache-Control'] = 'no-cache'
+    response.set_etag(etag)
+    return response.make_conditional(request)
+
 @app.route('/api/available-tilesets')
 def get_available_tilesets():
     """列出所有可用的 mbtiles 檔案並分析疊加策略"""
@@ -3894,10 +4820,9 @@ def get_available_tilesets():
                 'message': 'Maps folder not configured or not found'
             })
         
-        tilesets = []
-        mbtiles_files = glob.glob(os.path.join(maps_folder, '*.mbtiles'))
+        tileset_entries, derived = scan_tilesets(maps_folder)
         
-        if not mbtiles_files:
+        if not tileset_entries:
             return jsonify({
                 'success': True,
                 'map_enabled': False,
@@ -3906,112 +4831,7 @@ def get_available_tilesets():
                 'message': 'No mbtiles files found'
             })
         
-        # 讀取每個 mbtiles 檔案的 metadata
-        for mbtiles_path in sorted(mbtiles_files):
-            filename = os.path.basename(mbtiles_path)
-            tileset_name = filename[:-8]  # 移除 .mbtiles 副檔名
-            
-            try:
-                conn = sqlite3.connect(mbtiles_path)
-                cursor = conn.cursor()
-                cursor.execute('SELECT name, value FROM metadata')
-                metadata = dict(cursor.fetchall())
-                conn.close()
-                
-                # 解析 bounds
-                bounds_str = metadata.get('bounds', '-180,-85,180,85')
-                bounds = [float(b) for b in bounds_str.split(',')]
-                
-                # 取得 zoom 範圍
-                minzoom = int(metadata.get('minzoom', 0))
-                maxzoom = int(metadata.get('maxzoom', 14))
-                
-                # 判斷是 raster 還是 vector
-                tile_format = metadata.get('format', 'png')
-                tile_type = metadata.get('type', 'baselayer')
-                # pbf 是 vector tiles 格式，其他圖片格式才是 raster
-                is_raster = tile_format in ['png', 'jpg', 'jpeg', 'webp'] and tile_format != 'pbf'
-                
-                tileset_info = {
-                    'name': tileset_name,
-                    'display_name': metadata.get('name', tileset_name),
-                    'description': metadata.get('description', ''),
-                    'bounds': bounds,
-                    'minzoom': minzoom,
-                    'maxzoom': maxzoom,
-                    'format': tile_format,
-                    'type': tile_type,
-                    'is_raster': is_raster,
-                    'attribution': metadata.get('attribution', '')
-                }
-                
-                # Debug 輸出
-                #print(f"[DEBUG] 載入 tileset: {tileset_name}")
-                #print(f"  - display_name: {tileset_info['display_name']}")
-                #print(f"  - description: {tileset_info['description']}")
-                #print(f"  - bounds: {tileset_info['bounds']}")
-                #print(f"  - minzoom: {tileset_info['minzoom']}")
-                #print(f"  - maxzoom: {tileset_info['maxzoom']}")
-                #print(f"  - format: {tileset_info['format']}")
-                #print(f"  - type: {tileset_info['type']}")
-                #print(f"  - is_raster: {tileset_info['is_raster']}")
-                #print(f"  - attribution: {tileset_info['attribution']}")
-                
-                tilesets.append(tileset_info)
-            except Exception as e:
-                print(f"讀取 {filename} metadata 失敗: {e}")
-                # 即使讀取失敗，也加入基本資訊
-                tilesets.append({
-                    'name': tileset_name,
-                    'display_name': tileset_name,
-                    'description': '',
-                    'bounds': [-180, -85, 180, 85],
-                    'minzoom': 0,
-                    'maxzoom': 14,
-                    'format': 'png',
-                    'type': 'baselayer',
-                    'is_raster': True,
-                    'attribution': ''
-                })
-        
-        # 分析疊加策略
-        layer_mode = NOTEBOARD_MBTILES_LAYER_MODE
-        detected_mode = 'single'  # 預設為單一模式
-        
-        if len(tilesets) == 1:
-            # 只有一個 tileset，使用 single 模式
-            detected_mode = 'single'
-        elif len(tilesets) > 1 and layer_mode == 'auto':
-            # 自動判斷：檢查 zoom 範圍是否重疊
-            zoom_ranges = [(ts['minzoom'], ts['maxzoom']) for ts in tilesets]
-            
-            # 檢查是否有明顯的縮放層級分層（zoom 範圍不重疊或僅輕微重疊）
-            has_zoom_separation = False
-            for i in range(len(zoom_ranges) - 1):
-                for j in range(i + 1, len(zoom_ranges)):
-                    min1, max1 = zoom_ranges[i]
-                    min2, max2 = zoom_ranges[j]
-                    
-                    # 如果兩個範圍完全不重疊，或重疊少於 2 個層級
-                    overlap = min(max1, max2) - max(min1, min2)
-                    if overlap < 2:
-                        has_zoom_separation = True
-                        break
-                
-                if has_zoom_separation:
-                    break
-            
-            detected_mode = 'zoom-level' if has_zoom_separation else 'overlay'
-        elif layer_mode in ['overlay', 'zoom-level']:
-            detected_mode = layer_mode
-        
-        return jsonify({
-            'success': True,
-            'map_enabled': True,
-            'tilesets': tilesets,
-            'layer_mode': detected_mode,
-            'configured_mode': layer_mode
-        })
+        return cached_json_response(derived, ('available-tilesets',), lambda: _build_available_tilesets(tileset_entries))
         
     except Exception as e:
         print(f"取得可用 tilesets 失敗: {e}")
@@ -4021,48 +4841,153 @@ def get_available_tilesets():
             'error': str(e)
         }), 500
 
+def _build_available_tilesets(tileset_entries):
+    """由 tileset 登錄資料建立 /api/available-tilesets 的回應內容"""
+    tilesets = []
+    
+    # 讀取每個 mbtiles 檔案的 metadata
+    for tileset_name, entry in tileset_entries:
+        if entry is not None:
+            metadata = entry['metadata']
+            
+            # 解析 bounds
+            bounds_str = metadata.get('bounds', '-180,-85,180,85')
+            bounds = [float(b) for b in bounds_str.split(',')]
+            
+            # 取得 zoom 範圍
+            minzoom = int(metadata.get('minzoom', 0))
+            maxzoom = int(metadata.get('maxzoom', 14))
+            
+            # 判斷是 raster 還是 vector
+            tile_format = metadata.get('format', 'png')
+            tile_type = metadata.get('type', 'baselayer')
+            # pbf 是 vector tiles 格式，其他圖片格式才是 raster
+            is_raster = tile_format in ['png', 'jpg', 'jpeg', 'webp'] and tile_format != 'pbf'
+            
+            tileset_info = {
+                'name': tileset_name,
+                'display_name': metadata.get('name', tileset_name),
+                'description': metadata.get('description', ''),
+                'bounds': bounds,
+                'minzoom': minzoom,
+                'maxzoom': maxzoom,
+                'format': tile_format,
+                'type': tile_type,
+                'is_raster': is_raster,
+                'attribution': metadata.get('attribution', '')
+            }
+            
+            # Debug 輸出
+            #print(f"[DEBUG] 載入 tileset: {tileset_name}")
+            #print(f"  - display_name: {tileset_info['display_name']}")
+            #print(f"  - description: {tileset_info['description']}")
+            #print(f"  - bounds: {tileset_info['bounds']}")
+            #print(f"  - minzoom: {tileset_info['minzoom']}")
+            #print(f"  - maxzoom: {tileset_info['maxzoom']}")
+            #print(f"  - format: {tileset_info['format']}")
+            #print(f"  - type: {tileset_info['type']}")
+            #print(f"  - is_raster: {tileset_info['is_raster']}")
+            #print(f"  - attribution: {tileset_info['attribution']}")
+            
+            tilesets.append(tileset_info)
+        else:
+            # 即使讀取失敗，也加入基本資訊
+            tilesets.append({
+                'name': tileset_name,
+                'display_name': tileset_name,
+                'description': '',
+                'bounds': [-180, -85, 180, 85],
+                'minzoom': 0,
+                'maxzoom': 14,
+                'format': 'png',
+                'type': 'baselayer',
+                'is_raster': True,
+                'attribution': ''
+            })
+    
+    # 分析疊加策略
+    layer_mode = NOTEBOARD_MBTILES_LAYER_MODE
+    detected_mode = 'single'  # 預設為單一模式
+    
+    if len(tilesets) == 1:
+        # 只有一個 tileset，使用 single 模式
+        detected_mode = 'single'
+    elif len(tilesets) > 1 and layer_mode == 'auto':
+        # 自動判斷：檢查 zoom 範圍是否重疊
+        zoom_ranges = [(ts['minzoom'], ts['maxzoom']) for ts in tilesets]
+        
+        # 檢查是否有明顯的縮放層級分層（zoom 範圍不重疊或僅輕微重疊）
+        has_zoom_separation = False
+        for i in range(len(zoom_ranges) - 1):
+            for j in range(i + 1, len(zoom_ranges)):
+                min1, max1 = zoom_ranges[i]
+                min2, max2 = zoom_ranges[j]
+                
+                # 如果兩個範圍完全不重疊，或重疊少於 2 個層級
+                overlap = min(max1, max2) - max(min1, min2)
+                if overlap < 2:
+                    has_zoom_separation = True
+                    break
+            
+            if has_zoom_separation:
+                break
+        
+        detected_mode = 'zoom-level' if has_zoom_separation else 'overlay'
+    elif layer_mode in ['overlay', 'zoom-level']:
+        detected_mode = layer_mode
+    
+    return {
+        'success': True,
+        'map_enabled': True,
+        'tilesets': tilesets,
+        'layer_mode': detected_mode,
+        'configured_mode': layer_mode
+    }
+
 @app.route('/tiles/<tileset>/<int:z>/<int:x>/<int:y>')
 def get_tile(tileset, z, x, y):
-    """提供 MBTiles 的 tile 資料"""
+    """提供 MBTiles 的 tile 資料（使用共用唯讀連線與 tile 快取，大型 tile 以 blob I/O 分段回應）"""
     try:
         mbtiles_path = os.path.join(os.path.dirname(__file__), 'maps', f'{tileset}.mbtiles')
         
-        if not os.path.exists(mbtiles_path):
+        try:
+            tile = read_tile(tileset, mbtiles_path, z, x, y)
+        except FileNotFoundError:
             return jsonify({
                 'success': False,
                 'error': f'Tileset {tileset} not found'
             }), 404
         
-        conn = sqlite3.connect(mbtiles_path)
-        cursor = conn.cursor()
-        
-        # MBTiles 使用 TMS 座標系統，需要轉換 y 座標
-        tms_y = (2 ** z) - 1 - y
-        
-        cursor.execute('''
-            SELECT tile_data FROM tiles 
-            WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?
-        ''', (z, x, tms_y))
-        
-        row = cursor.fetchone()
-        conn.close()
-        
-        if row:
-            tile_data = row[0]
-            response = make_response(tile_data)
+        if tile:
+            etag = tile.etag
             
-            # 檢查 tile 格式
-            if tile_data[:8] == b'\x89\x50\x4E\x47\x0D\x0A\x1A\x0A':
-                response.headers['Content-Type'] = 'image/png'
-            elif tile_data[:2] == b'\xFF\xD8':
-                response.headers['Content-Type'] = 'image/jpeg'
-            elif tile_data[:2] == b'\x1f\x8b':
-                response.headers['Content-Type'] = 'application/x-protobuf'
-                response.headers['Content-Encoding'] = 'gzip'
+            # URL 帶有目前的 tileset 版本時，tile 內容不會再變動，可長期快取
+            if NOTEBOARD_TILE_IMMUTABLE_CACHE and request.args.get('v') == tile.version:
+                cache_control = 'public, max-age=31536000, immutable'
             else:
-                response.headers['Content-Type'] = 'application/octet-stream'
+                cache_control = 'public, max-age=86400'
             
-            response.headers['Cache-Control'] = 'public, max-age=86400'
+            # 瀏覽器已有相同內容時回應 304，不重送 tile
+            if request.if_none_match.contains(etag):
+                response = make_response('', 304)
+                response.set_etag(etag)
+                response.headers['Cache-Control'] = cache_control
+                return response
+            
+            if isinstance(tile.data, TileBlob):
+                # 不將整個 tile 載入記憶體，由 WSGI server 逐段送出
+                response = app.response_class(tile.data.iter_chunks(), direct_passthrough=True)
+                response.headers['Content-Length'] = str(len(tile.data))
+            else:
+                response = make_response(tile.data)
+            
+            # tile 格式於開啟 tileset 時依 metadata 決定
+            response.headers['Content-Type'] = tile.content_type
+            if tile.content_encoding:
+                response.headers['Content-Encoding'] = tile.content_encoding
+            
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = cache_control
             return response
         else:
             return '', 204
@@ -4074,9 +4999,18 @@ def get_tile(tileset, z, x, y):
             'error': str(e)
         }), 500
 
+@app.route('/api/tile-cache-stats')
+def get_tile_cache_stats():
+    """取得地圖 tile 快取的統計資料（命中率、大小、共用 tile 與缺少 tile 記錄）"""
+    return jsonify({
+        'success': True,
+        'stats': app_noteboard_tiles.tile_cache.stats(),
+        'missing': app_noteboard_tiles.missing_tile_stats()
+    })
+
 @app.route('/tiles/style.json')
 def get_multi_style():
-    """提供支援多個 mbtiles 疊加的 MapLibre style.json"""
+    """提供支援多個 mbtiles 疊加的 MapLibre style.json（依 host 快取，支援 ETag）"""
     try:
         maps_folder = NOTEBOARD_MBTILES_FOLDER
         
@@ -4087,153 +5021,22 @@ def get_multi_style():
                 'error': 'Maps folder not configured or not found'
             }), 404
         
-        mbtiles_files = sorted(glob.glob(os.path.join(maps_folder, '*.mbtiles')))
+        tileset_entries, derived = scan_tilesets(maps_folder)
         
-        if not mbtiles_files:
+        if not tileset_entries:
             return jsonify({
                 'success': False,
                 'error': 'No mbtiles files found'
             }), 404
         
-        # 讀取所有 mbtiles 的 metadata
-        tilesets_info = []
-        for mbtiles_path in mbtiles_files:
-            filename = os.path.basename(mbtiles_path)
-            tileset_name = filename[:-8]
-            
-            try:
-                conn = sqlite3.connect(mbtiles_path)
-                cursor = conn.cursor()
-                cursor.execute('SELECT name, value FROM metadata')
-                metadata = dict(cursor.fetchall())
-                conn.close()
-                
-                bounds_str = metadata.get('bounds', '-180,-85,180,85')
-                bounds = [float(b) for b in bounds_str.split(',')]
-                minzoom = int(metadata.get('minzoom', 0))
-                maxzoom = int(metadata.get('maxzoom', 14))
-                tile_format = metadata.get('format', 'png')
-                tile_type = metadata.get('type', 'baselayer')
-                # pbf 是 vector tiles 格式，其他圖片格式才是 raster
-                is_raster = tile_format in ['png', 'jpg', 'jpeg', 'webp'] and tile_format != 'pbf'
-                
-                tilesets_info.append({
-                    'name': tileset_name,
-                    'display_name': metadata.get('name', tileset_name),
-                    'bounds': bounds,
-                    'minzoom': minzoom,
-                    'maxzoom': maxzoom,
-                    'is_raster': is_raster,
-                    'format': tile_format,
-                    'type': tile_type
-                })
-            except Exception as e:
-                print(f"讀取 {filename} metadata 失敗: {e}")
-                continue
-        
-        if not tilesets_info:
+        if all(entry is None for _, entry in tileset_entries):
             return jsonify({
                 'success': False,
                 'error': 'Failed to read any mbtiles metadata'
             }), 500
         
-        # 判斷疊加模式
-        layer_mode = NOTEBOARD_MBTILES_LAYER_MODE
-        detected_mode = 'overlay'
-        
-        if len(tilesets_info) > 1 and layer_mode == 'auto':
-            zoom_ranges = [(ts['minzoom'], ts['maxzoom']) for ts in tilesets_info]
-            has_zoom_separation = False
-            
-            for i in range(len(zoom_ranges) - 1):
-                for j in range(i + 1, len(zoom_ranges)):
-                    min1, max1 = zoom_ranges[i]
-                    min2, max2 = zoom_ranges[j]
-                    overlap = min(max1, max2) - max(min1, min2)
-                    if overlap < 2:
-                        has_zoom_separation = True
-                        break
-                if has_zoom_separation:
-                    break
-            
-            detected_mode = 'zoom-level' if has_zoom_separation else 'overlay'
-        elif layer_mode in ['overlay', 'zoom-level']:
-            detected_mode = layer_mode
-        
-        # 建立 MapLibre style
-        host = request.host
-        style = {
-            "version": 8,
-            "name": "Multi-Tileset Map",
-            "sources": {},
-            "layers": []
-        }
-        
-        # 計算整體 bounds（取所有 tileset 的聯集）
-        all_bounds = [ts['bounds'] for ts in tilesets_info]
-        overall_bounds = [
-            min(b[0] for b in all_bounds),  # west
-            min(b[1] for b in all_bounds),  # south
-            max(b[2] for b in all_bounds),  # east
-            max(b[3] for b in all_bounds)   # north
-        ]
-        
-        # 根據模式建立 sources 和 layers
-        if detected_mode == 'zoom-level':
-            # 縮放層級模式：每個 tileset 在其 zoom 範圍內顯示
-            for idx, ts in enumerate(tilesets_info):
-                source_id = ts['name']
-                style['sources'][source_id] = {
-                    "type": "raster" if ts['is_raster'] else "vector",
-                    "tiles": [f"http://{host}/tiles/{ts['name']}/{{z}}/{{x}}/{{y}}"],
-                    "tileSize": 256 if ts['is_raster'] else None,
-                    "minzoom": ts['minzoom'],
-                    "maxzoom": ts['maxzoom'],
-                    "bounds": ts['bounds']
-                }
-                
-                if ts['is_raster']:
-                    style['layers'].append({
-                        "id": f"{source_id}-layer",
-                        "type": "raster",
-                        "source": source_id,
-                        "minzoom": ts['minzoom']
-                    })
-                else:
-                    # Vector tiles 在縮放層級模式下，需要讀取實際的 layers
-                    # 暫時使用簡化處理，建議使用單一 vector tileset 或使用 /tiles/<tileset>/style.json
-                    print(f"[WARNING] Vector tiles '{source_id}' in zoom-level mode may need custom styling")
-        else:
-            # 疊加模式：所有 tileset 同時顯示（底層到上層）
-            for idx, ts in enumerate(tilesets_info):
-                source_id = ts['name']
-                style['sources'][source_id] = {
-                    "type": "raster" if ts['is_raster'] else "vector",
-                    "tiles": [f"http://{host}/tiles/{ts['name']}/{{z}}/{{x}}/{{y}}"],
-                    "tileSize": 256 if ts['is_raster'] else None,
-                    "minzoom": ts['minzoom'],
-                    "maxzoom": ts['maxzoom'],
-                    "bounds": ts['bounds']
-                }
-                
-                if ts['is_raster']:
-                    # 第一層不透明，後續層可以設定透明度
-                    opacity = 1.0 if idx == 0 else 0.7
-                    style['layers'].append({
-                        "id": f"{source_id}-layer",
-                        "type": "raster",
-                        "source": source_id,
-                        "paint": {
-                            "raster-opacity": opacity
-                        }
-                    })
-                else:
-                    # Vector tiles 在疊加模式下需要更複雜的處理
-                    print(f"[WARNING] Vector tiles '{source_id}' in overlay mode may need custom styling")
-        
-        response = make_response(jsonify(style))
-        response.headers['Content-Type'] = 'application/json'
-        return response
+        host = request.host.lower()
+        return cached_json_response(derived, ('multi-style', host), lambda: _build_multi_style(tileset_entries, host))
         
     except Exception as e:
         print(f"取得 multi style.json 失敗: {e}")
@@ -4242,438 +5045,561 @@ def get_multi_style():
             'error': str(e)
         }), 500
 
-@app.route('/tiles/<tileset>/style.json')
-def get_style(tileset):
-    """提供 MapLibre style.json"""
-    try:
-        mbtiles_path = os.path.join(os.path.dirname(__file__), 'maps', f'{tileset}.mbtiles')
-        
-        if not os.path.exists(mbtiles_path):
-            return jsonify({
-                'success': False,
-                'error': f'Tileset {tileset} not found'
-            }), 404
-        
-        conn = sqlite3.connect(mbtiles_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        # 讀取 metadata
-        cursor.execute('SELECT name, value FROM metadata')
-        metadata = {row['name']: row['value'] for row in cursor.fetchall()}
-        
-        # 取得 bounds 和 zoom 範圍
-        bounds = metadata.get('bounds', '-180,-85,180,85').split(',')
-        bounds = [float(b) for b in bounds]
+def tile_url_template(host, tileset, version):
+    """tile URL 樣板，啟用 NOTEBOARD_TILE_IMMUTABLE_CACHE 時附加 tileset 版本"""
+    url = f"http://{host}/tiles/{tileset}/{{z}}/{{x}}/{{y}}"
+    if NOTEBOARD_TILE_IMMUTABLE_CACHE:
+        url += f"?v={version}"
+    return url
+
+def _build_multi_style(tileset_entries, host):
+    """由 tileset 登錄資料建立多個 mbtiles 疊加的 MapLibre style"""
+    # 讀取所有 mbtiles 的 metadata（略過讀取失敗的檔案）
+    tilesets_info = []
+    for tileset_name, entry in tileset_entries:
+        if entry is None:
+            continue
+        metadata = entry['metadata']
         
+        bounds_str = metadata.get('bounds', '-180,-85,180,85')
+        bounds = [float(b) for b in bounds_str.split(',')]
         minzoom = int(metadata.get('minzoom', 0))
         maxzoom = int(metadata.get('maxzoom', 14))
-        
-        # 檢查是否為 raster tiles
         tile_format = metadata.get('format', 'png')
         tile_type = metadata.get('type', 'baselayer')
         # pbf 是 vector tiles 格式，其他圖片格式才是 raster
         is_raster = tile_format in ['png', 'jpg', 'jpeg', 'webp'] and tile_format != 'pbf'
         
-        conn.close()
+        tilesets_info.append({
+            'name': tileset_name,
+            'display_name': metadata.get('name', tileset_name),
+            'bounds': bounds,
+            'minzoom': minzoom,
+            'maxzoom': maxzoom,
+            'is_raster': is_raster,
+            'format': tile_format,
+            'type': tile_type,
+            'version': entry['version']
+        })
+    
+    # 判斷疊加模式
+    layer_mode = NOTEBOARD_MBTILES_LAYER_MODE
+    detected_mode = 'overlay'
+    
+    if len(tilesets_info) > 1 and layer_mode == 'auto':
+        zoom_ranges = [(ts['minzoom'], ts['maxzoom']) for ts in tilesets_info]
+        has_zoom_separation = False
+        
+        for i in range(len(zoom_ranges) - 1):
+            for j in range(i + 1, len(zoom_ranges)):
+                min1, max1 = zoom_ranges[i]
+                min2, max2 = zoom_ranges[j]
+                overlap = min(max1, max2) - max(min1, min2)
+                if overlap < 2:
+                    has_zoom_separation = True
+                    break
+            if has_zoom_separation:
+                break
         
-        # 建立 MapLibre style
-        if is_raster:
-            # Raster tiles style
-            # source.maxzoom 定義 tile 資料的最大層級，MapLibre 會在超過此層級時自動 overzoom（放大顯示）
-            # layer 不設 maxzoom，讓 MapLibre 在任何 zoom level 都繼續渲染（避免白底）
-            style = {
-                "version": 8,
-                "name": metadata.get('name', tileset),
-                "sources": {
-                    tileset: {
-                        "type": "raster",
-                        "tiles": [f"http://{{host}}/tiles/{tileset}/{{z}}/{{x}}/{{y}}"],
-                        "tileSize": 256,
-                        "minzoom": minzoom,
-                        "maxzoom": maxzoom,
-                        "bounds": bounds
+        detected_mode = 'zoom-level' if has_zoom_separation else 'overlay'
+    elif layer_mode in ['overlay', 'zoom-level']:
+        detected_mode = layer_mode
+    
+    # 建立 MapLibre style
+    style = {
+        "version": 8,
+        "name": "Multi-Tileset Map",
+        "sources": {},
+        "layers": []
+    }
+    
+    # 計算整體 bounds（取所有 tileset 的聯集）
+    all_bounds = [ts['bounds'] for ts in tilesets_info]
+    overall_bounds = [
+        min(b[0] for b in all_bounds),  # west
+        min(b[1] for b in all_bounds),  # south
+        max(b[2] for b in all_bounds),  # east
+        max(b[3] for b in all_bounds)   # north
+    ]
+    
+    # 根據模式建立 sources 和 layers
+    if detected_mode == 'zoom-level':
+        # 縮放層級模式：每個 tileset 在其 zoom 範圍內顯示
+        for idx, ts in enumerate(tilesets_info):
+            source_id = ts['name']
+            style['sources'][source_id] = {
+                "type": "raster" if ts['is_raster'] else "vector",
+                "tiles": [tile_url_template(host, ts['name'], ts['version'])],
+                "tileSize": 256 if ts['is_raster'] else None,
+                "minzoom": ts['minzoom'],
+                "maxzoom": ts['maxzoom'],
+                "bounds": ts['bounds']
+            }
+            
+            if ts['is_raster']:
+                style['layers'].append({
+                    "id": f"{source_id}-layer",
+                    "type": "raster",
+                    "source": source_id,
+                    "minzoom": ts['minzoom']
+                })
+            else:
+                # Vector tiles 在縮放層級模式下，需要讀取實際的 layers
+                # 暫時使用簡化處理，建議使用單一 vector tileset 或使用 /tiles/<tileset>/style.json
+                print(f"[WARNING] Vector tiles '{source_id}' in zoom-level mode may need custom styling")
+    else:
+        # 疊加模式：所有 tileset 同時顯示（底層到上層）
+        for idx, ts in enumerate(tilesets_info):
+            source_id = ts['name']
+            style['sources'][source_id] = {
+                "type": "raster" if ts['is_raster'] else "vector",
+                "tiles": [tile_url_template(host, ts['name'], ts['version'])],
+                "tileSize": 256 if ts['is_raster'] else None,
+                "minzoom": ts['minzoom'],
+                "maxzoom": ts['maxzoom'],
+                "bounds": ts['bounds']
+            }
+            
+            if ts['is_raster']:
+                # 第一層不透明，後續層可以設定透明度
+                opacity = 1.0 if idx == 0 else 0.7
+                style['layers'].append({
+                    "id": f"{source_id}-layer",
+                    "type": "raster",
+                    "source": source_id,
+                    "paint": {
+                        "raster-opacity": opacity
                     }
-                },
-                "layers": [
-                    {
-                        "id": "raster-tiles",
-                        "type": "raster",
-                        "source": tileset,
-                        "minzoom": minzoom
+                })
+            else:
+                # Vector tiles 在疊加模式下需要更複雜的處理
+                print(f"[WARNING] Vector tiles '{source_id}' in overlay mode may need custom styling")
+    
+    return style
+
+def _build_tileset_style(tileset, metadata, host, version):
+    """依 tileset metadata 建立單一 tileset 的 MapLibre style"""
+    # 取得 bounds 和 zoom 範圍
+    bounds = metadata.get('bounds', '-180,-85,180,85').split(',')
+    bounds = [float(b) for b in bounds]
+    
+    minzoom = int(metadata.get('minzoom', 0))
+    maxzoom = int(metadata.get('maxzoom', 14))
+    
+    # 檢查是否為 raster tiles
+    tile_format = metadata.get('format', 'png')
+    tile_type = metadata.get('type', 'baselayer')
+    # pbf 是 vector tiles 格式，其他圖片格式才是 raster
+    is_raster = tile_format in ['png', 'jpg', 'jpeg', 'webp'] and tile_format != 'pbf'
+    
+    # 建立 MapLibre style
+    if is_raster:
+        # Raster tiles style
+        # source.maxzoom 定義 tile 資料的最大層級，MapLibre 會在超過此層級時自動 overzoom（放大顯示）
+        # layer 不設 maxzoom，讓 MapLibre 在任何 zoom level 都繼續渲染（避免白底）
+        style = {
+            "version": 8,
+            "name": metadata.get('name', tileset),
+            "sources": {
+                tileset: {
+                    "type": "raster",
+                    "tiles": [tile_url_template(host, tileset, version)],
+                    "tileSize": 256,
+                    "minzoom": minzoom,
+                    "maxzoom": maxzoom,
+                    "bounds": bounds
+                }
+            },
+            "layers": [
+                {
+                    "id": "raster-tiles",
+                    "type": "raster",
+                    "source": tileset,
+                    "minzoom": minzoom
+                }
+            ]
+        }
+    else:
+        # Vector tiles style
+        # 嘗試從 metadata 讀取 vector_layers 資訊
+        import json as json_module
+        vector_layers = []
+        
+        try:
+            if 'json' in metadata:
+                tile_json = json_module.loads(metadata['json'])
+                vector_layers = tile_json.get('vector_layers', [])
+        except Exception as e:
+            print(f"無法解析 vector_layers: {e}")
+        
+        # 建立基本 style
+        # 使用線上字體服務
+        style = {
+            "version": 8,
+            "name": metadata.get('name', tileset),
+            "glyphs": "https://cdn.protomaps.com/fonts/pbf/{fontstack}/{range}.pbf",
+            "sources": {
+                tileset: {
+                    "type": "vector",
+                    "tiles": [tile_url_template(host, tileset, version)],
+                    "minzoom": minzoom,
+                    "maxzoom": maxzoom,
+                    "bounds": bounds
+                }
+            },
+            "layers": [
+                {
+                    "id": "background",
+                    "type": "background",
+                    "paint": {
+                        "background-color": "#f8f8f8"
                     }
-                ]
-            }
-        else:
-            # Vector tiles style
-            # 嘗試從 metadata 讀取 vector_layers 資訊
-            import json as json_module
-            vector_layers = []
+                }
+            ]
+        }
+        
+        # 根據實際的 vector_layers 生成 layer 定義
+        if vector_layers:
+            print(f"[DEBUG] Vector layers found: {[layer.get('id') for layer in vector_layers]}")
             
-            try:
-                if 'json' in metadata:
-                    tile_json = json_module.loads(metadata['json'])
-                    vector_layers = tile_json.get('vector_layers', [])
-            except Exception as e:
-                print(f"無法解析 vector_layers: {e}")
+            # OpenMapTiles 標準 layers 的完整 style 定義
+            # 按照正確的渲染順序（從底層到上層）
             
-            # 建立基本 style
-            # 使用線上字體服務
-            host = request.host
-            style = {
-                "version": 8,
-                "name": metadata.get('name', tileset),
-                "glyphs": "https://cdn.protomaps.com/fonts/pbf/{fontstack}/{range}.pbf",
-                "sources": {
-                    tileset: {
-                        "type": "vector",
-                        "tiles": [f"http://{host}/tiles/{tileset}/{{z}}/{{x}}/{{y}}"],
-                        "minzoom": minzoom,
-                        "maxzoom": maxzoom,
-                        "bounds": bounds
+            # 1. Water (水域) - 底層
+            if any(l.get('id') == 'water' for l in vector_layers):
+                style['layers'].append({
+                    "id": "water",
+                    "type": "fill",
+                    "source": tileset,
+                    "source-layer": "water",
+                    "paint": {
+                        "fill-color": "#aad3df"
                     }
-                },
-                "layers": [
-                    {
-                        "id": "background",
-                        "type": "background",
-                        "paint": {
-                            "background-color": "#f8f8f8"
-                        }
+                })
+            
+            # 2. Waterway (河流)
+            if any(l.get('id') == 'waterway' for l in vector_layers):
+                style['layers'].append({
+                    "id": "waterway",
+                    "type": "line",
+                    "source": tileset,
+                    "source-layer": "waterway",
+                    "paint": {
+                        "line-color": "#aad3df",
+                        "line-width": 1
                     }
-                ]
-            }
+                })
             
-            # 根據實際的 vector_layers 生成 layer 定義
-            if vector_layers:
-                print(f"[DEBUG] Vector layers found: {[layer.get('id') for layer in vector_layers]}")
-                
-                # OpenMapTiles 標準 layers 的完整 style 定義
-                # 按照正確的渲染順序（從底層到上層）
-                
-                # 1. Water (水域) - 底層
-                if any(l.get('id') == 'water' for l in vector_layers):
-                    style['layers'].append({
-                        "id": "water",
-                        "type": "fill",
-                        "source": tileset,
-                        "source-layer": "water",
-                        "paint": {
-                            "fill-color": "#aad3df"
-                        }
-                    })
-                
-                # 2. Waterway (河流)
-                if any(l.get('id') == 'waterway' for l in vector_layers):
-                    style['layers'].append({
-                        "id": "waterway",
-                        "type": "line",
-                        "source": tileset,
-                        "source-layer": "waterway",
-                        "paint": {
-                            "line-color": "#aad3df",
-                            "line-width": 1
-                        }
-                    })
-                
-                # 3. Landcover (土地覆蓋 - 森林、草地等)
-                if any(l.get('id') == 'landcover' for l in vector_layers):
-                    style['layers'].append({
-                        "id": "landcover",
-                        "type": "fill",
-                        "source": tileset,
-                        "source-layer": "landcover",
-                        "paint": {
-                            "fill-color": "#d8e8c8",
-                            "fill-opacity": 0.5
-                        }
-                    })
-                
-                # 4. Landuse (土地使用)
-                if any(l.get('id') == 'landuse' for l in vector_layers):
-                    style['layers'].append({
-                        "id": "landuse",
-                        "type": "fill",
-                        "source": tileset,
-                        "source-layer": "landuse",
-                        "paint": {
-                            "fill-color": "#e0e0e0",
-                            "fill-opacity": 0.3
-                        }
-                    })
-                
-                # 5. Park (公園)
-                if any(l.get('id') == 'park' for l in vector_layers):
-                    style['layers'].append({
-                        "id": "park",
-                        "type": "fill",
-                        "source": tileset,
-                        "source-layer": "park",
-                        "paint": {
-                            "fill-color": "#c8e6c9",
-                            "fill-opacity": 0.6
-                        }
-                    })
-                
-                # 6. Boundary (邊界)
-                if any(l.get('id') == 'boundary' for l in vector_layers):
-                    style['layers'].append({
-                        "id": "boundary",
-                        "type": "line",
-                        "source": tileset,
-                        "source-layer": "boundary",
-                        "paint": {
-                            "line-color": "#9e9cab",
-                            "line-width": 1,
-                            "line-dasharray": [3, 3]
-                        }
-                    })
-                
-                # 7. Aeroway (機場跑道)
-                if any(l.get('id') == 'aeroway' for l in vector_layers):
-                    style['layers'].append({
-                        "id": "aeroway",
-                        "type": "fill",
-                        "source": tileset,
-                        "source-layer": "aeroway",
-                        "paint": {
-                            "fill-color": "#e9e9ed"
-                        }
-                    })
-                
-                # 8. Transportation (道路) - 多層渲染
-                if any(l.get('id') == 'transportation' for l in vector_layers):
-                    # 道路外框（較粗）
-                    style['layers'].append({
-                        "id": "transportation-case",
-                        "type": "line",
-                        "source": tileset,
-                        "source-layer": "transportation",
-                        "paint": {
-                            "line-color": "#e0e0e0",
-                            "line-width": {
-                                "stops": [[10, 2], [14, 6], [18, 12]]
-                            }
-                        }
-                    })
-                    # 道路內線（較細）
-                    style['layers'].append({
-                        "id": "transportation",
-                        "type": "line",
-                        "source": tileset,
-                        "source-layer": "transportation",
-                        "paint": {
-                            "line-color": "#ffffff",
-                            "line-width": {
-                                "stops": [[10, 1], [14, 4], [18, 10]]
-                            }
-                        }
-                    })
-                
-                # 9. Building (建築物)
-                if any(l.get('id') == 'building' for l in vector_layers):
-                    style['layers'].append({
-                        "id": "building",
-                        "type": "fill",
-                        "source": tileset,
-                        "source-layer": "building",
-                        "minzoom": 13,
-                        "paint": {
-                            "fill-color": "#d6d6d6",
-                            "fill-opacity": 0.7
-                        }
-                    })
-                
-                # 10. Water name (水域名稱)
-                if any(l.get('id') == 'water_name' for l in vector_layers):
-                    style['layers'].append({
-                        "id": "water_name",
-                        "type": "symbol",
-                        "source": tileset,
-                        "source-layer": "water_name",
-                        "layout": {
-                            "text-field": ["get", "name"],
-                            "text-font": ["Noto Sans Regular"],
-                            "text-size": 12
-                        },
-                        "paint": {
-                            "text-color": "#5a7a8f",
-                            "text-halo-color": "#ffffff",
-                            "text-halo-width": 1
-                        }
-                    })
-                
-                # 11. Transportation name (道路名稱)
-                if any(l.get('id') == 'transportation_name' for l in vector_layers):
-                    style['layers'].append({
-                        "id": "transportation_name",
-                        "type": "symbol",
-                        "source": tileset,
-                        "source-layer": "transportation_name",
-                        "layout": {
-                            "text-field": ["get", "name"],
-                            "text-font": ["Noto Sans Regular"],
-                            "text-size": 10,
-                            "symbol-placement": "line",
-                            "text-rotation-alignment": "map"
-                        },
-                        "paint": {
-                            "text-color": "#666666",
-                            "text-halo-color": "#ffffff",
-                            "text-halo-width": 1
-                        }
-                    })
-                
-                # 12. Place (地名)
-                if any(l.get('id') == 'place' for l in vector_layers):
-                    style['layers'].append({
-                        "id": "place",
-                        "type": "symbol",
-                        "source": tileset,
-                        "source-layer": "place",
-                        "layout": {
-                            "text-field": ["get", "name"],
-                            "text-font": ["Noto Sans Bold"],
-                            "text-size": {
-                                "stops": [[6, 10], [10, 14], [14, 18]]
-                            }
-                        },
-                        "paint": {
-                            "text-color": "#333333",
-                            "text-halo-color": "#ffffff",
-                            "text-halo-width": 1.5
-                        }
-                    })
-                
-                # 13. Housenumber (門牌號碼)
-                if any(l.get('id') == 'housenumber' for l in vector_layers):
-                    style['layers'].append({
-                        "id": "housenumber",
-                        "type": "symbol",
-                        "source": tileset,
-                        "source-layer": "housenumber",
-                        "minzoom": 17,
-                        "layout": {
-                            "text-field": ["get", "housenumber"],
-                            "text-font": ["Noto Sans Regular"],
-                            "text-size": 9
-                        },
-                        "paint": {
-                            "text-color": "#666666"
-                        }
-                    })
-                
-                # 14. POI (興趣點)
-                if any(l.get('id') == 'poi' for l in vector_layers):
-                    style['layers'].append({
-                        "id": "poi",
-                        "type": "symbol",
-                        "source": tileset,
-                        "source-layer": "poi",
-                        "minzoom": 14,
-                        "layout": {
-                            "text-field": ["get", "name"],
-                            "text-font": ["Noto Sans Regular"],
-                            "text-size": 10,
-                            "text-anchor": "top",
-                            "text-offset": [0, 0.5]
-                        },
-                        "paint": {
-                            "text-color": "#666666",
-                            "text-halo-color": "#ffffff",
-                            "text-halo-width": 1
-                        }
-                    })
-                
-                # 15. Aerodrome label (機場標籤)
-                if any(l.get('id') == 'aerodrome_label' for l in vector_layers):
-                    style['layers'].append({
-                        "id": "aerodrome_label",
-                        "type": "symbol",
-                        "source": tileset,
-                        "source-layer": "aerodrome_label",
-                        "layout": {
-                            "text-field": ["get", "name"],
-                            "text-font": ["Noto Sans Regular"],
-                            "text-size": 11
-                        },
-                        "paint": {
-                            "text-color": "#666666",
-                            "text-halo-color": "#ffffff",
-                            "text-halo-width": 1
-                        }
-                    })
-                
-                # 16. Mountain peak (山峰)
-                if any(l.get('id') == 'mountain_peak' for l in vector_layers):
-                    style['layers'].append({
-                        "id": "mountain_peak",
-                        "type": "symbol",
-                        "source": tileset,
-                        "source-layer": "mountain_peak",
-                        "layout": {
-                            "text-field": ["get", "name"],
-                            "text-font": ["Noto Sans Italic"],
-                            "text-size": 10
-                        },
-                        "paint": {
-                            "text-color": "#7a5c3d",
-                            "text-halo-color": "#ffffff",
-                            "text-halo-width": 1
+            # 3. Landcover (土地覆蓋 - 森林、草地等)
+            if any(l.get('id') == 'landcover' for l in vector_layers):
+                style['layers'].append({
+                    "id": "landcover",
+                    "type": "fill",
+                    "source": tileset,
+                    "source-layer": "landcover",
+                    "paint": {
+                        "fill-color": "#d8e8c8",
+                        "fill-opacity": 0.5
+                    }
+                })
+            
+            # 4. Landuse (土地使用)
+            if any(l.get('id') == 'landuse' for l in vector_layers):
+                style['layers'].append({
+                    "id": "landuse",
+                    "type": "fill",
+                    "source": tileset,
+                    "source-layer": "landuse",
+                    "paint": {
+                        "fill-color": "#e0e0e0",
+                        "fill-opacity": 0.3
+                    }
+                })
+            
+            # 5. Park (公園)
+            if any(l.get('id') == 'park' for l in vector_layers):
+                style['layers'].append({
+                    "id": "park",
+                    "type": "fill",
+                    "source": tileset,
+                    "source-layer": "park",
+                    "paint": {
+                        "fill-color": "#c8e6c9",
+                        "fill-opacity": 0.6
+                    }
+                })
+            
+            # 6. Boundary (邊界)
+            if any(l.get('id') == 'boundary' for l in vector_layers):
+                style['layers'].append({
+                    "id": "boundary",
+                    "type": "line",
+                    "source": tileset,
+                    "source-layer": "boundary",
+                    "paint": {
+                        "line-color": "#9e9cab",
+                        "line-width": 1,
+                        "line-dasharray": [3, 3]
+                    }
+                })
+            
+            # 7. Aeroway (機場跑道)
+            if any(l.get('id') == 'aeroway' for l in vector_layers):
+                style['layers'].append({
+                    "id": "aeroway",
+                    "type": "fill",
+                    "source": tileset,
+                    "source-layer": "aeroway",
+                    "paint": {
+                        "fill-color": "#e9e9ed"
+                    }
+                })
+            
+            # 8. Transportation (道路) - 多層渲染
+            if any(l.get('id') == 'transportation' for l in vector_layers):
+                # 道路外框（較粗）
+                style['layers'].append({
+                    "id": "transportation-case",
+                    "type": "line",
+                    "source": tileset,
+                    "source-layer": "transportation",
+                    "paint": {
+                        "line-color": "#e0e0e0",
+                        "line-width": {
+                            "stops": [[10, 2], [14, 6], [18, 12]]
                         }
-                    })
-            else:
-                # 如果沒有 vector_layers 資訊，使用預設的 layer 定義
-                print(f"[WARNING] No vector_layers found in metadata, using default layers")
-                style['layers'].extend([
-                    {
-                        "id": "water",
-                        "type": "fill",
-                        "source": tileset,
-                        "source-layer": "water",
-                        "paint": {
-                            "fill-color": "#a0c8f0"
+                    }
+                })
+                # 道路內線（較細）
+                style['layers'].append({
+                    "id": "transportation",
+                    "type": "line",
+                    "source": tileset,
+                    "source-layer": "transportation",
+                    "paint": {
+                        "line-color": "#ffffff",
+                        "line-width": {
+                            "stops": [[10, 1], [14, 4], [18, 10]]
                         }
+                    }
+                })
+            
+            # 9. Building (建築物)
+            if any(l.get('id') == 'building' for l in vector_layers):
+                style['layers'].append({
+                    "id": "building",
+                    "type": "fill",
+                    "source": tileset,
+                    "source-layer": "building",
+                    "minzoom": 13,
+                    "paint": {
+                        "fill-color": "#d6d6d6",
+                        "fill-opacity": 0.7
+                    }
+                })
+            
+            # 10. Water name (水域名稱)
+            if any(l.get('id') == 'water_name' for l in vector_layers):
+                style['layers'].append({
+                    "id": "water_name",
+                    "type": "symbol",
+                    "source": tileset,
+                    "source-layer": "water_name",
+                    "layout": {
+                        "text-field": ["get", "name"],
+                        "text-font": ["Noto Sans Regular"],
+                        "text-size": 12
                     },
-                    {
-                        "id": "landuse",
-                        "type": "fill",
-                        "source": tileset,
-                        "source-layer": "landuse",
-                        "paint": {
-                            "fill-color": "#e8e8e8"
-                        }
+                    "paint": {
+                        "text-color": "#5a7a8f",
+                        "text-halo-color": "#ffffff",
+                        "text-halo-width": 1
+                    }
+                })
+            
+            # 11. Transportation name (道路名稱)
+            if any(l.get('id') == 'transportation_name' for l in vector_layers):
+                style['layers'].append({
+                    "id": "transportation_name",
+                    "type": "symbol",
+                    "source": tileset,
+                    "source-layer": "transportation_name",
+                    "layout": {
+                        "text-field": ["get", "name"],
+                        "text-font": ["Noto Sans Regular"],
+                        "text-size": 10,
+                        "symbol-placement": "line",
+                        "text-rotation-alignment": "map"
                     },
-                    {
-                        "id": "roads",
-                        "type": "line",
-                        "source": tileset,
-                        "source-layer": "transportation",
-                        "paint": {
-                            "line-color": "#ffffff",
-                            "line-width": 2
+                    "paint": {
+                        "text-color": "#666666",
+                        "text-halo-color": "#ffffff",
+                        "text-halo-width": 1
+                    }
+                })
+            
+            # 12. Place (地名)
+            if any(l.get('id') == 'place' for l in vector_layers):
+                style['layers'].append({
+                    "id": "place",
+                    "type": "symbol",
+                    "source": tileset,
+                    "source-layer": "place",
+                    "layout": {
+                        "text-field": ["get", "name"],
+                        "text-font": ["Noto Sans Bold"],
+                        "text-size": {
+                            "stops": [[6, 10], [10, 14], [14, 18]]
                         }
                     },
-                    {
-                        "id": "buildings",
-                        "type": "fill",
-                        "source": tileset,
-                        "source-layer": "building",
-                        "paint": {
-                            "fill-color": "#d0d0d0",
-                            "fill-opacity": 0.7
-                        }
+                    "paint": {
+                        "text-color": "#333333",
+                        "text-halo-color": "#ffffff",
+                        "text-halo-width": 1.5
+                    }
+                })
+            
+            # 13. Housenumber (門牌號碼)
+            if any(l.get('id') == 'housenumber' for l in vector_layers):
+                style['layers'].append({
+                    "id": "housenumber",
+                    "type": "symbol",
+                    "source": tileset,
+                    "source-layer": "housenumber",
+                    "minzoom": 17,
+                    "layout": {
+                        "text-field": ["get", "housenumber"],
+                        "text-font": ["Noto Sans Regular"],
+                        "text-size": 9
+                    },
+                    "paint": {
+                        "text-color": "#666666"
+                    }
+                })
+            
+            # 14. POI (興趣點)
+            if any(l.get('id') == 'poi' for l in vector_layers):
+                style['layers'].append({
+                    "id": "poi",
+                    "type": "symbol",
+                    "source": tileset,
+                    "source-layer": "poi",
+                    "minzoom": 14,
+                    "layout": {
+                        "text-field": ["get", "name"],
+                        "text-font": ["Noto Sans Regular"],
+                        "text-size": 10,
+                        "text-anchor": "top",
+                        "text-offset": [0, 0.5]
+                    },
+                    "paint": {
+                        "text-color": "#666666",
+                        "text-halo-color": "#ffffff",
+                        "text-halo-width": 1
+                    }
+                })
+            
+            # 15. Aerodrome label (機場標籤)
+            if any(l.get('id') == 'aerodrome_label' for l in vector_layers):
+                style['layers'].append({
+                    "id": "aerodrome_label",
+                    "type": "symbol",
+                    "source": tileset,
+                    "source-layer": "aerodrome_label",
+                    "layout": {
+                        "text-field": ["get", "name"],
+                        "text-font": ["Noto Sans Regular"],
+                        "text-size": 11
+                    },
+                    "paint": {
+                        "text-color": "#666666",
+                        "text-halo-color": "#ffffff",
+                        "text-halo-width": 1
                     }
-                ])
+                })
+            
+            # 16. Mountain peak (山峰)
+            if any(l.get('id') == 'mountain_peak' for l in vector_layers):
+                style['layers'].append({
+                    "id": "mountain_peak",
+                    "type": "symbol",
+                    "source": tileset,
+                    "source-layer": "mountain_peak",
+                    "layout": {
+                        "text-field": ["get", "name"],
+                        "text-font": ["Noto Sans Italic"],
+                        "text-size": 10
+                    },
+                    "paint": {
+                        "text-color": "#7a5c3d",
+                        "text-halo-color": "#ffffff",
+                        "text-halo-width": 1
+                    }
+                })
+        else:
+            # 如果沒有 vector_layers 資訊，使用預設的 layer 定義
+            print(f"[WARNING] No vector_layers found in metadata, using default layers")
+            style['layers'].extend([
+                {
+                    "id": "water",
+                    "type": "fill",
+                    "source": tileset,
+                    "source-layer": "water",
+                    "paint": {
+                        "fill-color": "#a0c8f0"
+                    }
+                },
+                {
+                    "id": "landuse",
+                    "type": "fill",
+                    "source": tileset,
+                    "source-layer": "landuse",
+                    "paint": {
+                        "fill-color": "#e8e8e8"
+                    }
+                },
+                {
+                    "id": "roads",
+                    "type": "line",
+                    "source": tileset,
+                    "source-layer": "transportation",
+                    "paint": {
+                        "line-color": "#ffffff",
+                        "line-width": 2
+                    }
+                },
+                {
+                    "id": "buildings",
+                    "type": "fill",
+                    "source": tileset,
+                    "source-layer": "building",
+                    "paint": {
+                        "fill-color": "#d0d0d0",
+                        "fill-opacity": 0.7
+                    }
+                }
+            ])
+    
+    return style
+
+@app.route('/tiles/<tileset>/style.json')
+def get_style(tileset):
+    """提供 MapLibre style.json（依 tileset 與 host 快取，支援 ETag）"""
+    try:
+        mbtiles_path = os.path.join(os.path.dirname(__file__), 'maps', f'{tileset}.mbtiles')
         
-        # 替換 host placeholder
-        host = request.host
-        style_json = jsonify(style).get_data(as_text=True)
-        style_json = style_json.replace('{host}', host)
+        entry = get_tileset_entry(tileset, mbtiles_path)
+        if entry is None:
+            return jsonify({
+                'success': False,
+                'error': f'Tileset {tileset} not found'
+            }), 404
         
-        response = make_response(style_json)
-        response.headers['Content-Type'] = 'application/json'
-        return response
+        host = request.host.lower()
+        return cached_json_response(
+            entry['derived'], ('style', host),
+            lambda: _build_tileset_style(tileset, entry['metadata'], host, entry['version'])
+        )
         
     except Exception as e:
         print(f"取得 style.json 失敗: {e}")
@@ -4682,54 +5608,50 @@ def get_style(tileset):
             'error': str(e)
         }), 500
 
+def _build_tilejson(tileset, metadata, host, version):
+    """依 tileset metadata 建立 TileJSON"""
+    # 取得 bounds 和 zoom 範圍
+    bounds = metadata.get('bounds', '-180,-85,180,85').split(',')
+    bounds = [float(b) for b in bounds]
+    
+    center_str = metadata.get('center', '0,0,0').split(',')
+    center = [float(center_str[0]), float(center_str[1]), int(center_str[2])]
+    
+    minzoom = int(metadata.get('minzoom', 0))
+    maxzoom = int(metadata.get('maxzoom', 14))
+    
+    return {
+        "tilejson": "3.0.0",
+        "name": metadata.get('name', tileset),
+        "description": metadata.get('description', ''),
+        "version": metadata.get('version', '1.0.0'),
+        "attribution": metadata.get('attribution', ''),
+        "scheme": "xyz",
+        "tiles": [tile_url_template(host, tileset, version)],
+        "minzoom": minzoom,
+        "maxzoom": maxzoom,
+        "bounds": bounds,
+        "center": center
+    }
+
 @app.route('/tiles/<tileset>/tilejson.json')
 def get_tilejson(tileset):
-    """提供 TileJSON metadata"""
+    """提供 TileJSON metadata（依 tileset 與 host 快取，支援 ETag）"""
     try:
         mbtiles_path = os.path.join(os.path.dirname(__file__), 'maps', f'{tileset}.mbtiles')
         
-        if not os.path.exists(mbtiles_path):
+        entry = get_tileset_entry(tileset, mbtiles_path)
+        if entry is None:
             return jsonify({
                 'success': False,
                 'error': f'Tileset {tileset} not found'
             }), 404
         
-        conn = sqlite3.connect(mbtiles_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        # 讀取 metadata
-        cursor.execute('SELECT name, value FROM metadata')
-        metadata = {row['name']: row['value'] for row in cursor.fetchall()}
-        
-        conn.close()
-        
-        # 取得 bounds 和 zoom 範圍
-        bounds = metadata.get('bounds', '-180,-85,180,85').split(',')
-        bounds = [float(b) for b in bounds]
-        
-        center_str = metadata.get('center', '0,0,0').split(',')
-        center = [float(center_str[0]), float(center_str[1]), int(center_str[2])]
-        
-        minzoom = int(metadata.get('minzoom', 0))
-        maxzoom = int(metadata.get('maxzoom', 14))
-        
-        # 建立 TileJSON
-        tilejson = {
-            "tilejson": "3.0.0",
-            "name": metadata.get('name', tileset),
-            "description": metadata.get('description', ''),
-            "version": metadata.get('version', '1.0.0'),
-            "attribution": metadata.get('attribution', ''),
-            "scheme": "xyz",
-            "tiles": [f"http://{request.host}/tiles/{tileset}/{{z}}/{{x}}/{{y}}"],
-            "minzoom": minzoom,
-            "maxzoom": maxzoom,
-            "bounds": bounds,
-            "center": center
-        }
-        
-        return jsonify(tilejson), 200
+        host = request.host.lower()
+        return cached_json_response(
+            entry['derived'], ('tilejson', host),
+            lambda: _build_tilejson(tileset, entry['metadata'], host, entry['version'])
+        )
         
     except Exception as e:
         print(f"取得 tilejson.json 失敗: {e}")
@@ -4905,6 +5827,7 @@ def gen_204():
 
 @socketio.on('connect')
 def handle_connect():
+    join_room(NOTES_LEGACY_ROOM)
     emit('lora_status', {
         'online': lora_connected,
         'channel_validated': channel_validated,
@@ -4912,21 +5835,55 @@ def handle_connect():
         'active_channels': [ch['name'] for ch in active_channels]
     })
 
+@socketio.on('join_board')
+def handle_join_board(data):
+    """client 切換頻道時加入該頻道的 room，之後只收到該頻道的 notes_delta / ack_received"""
+    data = data or {}
+    board_id = data.get('board_id')
+    has_access, error_response, status_code = verify_channel_access(board_id)
+    # Flask session 模式下 socket 的 session 是連線當下的副本，之後才驗證的頻道改以 join token 確認
+    if not has_access and status_code == 403 and verify_join_board_token(data.get('token'), board_id):
+        has_access = True
+    if not has_access:
+        # 保留原本的 room，並確保仍在 legacy room，client 可繼續依 refresh_notes 更新
+        join_room(NOTES_LEGACY_ROOM)
+        emit('join_board_result', {'success': False, 'board_id': board_id, 'error': error_response.get_json().get('error')})
+        return
+    
+    board_room = get_board_room(board_id)
+    join_room(board_room)
+    for room in rooms():
+        if (room.startswith('board:') and room != board_room) or room == NOTES_LEGACY_ROOM:
+            leave_room(room)
+    emit('join_board_result', {'success': True, 'board_id': board_id})
+
 def run_noteboard_app():
     init_database()
     migrate_database()
     
-    # 檢查地圖功能是否啟用
+    # notes_delta 推播從目前的 cursor 開始
+    sync_cursor = get_notes_sync_cursor()
+    for ch in BOARD_MESSAGE_CHANNELS:
+        _notes_event_cursors[ch['name']] = sync_cursor
+    
+    # 檢查地圖功能是否啟用，並預先載入 tileset metadata
     map_enabled = False
     if NOTEBOARD_MBTILES_FOLDER and os.path.exists(NOTEBOARD_MBTILES_FOLDER):
-        mbtiles_files = glob.glob(os.path.join(NOTEBOARD_MBTILES_FOLDER, '*.mbtiles'))
-        map_enabled = len(mbtiles_files) > 0
+        tileset_entries, _ = scan_tilesets(NOTEBOARD_MBTILES_FOLDER)
+        map_enabled = len(tileset_entries) > 0
+        if map_enabled:
+            print(f"[地圖] 已載入 {len(tileset_entries)} 個 tileset: {[name for name, _ in tileset_entries]}")
     
     if not map_enabled:
         print("mbtiles 目錄未設定或無檔案，離線地圖功能停用")
     
+    restore_pending_acks()
+    
     socketio.start_background_task(target=mesh_loop)
     socketio.start_background_task(target=send_scheduler_loop)
+    socketio.start_background_task(target=ack_timeout_loop)
+    socketio.start_background_task(target=receive_worker_loop)
+    socketio.start_background_task(target=db_optimize_loop)
     start_epaper_periodic_refresh()
     print(f"MeshBridge NoteBoard 伺服器啟動中 (Port 80, Channels: {CONFIGURED_CHANNEL_NAMES})...")
     socketio.run(app, host='0.0.0.0', port=80, debug=False)
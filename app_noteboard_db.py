@@ -0,0 +1,318 @@
+import sqlite3
+import threading
+import itertools
+import atexit
+import weakref
+from contextlib import contextmanager
+
+# NoteBoard 資料庫存取層
+# 所有 noteboard.db 的連線都經由此模組取得，統一設定 WAL 與效能相關 PRAGMA，
+# 並以連線池重複使用已開啟的連線，避免每次請求都重新開檔與解析 schema。
+
+DB_PATH = 'noteboard.db'
+
+# 連線池保留的閒置連線數上限（超過的連線在歸還時直接關閉）
+DB_POOL_MAX_IDLE = 8
+
+# 等待其他寫入者釋放鎖定的最長時間（毫秒），逾時才會拋出 "database is locked"
+DB_BUSY_TIMEOUT_MS = 5000
+
+# 每條連線的 page cache 大小（負值代表 KiB），Pi Zero 記憶體有限，保持適中
+DB_CACHE_SIZE_KIB = 4096
+
+# 以 mmap 讀取資料庫檔案的上限（bytes），減少 SD 卡讀取時的系統呼叫與複製
+DB_MMAP_SIZE = 64 * 1024 * 1024
+
+# PRAGMA optimize 時 ANALYZE 每個索引最多取樣的列數，避免在大型資料庫上長時間阻塞
+DB_ANALYSIS_LIMIT = 400
+
+_pool = []
+try:
+    # 接收批次會在 eventlet tpool 的原生執行緒中取用連線池，使用未經 monkey patch 的原生鎖
+    # （臨界區段只操作 list、不會讓出執行權，在 eventlet hub 上持有也不會阻塞其他 greenlet）
+    from eventlet.patcher import original as _original_module
+    _pool_lock = _original_module('threading').Lock()
+except ImportError:
+    _pool_lock = threading.Lock()
+_wal_initialized = False
+_batch_local = threading.local()  # 目前執行緒（greenlet）進行中的 batch_transaction 連線
+_savepoint_ids = itertools.count(1)
+
+
+def _open_connection():
+    """開啟一條新的資料庫連線並套用 PRAGMA 設定"""
+    global _wal_initialized
+    conn = sqlite3.connect(DB_PATH, timeout=DB_BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+    cursor = conn.cursor()
+    if not _wal_initialized:
+        # journal_mode=WAL 會寫入資料庫檔案，只需設定一次即可持續生效
+        mode = cursor.execute('PRAGMA journal_mode=WAL').fetchone()[0]
+        if mode.lower() != 'wal':
+            print(f"[資料庫] 無法切換為 WAL 模式，目前為 {mode}")
+        _wal_initialized = True
+    cursor.execute(f'PRAGMA busy_timeout={int(DB_BUSY_TIMEOUT_MS)}')
+    # WAL 模式下 NORMAL 仍可保證資料庫一致性，僅在斷電時可能遺失最後一筆交易
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute(f'PRAGMA cache_size=-{int(DB_CACHE_SIZE_KIB)}')
+    cursor.execute(f'PRAGMA mmap_size={int(DB_MMAP_SIZE)}')
+    cursor.execute('PRAGMA temp_store=MEMORY')
+    cursor.close()
+    return conn
+
+
+class PooledConnection:
+    """連線池借出的連線
+
+    介面與 sqlite3.Connection 相同，呼叫 close() 時不會真正關閉，
+    而是將未提交的交易 rollback 後歸還連線池。
+    """
+
+    def __init__(self, conn):
+        object.__setattr__(self, '_conn', conn)
+
+    def __getattr__(self, name):
+        conn = object.__getattribute__(self, '_conn')
+        if conn is None:
+            raise sqlite3.ProgrammingError('Cannot operate on a closed database.')
+        return getattr(conn, name)
+
+    def __setattr__(self, name, value):
+        # row_factory 等屬性直接設定到底層連線
+        setattr(object.__getattribute__(self, '_conn'), name, value)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is None:
+            self._conn.commit()
+        self.close()
+        return False
+
+    def close(self):
+        conn = object.__getattribute__(self, '_conn')
+        if conn is None:
+            return
+        object.__setattr__(self, '_conn', None)
+        _release_connection(conn)
+
+
+class BatchConnection:
+    """batch_transaction() 期間借出的連線
+
+    與其他 get_db_connection() 共用同一條連線與同一個交易，各自以 SAVEPOINT 隔離：
+    commit() 釋放 savepoint（實際寫入延後到整批結束時才提交），
+    close() 時 rollback 尚未 commit 的部分，與一般連線的行為一致。
+    發生例外而未呼叫 close() 的連線，在被回收或 batch 結束時同樣 rollback，不會隨整批提交。
+    row_factory 只套用到此物件建立的 cursor，不影響共用連線上的其他使用者。
+    """
+
+    def __init__(self, conn, open_connections):
+        object.__setattr__(self, '_conn', conn)
+        object.__setattr__(self, '_row_factory', None)
+        object.__setattr__(self, '_savepoint', None)
+        object.__setattr__(self, '_open_connections', open_connections)
+        self._begin_savepoint()
+        open_connections.add(self)
+
+    def _begin_savepoint(self):
+        savepoint_id = next(_savepoint_ids)
+        name = f"sp_batch_{savepoint_id}"
+        object.__getattribute__(self, '_conn').execute(f'SAVEPOINT {name}')
+        object.__setattr__(self, '_savepoint', name)
+        object.__setattr__(self, '_savepoint_id', savepoint_id)
+
+    def __getattr__(self, name):
+        conn = object.__getattribute__(self, '_conn')
+        if conn is None:
+            raise sqlite3.ProgrammingError('Cannot operate on a closed database.')
+        return getattr(conn, name)
+
+    def __setattr__(self, name, value):
+        if name == 'row_factory':
+            object.__setattr__(self, '_row_factory', value)
+            return
+        setattr(object.__getattribute__(self, '_conn'), name, value)
+
+    @property
+    def row_factory(self):
+        return object.__getattribute__(self, '_row_factory')
+
+    def cursor(self):
+        conn = object.__getattribute__(self, '_conn')
+        if conn is None:
+            raise sqlite3.ProgrammingError('Cannot operate on a closed database.')
+        cursor = conn.cursor()
+        cursor.row_factory = object.__getattribute__(self, '_row_factory')
+        return cursor
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        conn = object.__getattribute__(self, '_conn')
+        conn.execute(f'RELEASE {object.__getattribute__(self, "_savepoint")}')
+        self._begin_savepoint()
+
+    def rollback(self):
+        conn = object.__getattribute__(self, '_conn')
+        conn.execute(f'ROLLBACK TO {object.__getattribute__(self, "_savepoint")}')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is None:
+            self.commit()
+        self.close()
+        return False
+
+    def close(self):
+        conn = object.__getattribute__(self, '_conn')
+        if conn is None:
+            return
+        object.__setattr__(self, '_conn', None)
+        object.__getattribute__(self, '_open_connections').discard(self)
+        savepoint = object.__getattribute__(self, '_savepoint')
+        try:
+            conn.execute(f'ROLLBACK TO {savepoint}')
+            conn.execute(f'RELEASE {savepoint}')
+        except sqlite3.Error as e:
+            print(f"[資料庫] 釋放 savepoint {savepoint} 失敗: {e}")
+
+    def _detach(self):
+        object.__setattr__(self, '_conn', None)
+
+    def __del__(self):
+        try:
+            if (object.__getattribute__(self, '_conn') is not None
+                    and object.__getattribute__(self, '_savepoint') is not None):
+                print(f"[資料庫] savepoint {object.__getattribute__(self, '_savepoint')} 未關閉即被回收，rollback 未提交的寫入")
+                self.close()
+        except Exception:
+            pass
+
+
+def _release_connection(conn):
+    """歸還連線至連線池"""
+    try:
+        if conn.in_transaction:
+            conn.rollback()
+        conn.row_factory = None
+    except sqlite3.Error as e:
+        print(f"[資料庫] 歸還連線時發生錯誤，捨棄此連線: {e}")
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        return
+
+    with _pool_lock:
+        if len(_pool) < DB_POOL_MAX_IDLE:
+            _pool.append(conn)
+            return
+    conn.close()
+
+
+def get_db_connection():
+    """從連線池取得一條連線（用完後呼叫 close() 歸還）
+
+    連線池為空時會直接開新連線，不會阻塞等待；
+    未歸還的連線被回收時會由 sqlite3 自行關閉，不會佔用連線池。
+    """
+    batch_conn = getattr(_batch_local, 'conn', None)
+    if batch_conn is not None:
+        return BatchConnection(batch_conn, _batch_local.open_connections)
+    return PooledConnection(_acquire_connection())
+
+
+def _acquire_connection():
+    conn = None
+    with _pool_lock:
+        if _pool:
+            conn = _pool.pop()
+    if conn is None:
+        conn = _open_connection()
+    return conn
+
+
+@contextmanager
+def batch_transaction():
+    """將區塊內同一執行緒（greenlet）所有 get_db_connection() 的寫入合併為單一交易
+
+    區塊正常結束時一次提交，發生例外時整批 rollback。
+    區塊開始時即取得寫入鎖（BEGIN IMMEDIATE），其他連線的寫入會等待到提交為止（最多 DB_BUSY_TIMEOUT_MS），
+    因此區塊內不應讓出執行權（例如 socketio.sleep）。
+    """
+    if getattr(_batch_local, 'conn', None) is not None:
+        # 已在 batch 中，沿用外層交易
+        yield
+        return
+    conn = _acquire_connection()
+    # 開始時即取得寫入鎖：deferred 交易若先讀取，其他連線在第一次寫入前提交時，
+    # 後續寫入會直接失敗（SQLITE_BUSY_SNAPSHOT），busy timeout 也無法等待
+    conn.execute('BEGIN IMMEDIATE')
+    _batch_local.conn = conn
+    # 以 weak reference 追蹤尚未 close() 的 BatchConnection，不延長其生命週期（被回收時由 __del__ rollback）
+    _batch_local.open_connections = weakref.WeakSet()
+    open_connections = _batch_local.open_connections
+    try:
+        yield
+        _rollback_open_savepoints(open_connections)
+        conn.commit()
+    finally:
+        # 整批已提交或 rollback，剩餘的 BatchConnection 不可再操作已歸還連線池的連線
+        for batch_conn in list(open_connections):
+            batch_conn._detach()
+        _batch_local.conn = None
+        _batch_local.open_connections = None
+        _release_connection(conn)
+
+
+def _rollback_open_savepoints(open_connections):
+    """batch 結束時 rollback 仍未 close() 的 BatchConnection（由內層往外層）"""
+    leaked = sorted(open_connections, key=lambda batch_conn: object.__getattribute__(batch_conn, '_savepoint_id'),
+                    reverse=True)
+    for batch_conn in leaked:
+        print(f"[資料庫] batch 結束時 savepoint {object.__getattribute__(batch_conn, '_savepoint')} 仍未關閉，rollback 未提交的寫入")
+        batch_conn.close()
+
+
+def _optimize_connection(conn):
+    conn.execute(f'PRAGMA analysis_limit={int(DB_ANALYSIS_LIMIT)}')
+    conn.execute('PRAGMA optimize')
+
+
+def optimize_database():
+    """以連線池中的連線執行 PRAGMA optimize，更新查詢規劃器的統計資訊
+
+    SQLite 只會 ANALYZE 該連線查詢過、且統計資訊需要更新的資料表，平時幾乎不花時間。
+    """
+    conn = _acquire_connection()
+    try:
+        _optimize_connection(conn)
+    except sqlite3.Error as e:
+        print(f"[資料庫] PRAGMA optimize 失敗: {e}")
+    finally:
+        _release_connection(conn)
+
+
+def close_db_pool():
+    """關閉連線池中所有閒置連線（關閉前執行 PRAGMA optimize），並將 WAL 內容寫回主資料庫檔案"""
+    with _pool_lock:
+        conns = list(_pool)
+        _pool.clear()
+    for i, conn in enumerate(conns):
+        try:
+            _optimize_connection(conn)
+            if i == 0:
+                conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            conn.close()
+        except sqlite3.Error as e:
+            print(f"[資料庫] 關閉連線失敗: {e}")
+
+
+atexit.register(close_db_pool)
@@ -0,0 +1,314 @@
+import re
+import zlib
+
+# NoteBoard LoRa 精簡二進位編碼
+# 將文字命令（/msg、/reply、/color、/author、/archive、/pin、/ack、/pack）轉為二進位格式，
+# 以 Meshtastic PRIVATE_APP port 發送：1 byte opcode、varint 編碼的 lora_msg_id、
+# 依格式壓縮的 author_key，以及可選擇以共用字典 deflate 壓縮的 body。
+# 接收端解碼回原本的文字命令後沿用既有的處理流程，因此兩種格式的行為完全相同。
+
+# Meshtastic PRIVATE_APP port
+COMPACT_PORTNUM = 256
+COMPACT_PORTNUM_NAME = 'PRIVATE_APP'
+
+# 格式版本（封包第一個 byte），用於與其他使用 PRIVATE_APP 的應用區分
+COMPACT_MAGIC = 0xB1
+
+OP_MSG_NEW = 0x01    # /msg [new,color,author]body
+OP_MSG = 0x02        # /msg [id,color,author]body
+OP_REPLY_NEW = 0x03  # /reply <new,color,author>[parent]body
+OP_REPLY = 0x04      # /reply <id,color,author>[parent]body
+OP_COLOR = 0x05      # /color [id]author, color
+OP_AUTHOR = 0x06     # /author [id]author
+OP_ARCHIVE = 0x07    # /archive [id]author
+OP_PIN = 0x08        # /pin [id]author
+OP_ACK = 0x09        # /ack id
+OP_PACK = 0x0A       # /pack <len>:<cmd>...
+OP_ACK_MULTI = 0x0B  # /ack id1,id2,...
+
+AUTHOR_RAW = 0x00     # varint 長度 + UTF-8
+AUTHOR_LORA = 0x01    # lora-!xxxxxxxx（8 位 hex 節點 ID）→ 4 bytes
+AUTHOR_BASE36 = 0x02  # [a-z0-9]{1,12}（Web 用戶隨機碼）→ 長度 + varint
+
+BODY_RAW = 0x00
+BODY_DEFLATE = 0x01
+
+# 合併 /ack 的 lora_msg_id 數量上限
+MAX_ACK_IDS = 64
+
+# body 解壓縮後的長度上限，避免惡意封包造成記憶體耗盡
+MAX_BODY_BYTES = 4096
+
+# deflate 共用字典：常見的 table cell 格式（{sheet_id:A1}）與中文用語，越常用的放越後面
+BODY_ZDICT = (
+    ':delete}:A1}:B1}:C1}:D1}:A2}:B2}:C2}:D2}:title}'
+    '請注意安全需要協助物資救援避難集合地點時間今天明天下午上午'
+    '謝謝收到確認已經沒有可以我們大家目前這裡'
+).encode('utf-8')
+
+_ID_VALUE = r'(?:0|[1-9]\d*)'
+_ID = '(' + _ID_VALUE + ')'
+_COLOR = r'(0|[1-9]\d?|1\d\d|2[0-4]\d|25[0-5])'
+_LORA_AUTHOR_RE = re.compile(r'^lora-!([0-9a-f]{8})$')
+_BASE36_AUTHOR_RE = re.compile(r'^[a-z0-9]{1,12}$')
+
+_TEXT_PATTERNS = [
+    (OP_MSG_NEW, re.compile(r'^/msg \[new,' + _COLOR + r',([^\],]*)\](.*)$', re.DOTALL)),
+    (OP_MSG, re.compile(r'^/msg \[' + _ID + ',' + _COLOR + r',([^\],]*)\](.*)$', re.DOTALL)),
+    (OP_REPLY_NEW, re.compile(r'^/reply <new,' + _COLOR + r',([^>,]*)>\[' + _ID + r'\](.*)$', re.DOTALL)),
+    (OP_REPLY, re.compile(r'^/reply <' + _ID + ',' + _COLOR + r',([^>,]*)>\[' + _ID + r'\](.*)$', re.DOTALL)),
+    (OP_COLOR, re.compile(r'^/color \[' + _ID + r'\]([^,\s]*), ' + _COLOR + '$')),
+    (OP_AUTHOR, re.compile(r'^/author \[' + _ID + r'\](\S*)$')),
+    (OP_ARCHIVE, re.compile(r'^/archive \[' + _ID + r'\](\S*)$')),
+    (OP_PIN, re.compile(r'^/pin \[' + _ID + r'\](\S*)$')),
+    (OP_ACK, re.compile(r'^/ack ' + _ID + '$')),
+    (OP_ACK_MULTI, re.compile(r'^/ack (' + _ID_VALUE + '(?:,' + _ID_VALUE + ')+)$')),
+]
+
+_PACK_PREFIX = '/pack '
+
+
+class CodecError(ValueError):
+    pass
+
+
+def _encode_varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+class _Reader:
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def byte(self):
+        if self.pos >= len(self.data):
+            raise CodecError('unexpected end of data')
+        value = self.data[self.pos]
+        self.pos += 1
+        return value
+
+    def varint(self):
+        value = 0
+        for shift in range(0, 64, 7):
+            byte = self.byte()
+            value |= (byte & 0x7F) << shift
+            if not byte & 0x80:
+                return value
+        raise CodecError('varint too long')
+
+    def bytes(self, length):
+        if length > len(self.data) - self.pos:
+            raise CodecError('length out of range')
+        value = self.data[self.pos:self.pos + length]
+        self.pos += length
+        return value
+
+    def at_end(self):
+        return self.pos == len(self.data)
+
+
+def _encode_author(author_key):
+    m = _LORA_AUTHOR_RE.match(author_key)
+    if m:
+        return bytes([AUTHOR_LORA]) + bytes.fromhex(m.group(1))
+    if _BASE36_AUTHOR_RE.match(author_key):
+        return bytes([AUTHOR_BASE36, len(author_key)]) + _encode_varint(int(author_key, 36))
+    raw = author_key.encode('utf-8')
+    return bytes([AUTHOR_RAW]) + _encode_varint(len(raw)) + raw
+
+
+def _to_base36(value, length):
+    digits = '0123456789abcdefghijklmnopqrstuvwxyz'
+    chars = []
+    while value:
+        value, rem = divmod(value, 36)
+        chars.append(digits[rem])
+    text = ''.join(reversed(chars)).rjust(length, '0')
+    if len(text) != length:
+        raise CodecError('base36 author overflow')
+    return text
+
+
+def _decode_author(reader):
+    tag = reader.byte()
+    if tag == AUTHOR_LORA:
+        return 'lora-!' + reader.bytes(4).hex()
+    if tag == AUTHOR_BASE36:
+        length = reader.byte()
+        if not 1 <= length <= 12:
+            raise CodecError('invalid base36 author length')
+        return _to_base36(reader.varint(), length)
+    if tag == AUTHOR_RAW:
+        try:
+            return reader.bytes(reader.varint()).decode('utf-8')
+        except UnicodeDecodeError:
+            raise CodecError('invalid author encoding')
+    raise CodecError('unknown author tag')
+
+
+def _encode_body(body):
+    raw = body.encode('utf-8')
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -15, zdict=BODY_ZDICT)
+    compressed = compressor.compress(raw) + compressor.flush()
+    if len(compressed) < len(raw):
+        return bytes([BODY_DEFLATE]) + _encode_varint(len(compressed)) + compressed
+    return bytes([BODY_RAW]) + _encode_varint(len(raw)) + raw
+
+
+def _decode_body(reader):
+    tag = reader.byte()
+    data = reader.bytes(reader.varint())
+    if tag == BODY_DEFLATE:
+        try:
+            decompressor = zlib.decompressobj(-15, zdict=BODY_ZDICT)
+            raw = decompressor.decompress(data, MAX_BODY_BYTES)
+            if decompressor.unconsumed_tail or not decompressor.eof:
+                raise CodecError('invalid compressed body')
+        except zlib.error:
+            raise CodecError('invalid compressed body')
+    elif tag == BODY_RAW:
+        raw = data
+    else:
+        raise CodecError('unknown body tag')
+    try:
+        return raw.decode('utf-8')
+    except UnicodeDecodeError:
+        raise CodecError('invalid body encoding')
+
+
+def _encode_single(msg):
+    for opcode, pattern in _TEXT_PATTERNS:
+        m = pattern.match(msg)
+        if not m:
+            continue
+        g = m.groups()
+        out = bytearray([opcode])
+        if opcode == OP_MSG_NEW:
+            out += bytes([int(g[0])]) + _encode_author(g[1]) + _encode_body(g[2])
+        elif opcode == OP_MSG:
+            out += _encode_varint(int(g[0])) + bytes([int(g[1])]) + _encode_author(g[2]) + _encode_body(g[3])
+        elif opcode == OP_REPLY_NEW:
+            out += bytes([int(g[0])]) + _encode_author(g[1]) + _encode_varint(int(g[2])) + _encode_body(g[3])
+        elif opcode == OP_REPLY:
+            out += (_encode_varint(int(g[0])) + bytes([int(g[1])]) + _encode_author(g[2])
+                    + _encode_varint(int(g[3])) + _encode_body(g[4]))
+        elif opcode == OP_COLOR:
+            out += _encode_varint(int(g[0])) + _encode_author(g[1]) + bytes([int(g[2])])
+        elif opcode in (OP_AUTHOR, OP_ARCHIVE, OP_PIN):
+            out += _encode_varint(int(g[0])) + _encode_author(g[1])
+        elif opcode == OP_ACK:
+            out += _encode_varint(int(g[0]))
+        elif opcode == OP_ACK_MULTI:
+            lora_msg_ids = g[0].split(',')
+            if len(lora_msg_ids) > MAX_ACK_IDS:
+                return None
+            out += _encode_varint(len(lora_msg_ids))
+            for lora_msg_id in lora_msg_ids:
+                out += _encode_varint(int(lora_msg_id))
+        return bytes(out)
+    return None
+
+
+def _decode_single(reader):
+    opcode = reader.byte()
+    if opcode == OP_MSG_NEW:
+        color = reader.byte()
+        author = _decode_author(reader)
+        return f"/msg [new,{color},{author}]{_decode_body(reader)}"
+    if opcode == OP_MSG:
+        lora_msg_id = reader.varint()
+        color = reader.byte()
+        author = _decode_author(reader)
+        return f"/msg [{lora_msg_id},{color},{author}]{_decode_body(reader)}"
+    if opcode == OP_REPLY_NEW:
+        color = reader.byte()
+        author = _decode_author(reader)
+        parent = reader.varint()
+        return f"/reply <new,{color},{author}>[{parent}]{_decode_body(reader)}"
+    if opcode == OP_REPLY:
+        lora_msg_id = reader.varint()
+        color = reader.byte()
+        author = _decode_author(reader)
+        parent = reader.varint()
+        return f"/reply <{lora_msg_id},{color},{author}>[{parent}]{_decode_body(reader)}"
+    if opcode == OP_COLOR:
+        lora_msg_id = reader.varint()
+        author = _decode_author(reader)
+        return f"/color [{lora_msg_id}]{author}, {reader.byte()}"
+    if opcode in (OP_AUTHOR, OP_ARCHIVE, OP_PIN):
+        command = {OP_AUTHOR: 'author', OP_ARCHIVE: 'archive', OP_PIN: 'pin'}[opcode]
+        lora_msg_id = reader.varint()
+        return f"/{command} [{lora_msg_id}]{_decode_author(reader)}"
+    if opcode == OP_ACK:
+        return f"/ack {reader.varint()}"
+    if opcode == OP_ACK_MULTI:
+        count = reader.varint()
+        if not 2 <= count <= MAX_ACK_IDS:
+            raise CodecError('invalid ack count')
+        return '/ack ' + ','.join(str(reader.varint()) for _ in range(count))
+    raise CodecError('unknown opcode')
+
+
+def encode_command(msg, unpack=None):
+    """將文字命令編碼為二進位格式，無法編碼（格式不符）時回傳 None
+
+    unpack 為拆解 /pack 訊息的函式（回傳命令清單或 None），未提供時不編碼 /pack。
+    """
+    if msg.startswith(_PACK_PREFIX):
+        sub_msgs = unpack(msg) if unpack else None
+        if not sub_msgs:
+            return None
+        out = bytearray([COMPACT_MAGIC, OP_PACK]) + _encode_varint(len(sub_msgs))
+        for sub_msg in sub_msgs:
+            encoded = _encode_single(sub_msg)
+            if encoded is None:
+                return None
+            out += _encode_varint(len(encoded)) + encoded
+        return bytes(out)
+
+    encoded = _encode_single(msg)
+    if encoded is None:
+        return None
+    return bytes([COMPACT_MAGIC]) + encoded
+
+
+def decode_command(data, pack=None):
+    """將二進位格式解碼回文字命令，格式錯誤時回傳 None
+
+    pack 為將命令清單合併為 /pack 訊息的函式，未提供時不接受 OP_PACK。
+    """
+    try:
+        reader = _Reader(bytes(data))
+        if reader.byte() != COMPACT_MAGIC:
+            return None
+        if reader.data[reader.pos:reader.pos + 1] == bytes([OP_PACK]):
+            reader.byte()
+            if not pack:
+                return None
+            count = reader.varint()
+            if not 1 <= count <= 64:
+                return None
+            sub_msgs = []
+            for _ in range(count):
+                sub_reader = _Reader(reader.bytes(reader.varint()))
+                sub_msg = _decode_single(sub_reader)
+                if not sub_reader.at_end() or not (sub_msg.startswith('/msg [') or sub_msg.startswith('/reply <')):
+                    return None
+                sub_msgs.append(sub_msg)
+            msg = pack(sub_msgs)
+        else:
+            msg = _decode_single(reader)
+        if not reader.at_end():
+            return None
+        return msg
+    except CodecError:
+        return None
@@ -0,0 +1,176 @@
+import re
+from collections import namedtuple, OrderedDict
+
+from app_noteboard_send_queue import LORA_PACK_PREFIX, unpack_lora_messages
+
+# NoteBoard LoRa 文字命令解析
+# 依命令名稱（第一個空白前的字串）查表取得對應的解析函式，每則訊息只解析一次，
+# 產生下列命令物件，由 app_noteboard 的 LORA_COMMAND_HANDLERS 依型別分派處理。
+# 不含 color_id / author_key 的舊版格式以 color_id=None、author_key='' 表示。
+# 本模組不存取資料庫，可單獨進行效能測試與 fuzz 測試。
+
+NewNote = namedtuple('NewNote', 'color_id author_key body')                              # /msg [new,color,author]body、/msg [new]body
+ResendNote = namedtuple('ResendNote', 'lora_msg_id color_id author_key body')            # /msg [id,color,author]body、/msg [id]body
+NewReply = namedtuple('NewReply', 'parent_lora_msg_id color_id author_key body')         # /reply <new,color,author>[parent]body、/reply <new>[parent]body
+ResendReply = namedtuple('ResendReply', 'lora_msg_id parent_lora_msg_id color_id author_key body')  # /reply <id,color,author>[parent]body、/reply <id>[parent]body
+SetColor = namedtuple('SetColor', 'lora_msg_id author_key color_id')                     # /color [id]author,color
+SetAuthor = namedtuple('SetAuthor', 'lora_msg_id author_key')                            # /author [id]author
+ArchiveNote = namedtuple('ArchiveNote', 'lora_msg_id author_key')                        # /archive [id]author
+PinNote = namedtuple('PinNote', 'lora_msg_id author_key')                                # /pin [id]author
+UserAck = namedtuple('UserAck', 'lora_msg_ids')                                          # /ack id、/ack id1,id2,...
+PackedCommands = namedtuple('PackedCommands', 'msgs')                                    # /pack <len>:<cmd>...
+InvalidCommand = namedtuple('InvalidCommand', 'msg error')                               # 已知命令但格式錯誤
+UnknownCommand = namedtuple('UnknownCommand', 'msg')                                     # 非 noteboard 命令
+
+MSG_NEW_USAGE = "  -> 格式錯誤，應為 /msg [new,color_id,author_key]body"
+MSG_RESEND_USAGE = "  -> 格式錯誤，應為 /msg [lora_msg_id,color_id,author_key]body"
+REPLY_NEW_USAGE = "  -> 格式錯誤，應為 /reply <new,color_id,author_key>[parent_lora_msg_id]body"
+REPLY_RESEND_USAGE = "  -> 格式錯誤，應為 /reply <lora_msg_id,color_id,author_key>[parent_lora_msg_id]body"
+REPLY_RESEND_FORMAT_ERROR = "[格式錯誤] /reply 重發格式應為 /reply <lora_msg_id>[parent_lora_msg_id]body"
+COLOR_USAGE = "  -> 格式錯誤，應為 /color [lora_msg_id]author_key,color_id"
+
+# [ ] 與 < > 內容取到第一個結尾符號為止，與舊版以 str.index 解析的結果一致
+_MSG_RE = re.compile(r'/msg \[([^\]]*)\](.*)', re.DOTALL)
+_REPLY_RE = re.compile(r'/reply <([^>]*)>\[([^\]]*)\](.*)', re.DOTALL)
+_BRACKET_RE = re.compile(r'/\w+ \[([^\]]*)\](.*)', re.DOTALL)
+
+
+def _split_params(content, count):
+    """以逗號拆解參數並去除空白，數量不符時回傳 None"""
+    parts = content.split(',')
+    if len(parts) != count:
+        return None
+    return [part.strip() for part in parts]
+
+
+def _parse_msg(msg):
+    match = _MSG_RE.match(msg)
+    if not match:
+        return UnknownCommand(msg)
+    content, body = match.groups()
+    if content == 'new':
+        return NewNote(None, '', body)
+    if content.startswith('new,'):
+        params = _split_params(content[4:], 2)
+        if params is None:
+            return InvalidCommand(msg, MSG_NEW_USAGE)
+        return NewNote(params[0], params[1], body)
+    if ',' in content:
+        params = _split_params(content, 3)
+        if params is None:
+            return InvalidCommand(msg, MSG_RESEND_USAGE)
+        return ResendNote(params[0], params[1], params[2], body)
+    return ResendNote(content, None, '', body)
+
+
+def _parse_reply(msg):
+    match = _REPLY_RE.match(msg)
+    if not match:
+        if msg.startswith('/reply <new,') and ']' in msg:
+            return InvalidCommand(msg, REPLY_NEW_USAGE)
+        if msg.startswith('/reply <') and '>[' in msg and ']' in msg:
+            return InvalidCommand(msg, REPLY_RESEND_FORMAT_ERROR)
+        return UnknownCommand(msg)
+    content, parent_lora_msg_id, body = match.groups()
+    if content == 'new':
+        return NewReply(parent_lora_msg_id, None, '', body)
+    if content.startswith('new,'):
+        params = _split_params(content, 3)
+        if params is None:
+            return InvalidCommand(msg, REPLY_NEW_USAGE)
+        return NewReply(parent_lora_msg_id, params[1], params[2], body)
+    if ',' in content:
+        params = _split_params(content, 3)
+        if params is None:
+            return InvalidCommand(msg, REPLY_RESEND_USAGE)
+        return ResendReply(params[0], parent_lora_msg_id, params[1], params[2], body)
+    return ResendReply(content, parent_lora_msg_id, None, '', body)
+
+
+def _parse_color(msg):
+    match = _BRACKET_RE.match(msg)
+    if not match:
+        return UnknownCommand(msg)
+    lora_msg_id, params = match.group(1), match.group(2).strip()
+    if ',' not in params:
+        return InvalidCommand(msg, COLOR_USAGE)
+    author_key, color_id = params.split(',', 1)
+    return SetColor(lora_msg_id, author_key.strip(), color_id.strip())
+
+
+def _author_command_parser(command_type):
+    """產生 /author、/archive、/pin 等 [lora_msg_id]author_key 格式命令的解析函式"""
+    def parse(msg):
+        match = _BRACKET_RE.match(msg)
+        if not match:
+            return UnknownCommand(msg)
+        return command_type(match.group(1), match.group(2).strip())
+    return parse
+
+
+def _parse_ack(msg):
+    return UserAck([x.strip() for x in msg[5:].split(',') if x.strip()])
+
+
+def _parse_pack(msg):
+    msgs = unpack_lora_messages(msg)
+    if not msgs:
+        return InvalidCommand(msg, f"[格式錯誤] /pack 訊息無法解析: {msg}")
+    return PackedCommands(msgs)
+
+
+_COMMAND_PARSERS = {
+    '/msg': _parse_msg,
+    '/reply': _parse_reply,
+    '/color': _parse_color,
+    '/author': _author_command_parser(SetAuthor),
+    '/archive': _author_command_parser(ArchiveNote),
+    '/pin': _author_command_parser(PinNote),
+    '/ack': _parse_ack,
+    LORA_PACK_PREFIX.strip(): _parse_pack,
+}
+
+
+def parse_lora_command(msg):
+    """解析一則 LoRa 文字訊息，回傳對應的命令物件
+
+    無法辨識的訊息回傳 UnknownCommand，已知命令但參數格式錯誤時回傳 InvalidCommand。
+    """
+    name, sep, _ = msg.partition(' ')
+    parser = _COMMAND_PARSERS.get(name) if sep else None
+    if parser is None:
+        return UnknownCommand(msg)
+    return parser(msg)
+
+
+class RecentKeys:
+    """記錄最近出現過的 key 與時間（LRU），超過 max_size 時移除最久未使用的項目
+
+    用於接收端的重複封包過濾，查詢與新增皆為 O(1)，不存取資料庫。
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._items = OrderedDict()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def get(self, key):
+        """取得 key 最後一次記錄的時間，不存在時回傳 None"""
+        value = self._items.get(key)
+        if value is not None:
+            self._items.move_to_end(key)
+        return value
+
+    def add(self, key, value):
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def clear(self):
+        self._items.clear()
@@ -0,0 +1,75 @@
+import math
+
+# NoteBoard 自適應自動重送
+# 依各頻道近期 USER ACK 的往返時間（ack_records.latency_ms：收到 ACK 時距該次傳輸的時間，
+# 已扣除對方延遲發送 ACK 的秒數）與回覆過 ACK 的節點數量，決定重送退避時間與需要等待的 ACK 數量：
+# - 網路回應慢時拉長退避，避免 ACK 還在路上就重送
+# - 頻道上近期可達的節點少於 AUTO_RESEND_NODE 時，以可達節點數為目標，避免對不存在的節點無限重送
+# 樣本不足時沿用固定的退避基數與 AUTO_RESEND_NODE。
+
+# 統計視窗（秒）：只使用此時間內收到的 ACK
+RESEND_STATS_WINDOW_SECOND = 24 * 60 * 60
+# 統計結果快取時間（秒）
+RESEND_STATS_REFRESH_SECOND = 300
+# 至少需要的往返時間樣本數，不足時使用固定參數
+RESEND_STATS_MIN_SAMPLES = 5
+# 以往返時間的 p90 乘上倍數作為退避基數，並限制在上下限之間
+RESEND_LATENCY_QUANTILE = 0.9
+RESEND_LATENCY_FACTOR = 2.0
+RESEND_MIN_BACKOFF_SECOND = 30
+RESEND_MAX_BACKOFF_SECOND = 600
+
+
+def latency_quantile(values, q):
+    """取得已排序數列的分位數（nearest-rank），空數列回傳 None"""
+    if not values:
+        return None
+    rank = max(1, math.ceil(q * len(values)))
+    return values[rank - 1]
+
+
+def compute_channel_ack_stats(rows):
+    """由 ACK 資料列計算各頻道的往返時間分布與可達節點
+
+    rows 為 (board_id, lora_node_id, latency_ms, hops) 序列，
+    latency_ms 無法計算時為 None（例如非本機發送的 note），hops 未知時為 None。
+    latency_ms 已扣除 ACK 延遲，網路很快時可能為 0。
+    回傳 {board_id: {'samples', 'latency_p50', 'latency_p90', 'nodes', 'max_hops'}}，時間單位為秒。
+    """
+    latencies = {}
+    nodes = {}
+    max_hops = {}
+    for board_id, lora_node_id, latency_ms, hops in rows:
+        nodes.setdefault(board_id, set()).add(lora_node_id)
+        latencies.setdefault(board_id, [])
+        if latency_ms is not None and latency_ms >= 0:
+            latencies[board_id].append(latency_ms / 1000)
+        if hops is not None and hops >= 0:
+            max_hops[board_id] = max(max_hops.get(board_id, 0), hops)
+
+    stats = {}
+    for board_id, values in latencies.items():
+        values.sort()
+        stats[board_id] = {
+            'samples': len(values),
+            'latency_p50': latency_quantile(values, 0.5),
+            'latency_p90': latency_quantile(values, RESEND_LATENCY_QUANTILE),
+            'nodes': nodes[board_id],
+            'max_hops': max_hops.get(board_id),
+        }
+    return stats
+
+
+def resend_backoff_second(stats, default_backoff_second):
+    """依頻道統計決定重送退避基數（秒），樣本不足時回傳 default_backoff_second"""
+    if not stats or stats['samples'] < RESEND_STATS_MIN_SAMPLES:
+        return default_backoff_second
+    backoff = stats['latency_p90'] * RESEND_LATENCY_FACTOR
+    return min(RESEND_MAX_BACKOFF_SECOND, max(RESEND_MIN_BACKOFF_SECOND, backoff))
+
+
+def resend_target_nodes(stats, default_target):
+    """依頻道近期可達節點數決定需要的 ACK 數量，樣本不足時回傳 default_target"""
+    if not stats or stats['samples'] < RESEND_STATS_MIN_SAMPLES or not stats['nodes']:
+        return default_target
+    return min(default_target, len(stats['nodes']))
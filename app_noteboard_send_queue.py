@@ -0,0 +1,253 @@
+import heapq
+import itertools
+import threading
+import time
+
+# NoteBoard LoRa 發送佇列
+# 待發送的 notes 由寫入事件（建立、變更顏色、封存、ACK 超時）放入優先佇列，
+# 排程器依優先順序取出，並以各頻道的 airtime token bucket 控制發送速度，
+# 取代固定間隔輪詢資料庫、每次只發一筆的做法。
+
+# 優先順序（數字越小越優先）
+PRIORITY_PINNED = 0   # 置頂 note
+PRIORITY_REPLY = 1    # 回覆
+PRIORITY_NEW = 2      # 新 note
+PRIORITY_UPDATE = 3   # 顏色 / 封存更新命令
+PRIORITY_RESEND = 4   # 自動重送
+
+# 佇列項目種類
+KIND_SEND = 'send'
+KIND_UPDATE = 'update'
+KIND_RESEND = 'resend'
+
+# LoRa 封包 airtime 估算（預設以 Meshtastic LongFast 為基準，約 1 kbps）
+# 每個封包另有 preamble 與 Meshtastic header / 加密 overhead
+LORA_PACKET_BASE_AIRTIME_SECOND = 0.15
+LORA_PACKET_OVERHEAD_BYTES = 32
+LORA_AIRTIME_PER_BYTE_SECOND = 0.0075
+
+# 多筆 note 合併發送（/pack）
+# 格式：/pack <長度>:<命令><長度>:<命令>...，長度為命令的字元數，
+# 每個命令都是指定 lora_msg_id 的既有格式（/msg [id,color,author]body 或 /reply <id,color,author>[parent]body），
+# 接收端拆開後逐一以原本的命令處理。
+LORA_PACK_PREFIX = '/pack '
+# 單一 LoRa 文字訊息的大小上限（bytes），Meshtastic 封包 payload 約 230 bytes，保留餘裕
+LORA_MAX_TEXT_BYTES = 200
+
+
+def estimate_airtime(msg):
+    """估算一則訊息的 LoRa airtime（秒），msg 可為文字或已編碼的 bytes"""
+    payload = msg if isinstance(msg, bytes) else msg.encode('utf-8')
+    payload_bytes = len(payload) + LORA_PACKET_OVERHEAD_BYTES
+    return LORA_PACKET_BASE_AIRTIME_SECOND + payload_bytes * LORA_AIRTIME_PER_BYTE_SECOND
+
+
+def pack_lora_messages(msgs):
+    """將多則命令合併為一則 /pack 訊息"""
+    return LORA_PACK_PREFIX + ''.join(f"{len(msg)}:{msg}" for msg in msgs)
+
+
+def unpack_lora_messages(msg):
+    """拆解 /pack 訊息，回傳命令清單；格式錯誤時回傳 None
+
+    只接受 /msg [ 與 /reply < 開頭的命令，不允許巢狀 /pack。
+    """
+    if not msg.startswith(LORA_PACK_PREFIX):
+        return None
+    msgs = []
+    pos = len(LORA_PACK_PREFIX)
+    while pos < len(msg):
+        colon = msg.find(':', pos)
+        length_text = msg[pos:colon]
+        # 只接受 ASCII 數字（str.isdigit() 也接受 '²' 等字元，int() 會拋出 ValueError）
+        if colon == -1 or not (length_text.isascii() and length_text.isdigit()):
+            return None
+        length = int(length_text)
+        sub_msg = msg[colon + 1:colon + 1 + length]
+        if len(sub_msg) != length:
+            return None
+        if not (sub_msg.startswith('/msg [') or sub_msg.startswith('/reply <')):
+            return None
+        msgs.append(sub_msg)
+        pos = colon + 1 + length
+    return msgs or None
+
+
+class AirtimeBucket:
+    """以 airtime 秒數為單位的 token bucket
+
+    每秒補充 rate 秒的 airtime（即 duty cycle），最多累積 capacity 秒。
+    只要 token 大於 0 即可發送，發送後扣除實際估算的 airtime（允許暫時為負），
+    因此不需要在取出佇列前就知道訊息長度。
+    rate <= 0 代表不限制 airtime，隨時可發送。
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    @property
+    def is_unlimited(self):
+        return self.rate <= 0
+
+    def is_ready(self):
+        if self.is_unlimited:
+            return True
+        self._refill()
+        return self.tokens > 0
+
+    def consume(self, airtime):
+        if self.is_unlimited:
+            return
+        self._refill()
+        self.tokens -= airtime
+
+    def wait_time(self):
+        """距離可再次發送的秒數（0 代表現在即可發送）"""
+        if self.is_unlimited:
+            return 0
+        self._refill()
+        if self.tokens > 0:
+            return 0
+        return (-self.tokens) / self.rate + 0.01
+
+
+class SendQueue:
+    """依優先順序排列的待發送 note 佇列
+
+    同一個 note 同一種類只保留一筆，重複加入時保留較高的優先順序；
+    被取代的舊項目留在 heap 中，取出時略過（lazy deletion）。
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._entries = {}  # key: (note_id, kind) -> priority
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+
+    def push(self, board_id, note_id, kind, priority):
+        key = (note_id, kind)
+        with self._lock:
+            current = self._entries.get(key)
+            if current is not None and current <= priority:
+                return False
+            self._entries[key] = priority
+            heapq.heappush(self._heap, (priority, next(self._counter), board_id, note_id, kind))
+        self._wakeup.set()
+        return True
+
+    def pop(self, is_ready):
+        """取出優先順序最高、且 is_ready(board_id, kind) 為 True 的項目，沒有時回傳 None
+
+        回傳 (board_id, note_id, kind, priority, seq)，seq 供 requeue() 放回原本的位置
+        """
+        skipped = []
+        result = None
+        with self._lock:
+            while self._heap:
+                item = heapq.heappop(self._heap)
+                priority, seq, board_id, note_id, kind = item
+                if self._entries.get((note_id, kind)) != priority:
+                    continue
+                if not is_ready(board_id, kind):
+                    skipped.append(item)
+                    continue
+                del self._entries[(note_id, kind)]
+                result = (board_id, note_id, kind, priority, seq)
+                break
+            for item in skipped:
+                heapq.heappush(self._heap, item)
+        return result
+
+    def requeue(self, item):
+        """將 pop() 取出但未處理的項目放回原本的位置"""
+        board_id, note_id, kind, priority, seq = item
+        key = (note_id, kind)
+        with self._lock:
+            current = self._entries.get(key)
+            if current is not None and current <= priority:
+                return
+            self._entries[key] = priority
+            heapq.heappush(self._heap, (priority, seq, board_id, note_id, kind))
+
+    def board_ids(self):
+        """目前佇列中有待發送項目的頻道"""
+        with self._lock:
+            return {item[2] for item in self._heap if self._entries.get((item[3], item[4])) == item[0]}
+
+    def wait(self, timeout):
+        """等待新項目加入或被 wake() 喚醒，最多 timeout 秒"""
+        self._wakeup.wait(timeout)
+        self._wakeup.clear()
+
+    def wake(self):
+        self._wakeup.set()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class DeadlineHeap:
+    """依到期時間（time.time() 秒）排列的計時項目，用於等待設備 ACK 的超時處理
+
+    同一個 key 只保留最後設定的到期時間；被取消或取代的舊項目留在 heap 中，取出時略過（lazy deletion）。
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._deadlines = {}  # key -> deadline
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+
+    def push(self, key, deadline):
+        with self._lock:
+            self._deadlines[key] = deadline
+            heapq.heappush(self._heap, (deadline, key))
+        self._wakeup.set()
+
+    def cancel(self, key):
+        with self._lock:
+            return self._deadlines.pop(key, None) is not None
+
+    def pop_expired(self, now):
+        """取出所有已到期的 key"""
+        expired = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                deadline, key = heapq.heappop(self._heap)
+                if self._deadlines.get(key) != deadline:
+                    continue
+                del self._deadlines[key]
+                expired.append(key)
+        return expired
+
+    def next_deadline(self):
+        """最近的到期時間，沒有項目時回傳 None"""
+        with self._lock:
+            while self._heap and self._deadlines.get(self._heap[0][1]) != self._heap[0][0]:
+                heapq.heappop(self._heap)
+            return self._heap[0][0] if self._heap else None
+
+    def wait(self, max_timeout=None):
+        """等待到最近的到期時間，或有新項目加入時提前返回"""
+        deadline = self.next_deadline()
+        timeout = max_timeout
+        if deadline is not None:
+            timeout = max(0, deadline - time.time())
+            if max_timeout is not None:
+                timeout = min(timeout, max_timeout)
+        self._wakeup.wait(timeout)
+        self._wakeup.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._deadlines)
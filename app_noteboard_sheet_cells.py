@@ -0,0 +1,331 @@
+import re
+import sys
+import time
+
+from app_noteboard_db import get_db_connection
+
+# NoteBoard 試算表（TableView）資料實體化
+# 試算表的每一格都是一則 {sheetId:Cell}內容 格式的 note，同一格以 created_at 最新、未刪除的 note 為準。
+# notes 的 is_table / sheet_id / cell_id 欄位由 trigger 依 body 填入，查詢時不需以 GLOB 掃描 body。
+# sheet_cells 表保存每一格目前的內容，由 trigger 將新增或異動的 table note 放入 sheet_cells_pending，
+# 寫入 note 的函式與讀取 table base 時再逐筆套用，不需每次重播全部歷史 notes。
+# 既有資料庫可執行 python3 app_noteboard_sheet_cells.py rebuild 重建。
+
+SHEET_DELETE_RE = re.compile(r'^\{([a-z0-9]{6}):delete\}$')
+SHEET_TITLE_RE = re.compile(r'^\{([a-z0-9]{6}):title\}([\s\S]*)$')
+TABLE_CELL_RE = re.compile(r'^\{([a-z0-9]{6}):((?:[A-Z][1-9]\d{0,2})|title)\}([\s\S]*)$', re.DOTALL)
+
+# 與 TABLE_CELL_RE / SHEET_DELETE_RE 對應的 SQL GLOB（只比對開頭，實際格式再以 regex 判斷）
+TABLE_NOTE_GLOB = '{[a-z0-9][a-z0-9][a-z0-9][a-z0-9][a-z0-9][a-z0-9]:*'
+
+# trigger 監看的 notes 欄位（影響 cell 內容或是否有效）
+SHEET_CELLS_TRACKED_COLUMNS = ('board_id', 'body', 'bg_color', 'deleted', 'created_at')
+
+# 由 body 取出 sheet_id 與 cell_id（{sheetId:cellId}...，cellId 可為 A1、title、delete）
+_SHEET_ID_SQL = "substr({body}, 2, 6)"
+_CELL_ID_SQL = "CASE WHEN instr({body}, '}}') > 9 THEN substr({body}, 9, instr({body}, '}}') - 9) END"
+
+
+def parse_table_note(body):
+    """解析 table note，回傳 ('delete', sheet_id, None, None) 或 ('cell', sheet_id, cell_id, content)，非 table note 時回傳 None"""
+    body = (body or '').strip()
+    m = SHEET_DELETE_RE.match(body)
+    if m:
+        return ('delete', m.group(1), None, None)
+    m = TABLE_CELL_RE.match(body)
+    if m:
+        return ('cell', m.group(1), m.group(2), m.group(3))
+    return None
+
+
+def ensure_table_note_schema(cursor):
+    """建立維護 notes.is_table / sheet_id / cell_id 的 trigger 與索引（可重複執行，欄位需已存在）"""
+    sheet_id_sql = _SHEET_ID_SQL.format(body='NEW.body')
+    cell_id_sql = _CELL_ID_SQL.format(body='NEW.body')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_notes_table_insert AFTER INSERT ON notes
+        WHEN NEW.body GLOB '{TABLE_NOTE_GLOB}'
+        BEGIN
+            UPDATE notes SET is_table = 1, sheet_id = {sheet_id_sql}, cell_id = {cell_id_sql}
+            WHERE rowid = NEW.rowid;
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_notes_table_update AFTER UPDATE OF body ON notes
+        BEGIN
+            UPDATE notes SET
+                is_table = (NEW.body GLOB '{TABLE_NOTE_GLOB}'),
+                sheet_id = CASE WHEN NEW.body GLOB '{TABLE_NOTE_GLOB}' THEN {sheet_id_sql} END,
+                cell_id = CASE WHEN NEW.body GLOB '{TABLE_NOTE_GLOB}' THEN {cell_id_sql} END
+            WHERE rowid = NEW.rowid;
+        END
+    ''')
+    # 留言列表、自動封存：依頻道、是否封存、是否為 table note 分段，再依置頂與時間排序
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_notes_board_list
+        ON notes(board_id, deleted, is_table, is_pined_note, created_at)
+    ''')
+    # 留言列表中的 table notes：依時間排序（不含置頂排序）
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_notes_board_table ON notes(board_id, is_table, deleted, created_at)')
+    # 試算表：依工作表與儲存格查詢
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_notes_sheet_cell ON notes(sheet_id, cell_id, created_at)')
+
+
+def backfill_table_note_columns(cursor):
+    """依 body 填入既有 notes 的 is_table / sheet_id / cell_id，回傳 table note 筆數"""
+    cursor.execute(f'''
+        UPDATE notes SET is_table = 1, sheet_id = {_SHEET_ID_SQL.format(body='body')},
+                         cell_id = {_CELL_ID_SQL.format(body='body')}
+        WHERE body GLOB ?
+    ''', (TABLE_NOTE_GLOB,))
+    return cursor.rowcount
+
+
+def ensure_sheet_cells_schema(cursor):
+    """建立 sheet_cells 相關資料表與 trigger（可重複執行），回傳 sheet_cells 表是否為新建立"""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sheet_cells'")
+    is_new = cursor.fetchone() is None
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sheet_cells (
+            board_id TEXT NOT NULL,
+            sheet_id TEXT NOT NULL,
+            cell_id TEXT NOT NULL,
+            content TEXT NOT NULL,
+            bg_color TEXT,
+            note_id TEXT NOT NULL,
+            created_at INTEGER NOT NULL,
+            updated_at INTEGER NOT NULL,
+            PRIMARY KEY (board_id, sheet_id, cell_id)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_sheet_cells_note_id ON sheet_cells(note_id)')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS deleted_sheets (
+            board_id TEXT NOT NULL,
+            sheet_id TEXT NOT NULL,
+            note_id TEXT NOT NULL,
+            created_at INTEGER NOT NULL,
+            PRIMARY KEY (board_id, sheet_id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sheet_cells_pending (
+            note_id TEXT PRIMARY KEY,
+            board_id TEXT NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_sheet_cells_pending_board ON sheet_cells_pending(board_id)')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_sheet_cells_insert AFTER INSERT ON notes
+        WHEN NEW.body GLOB '{TABLE_NOTE_GLOB}'
+        BEGIN
+            INSERT OR IGNORE INTO sheet_cells_pending (note_id, board_id) VALUES (NEW.note_id, NEW.board_id);
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_sheet_cells_update
+        AFTER UPDATE OF {', '.join(SHEET_CELLS_TRACKED_COLUMNS)} ON notes
+        WHEN OLD.body GLOB '{TABLE_NOTE_GLOB}' OR NEW.body GLOB '{TABLE_NOTE_GLOB}'
+        BEGIN
+            INSERT OR IGNORE INTO sheet_cells_pending (note_id, board_id) VALUES (NEW.note_id, NEW.board_id);
+        END
+    ''')
+    return is_new
+
+
+def _is_sheet_deleted(cursor, board_id, sheet_id):
+    cursor.execute('SELECT 1 FROM deleted_sheets WHERE board_id = ? AND sheet_id = ?', (board_id, sheet_id))
+    return cursor.fetchone() is not None
+
+
+def _recompute_sheet_cell(cursor, board_id, sheet_id, cell_id, timestamp):
+    """以最新一則未刪除的 note 重新計算單一格（原本的來源 note 被刪除或修改時使用）"""
+    if not _is_sheet_deleted(cursor, board_id, sheet_id):
+        cursor.execute('''
+            SELECT note_id, body, bg_color, created_at FROM notes
+            WHERE sheet_id = ? AND cell_id = ? AND board_id = ? AND deleted = 0
+            ORDER BY created_at DESC
+        ''', (sheet_id, cell_id, board_id))
+        for note_id, body, bg_color, created_at in cursor.fetchall():
+            parsed = parse_table_note(body)
+            if parsed and parsed[0] == 'cell' and parsed[1] == sheet_id and parsed[2] == cell_id:
+                cursor.execute('''
+                    INSERT OR REPLACE INTO sheet_cells
+                        (board_id, sheet_id, cell_id, content, bg_color, note_id, created_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (board_id, sheet_id, cell_id, parsed[3], bg_color or '', note_id, created_at, timestamp))
+                return
+    cursor.execute('DELETE FROM sheet_cells WHERE board_id = ? AND sheet_id = ? AND cell_id = ?',
+                   (board_id, sheet_id, cell_id))
+
+
+def _rebuild_sheet(cursor, board_id, sheet_id, timestamp):
+    """重播單一工作表的所有 table notes（刪除指令本身被刪除或修改時使用）"""
+    cursor.execute('DELETE FROM sheet_cells WHERE board_id = ? AND sheet_id = ?', (board_id, sheet_id))
+    cursor.execute('DELETE FROM deleted_sheets WHERE board_id = ? AND sheet_id = ?', (board_id, sheet_id))
+    cursor.execute('''
+        SELECT note_id, body, bg_color, created_at FROM notes
+        WHERE sheet_id = ? AND board_id = ? AND deleted = 0
+        ORDER BY created_at ASC
+    ''', (sheet_id, board_id))
+    sheet_cells = {}
+    for note_id, body, bg_color, created_at in cursor.fetchall():
+        parsed = parse_table_note(body)
+        if not parsed or parsed[1] != sheet_id:
+            continue
+        if parsed[0] == 'delete':
+            cursor.execute('''
+                INSERT INTO deleted_sheets (board_id, sheet_id, note_id, created_at) VALUES (?, ?, ?, ?)
+            ''', (board_id, sheet_id, note_id, created_at))
+            return
+        sheet_cells[parsed[2]] = (parsed[3], bg_color or '', note_id, created_at)
+    cursor.executemany('''
+        INSERT INTO sheet_cells (board_id, sheet_id, cell_id, content, bg_color, note_id, created_at, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', [(board_id, sheet_id, cell_id) + value + (timestamp,) for cell_id, value in sheet_cells.items()])
+
+
+def apply_pending_sheet_cells(cursor, board_id=None):
+    """套用 sheet_cells_pending 中待處理的 table notes（由呼叫端 commit），回傳處理筆數
+
+    board_id 為 None 時處理所有頻道。
+    """
+    if board_id is None:
+        cursor.execute('SELECT note_id FROM sheet_cells_pending')
+    else:
+        cursor.execute('SELECT note_id FROM sheet_cells_pending WHERE board_id = ?', (board_id,))
+    pending_note_ids = [row[0] for row in cursor.fetchall()]
+    timestamp = int(time.time() * 1000)
+
+    for note_id in pending_note_ids:
+        # 原本以此 note 為來源的格子，note 被刪除或內容改變時需要重新計算
+        cursor.execute('SELECT board_id, sheet_id, cell_id FROM sheet_cells WHERE note_id = ?', (note_id,))
+        affected_cells = set(cursor.fetchall())
+
+        cursor.execute('SELECT board_id, body, bg_color, created_at, deleted FROM notes WHERE note_id = ?', (note_id,))
+        note = cursor.fetchone()
+        parsed = parse_table_note(note[1]) if note and note[4] == 0 else None
+
+        # 工作表刪除指令本身失效時，重播該工作表（可能有其他刪除指令，或恢復為未刪除）
+        cursor.execute('SELECT board_id, sheet_id FROM deleted_sheets WHERE note_id = ?', (note_id,))
+        for sheet_board_id, sheet_id in cursor.fetchall():
+            if not (parsed and parsed[0] == 'delete' and (note[0], parsed[1]) == (sheet_board_id, sheet_id)):
+                _rebuild_sheet(cursor, sheet_board_id, sheet_id, timestamp)
+                affected_cells = {cell for cell in affected_cells if cell[:2] != (sheet_board_id, sheet_id)}
+
+        if parsed and parsed[0] == 'delete':
+            note_board_id, sheet_id = note[0], parsed[1]
+            cursor.execute('''
+                INSERT OR IGNORE INTO deleted_sheets (board_id, sheet_id, note_id, created_at)
+                VALUES (?, ?, ?, ?)
+            ''', (note_board_id, sheet_id, note_id, note[3]))
+            cursor.execute('DELETE FROM sheet_cells WHERE board_id = ? AND sheet_id = ?', (note_board_id, sheet_id))
+            affected_cells = {cell for cell in affected_cells if cell[:2] != (note_board_id, sheet_id)}
+        elif parsed and not _is_sheet_deleted(cursor, note[0], parsed[1]):
+            note_board_id, sheet_id, cell_id, content = note[0], parsed[1], parsed[2], parsed[3]
+            # 只有比目前內容新（或相同時間）的 note 才會覆蓋
+            cursor.execute('''
+                INSERT INTO sheet_cells (board_id, sheet_id, cell_id, content, bg_color, note_id, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (board_id, sheet_id, cell_id) DO UPDATE SET
+                    content = excluded.content, bg_color = excluded.bg_color, note_id = excluded.note_id,
+                    created_at = excluded.created_at, updated_at = excluded.updated_at
+                WHERE excluded.created_at >= sheet_cells.created_at
+            ''', (note_board_id, sheet_id, cell_id, content, note[2] or '', note_id, note[3], timestamp))
+            affected_cells.discard((note_board_id, sheet_id, cell_id))
+
+        for cell_board_id, sheet_id, cell_id in affected_cells:
+            _recompute_sheet_cell(cursor, cell_board_id, sheet_id, cell_id, timestamp)
+
+        cursor.execute('DELETE FROM sheet_cells_pending WHERE note_id = ?', (note_id,))
+
+    return len(pending_note_ids)
+
+
+def get_sheet_cells(board_id):
+    """取得頻道所有工作表目前的內容，回傳 (cells, titles, deleted_sheets)
+
+    cells 為 [{'s': sheetId, 'r': 列號, 'c': 欄 index, 't': 內容, 'bg': 背景色}, ...]，titles 為 {sheetId: 標題}
+    """
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        if apply_pending_sheet_cells(cursor, board_id):
+            conn.commit()
+
+        cells = []
+        titles = {}
+        cursor.execute('SELECT sheet_id, cell_id, content, bg_color FROM sheet_cells WHERE board_id = ?', (board_id,))
+        for sheet_id, cell_id, content, bg_color in cursor.fetchall():
+            if cell_id == 'title':
+                titles[sheet_id] = content.strip()
+            else:
+                # cell_id 格式為 "A1"~"Z999"，拆分為 col index 與 row number
+                cells.append({
+                    's': sheet_id,
+                    'r': int(cell_id[1:]),
+                    'c': ord(cell_id[0]) - 65,  # A=0, B=1, ...
+                    't': content,
+                    'bg': bg_color or ''
+                })
+
+        cursor.execute('SELECT sheet_id FROM deleted_sheets WHERE board_id = ?', (board_id,))
+        deleted_sheets = [row[0] for row in cursor.fetchall()]
+        return cells, titles, deleted_sheets
+    finally:
+        conn.close()
+
+
+def rebuild_sheet_cells(cursor):
+    """依 created_at 重播所有 table notes，重建 sheet_cells 與 deleted_sheets（由呼叫端 commit），回傳格子數量"""
+    cursor.execute('DELETE FROM sheet_cells')
+    cursor.execute('DELETE FROM deleted_sheets')
+    cursor.execute('DELETE FROM sheet_cells_pending')
+
+    # key: (board_id, sheet_id, cell_id) -> (content, bg_color, note_id, created_at)
+    sheet_cells = {}
+    deleted_sheets = {}
+    cursor.execute('''
+        SELECT note_id, board_id, body, bg_color, created_at FROM notes
+        WHERE is_table = 1 AND deleted = 0
+        ORDER BY created_at ASC
+    ''')
+    for note_id, board_id, body, bg_color, created_at in cursor.fetchall():
+        parsed = parse_table_note(body)
+        if not parsed:
+            continue
+        sheet_key = (board_id, parsed[1])
+        if parsed[0] == 'delete':
+            deleted_sheets.setdefault(sheet_key, (note_id, created_at))
+            continue
+        if sheet_key in deleted_sheets:
+            continue
+        sheet_cells[(board_id, parsed[1], parsed[2])] = (parsed[3], bg_color or '', note_id, created_at)
+
+    # 較晚出現的刪除指令也會清除先前累積的格子
+    timestamp = int(time.time() * 1000)
+    cursor.executemany('''
+        INSERT INTO sheet_cells (board_id, sheet_id, cell_id, content, bg_color, note_id, created_at, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', [key + value + (timestamp,) for key, value in sheet_cells.items() if key[:2] not in deleted_sheets])
+    cursor.executemany('''
+        INSERT INTO deleted_sheets (board_id, sheet_id, note_id, created_at) VALUES (?, ?, ?, ?)
+    ''', [key + value for key, value in deleted_sheets.items()])
+    return sum(1 for key in sheet_cells if key[:2] not in deleted_sheets)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] != 'rebuild':
+        print("用法: python3 app_noteboard_sheet_cells.py rebuild")
+        print("  依現有 notes 重建試算表資料（sheet_cells）")
+        sys.exit(1)
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    ensure_table_note_schema(cursor)
+    backfill_table_note_columns(cursor)
+    ensure_sheet_cells_schema(cursor)
+    count = rebuild_sheet_cells(cursor)
+    conn.commit()
+    conn.close()
+    print(f"[試算表] 已重建 sheet_cells，共 {count} 格")
@@ -0,0 +1,596 @@
+import os
+import glob
+import hashlib
+import math
+import sqlite3
+import threading
+import time
+from collections import namedtuple, OrderedDict
+from urllib.parse import quote
+
+# NoteBoard 離線地圖 tile 存取層
+# 每個 .mbtiles 檔案維持一條長期開啟的唯讀連線（mode=ro、immutable=1、mmap），
+# 並以 LRU 快取最近讀取的 tile（依總大小限制），避免每個 tile 請求都重新開檔、讀取 SD 卡。
+# 檔案被替換（mtime 或大小改變）或刪除時，自動關閉舊連線並清除該 tileset 的快取。
+# tileset 的 metadata 也在此登錄，並提供衍生資料（style.json、tilejson 等）的快取空間，
+# 檔案新增、替換或刪除時自動重新讀取。
+# 每個 tile 附帶 ETag（內容雜湊，或 map/images 格式的 tile_id），每個 tileset 依檔案狀態產生版本字串，
+# 讓 tile URL 可帶版本並使用 immutable 快取。
+# 內容相同的 tile（例如海面、空白 tile）在快取中共用同一份資料；
+# 每個 zoom 以點陣圖記錄已知不存在的 tile，空白區域的重複請求不需再查詢 SQLite。
+# 大型 tile 不載入記憶體，回應時以 SQLite blob I/O（Connection.blobopen）分段讀出，
+# 分段回應期間檔案被替換時，舊連線保留到回應結束才關閉；
+# Content-Type 於開啟 tileset 時依 metadata 的 format 決定，不需逐一檢查 tile 內容。
+
+# 唯讀連線使用的 mmap 大小
+MBTILES_MMAP_SIZE = 64 * 1024 * 1024
+# 檢查 .mbtiles 檔案是否變更的最短間隔（秒）
+MBTILES_STAT_INTERVAL_SECOND = 5
+# 超過此大小的 tile 不放入快取，避免單一大 tile 擠掉大量小 tile
+TILE_CACHE_MAX_TILE_BYTES = 512 * 1024
+# 每個 zoom 的缺少 tile 點陣圖上限（bits），tile 範圍超過時只以範圍判斷
+MISSING_TILE_BITMAP_MAX_BITS = 2 * 1024 * 1024
+# 超過此大小的 tile 以 blob I/O 分段回應，不放入快取（Python 3.11 以上才支援，否則一次讀出）
+TILE_STREAM_MIN_BYTES = 128 * 1024
+TILE_STREAM_CHUNK_BYTES = 32 * 1024
+
+TILE_CONTENT_TYPES = {
+    'png': 'image/png',
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'webp': 'image/webp',
+    'pbf': 'application/x-protobuf'
+}
+
+_connections = {}  # tileset -> {'conn', 'path', 'signature', 'version', 'has_images', 'stream_table', 'tile_sql', 'content_type', 'content_encoding', 'bounds', 'missing', 'checked_at', 'streams', 'dropped'}
+# 可重入：TileBlob 被回收時（可能發生在持有鎖的期間）會取得此鎖釋放連線
+_connections_lock = threading.RLock()
+_tilesets = {}  # path -> {'name', 'path', 'signature', 'version', 'metadata', 'checked_at', 'derived'}
+_folders = {}  # folder -> {'paths', 'checked_at', 'key', 'derived'}
+_registry_lock = threading.RLock()
+_missing_lookups_skipped = 0
+
+
+# data 為 bytes 或 TileBlob，content_encoding 為 None 代表未壓縮
+Tile = namedtuple('Tile', 'data etag version content_type content_encoding')
+
+
+class TileBlob:
+    """尚未讀取的大型 tile，回應時以 SQLite blob I/O 分段讀出
+
+    建立時即佔用 tileset 的連線，直到 iter_chunks() 讀完（或中斷）、release() 或物件被回收為止；
+    期間檔案被替換時，舊連線不會被關閉，rowid 仍對應取得 tile 時的檔案內容。
+    """
+
+    def __init__(self, entry, table, rowid, length):
+        self._entry = None
+        self.conn = entry['conn']
+        self.table = table
+        self.rowid = rowid
+        self.length = length
+        _retain_connection(entry)
+        self._entry = entry
+
+    def __len__(self):
+        return self.length
+
+    def iter_chunks(self):
+        try:
+            with self.conn.blobopen(self.table, 'tile_data', self.rowid, readonly=True) as blob:
+                while True:
+                    chunk = blob.read(TILE_STREAM_CHUNK_BYTES)
+                    if not chunk:
+                        break
+                    yield chunk
+        finally:
+            self.release()
+
+    def release(self):
+        """釋放佔用的連線（可重複呼叫）"""
+        entry, self._entry = self._entry, None
+        if entry is not None:
+            _release_connection(entry)
+
+    def __del__(self):
+        self.release()
+
+
+class TileCache:
+    """以總位元組數限制的 tile LRU 快取，key 為 (tileset, z, x, y)，value 為 (tile_data, etag)
+
+    tile 資料依 ETag 存放，ETag 相同（內容相同）的 tile 共用同一份資料，只計算一次大小。
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()  # key -> etag
+        self._buffers = {}  # etag -> [tile_data, 參照數]
+        self._lock = threading.Lock()
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.shared = 0
+
+    def _release(self, etag):
+        buffer = self._buffers[etag]
+        buffer[1] -= 1
+        if buffer[1] == 0:
+            del self._buffers[etag]
+            self.size_bytes -= len(buffer[0])
+
+    def get(self, key):
+        with self._lock:
+            etag = self._items.get(key)
+            if etag is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return self._buffers[etag][0], etag
+
+    def put(self, key, value):
+        data, etag = value
+        size = len(data)
+        if size > min(self.max_bytes, TILE_CACHE_MAX_TILE_BYTES):
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._release(old)
+            buffer = self._buffers.get(etag)
+            if buffer is not None:
+                buffer[1] += 1
+                self.shared += 1
+            else:
+                self._buffers[etag] = [data, 1]
+                self.size_bytes += size
+            self._items[key] = etag
+            while self.size_bytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._release(evicted)
+                self.evictions += 1
+
+    def invalidate(self, tileset):
+        """移除指定 tileset 的所有快取"""
+        with self._lock:
+            for key in [key for key in self._items if key[0] == tileset]:
+                self._release(self._items.pop(key))
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'tiles': len(self._items),
+                'buffers': len(self._buffers),
+                'shared': self.shared,
+                'size_bytes': self.size_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'evictions': self.evictions
+            }
+
+
+class MissingTileMap:
+    """記錄單一 zoom 已知不存在的 tile（TMS 座標）
+
+    以該 zoom 實際有 tile 的欄範圍判斷，範圍外的 tile 一定不存在；
+    範圍內查詢過但不存在的 tile 記錄在點陣圖中（每個 tile 1 bit）。
+    點陣圖的列範圍只用來限制點陣圖大小（例如依 metadata 的 bounds 估計），範圍外的 tile 不記錄，仍需查詢 SQLite。
+    """
+
+    def __init__(self, columns, rows):
+        self.columns = columns  # (min_col, max_col)，該 zoom 沒有 tile 時為 None
+        self.rows = rows  # 點陣圖涵蓋的 (min_row, max_row)
+        self.bits = None
+        if columns:
+            min_col, max_col = columns
+            min_row, max_row = rows
+            self.width = max_col - min_col + 1
+            count = self.width * max(0, max_row - min_row + 1)
+            if 0 < count <= MISSING_TILE_BITMAP_MAX_BITS:
+                self.bits = bytearray((count + 7) // 8)
+
+    def _index(self, col, row):
+        min_row, max_row = self.rows
+        if self.bits is None or not (min_row <= row <= max_row):
+            return None
+        return (row - min_row) * self.width + (col - self.columns[0])
+
+    def contains(self, col, row):
+        if self.columns is None:
+            return True
+        min_col, max_col = self.columns
+        if not (min_col <= col <= max_col):
+            return True
+        index = self._index(col, row)
+        return index is not None and bool(self.bits[index >> 3] & (1 << (index & 7)))
+
+    def add(self, col, row):
+        if self.columns is None or not (self.columns[0] <= col <= self.columns[1]):
+            return
+        index = self._index(col, row)
+        if index is not None:
+            self.bits[index >> 3] |= 1 << (index & 7)
+
+    def size_bytes(self):
+        return len(self.bits) if self.bits is not None else 0
+
+
+tile_cache = TileCache(16 * 1024 * 1024)
+
+
+def configure_tile_cache(max_bytes):
+    """設定 tile 快取大小（bytes），0 代表停用快取"""
+    global tile_cache
+    tile_cache = TileCache(max(0, int(max_bytes)))
+
+
+def _file_signature(path):
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _tileset_version(signature):
+    """由檔案狀態（mtime、大小）產生 tileset 版本字串，檔案替換後版本即改變"""
+    return hashlib.blake2b(repr(signature).encode(), digest_size=6).hexdigest()
+
+
+def _has_images_schema(conn):
+    """是否為 map/images 正規化格式（重複的 tile 只存一份於 images，以 tile_id 對應）"""
+    row = conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type IN ('table', 'view') AND name IN ('map', 'images')"
+    ).fetchone()
+    return row[0] == 2
+
+
+def _stream_table(conn, table):
+    """可用 blob I/O 讀取 tile_data 的資料表名稱，不支援時回傳 None（舊版 Python、view 或 WITHOUT ROWID 表）"""
+    if not hasattr(conn, 'blobopen'):
+        return None
+    try:
+        conn.execute(f'SELECT rowid FROM {table} LIMIT 1').fetchone()
+    except sqlite3.Error:
+        return None
+    row = conn.execute("SELECT type FROM sqlite_master WHERE name = ?", (table,)).fetchone()
+    return table if row and row[0] == 'table' else None
+
+
+def _tile_sql(has_images, stream_table):
+    """查詢單一 tile 的 SQL，回傳 (長度, 內容, tile_id, rowid)
+
+    內容只在長度小於第一、二個參數（負數代表不限）時讀出，其餘以 rowid 分段讀取。
+    """
+    rowid = 'rowid' if stream_table else 'NULL'
+    if has_images:
+        return f'''
+            SELECT length(images.tile_data),
+                   CASE WHEN ? < 0 OR length(images.tile_data) < ? THEN images.tile_data END,
+                   images.tile_id, images.{rowid}
+            FROM map
+            JOIN images ON images.tile_id = map.tile_id
+            WHERE map.zoom_level = ? AND map.tile_column = ? AND map.tile_row = ?
+        '''
+    return f'''
+        SELECT length(tile_data),
+               CASE WHEN ? < 0 OR length(tile_data) < ? THEN tile_data END,
+               NULL, {rowid}
+        FROM tiles
+        WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?
+    '''
+
+
+def _sniff_content_headers(head):
+    """依 tile 開頭位元組判斷 (Content-Type, Content-Encoding)"""
+    if head[:8] == b'\x89\x50\x4E\x47\x0D\x0A\x1A\x0A':
+        return 'image/png', None
+    if head[:2] == b'\xFF\xD8':
+        return 'image/jpeg', None
+    if head[:2] == b'\x1f\x8b':
+        return 'application/x-protobuf', 'gzip'
+    return 'application/octet-stream', None
+
+
+def _tile_content_headers(conn, table):
+    """依 metadata 的 format 決定 tileset 的 (Content-Type, Content-Encoding)
+
+    pbf 是否經 gzip 壓縮由第一個 tile 判斷，不支援同一個 tileset 混用 gzip 與未壓縮的 pbf tile；
+    metadata 沒有可辨識的 format 時改以第一個 tile 的內容判斷。
+    """
+    try:
+        row = conn.execute("SELECT value FROM metadata WHERE name = 'format'").fetchone()
+    except sqlite3.Error:
+        row = None
+    tile_format = str(row[0]).strip().lower() if row and row[0] else ''
+    sample = conn.execute(f'SELECT substr(tile_data, 1, 8) FROM {table} LIMIT 1').fetchone()
+    head = bytes(sample[0]) if sample and sample[0] else b''
+
+    if tile_format not in TILE_CONTENT_TYPES:
+        return _sniff_content_headers(head)
+    if tile_format == 'pbf' and head[:2] == b'\x1f\x8b':
+        return TILE_CONTENT_TYPES['pbf'], 'gzip'
+    return TILE_CONTENT_TYPES[tile_format], None
+
+
+def _metadata_bounds(conn):
+    """metadata 的 bounds（west, south, east, north），沒有或格式錯誤時回傳 None"""
+    try:
+        row = conn.execute("SELECT value FROM metadata WHERE name = 'bounds'").fetchone()
+        bounds = [float(value) for value in str(row[0]).split(',')] if row and row[0] else []
+    except (sqlite3.Error, ValueError):
+        return None
+    if len(bounds) != 4 or not all(math.isfinite(value) for value in bounds):
+        return None
+    return bounds
+
+
+def _bounds_tms_rows(bounds, z):
+    """bounds 在 zoom z 涵蓋的 TMS 列範圍（前後各多一列），沒有 bounds 時為整個 zoom"""
+    last_row = 2 ** z - 1
+    if bounds is None:
+        return 0, last_row
+
+    def xyz_row(lat):
+        lat = math.radians(max(-85.0511, min(85.0511, lat)))
+        return int((1 - math.log(math.tan(lat) + 1 / math.cos(lat)) / math.pi) / 2 * 2 ** z)
+
+    # XYZ 的 y 由北往南遞增，TMS 的 row 由南往北遞增
+    south, north = min(bounds[1], bounds[3]), max(bounds[1], bounds[3])
+    min_row = last_row - xyz_row(south) - 1
+    max_row = last_row - xyz_row(north) + 1
+    return max(0, min_row), min(last_row, max_row)
+
+
+def _open_mbtiles(path):
+    """以唯讀方式開啟 .mbtiles（immutable=1 不做檔案鎖定與變更偵測）"""
+    uri = f"file:{quote(path)}?mode=ro&immutable=1"
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    conn.execute(f'PRAGMA mmap_size = {MBTILES_MMAP_SIZE}')
+    return conn
+
+
+def _drop_connection(tileset):
+    """移除 tileset 的連線並清除快取；仍有 TileBlob 分段回應中時，連線在最後一個回應結束後才關閉"""
+    entry = _connections.pop(tileset, None)
+    if entry is None:
+        return
+    entry['dropped'] = True
+    if not entry['streams']:
+        _close_entry(entry)
+    tile_cache.invalidate(tileset)
+
+
+def _close_entry(entry):
+    try:
+        entry['conn'].close()
+    except sqlite3.Error:
+        pass
+
+
+def _retain_connection(entry):
+    with _connections_lock:
+        entry['streams'] += 1
+
+
+def _release_connection(entry):
+    with _connections_lock:
+        entry['streams'] -= 1
+        if entry['dropped'] and not entry['streams']:
+            _close_entry(entry)
+
+
+def get_mbtiles_connection(tileset, path, force_check=False):
+    """取得 tileset 的共用唯讀連線，檔案不存在時回傳 None
+
+    每 MBTILES_STAT_INTERVAL_SECOND 秒最多檢查一次檔案（force_check=True 時立即檢查），
+    檔案被替換時重新開啟連線並清除該 tileset 的 tile 快取。
+    呼叫端不可關閉取得的連線。
+    """
+    entry = _get_connection_entry(tileset, path, force_check)
+    return entry['conn'] if entry else None
+
+
+def _get_connection_entry(tileset, path, force_check=False):
+    path = os.path.abspath(path)
+    now = time.time()
+    with _connections_lock:
+        entry = _connections.get(tileset)
+        if (entry and entry['path'] == path and not force_check
+                and now - entry['checked_at'] < MBTILES_STAT_INTERVAL_SECOND):
+            return entry
+
+        try:
+            signature = _file_signature(path)
+        except FileNotFoundError:
+            _drop_connection(tileset)
+            return None
+
+        if entry and entry['path'] == path and entry['signature'] == signature:
+            entry['checked_at'] = now
+            return entry
+
+        if entry:
+            print(f"[地圖] {tileset}.mbtiles 已變更，重新開啟")
+        _drop_connection(tileset)
+        conn = _open_mbtiles(path)
+        has_images = _has_images_schema(conn)
+        tile_table = 'images' if has_images else 'tiles'
+        stream_table = _stream_table(conn, tile_table)
+        content_type, content_encoding = _tile_content_headers(conn, tile_table)
+        entry = {
+            'conn': conn,
+            'path': path,
+            'signature': signature,
+            'version': _tileset_version(signature),
+            'has_images': has_images,
+            'stream_table': stream_table,
+            'tile_sql': _tile_sql(has_images, stream_table),
+            'content_type': content_type,
+            'content_encoding': content_encoding,
+            'bounds': _metadata_bounds(conn),
+            'missing': {},
+            'checked_at': now,
+            'streams': 0,
+            'dropped': False
+        }
+        _connections[tileset] = entry
+        return entry
+
+
+def _get_missing_tile_map(entry, z):
+    """取得 zoom 的缺少 tile 記錄，第一次使用時查詢該 zoom 的欄範圍
+
+    只查詢 MIN / MAX(tile_column)，可直接由 (zoom_level, tile_column, tile_row) 索引取得，
+    不需掃描該 zoom 的所有 tile（同時查詢 tile_row 範圍會逐筆掃描索引）。
+    """
+    missing = entry['missing'].get(z)
+    if missing is None:
+        table = 'map' if entry['has_images'] else 'tiles'
+        conn = entry['conn']
+        min_col = conn.execute(f'SELECT MIN(tile_column) FROM {table} WHERE zoom_level = ?', (z,)).fetchone()[0]
+        max_col = conn.execute(f'SELECT MAX(tile_column) FROM {table} WHERE zoom_level = ?', (z,)).fetchone()[0]
+        columns = (min_col, max_col) if min_col is not None else None
+        missing = MissingTileMap(columns, _bounds_tms_rows(entry['bounds'], z))
+        entry['missing'][z] = missing
+    return missing
+
+
+def read_tile(tileset, path, z, x, y):
+    """讀取 tile（XYZ 座標），優先使用快取，回傳 Tile
+
+    超過 TILE_STREAM_MIN_BYTES 的 tile 以 TileBlob 回傳，由呼叫端分段讀出。
+    tileset 不存在時拋出 FileNotFoundError，tile 不存在時回傳 None。
+    """
+    global _missing_lookups_skipped
+    # 先確認檔案狀態（有節流），檔案被替換時會一併清除快取
+    entry = _get_connection_entry(tileset, path)
+    if entry is None:
+        raise FileNotFoundError(path)
+
+    key = (tileset, z, x, y)
+    cached = tile_cache.get(key)
+    if cached is not None:
+        return Tile(cached[0], cached[1], entry['version'], entry['content_type'], entry['content_encoding'])
+
+    # MBTiles 使用 TMS 座標系統，需要轉換 y 座標
+    tms_y = (2 ** z) - 1 - y
+    missing = _get_missing_tile_map(entry, z)
+    if missing.contains(x, tms_y):
+        _missing_lookups_skipped += 1
+        return None
+
+    # 大型 tile 只取 rowid 與長度，不讀出內容
+    max_inline = TILE_STREAM_MIN_BYTES if entry['stream_table'] else -1
+    row = entry['conn'].execute(entry['tile_sql'], (max_inline, max_inline, z, x, tms_y)).fetchone()
+    if row is None or not row[0]:
+        missing.add(x, tms_y)
+        return None
+
+    length, data, tile_id, rowid = row
+    if tile_id is not None:
+        etag = hashlib.blake2b(f"{entry['version']}:{tile_id}".encode(), digest_size=10).hexdigest()
+    elif data is None:
+        # 不讀出內容計算雜湊，同一版本檔案中同座標的 tile 內容不變
+        etag = hashlib.blake2b(f"{entry['version']}:{z}/{x}/{y}".encode(), digest_size=10).hexdigest()
+    else:
+        etag = hashlib.blake2b(data, digest_size=10).hexdigest()
+
+    if data is None:
+        data = TileBlob(entry, entry['stream_table'], rowid, length)
+    else:
+        tile_cache.put(key, (data, etag))
+    return Tile(data, etag, entry['version'], entry['content_type'], entry['content_encoding'])
+
+
+def missing_tile_stats():
+    """缺少 tile 記錄的統計資料"""
+    with _connections_lock:
+        maps = [missing for entry in _connections.values() for missing in entry['missing'].values()]
+    return {
+        'zoom_levels': len(maps),
+        'bitmap_bytes': sum(missing.size_bytes() for missing in maps),
+        'lookups_skipped': _missing_lookups_skipped
+    }
+
+
+def get_tileset_entry(tileset, path):
+    """取得 tileset 的登錄資料（metadata 與衍生資料快取），檔案不存在時回傳 None
+
+    檔案變更時重新讀取 metadata 並清除衍生資料；metadata 讀取失敗時拋出例外。
+    """
+    path = os.path.abspath(path)
+    now = time.time()
+    with _registry_lock:
+        entry = _tilesets.get(path)
+        if entry and now - entry['checked_at'] < MBTILES_STAT_INTERVAL_SECOND:
+            return entry
+
+        try:
+            signature = _file_signature(path)
+        except FileNotFoundError:
+            _tilesets.pop(path, None)
+            return None
+
+        if entry and entry['signature'] == signature:
+            entry['checked_at'] = now
+            return entry
+
+        conn = get_mbtiles_connection(tileset, path, force_check=True)
+        if conn is None:
+            _tilesets.pop(path, None)
+            return None
+        metadata = dict(conn.execute('SELECT name, value FROM metadata').fetchall())
+        entry = {
+            'name': tileset,
+            'path': path,
+            'signature': signature,
+            'version': _tileset_version(signature),
+            'metadata': metadata,
+            'checked_at': now,
+            'derived': {}
+        }
+        _tilesets[path] = entry
+        return entry
+
+
+def scan_tilesets(folder):
+    """列出資料夾中的 tileset，回傳 ([(tileset, entry)], derived)
+
+    依檔名排序，metadata 讀取失敗的 tileset 其 entry 為 None。
+    derived 為這組 tileset 共用的衍生資料快取，任一檔案新增、替換或刪除時清空。
+    """
+    now = time.time()
+    with _registry_lock:
+        state = _folders.get(folder)
+        if state is None or now - state['checked_at'] >= MBTILES_STAT_INTERVAL_SECOND:
+            paths = sorted(glob.glob(os.path.join(folder, '*.mbtiles')))
+            state = dict(state or {'key': None, 'derived': {}}, paths=paths, checked_at=now)
+            _folders[folder] = state
+
+        tilesets = []
+        for path in state['paths']:
+            filename = os.path.basename(path)
+            tileset = filename[:-8]  # 移除 .mbtiles 副檔名
+            try:
+                entry = get_tileset_entry(tileset, path)
+                if entry is None:
+                    continue
+            except Exception as e:
+                print(f"讀取 {filename} metadata 失敗: {e}")
+                entry = None
+            tilesets.append((tileset, entry))
+
+        key = tuple((tileset, entry['signature'] if entry else None) for tileset, entry in tilesets)
+        if key != state['key']:
+            state['key'] = key
+            state['derived'] = {}
+        return tilesets, state['derived']
+
+
+def close_mbtiles_connections():
+    """關閉所有 .mbtiles 連線並清除快取"""
+    with _connections_lock:
+        for tileset in list(_connections):
+            _drop_connection(tileset)
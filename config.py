@@ -1,9 +1,29 @@
 LOCAL_APP = "noteboard"
 
-# SEND_INTERVAL_SECOND: 排程器的執行間隔（秒），控制留言自動發送至 LoRa 的頻率。
-#   建議設定在 60~180 秒之間，過短可能造成 LoRa 頻寬阻塞。
+# SEND_INTERVAL_SECOND: 排程器從資料庫校正發送佇列、檢查自動補發的間隔（秒）。
+#   新留言會立即進入發送佇列，實際發送速度由下方的 LORA_DUTY_CYCLE_PERCENT 控制。
 SEND_INTERVAL_SECOND = 60
 
+# LORA_DUTY_CYCLE_PERCENT: LoRa 發送可使用的 airtime 比例（%），平均分配給各頻道。
+#   例如 10 代表每 100 秒最多約 10 秒用於發送，過高可能造成 LoRa 頻寬阻塞；設為 0 代表不限制。
+# LORA_AIRTIME_BURST_SECOND: 每個頻道可累積的 airtime 上限（秒），決定短時間內可連續發送的留言數量。
+LORA_DUTY_CYCLE_PERCENT = 10
+LORA_AIRTIME_BURST_SECOND = 5
+
+# LORA_MAX_INFLIGHT: 同時等待設備 ACK 的訊息數量上限（整個設備），預設 1 代表收到 ACK 後才發送下一則。
+# LORA_MAX_INFLIGHT_PER_CHANNEL: 每個頻道同時等待設備 ACK 的訊息數量上限。
+#   多頻道時可將 LORA_MAX_INFLIGHT 設為頻道數，讓各頻道的發送不必等待其他頻道的 ACK，實際速度仍受 duty cycle 限制。
+LORA_MAX_INFLIGHT = 1
+LORA_MAX_INFLIGHT_PER_CHANNEL = 1
+
+# LORA_PACK_NOTES: 將同頻道多筆待發送留言合併為一則 LoRa 訊息（/pack）發送，節省 airtime。
+#   舊版 MeshBridge 節點無法解讀合併訊息，請確認頻道上所有節點皆已更新後再啟用。
+LORA_PACK_NOTES = False
+
+# LORA_AGGREGATE_ACKS: 收到留言後的 USER ACK 在延遲期間內合併為一則 /ack id1,id2,... 發送，減少 ACK 封包數量。
+#   舊版 MeshBridge 節點無法解讀合併 ACK，請確認頻道上所有節點皆已更新後再啟用。
+LORA_AGGREGATE_ACKS = False
+
 # NOTEBOARD_SERVICE_NAME: 服務顯示名稱，用於網頁標題與 ePaper 頁面標題。
 #   可自訂為符合應用場景的名稱，例如："社區公佈欄"、"活動留言板"。
 NOTEBOARD_SERVICE_NAME = "Mesh資訊站"
@@ -18,6 +38,8 @@ NOTEBOARD_SERVICE_NAME = "Mesh資訊站"
 # 多頻道設定（新功能）
 # 格式：[{"name": "頻道名稱", "user_passcode": "進入密碼", "admin_passcode": "管理密碼", "post_passcode": "發文密碼", "max_notes": 便利貼數量上限，超過會自動封存 , "max_archived_notes": 封存的便利貼檢視數量上限}, ...]
 # 每個頻道可設定獨立的密碼與顯示數量
+# 選填 "compact_protocol": True：此頻道改以精簡二進位格式（Meshtastic PRIVATE_APP port）發送命令，節省 airtime。
+#   所有節點不論設定都能解讀此格式，但舊版節點無法解讀，需頻道上所有節點皆更新後再啟用
 
 BOARD_MESSAGE_CHANNELS = [
     {
@@ -39,10 +61,12 @@ REAUTH_ON_CHANNEL_SWITCH = False
 #
 # AUTO_RESEND_MIN_MINUTE: 留言建立後的最短等待時間（分鐘），避免剛發送的留言立即被重發。
 # AUTO_RESEND_MAX_MINUTE: 留言建立後的最長有效時間（分鐘），超過此時間的留言不再自動重發。
+# AUTO_RESEND_ADAPTIVE: 依各頻道近期 ACK 往返時間調整重發間隔，並以近期回覆過 ACK 的節點數作為期望 ACK 數上限，減少無效重發。
 
 AUTO_RESEND_NODE=0
 AUTO_RESEND_MIN_MINUTE=2
 AUTO_RESEND_MAX_MINUTE=30
+AUTO_RESEND_ADAPTIVE=False
 
 # 裝置連線時，自動用主機時間更新設備時間
 # 建議在 Raspberry Pi 有安裝 RTC 模組 (eg. DS3231)並有正確設定時間時，可啟用此功能
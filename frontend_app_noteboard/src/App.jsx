@@ -32,6 +32,33 @@ const COLOR_PALETTE = [
   'hsl(0, 0%, 100%)'       // 15: White
 ]
 
+// 將 delta sync 回應（異動的討論串與 removed note_id）合併進目前的 notes
+function mergeNotesDelta(prevNotes, delta) {
+  const removedIds = new Set(delta.removed || [])
+  const incomingById = new Map()
+  delta.notes.forEach(note => {
+    incomingById.set(note.noteId, note)
+    removedIds.add(note.noteId)
+    ;(note.replyNotes || []).forEach(reply => removedIds.add(reply.noteId))
+  })
+
+  const merged = []
+  prevNotes.forEach(note => {
+    if (incomingById.has(note.noteId)) {
+      merged.push(incomingById.get(note.noteId))
+      incomingById.delete(note.noteId)
+    } else if (!removedIds.has(note.noteId)) {
+      const replyNotes = (note.replyNotes || []).filter(reply => !removedIds.has(reply.noteId))
+      merged.push(replyNotes.length === (note.replyNotes || []).length ? note : { ...note, replyNotes })
+    }
+  })
+  merged.push(...incomingById.values())
+
+  // 與後端相同的排序：置頂優先，其餘依時間由新到舊
+  merged.sort((a, b) => (Number(!!b.isPinedNote) - Number(!!a.isPinedNote)) || ((b.timestamp || 0) - (a.timestamp || 0)))
+  return merged
+}
+
 function randomCode8() {
   const alphabet = 'abcdefghijklmnopqrstuvwxyz0123456789';
   const bytes = crypto.getRandomValues(new Uint8Array(8));
@@ -129,6 +156,7 @@ function App() {
   const filterInputRef = useRef(null)
   const channelSwitchRef = useRef(false)
   const boardViewMemory = useRef({})
+  const notesSyncRef = useRef({ key: null, cursor: null, date: null })
   const [isSubmittingDraft, setIsSubmittingDraft] = useState(false)
   const [isSubmittingReply, setIsSubmittingReply] = useState(false)
   const [isSubmittingEdit, setIsSubmittingEdit] = useState(false)
@@ -176,14 +204,30 @@ function App() {
     }
   }
 
-  const fetchNotes = async (includeDeleted = false, targetBoardId = null, autoSwitchView = false) => {
+  const fetchNotes = async (includeDeleted = false, targetBoardId = null, autoSwitchView = false, useDelta = false) => {
     try {
       const actualBoardId = targetBoardId || boardId
-      const response = await fetch(`/api/boards/${actualBoardId}/notes?is_include_deleted=${includeDeleted}`)
+      const syncKey = `${actualBoardId}|${includeDeleted}`
+      const today = new Date().toDateString()
+      const sync = notesSyncRef.current
+      // 同頻道、同封存設定且未跨日（相對時間文字不變）時，只取 cursor 之後的異動
+      const canDelta = useDelta && sync.key === syncKey && sync.cursor !== null && sync.date === today
+      const sinceParam = canDelta ? `&since=${sync.cursor}` : ''
+      const response = await fetch(`/api/boards/${actualBoardId}/notes?is_include_deleted=${includeDeleted}&include_acks=true${sinceParam}`)
       const data = await response.json()
       if (data.success) {
-        setNotes(data.notes)
-        fetchAllAcks(data.notes, actualBoardId)
+        if (data.delta) {
+          if (notesSyncRef.current.key !== syncKey) return
+          notesSyncRef.current = { key: syncKey, cursor: data.cursor, date: today }
+          if (data.notes.length > 0 || data.removed.length > 0) {
+            setNotes(prev => mergeNotesDelta(prev, data))
+            mergeAcks(data.notes, data.removed)
+          }
+        } else {
+          notesSyncRef.current = { key: syncKey, cursor: data.cursor ?? null, date: today }
+          setNotes(data.notes)
+          fetchAllAcks(data.notes, actualBoardId)
+        }
         // Auto-switch view mode after channel switch
         if (autoSwitchView) {
           const remembered = boardViewMemory.current[actualBoardId]
@@ -195,6 +239,21 @@ function App() {
     }
   }
 
+  const mergeAcks = (notesList, removedIds = []) => {
+    setAckData(prev => {
+      const next = { ...prev }
+      removedIds.forEach(noteId => { delete next[noteId] })
+      notesList.forEach(note => {
+        ;[note, ...(note.replyNotes || [])].forEach(n => {
+          if (n.noteId && Array.isArray(n.acks)) {
+            next[n.noteId] = n.acks
+          }
+        })
+      })
+      return next
+    })
+  }
+
   const fetchAllAcks = async (notesList, targetBoardId = null) => {
     const actualBoardId = targetBoardId || boardId
     const newAckData = {}
@@ -207,17 +266,32 @@ function App() {
       }
     })
     
+    // notes 回應已內含 acks 時直接使用，其餘的以單一批次請求補齊
+    const missingNoteIds = []
     for (const note of allNotes) {
-      if (note.noteId) {
-        try {
-          const response = await fetch(`/api/boards/${actualBoardId}/notes/${note.noteId}/acks`)
-          const data = await response.json()
-          if (data.success) {
-            newAckData[note.noteId] = data.acks
-          }
-        } catch (error) {
-          console.error(`Failed to fetch ACKs for note ${note.noteId}:`, error)
+      if (!note.noteId) continue
+      if (Array.isArray(note.acks)) {
+        newAckData[note.noteId] = note.acks
+      } else {
+        missingNoteIds.push(note.noteId)
+      }
+    }
+    
+    if (missingNoteIds.length > 0) {
+      try {
+        const response = await fetch(`/api/boards/${actualBoardId}/acks`, {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify({ note_ids: missingNoteIds })
+        })
+        const data = await response.json()
+        if (data.success) {
+          missingNoteIds.forEach(noteId => {
+            newAckData[noteId] = data.acks[noteId] || []
+          })
         }
+      } catch (error) {
+        console.error('Failed to fetch ACKs:', error)
       }
     }
     
@@ -423,14 +497,72 @@ function App() {
 
   useEffect(() => {
     if (!socket) return
+    let cancelled = false
 
     const handleRefreshNotes = (data) => {
-      fetchNotes(showArchived, boardId)
+      fetchNotes(showArchived, boardId, false, true)
       fetchGlobalLanOnlyCount()
     }
 
+    // 伺服器推播的 notes 異動；cursor 與本地一致時直接合併，否則改以 HTTP delta 補齊
+    const handleNotesDelta = (data) => {
+      if (data.board_id !== boardId) return
+      const sync = notesSyncRef.current
+      const today = new Date().toDateString()
+      const canMerge = !showArchived && data.cursor !== undefined &&
+        sync.key === `${boardId}|false` && sync.cursor === data.since && sync.date === today
+      if (canMerge) {
+        notesSyncRef.current = { ...sync, cursor: data.cursor }
+        setNotes(prev => mergeNotesDelta(prev, data))
+        mergeAcks(data.notes, data.removed)
+      } else if (data.cursor === undefined || sync.cursor === null || sync.cursor < data.cursor) {
+        fetchNotes(showArchived, boardId, false, true)
+      }
+    }
+
+    // 先以 HTTP（帶目前的 cookie）取得 join token，連線後才驗證的頻道也能加入 room
+    const joinBoard = async () => {
+      if (boardId === DEFAULT_BOARD_ID) return
+      let token = null
+      try {
+        const response = await fetch(`/api/boards/${boardId}/join-token`)
+        const data = await response.json()
+        if (data.success) token = data.token
+      } catch (error) {
+        console.error('Failed to fetch join token:', error)
+      }
+      if (!cancelled) {
+        socket.emit('join_board', { board_id: boardId, token })
+      }
+    }
+
+    // 加入失敗時伺服器讓 socket 留在 legacy room，改依 refresh_notes 更新；先補上目前的內容
+    const handleJoinBoardResult = (data) => {
+      if (data.success || data.board_id !== boardId) return
+      console.warn('join_board failed:', data.error)
+      fetchNotes(showArchived, boardId, false, true)
+    }
+
+    const handleLanOnlyCount = (data) => {
+      setGlobalLanOnlyCount(data.count)
+    }
+
+    // 斷線重連後重新加入頻道 room，並補上斷線期間的異動（首次連線時 notes 尚未載入，略過）
+    const handleReconnect = () => {
+      joinBoard()
+      if (notesSyncRef.current.cursor !== null) {
+        fetchNotes(showArchived, boardId, false, true)
+      }
+    }
+
     const handleAckReceived = (data) => {
-      if (data.note_id) {
+      if (!data.note_id) return
+      if (Array.isArray(data.acks)) {
+        setAckData(prev => ({
+          ...prev,
+          [data.note_id]: data.acks
+        }))
+      } else {
         fetchAckForNote(data.note_id)
       }
     }
@@ -446,12 +578,22 @@ function App() {
       })
     }
 
+    joinBoard()
+    socket.on('connect', handleReconnect)
     socket.on('refresh_notes', handleRefreshNotes)
+    socket.on('notes_delta', handleNotesDelta)
+    socket.on('join_board_result', handleJoinBoardResult)
+    socket.on('lan_only_count', handleLanOnlyCount)
     socket.on('ack_received', handleAckReceived)
     socket.on('usb_connection_error', handleUsbConnectionError)
 
     return () => {
+      cancelled = true
+      socket.off('connect', handleReconnect)
       socket.off('refresh_notes', handleRefreshNotes)
+      socket.off('notes_delta', handleNotesDelta)
+      socket.off('join_board_result', handleJoinBoardResult)
+      socket.off('lan_only_count', handleLanOnlyCount)
       socket.off('ack_received', handleAckReceived)
       socket.off('usb_connection_error', handleUsbConnectionError)
     }
@@ -653,6 +653,6 @@ uniform ${M} ${A} u_${B};
           <circle class="ring-bg" cx="50" cy="50" r="45" />
           <circle class="ring-progress" cx="50" cy="50" r="45" />
         </svg>
-      `,vn.appendChild(Yt),tt=Yt,requestAnimationFrame(()=>{requestAnimationFrame(()=>{tt===Yt&&Yt.classList.add("animating")})})},_n=bt=>{if(!He.current||!w.current)return;Ae.current&&(Ae.current.remove(),Ae.current=null),hn(bt);const vn=document.createElement("div");vn.className="mapview-longpress-popup";const Yt=document.createElement("div");Yt.className="mapview-longpress-title",Yt.textContent="新增便利貼",vn.appendChild(Yt);const jt=document.createElement("div");jt.className="mapview-longpress-coords",jt.textContent=`${bt.lat.toFixed(4)}, ${bt.lng.toFixed(4)}`,vn.appendChild(jt);const sn=document.createElement("div");sn.className="mapview-longpress-actions";const Xt=document.createElement("button");Xt.className="mapview-longpress-btn mapview-longpress-btn-cancel",Xt.textContent="取消",Xt.addEventListener("click",un=>{un.stopPropagation(),wn()}),sn.appendChild(Xt);const Ct=document.createElement("button");Ct.className="mapview-longpress-btn mapview-longpress-btn-create",Ct.textContent="建立",Ct.addEventListener("click",un=>{un.stopPropagation(),wn(),He.current&&He.current(bt.lat,bt.lng)}),sn.appendChild(Ct),vn.appendChild(sn);const Wt=new dr.Popup({closeButton:!1,closeOnClick:!1,anchor:"bottom",offset:[0,-14]}).setLngLat([bt.lng,bt.lat]).setDOMContent(vn).addTo(w.current);Wt.on("close",()=>{xn(),tn(),Ae.current=null}),Ae.current=Wt;const Se=w.current.getCanvasContainer(),Dn=un=>{un.stopPropagation(),un.preventDefault()};Se.addEventListener("click",Dn,{once:!0,capture:!0}),setTimeout(()=>Se.removeEventListener("click",Dn,{capture:!0}),500),setTimeout(()=>{Ae.current&&(De=()=>{wn()},w.current&&w.current.on("click",De))},600)},ge=bt=>{bt.originalEvent.type,!(bt.originalEvent.touches&&bt.originalEvent.touches.length>1)&&(Oe={x:bt.point.x,y:bt.point.y},ze={x:bt.point.x,y:bt.point.y},Ve={lat:bt.lngLat.lat,lng:bt.lngLat.lng},lt=!1,Ye=!0,Ht&&(clearTimeout(Ht),Ht=null),Ee.current&&(clearTimeout(Ee.current),Ee.current=null),Ut(),Ht=setTimeout(()=>{Hn(ze),Ht=null},st),Ee.current=setTimeout(()=>{Ut(),lt=!0,Ye=!1,_n(Ve),Ee.current=null},st+rt))},Mn=bt=>{if(!Oe||!Ye)return;const vn=Math.abs(bt.point.x-Oe.x),Yt=Math.abs(bt.point.y-Oe.y);(vn>ht||Yt>ht)&&(ct(),Oe=null)},Ln=bt=>{if(bt&&bt.originalEvent&&bt.originalEvent.type,lt){lt=!1,Oe=null;return}ct(),Oe=null},Ot=()=>{ct(),Oe=null};return w.current.on("mousedown",ge),w.current.on("mousemove",Mn),w.current.on("mouseup",Ln),w.current.on("touchstart",ge),w.current.on("touchmove",Mn),w.current.on("touchend",Ln),w.current.on("touchcancel",Ln),w.current.on("dragstart",Ot),()=>{ct(),wn(),xn(),w.current&&(w.current.off("mousedown",ge),w.current.off("mousemove",Mn),w.current.off("mouseup",Ln),w.current.off("touchstart",ge),w.current.off("touchmove",Mn),w.current.off("touchend",Ln),w.current.off("touchcancel",Ln),w.current.off("dragstart",Ot))}},[Mt]),Ne?O.jsx("div",{className:"mapview-container",children:O.jsx("div",{className:"view-placeholder",children:O.jsx("div",{className:"view-placeholder-title",children:"載入地圖中..."})})}):$?O.jsxs("div",{className:"mapview-container",children:[O.jsx("div",{ref:k,className:"mapview-map"}),Be.length===0&&O.jsx("div",{className:"mapview-empty-hint",children:"目前沒有包含座標的便利貼"})]}):O.jsx("div",{className:"mapview-container",children:O.jsxs("div",{className:"view-placeholder",children:[O.jsxs("svg",{width:"48",height:"48",viewBox:"0 0 24 24",fill:"none",stroke:"#95a5a6",strokeWidth:"1.5",strokeLinecap:"round",strokeLinejoin:"round",children:[O.jsx("path",{d:"M12 2C8.13 2 5 5.13 5 9c0 5.25 7 13 7 13s7-7.75 7-13c0-3.87-3.13-7-7-7z"}),O.jsx("circle",{cx:"12",cy:"9",r:"2.5"})]}),O.jsx("div",{className:"view-placeholder-title",children:"地圖模式 Map View"}),O.jsx("div",{className:"view-placeholder-desc",children:"地圖功能未啟用（請設定 mbtiles 檔案）"})]})})}const Vp=/^\{([a-z0-9]{6}):((?:[A-Z][1-9]\d{0,2})|title)\}([\s\S]*)$/,RC=/^\{([a-z0-9]{6}):delete\}$/,Sl=15,BC=n=>{if(!n)return!0;const i=n.trim().toLowerCase();return i==="white"||i==="#fff"||i==="#ffffff"||i==="rgb(255, 255, 255)"||i==="rgb(255,255,255)"||i==="hsl(0, 0%, 100%)"||i==="hsl(0,0%,100%)"};function FC(n,i){const l={},p=new Set;if(i){if(i.deleted_sheets&&i.deleted_sheets.forEach(k=>p.add(k)),i.titles)for(const[k,w]of Object.entries(i.titles))p.has(k)||(l[k]||(l[k]={title:"",cells:{}}),l[k].title=w);if(i.cells)for(const k of i.cells){const w=k.s;if(p.has(w))continue;l[w]||(l[w]={title:"",cells:{}});const d=String.fromCharCode(65+k.c)+k.r;l[w].cells[d]={content:k.t,bgColor:k.bg||""}}}return[...n||[]].sort((k,w)=>(k.timestamp||0)-(w.timestamp||0)).forEach(k=>{if(k.archived)return;const w=(k.text||"").trim(),d=w.match(RC);if(d){const N=d[1];p.add(N),delete l[N];return}const $=w.match(Vp);if(!$)return;const ie=$[1],ce=$[2],te=$[3];p.has(ie)||(l[ie]||(l[ie]={title:"",cells:{}}),ce==="title"?l[ie].title=te.trim():l[ie].cells[ce]={content:te,bgColor:k.bgColor||""})}),l}function NC({notes:n,isActive:i,onAddRow:l,headerVisible:p=!0,boardId:_,myUUID:k,colorPalette:w=[],isAdmin:d=!1,postPasscodeRequired:$=!1,loraOnline:ie=!1,sendIntervalSecond:ce=30,globalLanOnlyCount:te=0}){const[N,Fe]=ae.useState(null),[Ne,Ze]=ae.useState(0),[Mt,he]=ae.useState(0),[ne,de]=ae.useState(null),Ee=ae.useRef(null),[Ae,He]=ae.useState(null),[Be,nt]=ae.useState(""),[Lt,At]=ae.useState(Sl),[Pt,rn]=ae.useState(""),[Dt,_t]=ae.useState(Sl),[rt,st]=ae.useState(!1),[ht,Ce]=ae.useState(!1),[Oe,ze]=ae.useState(!1),Ve=ae.useRef(null),tt=ae.useRef(null),[Bt,Ht]=ae.useState(null),[lt,Ye]=ae.useState(!1),[De,ct]=ae.useState("create"),[Ut,xn]=ae.useState(""),[hn,wn]=ae.useState(null),[tn,Hn]=ae.useState(!1),[_n,ge]=ae.useState(!1),[Mn,Ln]=ae.useState(null),[Ot,bt]=ae.useState(!1),[vn,Yt]=ae.useState(!1),[jt,sn]=ae.useState(""),[Xt,Ct]=ae.useState(""),[Wt,Se]=ae.useState(null),Dn=ae.useMemo(()=>!n||n.length===0?0:n.filter(Ie=>{if(Ie.archived)return!1;const gt=(Ie.text||"").trim();return Vp.test(gt)?Ie.status==="LAN only":!1}).length,[n]),[un,bn]=ae.useState(0),Cr=ae.useRef(0);ae.useEffect(()=>{const Ie=te*ce;bn(Ie),Cr.current=Ie},[te,ce]),ae.useEffect(()=>{if(un<=0)return;const Ie=setInterval(()=>{bn(gt=>{const ft=gt-1;return Cr.current=ft,ft<=0?0:ft})},1e3);return()=>clearInterval(Ie)},[un>0]);const je=ie&&Dn>0&&un>0,$t=Ie=>{const gt=Math.floor(Ie/3600),ft=Math.floor(Ie%3600/60),Qt=Ie%60;return gt>0?`${String(gt).padStart(2,"0")}:${String(ft).padStart(2,"0")}:${String(Qt).padStart(2,"0")}`:`${String(ft).padStart(2,"0")}:${String(Qt).padStart(2,"0")}`};ae.useEffect(()=>{if(!_)return;let Ie=!1;return(async()=>{try{const Qt=await(await fetch(`/api/boards/${_}/table-base`)).json();!Ie&&Qt.success&&de(Qt)}catch(ft){console.error("Failed to fetch table base data:",ft)}})(),()=>{Ie=!0}},[_]);const Tt=ae.useMemo(()=>FC(n,ne),[n,ne]),nn=ae.useMemo(()=>Object.keys(Tt),[Tt]);ae.useEffect(()=>{Fe(Ie=>{try{const gt=localStorage.getItem(`tableview_lastSheet_${_}`);if(gt&&nn.includes(gt))return gt}catch{}return Ie&&nn.includes(Ie)?Ie:nn.length>0?nn[0]:null})},[nn,_]),ae.useEffect(()=>{if(N&&_&&nn.includes(N))try{localStorage.setItem(`tableview_lastSheet_${_}`,N)}catch{}},[N,_,nn]),ae.useEffect(()=>{Ht(null),re()},[N,_]),ae.useEffect(()=>{if(Ee.current){const Ie=Ee.current.querySelector(".tv-tab.is-active");Ie&&Ie.scrollIntoView({inline:"center",block:"nearest"})}},[N]),ae.useEffect(()=>{if(!rt)return;const Ie=gt=>{tt.current&&!tt.current.contains(gt.target)&&st(!1)};return document.addEventListener("mousedown",Ie),()=>document.removeEventListener("mousedown",Ie)},[rt]);const nr=()=>{const Ie="abcdefghijklmnopqrstuvwxyz0123456789",gt=crypto.getRandomValues(new Uint8Array(6));let ft="";for(let Qt=0;Qt<6;Qt++)ft+=Ie[gt[Qt]%36];return ft},Rt=ae.useCallback(()=>{ct("create"),xn("新工作表"),wn(null),Ye(!0)},[]),xr=ae.useCallback(Ie=>{Ln(Ie),ge(!0)},[]),Tr=ae.useCallback(()=>{ge(!1),Ln(null)},[]),jr=ae.useCallback(async()=>{const Ie=Mn;if(!_||!Ie||Ot)return;const gt=`{${Ie}:delete}`;bt(!0);try{const Qt=await(await fetch(`/api/boards/${_}/notes`,{method:"POST",headers:{"Content-Type":"application/json"},body:JSON.stringify({text:gt,author_key:k,color_index:Sl,post_passcode:""})})).json();if(Qt.success){if(N===Ie){const En=nn.filter(zn=>zn!==Ie);Fe(En.length>0?En[0]:null)}}else console.error("Failed to delete sheet:",Qt.error)}catch(ft){console.error("Failed to delete sheet:",ft)}finally{bt(!1),ge(!1),Ln(null)}},[_,k,Ot,Mn,N,nn]),Dr=ae.useCallback(Ie=>{ct("rename"),xn(j(Ie)),wn(Ie),Ye(!0)},[Tt]),W=ae.useCallback(()=>{Ye(!1),xn(""),wn(null)},[]),D=ae.useCallback(async(Ie="")=>{if(!_||tn)return;const gt=Ut.trim();if(!gt)return;const ft=De==="create"?nr():hn,Qt=`{${ft}:title}${gt}`;Hn(!0);try{const En={text:Qt,author_key:k,color_index:Sl,post_passcode:Ie};De==="create"&&(En.is_new_sheet=!0);const Un=await(await fetch(`/api/boards/${_}/notes`,{method:"POST",headers:{"Content-Type":"application/json"},body:JSON.stringify(En)})).json();Un.success?(W(),Yt(!1),sn(""),Ct(""),Se(null),De==="create"&&Fe(Un.sheet_id||ft)):Ie?Ct(Un.error||"通關碼錯誤"):console.error("Failed to post sheet title note:",Un.error)}catch(En){console.error("Failed to post sheet title note:",En)}finally{Hn(!1)}},[_,k,De,Ut,hn,tn,W]),L=ae.useCallback(()=>{if(!(!_||tn||!Ut.trim())){if(!d&&$){Se("sheet"),sn(""),Ct(""),Yt(!0);return}D("")}},[_,tn,Ut,d,$,D]),j=Ie=>{const gt=Tt[Ie];return gt&&gt.title?gt.title:Ie},Z=ae.useCallback((Ie,gt,ft,Qt)=>{if(Ae)return;let En=Sl;if(Qt&&w.length>0){const zn=w.findIndex(Un=>Un.toLowerCase()===Qt.toLowerCase());zn!==-1&&(En=zn)}He({sheetId:Ie,cellId:gt}),nt(ft),rn(ft),At(En),_t(En),st(!1)},[Ae,w]),re=ae.useCallback(()=>{He(null),nt(""),rn(""),At(Sl),_t(Sl),st(!1)},[]),le=ae.useCallback(async(Ie="")=>{if(!Ae||!_||Oe)return;const gt=Be.trim(),ft=`{${Ae.sheetId}:${Ae.cellId}}${gt}`;ze(!0);try{const En=await(await fetch(`/api/boards/${_}/notes`,{method:"POST",headers:{"Content-Type":"application/json"},body:JSON.stringify({text:ft,author_key:k,color_index:Lt,post_passcode:Ie})})).json();En.success?(re(),Yt(!1),sn(""),Ct(""),Se(null)):Ie?Ct(En.error||"通關碼錯誤"):console.error("Failed to post table cell note:",En.error)}catch(Qt){console.error("Failed to post table cell note:",Qt)}finally{ze(!1)}},[Ae,Be,Lt,_,k,Oe,re]),pe=ae.useCallback(()=>{if(!Ae||!_||Oe)return;if(Be.trim()===Pt.trim()&&Lt===Dt){re();return}if(!d&&$){Se("cell"),sn(""),Ct(""),Yt(!0);return}le("")},[Ae,Be,Pt,Lt,Dt,_,Oe,re,d,$,le]),J=ae.useCallback(()=>{const Ie=jt.trim();if(!Ie){Ct("請輸入資料輸入密碼");return}Wt==="cell"?le(Ie):Wt==="sheet"&&D(Ie)},[jt,Wt,le,D]),xe=ae.useCallback(()=>{Yt(!1),sn(""),Ct(""),Se(null)},[]);if(nn.length===0)return O.jsxs("div",{className:"tv-empty",children:[O.jsxs("svg",{className:"tv-empty-icon",width:"56",height:"56",viewBox:"0 0 56 56",fill:"none",xmlns:"http://www.w3.org/2000/svg",children:[O.jsx("rect",{x:"6",y:"10",width:"44",height:"36",rx:"4",stroke:"#bdc1c6",strokeWidth:"2.2"}),O.jsx("line",{x1:"6",y1:"20",x2:"50",y2:"20",stroke:"#bdc1c6",strokeWidth:"2.2"}),O.jsx("line",{x1:"6",y1:"30",x2:"50",y2:"30",stroke:"#dadce0",strokeWidth:"1.5"}),O.jsx("line",{x1:"6",y1:"38",x2:"50",y2:"38",stroke:"#dadce0",strokeWidth:"1.5"}),O.jsx("line",{x1:"20",y1:"20",x2:"20",y2:"46",stroke:"#dadce0",strokeWidth:"1.5"}),O.jsx("line",{x1:"36",y1:"20",x2:"36",y2:"46",stroke:"#dadce0",strokeWidth:"1.5"})]}),O.jsx("div",{className:"tv-empty-msg",children:"暫無表格資料，可等待接收其他節點資料，或以管理者身份建立新工作表.."}),d&&O.jsx("button",{className:"tv-empty-btn",onClick:Rt,children:"建立新工作表"}),lt&&O.jsx("div",{className:"modal-overlay",onClick:W,children:O.jsxs("div",{className:"modal-content",onClick:Ie=>Ie.stopPropagation(),children:[O.jsx("div",{className:"modal-header",children:De==="create"?"新建立工作表":"工作表名稱異動"}),O.jsxs("div",{className:"modal-body",children:[O.jsx("label",{className:"tv-sheet-modal-label",children:"工作表名稱"}),O.jsx("input",{type:"text",className:"admin-passcode-input tv-sheet-name-input",value:Ut,onChange:Ie=>xn(Ie.target.value),maxLength:50,onKeyDown:Ie=>{Ie.key==="Enter"&&L()},autoFocus:!0})]}),O.jsxs("div",{className:"modal-actions",children:[O.jsx("button",{className:"modal-btn modal-btn-cancel",onClick:W,children:"取消"}),O.jsx("button",{className:"modal-btn modal-btn-confirm",onClick:L,disabled:tn||!Ut.trim(),children:"確定"})]})]})}),_n&&Mn&&O.jsx("div",{className:"modal-overlay",onClick:Tr,children:O.jsxs("div",{className:"modal-content",onClick:Ie=>Ie.stopPropagation(),children:[O.jsx("div",{className:"modal-header",children:"刪除工作表"}),O.jsx("div",{className:"modal-body",children:O.jsxs("p",{children:["確認要刪除工作表「",j(Mn),"」？刪除後無法復原，並會同步影響其他節點中的內容。"]})}),O.jsxs("div",{className:"modal-actions",children:[O.jsx("button",{className:"modal-btn modal-btn-cancel",onClick:Tr,children:"取消"}),O.jsx("button",{className:"modal-btn modal-btn-confirm",onClick:jr,disabled:Ot,style:{background:"#d32f2f"},children:"刪除"})]})]})})]});const Pe=N?Tt[N]:null,ve=Pe&&Pe.cells||{},Ue=Object.keys(ve);let pt=0,vt=0;Ue.forEach(Ie=>{const gt=Ie.charCodeAt(0)-65,ft=parseInt(Ie.substring(1),10);gt>pt&&(pt=gt),ft>vt&&(vt=ft)});const Vt=Math.max(Ue.length>0?pt+1:0,10)+Mt,dn=Vt+3,On=Math.max(vt,20)+Ne,pn=40,Kt=(Ie,gt)=>Ie?Ie.length>gt?Ie.substring(0,gt)+"…":Ie:"",Tn=()=>{Ze(Ie=>Ie+1)},An=()=>{he(Ie=>Ie+1)},lr=(Ie,gt)=>Ae&&Ae.sheetId===Ie&&Ae.cellId===gt,rr=(Ie,gt,ft)=>{const Qt=ve[Ie],En=Qt?Qt.content:"",zn=Qt&&Qt.bgColor?{width:120,minWidth:120,backgroundColor:Qt.bgColor}:{width:120,minWidth:120},Un=lr(N,Ie),Ms=!Un&&Bt&&(Bt.type==="row"&&ft===Bt.index||Bt.type==="col"&&gt===Bt.index),Vr=Qt&&Qt.bgColor&&!BC(Qt.bgColor);return Un?O.jsxs("td",{className:"tv-cell tv-cell-editing",style:{...zn,position:"relative",overflow:"visible"},ref:Ve,children:[O.jsx("textarea",{className:"tv-cell-input",style:w[Lt]?{backgroundColor:w[Lt]}:void 0,value:Be,onChange:$n=>nt($n.target.value),autoFocus:!0,onKeyDown:$n=>{$n.key==="Escape"&&re()}}),O.jsxs("div",{className:"tv-cell-toolbar",ref:tt,children:[O.jsx("button",{className:"tv-toolbar-btn tv-toolbar-confirm",onClick:pe,disabled:Oe,title:"確認",children:"✓"}),O.jsx("button",{className:"tv-toolbar-btn tv-toolbar-cancel",onClick:re,title:"取消",children:"✕"}),O.jsxs("div",{className:"tv-toolbar-color-wrapper",children:[O.jsx("button",{className:"tv-toolbar-btn tv-toolbar-color",onClick:$n=>{const li=$n.currentTarget.getBoundingClientRect();Ce(li.top<200),st(!rt)},title:"變更顏色",children:"🎨"}),rt&&w.length>0&&O.jsx("div",{className:`tv-color-dropdown${ht?" drop-down":""}`,children:w.map(($n,li)=>O.jsx("div",{className:`tv-color-option ${Lt===li?"selected":""}`,style:{backgroundColor:$n},onClick:()=>{At(li),st(!1)}},li))})]})]})]},gt):O.jsx("td",{className:`tv-cell${Ms?" tv-cell-hl":""}${Ms&&!Vr?" tv-cell-hl-nobg":""}`,title:En,style:zn,onClick:()=>Z(N,Ie,En,Qt?Qt.bgColor:""),children:En},gt)};return O.jsxs("div",{className:`tv-wrapper ${p?"header-visible":"header-hidden"}`,children:[O.jsx("div",{className:"tv-grid-area",children:O.jsxs("table",{className:"tv-grid",style:{"--row-header-width":`${pn}px`},children:[O.jsxs("colgroup",{children:[O.jsx("col",{style:{width:pn}}),Array.from({length:dn},(Ie,gt)=>O.jsx("col",{style:{width:"120px"}},gt))]}),O.jsx("thead",{children:O.jsxs("tr",{children:[O.jsx("th",{className:"tv-corner",style:{width:pn,minWidth:pn,maxWidth:pn}}),Array.from({length:Vt},(Ie,gt)=>O.jsx("th",{style:{width:120,minWidth:120},className:Bt&&Bt.type==="col"&&Bt.index===gt?"tv-hl-active":"",onClick:()=>Ht(ft=>ft&&ft.type==="col"&&ft.index===gt?null:{type:"col",index:gt}),children:String.fromCharCode(65+gt)},gt)),Array.from({length:3},(Ie,gt)=>O.jsx("th",{className:"tv-blank-col-header",style:{width:120,minWidth:120},children:gt===0?O.jsx("button",{className:"tv-add-col-btn",onClick:An,title:"新增一欄",children:"+"}):null},`blank-col-${gt}`))]})}),O.jsxs("tbody",{children:[Array.from({length:On},(Ie,gt)=>{const ft=gt+1;return O.jsxs("tr",{children:[O.jsx("th",{className:`tv-row-header${Bt&&Bt.type==="row"&&Bt.index===ft?" tv-hl-active":""}`,style:{width:pn,minWidth:pn,maxWidth:pn},onClick:()=>Ht(Qt=>Qt&&Qt.type==="row"&&Qt.index===ft?null:{type:"row",index:ft}),children:ft}),Array.from({length:Vt},(Qt,En)=>{const zn=String.fromCharCode(65+En)+ft;return rr(zn,En,ft)}),Array.from({length:3},(Qt,En)=>O.jsx("td",{className:"tv-cell tv-blank-cell",style:{width:120,minWidth:120}},`blank-${En}`))]},ft)}),Array.from({length:3},(Ie,gt)=>{const ft=On+gt+1,Qt=gt===0;return O.jsxs("tr",{className:"tv-blank-row",children:[O.jsx("th",{className:"tv-row-header tv-blank-header",style:{width:pn,minWidth:pn,maxWidth:pn},children:Qt?O.jsx("button",{className:"tv-add-row-btn",onClick:Tn,title:"新增一行",children:"+"}):null}),Array.from({length:Vt},(En,zn)=>O.jsx("td",{className:"tv-cell tv-blank-cell",style:{width:120,minWidth:120}},zn)),Array.from({length:3},(En,zn)=>O.jsx("td",{className:"tv-cell tv-blank-cell",style:{width:120,minWidth:120}},`blank-col-${zn}`))]},`blank-${ft}`)})]})]})}),O.jsxs("div",{className:"tv-sheet-tabs",ref:Ee,children:[nn.map(Ie=>O.jsxs("div",{className:`tv-tab ${Ie===N?"is-active":""}`,onClick:()=>Fe(Ie),children:[O.jsx("span",{className:"tv-tab-label",children:Kt(j(Ie),12)}),d&&O.jsx("button",{className:"tv-tab-edit-btn",title:"重新命名",onClick:gt=>{gt.stopPropagation(),Dr(Ie)},children:O.jsxs("svg",{width:"12",height:"12",viewBox:"0 0 24 24",fill:"none",stroke:"currentColor",strokeWidth:"2.5",strokeLinecap:"round",strokeLinejoin:"round",children:[O.jsx("path",{d:"M17 3a2.83 2.83 0 0 1 4 4L7.5 20.5 2 22l1.5-5.5Z"}),O.jsx("path",{d:"m15 5 4 4"})]})}),d&&O.jsx("button",{className:"tv-tab-delete-btn",title:"刪除工作表",onClick:gt=>{gt.stopPropagation(),xr(Ie)},disabled:Ot,children:O.jsxs("svg",{width:"12",height:"12",viewBox:"0 0 24 24",fill:"none",stroke:"currentColor",strokeWidth:"2.5",strokeLinecap:"round",strokeLinejoin:"round",children:[O.jsx("polyline",{points:"3 6 5 6 21 6"}),O.jsx("path",{d:"M19 6v14a2 2 0 0 1-2 2H7a2 2 0 0 1-2-2V6m3 0V4a2 2 0 0 1 2-2h4a2 2 0 0 1 2 2v2"})]})})]},Ie)),d&&O.jsx("button",{className:"tv-tab tv-tab-add",title:"新建立工作表",onClick:Rt,children:O.jsxs("svg",{width:"16",height:"16",viewBox:"0 0 24 24",fill:"none",stroke:"currentColor",strokeWidth:"2.5",strokeLinecap:"round",strokeLinejoin:"round",children:[O.jsx("line",{x1:"12",y1:"5",x2:"12",y2:"19"}),O.jsx("line",{x1:"5",y1:"12",x2:"19",y2:"12"})]})}),je&&O.jsxs("div",{className:"tv-send-countdown",title:"資料完成送出時間倒數",children:[O.jsxs("svg",{className:"tv-countdown-icon",width:"14",height:"14",viewBox:"0 0 24 24",fill:"none",stroke:"currentColor",strokeWidth:"2",strokeLinecap:"round",strokeLinejoin:"round",children:[O.jsx("circle",{cx:"12",cy:"12",r:"10"}),O.jsx("polyline",{points:"12 6 12 12 16 14"})]}),O.jsx("span",{className:"tv-countdown-time",children:$t(un)})]})]}),lt&&O.jsx("div",{className:"modal-overlay",onClick:W,children:O.jsxs("div",{className:"modal-content",onClick:Ie=>Ie.stopPropagation(),children:[O.jsx("div",{className:"modal-header",children:De==="create"?"新建立工作表":"工作表名稱異動"}),O.jsxs("div",{className:"modal-body",children:[O.jsx("label",{className:"tv-sheet-modal-label",children:"工作表名稱"}),O.jsx("input",{type:"text",className:"admin-passcode-input tv-sheet-name-input",value:Ut,onChange:Ie=>xn(Ie.target.value),maxLength:50,onKeyDown:Ie=>{Ie.key==="Enter"&&L()},autoFocus:!0})]}),O.jsxs("div",{className:"modal-actions",children:[O.jsx("button",{className:"modal-btn modal-btn-cancel",onClick:W,children:"取消"}),O.jsx("button",{className:"modal-btn modal-btn-confirm",onClick:L,disabled:tn||!Ut.trim(),children:"確定"})]})]})}),_n&&Mn&&O.jsx("div",{className:"modal-overlay",onClick:Tr,children:O.jsxs("div",{className:"modal-content",onClick:Ie=>Ie.stopPropagation(),children:[O.jsx("div",{className:"modal-header",children:"刪除工作表"}),O.jsx("div",{className:"modal-body",children:O.jsxs("p",{children:["確認要刪除工作表「",j(Mn),"」？刪除後無法復原，並會同步影響其他節點中的內容。"]})}),O.jsxs("div",{className:"modal-actions",children:[O.jsx("button",{className:"modal-btn modal-btn-cancel",onClick:Tr,children:"取消"}),O.jsx("button",{className:"modal-btn modal-btn-confirm",onClick:jr,disabled:Ot,style:{background:"#d32f2f"},children:"刪除"})]})]})}),vn&&O.jsx("div",{className:"modal-overlay",onClick:xe,children:O.jsxs("div",{className:"modal-content",onClick:Ie=>Ie.stopPropagation(),children:[O.jsx("div",{className:"modal-header",children:"資料輸入密碼"}),O.jsxs("div",{className:"modal-body",children:[O.jsx("p",{children:"請輸入發送用通關碼以送出資料："}),O.jsx("input",{type:"password",className:"admin-passcode-input",placeholder:"輸入發送用通關碼",value:jt,onChange:Ie=>{sn(Ie.target.value),Ct("")},onKeyDown:Ie=>{Ie.key==="Enter"&&J()},autoFocus:!0}),Xt&&O.jsx("div",{className:"tv-passcode-error",children:Xt})]}),O.jsxs("div",{className:"modal-actions",children:[O.jsx("button",{className:"modal-btn modal-btn-cancel",onClick:xe,children:"取消"}),O.jsx("button",{className:"modal-btn modal-btn-confirm",onClick:J,disabled:Oe||tn,children:"確定"})]})]})})]})}const Yd="YourChannelName",af=typeof window<"u"&&window.APP_META?window.APP_META:{},OC=af.serviceName||"Mesh資訊站",jC=af.projectName||"meshBridge/meshNoteboard",VC=af.version||"-",UC=af.sendIntervalSecond||30,xs=["hsl(0, 70%, 85%)","hsl(30, 70%, 85%)","hsl(60, 70%, 85%)","hsl(90, 70%, 85%)","hsl(120, 70%, 85%)","hsl(150, 70%, 85%)","hsl(180, 70%, 85%)","hsl(210, 70%, 85%)","hsl(240, 70%, 85%)","hsl(270, 70%, 85%)","hsl(300, 70%, 85%)","hsl(330, 70%, 85%)","hsl(0, 0%, 85%)","hsl(0, 0%, 75%)","hsl(45, 80%, 85%)","hsl(0, 0%, 100%)"];function zx(){const n="abcdefghijklmnopqrstuvwxyz0123456789",i=crypto.getRandomValues(new Uint8Array(8));let l="";for(let p=0;p<8;p++)l+=n[i[p]%36];return l}function $C(n){let i=0;for(let p=0;p<n.length;p++)i=n.charCodeAt(p)+((i<<5)-i);return{bg:`hsl(${Math.abs(i)%360}, 70%, 85%)`,text:"#333"}}function ws(n){return new Blob([n]).size}const Ar=150;function qC(){const[n,i]=ae.useState(null),[l,p]=ae.useState([]),[_,k]=ae.useState(!1),[w,d]=ae.useState(!1),[$,ie]=ae.useState(null),[ce,te]=ae.useState(!1),[N,Fe]=ae.useState(Yd),[Ne,Ze]=ae.useState([]),[Mt,he]=ae.useState(!1),[ne,de]=ae.useState({}),[Ee,Ae]=ae.useState(!1),[He,Be]=ae.useState(null),[nt,Lt]=ae.useState(""),[At,Pt]=ae.useState(""),[rn,Dt]=ae.useState(""),[_t,rt]=ae.useState(!1),[st,ht]=ae.useState(""),[Ce,Oe]=ae.useState(0),[ze,Ve]=ae.useState(null),[tt,Bt]=ae.useState(""),[Ht,lt]=ae.useState(0),[Ye,De]=ae.useState({show:!1,type:"alert",title:"",message:"",onConfirm:null}),[ct,Ut]=ae.useState(null),[xn,hn]=ae.useState(0),[wn,tn]=ae.useState("newest"),[Hn,_n]=ae.useState(""),[ge,Mn]=ae.useState(!1),[Ln,Ot]=ae.useState(!1),[bt,vn]=ae.useState(!1),[Yt,jt]=ae.useState(!0),sn=ae.useRef(0),Xt=ae.useRef(null),Ct=ae.useRef(null),[Wt,Se]=ae.useState(0),[Dn,un]=ae.useState(0),[bn,Cr]=ae.useState(!1),[je,$t]=ae.useState(!1),Tt=ae.useRef(wn),[nn,nr]=ae.useState(null),[Rt,xr]=ae.useState(""),[Tr,jr]=ae.useState(0),[Dr,W]=ae.useState(0),D=ae.useRef(null),[L,j]=ae.useState(null),Z=ae.useRef({}),[re,le]=ae.useState({}),[pe,J]=ae.useState(null),[xe,Pe]=ae.useState({top:0,left:0}),ve=ae.useRef(null),Ue=ae.useRef({}),pt=ae.useRef({x:0,y:0}),[vt,ln]=ae.useState(null),[Vt,dn]=ae.useState({top:0,left:0}),[Jt,On]=ae.useState(null),pn=ae.useRef(null),Kt=ae.useRef({}),[Tn,An]=ae.useState([]),[lr,rr]=ae.useState(!1),[Ie,gt]=ae.useState(""),[ft,Qt]=ae.useState({}),[En,zn]=ae.useState(""),[Un,Ms]=ae.useState(""),[Vr,$n]=ae.useState(!1),[li,ds]=ae.useState({}),[Wn,so]=ae.useState(!1),[ci,ir]=ae.useState(!0),[oo,wi]=ae.useState(!1),ao=ae.useRef(null),Ur=ae.useRef(!1),Nl=ae.useRef({}),[lo,ps]=ae.useState(!1),[Gi,Sn]=ae.useState(!1),[jo,Vo]=ae.useState(!1),[fr,fs]=ae.useState(()=>{try{return sessionStorage.getItem("viewMode")||"sticky"}catch{return"sticky"}}),[Uo,co]=ae.useState(0),Er=Tn.includes(N),Ai=ft[N]||!1;ae.useEffect(()=>{(async()=>{if(rn)try{const ke=await(await fetch(`/api/user/${rn}/last-location`)).json();ke.success&&ke.location&&ds($e=>({...$e,[rn]:ke.location}))}catch(be){console.error("Failed to fetch user last location:",be)}})()},[rn]);const Ga=async()=>{try{const be=await(await fetch("/api/global/lan-only-count")).json();be.success&&co(be.count)}catch(K){console.error("Failed to fetch global LAN-only count:",K)}},Ol=async(K=!1,be=null,ke=!1)=>{try{const $e=be||N,Ge=await(await fetch(`/api/boards/${$e}/notes?is_include_deleted=${K}`)).json();if(Ge.success&&(p(Ge.notes),jl(Ge.notes,$e),ke)){const zt=Nl.current[$e];fs(zt||"sticky")}}catch($e){console.error("Failed to fetch notes:",$e)}},jl=async(K,be=null)=>{const ke=be||N,$e={},Le=[];K.forEach(Ge=>{Le.push(Ge),Ge.replyNotes&&Le.push(...Ge.replyNotes)});for(const Ge of Le)if(Ge.noteId)try{const qr=await(await fetch(`/api/boards/${ke}/notes/${Ge.noteId}/acks`)).json();qr.success&&($e[Ge.noteId]=qr.acks)}catch(zt){console.error(`Failed to fetch ACKs for note ${Ge.noteId}:`,zt)}le($e)},ou=async K=>{try{const ke=await(await fetch(`/api/boards/${N}/notes/${K}/acks`)).json();ke.success&&le($e=>({...$e,[K]:ke.acks}))}catch(be){console.error(`Failed to fetch ACKs for note ${K}:`,be)}};ae.useEffect(()=>((async()=>{try{const Le=localStorage.getItem("activeChannels");if(Le){const Ge=JSON.parse(Le);Array.isArray(Ge)&&Ge.length>0&&(Ze(Ge),console.log("已從快取載入頻道清單:",Ge))}}catch(Le){console.error("Failed to load cached channels:",Le)}try{const Ge=await(await fetch("/api/user/uuid")).json();if(Ge.success)Dt(Ge.uuid);else{const zt=zx();Dt(zt)}}catch(Le){console.error("Failed to fetch UUID from backend:",Le);const Ge=zx();Dt(Ge)}try{const Ge=await(await fetch("/api/user/admin/status",{credentials:"include"})).json();Ge.success&&Ge.admin_channels&&An(Ge.admin_channels)}catch(Le){console.error("Failed to fetch admin status:",Le)}try{const Ge=await(await fetch("/api/config/post_passcode_required")).json();Ge.success&&Ge.channels_post_passcode&&Qt(Ge.channels_post_passcode)}catch(Le){console.error("Failed to fetch post passcode config:",Le)}try{const Ge=await(await fetch("/api/config/features")).json();Ge.success&&Ge.features&&(so(Ge.features.map_enabled||!1),wi(Ge.features.reauth_on_channel_switch||!1))}catch(Le){console.error("Failed to fetch features config:",Le)}let be=null;try{const Ge=await(await fetch("/api/session/current_board")).json();Ge.success&&Ge.board_id&&(be=Ge.board_id,Fe(be))}catch(Le){console.error("Failed to fetch current board:",Le)}let ke={};try{const Ge=await(await fetch("/api/channel/verified_status")).json();Ge.success&&Ge.channels&&(Ge.channels.forEach(zt=>{ke[zt.name]={requiresPassword:zt.requires_password,isVerified:zt.is_verified}}),de(ke))}catch(Le){console.error("Failed to fetch verified status:",Le)}if(be&&ke[be]){const Le=ke[be];Le.requiresPassword&&!Le.isVerified&&(Be(be),Lt(""),Pt(""),Ae(!0))}Ga();const $e=fp();i($e),$e.on("lora_status",Le=>{k(Le.online),d(Le.channel_validated!==!1),ie(Le.error_message||null),te(Le.power_issue||!1),Le.active_channels&&Le.active_channels.length>0?(Ze(Le.active_channels),Fe(Ge=>Ge===Yd&&Le.active_channels.length>0?Le.active_channels[0]:Ge!==Yd&&Le.active_channels.length>0&&!Le.active_channels.includes(Ge)?(console.log(`⚠️ 先前選擇的頻道 "${Ge}" 已不在可用頻道中，自動切換至 "${Le.active_channels[0]}"`),Le.active_channels[0]):Ge)):Le.active_channels&&Le.active_channels.length===0&&console.log("LoRa 斷線，保留快取的頻道清單以供切換"),Le.online&&Le.channel_validated===!1&&(console.log("⚠️ LoRa 已連線，但 Channel 名稱不符合設定"),Le.error_message&&console.log("   "+Le.error_message))})})(),()=>{n&&n.close()}),[]),ae.useEffect(()=>{if(Ne.length>0)try{localStorage.setItem("activeChannels",JSON.stringify(Ne)),console.log("已儲存頻道清單到快取:",Ne)}catch(K){console.error("Failed to cache channels:",K)}},[Ne]),ae.useEffect(()=>{try{sessionStorage.setItem("viewMode",fr)}catch{}},[fr]),ae.useEffect(()=>{if(!Mt)return;const K=be=>{be.target.closest(".header-left")||he(!1)};return document.addEventListener("mousedown",K),()=>document.removeEventListener("mousedown",K)},[Mt]),ae.useEffect(()=>{if(!n)return;const K=$e=>{Ol(ge,N),Ga()},be=$e=>{$e.note_id&&ou($e.note_id)},ke=$e=>{console.error("USB connection error:",$e.message),De({show:!0,type:"alert",title:"連線錯誤",message:$e.message,onConfirm:()=>De(Le=>({...Le,show:!1}))})};return n.on("refresh_notes",K),n.on("ack_received",be),n.on("usb_connection_error",ke),()=>{n.off("refresh_notes",K),n.off("ack_received",be),n.off("usb_connection_error",ke)}},[n,ge,N]),ae.useEffect(()=>{if(N!==Yd){const K=Ur.current;Ol(ge,null,K),Ur.current=!1}},[ge,N]),ae.useEffect(()=>{if(Tt.current!==wn){$t(!0);const K=setTimeout(()=>{$t(!1)},600);return Tt.current=wn,()=>clearTimeout(K)}},[wn]),ae.useEffect(()=>{const K=be=>{pe&&ve.current&&!ve.current.contains(be.target)&&(be.target.closest(".ack-counter")||J(null))};if(pe)return document.addEventListener("mousedown",K),()=>{document.removeEventListener("mousedown",K)}},[pe]),ae.useEffect(()=>{const K=be=>{vt&&pn.current&&!pn.current.contains(be.target)&&(be.target.closest(".note-status.sender-clickable")||(ln(null),On(null)))};if(vt)return document.addEventListener("mousedown",K),()=>{document.removeEventListener("mousedown",K)}},[vt]),ae.useEffect(()=>{const K=()=>{if(window.innerWidth>768){jt(!0);return}const be=window.scrollY,ke=be-sn.current,$e=document.documentElement.scrollHeight,Le=window.innerHeight,Ge=be+Le>=$e-50;be<10?jt(!0):ke>5&&be>50&&!Ge?jt(!1):ke<-5&&!Ge&&jt(!0),sn.current=be};return window.addEventListener("scroll",K,{passive:!0}),()=>window.removeEventListener("scroll",K)},[]),ae.useEffect(()=>{_t&&Ct.current&&setTimeout(()=>{if(Ct.current){const K=Ct.current.getBoundingClientRect(),ke=window.scrollY+K.top-100;window.scrollTo({top:ke,behavior:"smooth"}),Ct.current.focus(),Ct.current.value&&Ct.current.setSelectionRange(0,0)}},150)},[_t]),ae.useEffect(()=>{if(L){let K=!1;const be=()=>{const zt=Z.current[L];if(zt&&!K){const qr=zt.getBoundingClientRect(),jn=window.scrollY+qr.top-100;return window.scrollTo({top:jn,behavior:"smooth"}),K=!0,setTimeout(()=>{zt&&zt.classList.add("note-paste-animation")},500),!0}return!1};let ke=0;const $e=10,Le=setInterval(()=>{ke++,(be()||ke>=$e)&&clearInterval(Le)},100),Ge=setTimeout(()=>{j(null)},3e3);return()=>{clearInterval(Le),clearTimeout(Ge)}}},[L,l]);const on=(K,be="提示")=>{De({show:!0,type:"alert",title:be,message:K,onConfirm:()=>De({...Ye,show:!1})})},Hi=(K,be="確認")=>new Promise(ke=>{De({show:!0,type:"confirm",title:be,message:K,onConfirm:()=>{De({...Ye,show:!1}),ke(!0)},onCancel:()=>{De({...Ye,show:!1}),ke(!1)}})}),$r=async()=>{Er?await Hi(`確定要登出頻道 "${N}" 的管理者身份，切換為一般使用者嗎？`,"登出管理者")&&$o():(rr(!0),gt(""))},Rr=async()=>{if(!Ie.trim()){on("請輸入管理者密碼！");return}try{const be=await(await fetch("/api/user/admin/authenticate",{method:"POST",credentials:"include",headers:{"Content-Type":"application/json"},body:JSON.stringify({passcode:Ie,board_id:N})})).json();be.success&&be.is_admin?(An(ke=>ke.includes(N)?ke:[...ke,N]),rr(!1),gt(""),on(`已切換至頻道 "${N}" 的管理者身份`,"成功")):(on("密碼錯誤，請重新輸入","錯誤"),gt(""))}catch(K){console.error("Failed to authenticate admin:",K),on("認證失敗："+K.message,"錯誤")}},uo=()=>{rr(!1),gt("")},$o=async()=>{try{const be=await(await fetch("/api/user/admin/logout",{method:"POST",credentials:"include",headers:{"Content-Type":"application/json"},body:JSON.stringify({board_id:N})})).json();be.success?(An(ke=>ke.filter($e=>$e!==N)),on(`已登出頻道 "${N}" 的管理者身份`,"成功")):on("登出失敗："+(be.error||"未知錯誤"),"錯誤")}catch(K){console.error("Failed to logout admin:",K),on("登出失敗："+K.message,"錯誤")}},ho=async K=>{if(await Hi("是否將此便利貼置頂？一次僅能有一則置頂。","置頂便利貼"))try{const $e=await(await fetch(`/api/boards/${N}/notes/${K}/pin`,{method:"POST",headers:{"Content-Type":"application/json"}})).json();$e.success?on("已成功置頂便利貼","成功"):on("置頂失敗："+($e.error||"未知錯誤"),"錯誤")}catch(ke){console.error("Failed to pin note:",ke),on("置頂失敗："+ke.message,"錯誤")}},Ha=async K=>{if(await Hi("確認重新發送置頂指令？","重送置頂"))try{const $e=await(await fetch(`/api/boards/${N}/notes/${K}/pin`,{method:"POST",headers:{"Content-Type":"application/json"}})).json();$e.success?on("已重新發送置頂指令","成功"):on("重送置頂失敗："+($e.error||"未知錯誤"),"錯誤")}catch(ke){console.error("Failed to resend pin:",ke),on("重送置頂失敗："+ke.message,"錯誤")}},As=K=>{const be=typeof K=="string"?K:"";rt(!0),ht(be),Oe(0),Se(ws(be)),zn("")},po=()=>{rt(!1),ht(""),Oe(0),Se(0),zn("")},Vl=K=>{nr(K),xr(""),jr(0),W(0),Ms("")},qo=()=>{Nl.current[N]=fr},au=async K=>{_t&&po(),nn&&Wi();const be=ne[K];if(be&&be.requiresPassword&&!be.isVerified){if(oo&&N!==K){try{await fetch("/api/session/select_board",{method:"POST",headers:{"Content-Type":"application/json"},body:JSON.stringify({board_id:K})})}catch{}de(ke=>{const $e=ke[N];return $e&&$e.requiresPassword?{...ke,[N]:{...$e,isVerified:!1}}:ke}),An(ke=>ke.filter($e=>$e!==N))}qo(),Be(K),Lt(""),Pt(""),Ae(!0),he(!1);return}try{const ke=N;(await(await fetch("/api/session/select_board",{method:"POST",headers:{"Content-Type":"application/json"},body:JSON.stringify({board_id:K})})).json()).success&&(oo&&ke!==K&&(de(Ge=>{const zt=Ge[ke];return zt&&zt.requiresPassword?{...Ge,[ke]:{...zt,isVerified:!1}}:Ge}),An(Ge=>Ge.filter(zt=>zt!==ke))),qo(),Ur.current=!0,Fe(K),he(!1))}catch(ke){console.error("Failed to switch channel:",ke)}},Ul=async()=>{if(He){Pt("");try{const be=await(await fetch("/api/channel/verify_password",{method:"POST",headers:{"Content-Type":"application/json"},body:JSON.stringify({channel_name:He,password:nt})})).json();if(be.success&&be.verified){if(de(Le=>({...Le,[He]:{...Le[He],isVerified:!0}})),(await(await fetch("/api/session/select_board",{method:"POST",headers:{"Content-Type":"application/json"},body:JSON.stringify({board_id:He})})).json()).success){const Le=He;qo(),Ur.current=!0,Fe(Le),Ae(!1),Be(null),Lt("")}}else Pt("密碼錯誤，請重試")}catch(K){console.error("Failed to verify password:",K),Pt("驗證失敗，請重試")}}},Wa=()=>{Ae(!1),Be(null),Lt(""),Pt("")},Wi=()=>{nr(null),xr(""),jr(0),W(0),Ms("")},Xa=async()=>{const K=Rt.trim();if(!K){on("請輸入回覆內容！");return}if(!Er&&Ai&&!Un.trim()){on("請輸入發送用通關碼！");return}if(!Gi){Sn(!0);try{const ke=await(await fetch(`/api/boards/${N}/notes`,{method:"POST",headers:{"Content-Type":"application/json"},body:JSON.stringify({text:K,author_key:rn,color_index:Tr,parent_note_id:nn,post_passcode:Un})})).json();ke.success?(nr(null),xr(""),jr(0),W(0),Ms(""),ke.note&&ke.note.noteId&&j(ke.note.noteId)):on("張貼回覆失敗："+(ke.error||"未知錯誤"),"錯誤")}catch(be){console.error("Failed to create reply:",be),on("張貼回覆失敗："+be.message,"錯誤")}finally{Sn(!1)}}},Zo=K=>{const be=K.target.value,ke=ws(be);!bn&&ke>Ar||(xr(be),W(ke))},Ka=async()=>{const K=st.trim();if(!K){on("請輸入便利貼內容！");return}if(!Er&&Ai&&!En.trim()){on("請輸入發送用通關碼！");return}if(!lo){ps(!0);try{const ke=await(await fetch(`/api/boards/${N}/notes`,{method:"POST",headers:{"Content-Type":"application/json"},body:JSON.stringify({text:K,author_key:rn,color_index:Ce,post_passcode:En})})).json();ke.success?(rt(!1),ht(""),Oe(0),Se(0),zn(""),ke.note&&ke.note.noteId&&j(ke.note.noteId)):on("建立便利貼失敗："+(ke.error||"未知錯誤"),"錯誤")}catch(be){console.error("Failed to create note:",be),on("建立便利貼失敗："+be.message,"錯誤")}finally{ps(!1)}}},Ya=K=>{Ve(K.noteId),Bt(K.text),un(ws(K.text));const be=xs.findIndex(ke=>ke===K.bgColor);lt(be>=0?be:0)},zi=()=>{Ve(null),Bt(""),lt(0),un(0)},lu=async K=>{const be=tt.trim();if(!be){on("請輸入便利貼內容！");return}if(!jo){Vo(!0);try{const $e=await(await fetch(`/api/boards/${N}/notes/${K}`,{method:"PUT",headers:{"Content-Type":"application/json"},body:JSON.stringify({text:be,author_key:rn,color_index:Ht})})).json();$e.success?(Ve(null),Bt(""),lt(0),un(0)):on("更新便利貼失敗："+($e.error||"未知錯誤"),"錯誤")}catch(ke){console.error("Failed to update note:",ke),on("更新便利貼失敗："+ke.message,"錯誤")}finally{Vo(!1)}}},fo=async(K,be=!1,ke=null)=>{let $e=!1,Le=l.find(er=>er.noteId===K);if(Le)$e=!0;else for(const er of l)if(er.replyNotes&&(Le=er.replyNotes.find(jn=>jn.noteId===K),Le)){$e=!1;break}let Ge="確定要封存這個便利貼嗎？";if($e&&(Ge+=`
+      `,vn.appendChild(Yt),tt=Yt,requestAnimationFrame(()=>{requestAnimationFrame(()=>{tt===Yt&&Yt.classList.add("animating")})})},_n=bt=>{if(!He.current||!w.current)return;Ae.current&&(Ae.current.remove(),Ae.current=null),hn(bt);const vn=document.createElement("div");vn.className="mapview-longpress-popup";const Yt=document.createElement("div");Yt.className="mapview-longpress-title",Yt.textContent="新增便利貼",vn.appendChild(Yt);const jt=document.createElement("div");jt.className="mapview-longpress-coords",jt.textContent=`${bt.lat.toFixed(4)}, ${bt.lng.toFixed(4)}`,vn.appendChild(jt);const sn=document.createElement("div");sn.className="mapview-longpress-actions";const Xt=document.createElement("button");Xt.className="mapview-longpress-btn mapview-longpress-btn-cancel",Xt.textContent="取消",Xt.addEventListener("click",un=>{un.stopPropagation(),wn()}),sn.appendChild(Xt);const Ct=document.createElement("button");Ct.className="mapview-longpress-btn mapview-longpress-btn-create",Ct.textContent="建立",Ct.addEventListener("click",un=>{un.stopPropagation(),wn(),He.current&&He.current(bt.lat,bt.lng)}),sn.appendChild(Ct),vn.appendChild(sn);const Wt=new dr.Popup({closeButton:!1,closeOnClick:!1,anchor:"bottom",offset:[0,-14]}).setLngLat([bt.lng,bt.lat]).setDOMContent(vn).addTo(w.current);Wt.on("close",()=>{xn(),tn(),Ae.current=null}),Ae.current=Wt;const Se=w.current.getCanvasContainer(),Dn=un=>{un.stopPropagation(),un.preventDefault()};Se.addEventListener("click",Dn,{once:!0,capture:!0}),setTimeout(()=>Se.removeEventListener("click",Dn,{capture:!0}),500),setTimeout(()=>{Ae.current&&(De=()=>{wn()},w.current&&w.current.on("click",De))},600)},ge=bt=>{bt.originalEvent.type,!(bt.originalEvent.touches&&bt.originalEvent.touches.length>1)&&(Oe={x:bt.point.x,y:bt.point.y},ze={x:bt.point.x,y:bt.point.y},Ve={lat:bt.lngLat.lat,lng:bt.lngLat.lng},lt=!1,Ye=!0,Ht&&(clearTimeout(Ht),Ht=null),Ee.current&&(clearTimeout(Ee.current),Ee.current=null),Ut(),Ht=setTimeout(()=>{Hn(ze),Ht=null},st),Ee.current=setTimeout(()=>{Ut(),lt=!0,Ye=!1,_n(Ve),Ee.current=null},st+rt))},Mn=bt=>{if(!Oe||!Ye)return;const vn=Math.abs(bt.point.x-Oe.x),Yt=Math.abs(bt.point.y-Oe.y);(vn>ht||Yt>ht)&&(ct(),Oe=null)},Ln=bt=>{if(bt&&bt.originalEvent&&bt.originalEvent.type,lt){lt=!1,Oe=null;return}ct(),Oe=null},Ot=()=>{ct(),Oe=null};return w.current.on("mousedown",ge),w.current.on("mousemove",Mn),w.current.on("mouseup",Ln),w.current.on("touchstart",ge),w.current.on("touchmove",Mn),w.current.on("touchend",Ln),w.current.on("touchcancel",Ln),w.current.on("dragstart",Ot),()=>{ct(),wn(),xn(),w.current&&(w.current.off("mousedown",ge),w.current.off("mousemove",Mn),w.current.off("mouseup",Ln),w.current.off("touchstart",ge),w.current.off("touchmove",Mn),w.current.off("touchend",Ln),w.current.off("touchcancel",Ln),w.current.off("dragstart",Ot))}},[Mt]),Ne?O.jsx("div",{className:"mapview-container",children:O.jsx("div",{className:"view-placeholder",children:O.jsx("div",{className:"view-placeholder-title",children:"載入地圖中..."})})}):$?O.jsxs("div",{className:"mapview-container",children:[O.jsx("div",{ref:k,className:"mapview-map"}),Be.length===0&&O.jsx("div",{className:"mapview-empty-hint",children:"目前沒有包含座標的便利貼"})]}):O.jsx("div",{className:"mapview-container",children:O.jsxs("div",{className:"view-placeholder",children:[O.jsxs("svg",{width:"48",height:"48",viewBox:"0 0 24 24",fill:"none",stroke:"#95a5a6",strokeWidth:"1.5",strokeLinecap:"round",strokeLinejoin:"round",children:[O.jsx("path",{d:"M12 2C8.13 2 5 5.13 5 9c0 5.25 7 13 7 13s7-7.75 7-13c0-3.87-3.13-7-7-7z"}),O.jsx("circle",{cx:"12",cy:"9",r:"2.5"})]}),O.jsx("div",{className:"view-placeholder-title",children:"地圖模式 Map View"}),O.jsx("div",{className:"view-placeholder-desc",children:"地圖功能未啟用（請設定 mbtiles 檔案）"})]})})}const Vp=/^\{([a-z0-9]{6}):((?:[A-Z][1-9]\d{0,2})|title)\}([\s\S]*)$/,RC=/^\{([a-z0-9]{6}):delete\}$/,Sl=15,BC=n=>{if(!n)return!0;const i=n.trim().toLowerCase();return i==="white"||i==="#fff"||i==="#ffffff"||i==="rgb(255, 255, 255)"||i==="rgb(255,255,255)"||i==="hsl(0, 0%, 100%)"||i==="hsl(0,0%,100%)"};function FC(n,i){const l={},p=new Set;if(i){if(i.deleted_sheets&&i.deleted_sheets.forEach(k=>p.add(k)),i.titles)for(const[k,w]of Object.entries(i.titles))p.has(k)||(l[k]||(l[k]={title:"",cells:{}}),l[k].title=w);if(i.cells)for(const k of i.cells){const w=k.s;if(p.has(w))continue;l[w]||(l[w]={title:"",cells:{}});const d=String.fromCharCode(65+k.c)+k.r;l[w].cells[d]={content:k.t,bgColor:k.bg||""}}}return[...n||[]].sort((k,w)=>(k.timestamp||0)-(w.timestamp||0)).forEach(k=>{if(k.archived)return;const w=(k.text||"").trim(),d=w.match(RC);if(d){const N=d[1];p.add(N),delete l[N];return}const $=w.match(Vp);if(!$)return;const ie=$[1],ce=$[2],te=$[3];p.has(ie)||(l[ie]||(l[ie]={title:"",cells:{}}),ce==="title"?l[ie].title=te.trim():l[ie].cells[ce]={content:te,bgColor:k.bgColor||""})}),l}function NC({notes:n,isActive:i,onAddRow:l,headerVisible:p=!0,boardId:_,myUUID:k,colorPalette:w=[],isAdmin:d=!1,postPasscodeRequired:$=!1,loraOnline:ie=!1,sendIntervalSecond:ce=30,globalLanOnlyCount:te=0}){const[N,Fe]=ae.useState(null),[Ne,Ze]=ae.useState(0),[Mt,he]=ae.useState(0),[ne,de]=ae.useState(null),Ee=ae.useRef(null),[Ae,He]=ae.useState(null),[Be,nt]=ae.useState(""),[Lt,At]=ae.useState(Sl),[Pt,rn]=ae.useState(""),[Dt,_t]=ae.useState(Sl),[rt,st]=ae.useState(!1),[ht,Ce]=ae.useState(!1),[Oe,ze]=ae.useState(!1),Ve=ae.useRef(null),tt=ae.useRef(null),[Bt,Ht]=ae.useState(null),[lt,Ye]=ae.useState(!1),[De,ct]=ae.useState("create"),[Ut,xn]=ae.useState(""),[hn,wn]=ae.useState(null),[tn,Hn]=ae.useState(!1),[_n,ge]=ae.useState(!1),[Mn,Ln]=ae.useState(null),[Ot,bt]=ae.useState(!1),[vn,Yt]=ae.useState(!1),[jt,sn]=ae.useState(""),[Xt,Ct]=ae.useState(""),[Wt,Se]=ae.useState(null),Dn=ae.useMemo(()=>!n||n.length===0?0:n.filter(Ie=>{if(Ie.archived)return!1;const gt=(Ie.text||"").trim();return Vp.test(gt)?Ie.status==="LAN only":!1}).length,[n]),[un,bn]=ae.useState(0),Cr=ae.useRef(0);ae.useEffect(()=>{const Ie=te*ce;bn(Ie),Cr.current=Ie},[te,ce]),ae.useEffect(()=>{if(un<=0)return;const Ie=setInterval(()=>{bn(gt=>{const ft=gt-1;return Cr.current=ft,ft<=0?0:ft})},1e3);return()=>clearInterval(Ie)},[un>0]);const je=ie&&Dn>0&&un>0,$t=Ie=>{const gt=Math.floor(Ie/3600),ft=Math.floor(Ie%3600/60),Qt=Ie%60;return gt>0?`${String(gt).padStart(2,"0")}:${String(ft).padStart(2,"0")}:${String(Qt).padStart(2,"0")}`:`${String(ft).padStart(2,"0")}:${String(Qt).padStart(2,"0")}`};ae.useEffect(()=>{if(!_)return;let Ie=!1;return(async()=>{try{const Qt=await(await fetch(`/api/boards/${_}/table-base`)).json();!Ie&&Qt.success&&de(Qt)}catch(ft){console.error("Failed to fetch table base data:",ft)}})(),()=>{Ie=!0}},[_]);const Tt=ae.useMemo(()=>FC(n,ne),[n,ne]),nn=ae.useMemo(()=>Object.keys(Tt),[Tt]);ae.useEffect(()=>{Fe(Ie=>{try{const gt=localStorage.getItem(`tableview_lastSheet_${_}`);if(gt&&nn.includes(gt))return gt}catch{}return Ie&&nn.includes(Ie)?Ie:nn.length>0?nn[0]:null})},[nn,_]),ae.useEffect(()=>{if(N&&_&&nn.includes(N))try{localStorage.setItem(`tableview_lastSheet_${_}`,N)}catch{}},[N,_,nn]),ae.useEffect(()=>{Ht(null),re()},[N,_]),ae.useEffect(()=>{if(Ee.current){const Ie=Ee.current.querySelector(".tv-tab.is-active");Ie&&Ie.scrollIntoView({inline:"center",block:"nearest"})}},[N]),ae.useEffect(()=>{if(!rt)return;const Ie=gt=>{tt.current&&!tt.current.contains(gt.target)&&st(!1)};return document.addEventListener("mousedown",Ie),()=>document.removeEventListener("mousedown",Ie)},[rt]);const nr=()=>{const Ie="abcdefghijklmnopqrstuvwxyz0123456789",gt=crypto.getRandomValues(new Uint8Array(6));let ft="";for(let Qt=0;Qt<6;Qt++)ft+=Ie[gt[Qt]%36];return ft},Rt=ae.useCallback(()=>{ct("create"),xn("新工作表"),wn(null),Ye(!0)},[]),xr=ae.useCallback(Ie=>{Ln(Ie),ge(!0)},[]),Tr=ae.useCallback(()=>{ge(!1),Ln(null)},[]),jr=ae.useCallback(async()=>{const Ie=Mn;if(!_||!Ie||Ot)return;const gt=`{${Ie}:delete}`;bt(!0);try{const Qt=await(await fetch(`/api/boards/${_}/notes`,{method:"POST",headers:{"Content-Type":"application/json"},body:JSON.stringify({text:gt,author_key:k,color_index:Sl,post_passcode:""})})).json();if(Qt.success){if(N===Ie){const En=nn.filter(zn=>zn!==Ie);Fe(En.length>0?En[0]:null)}}else console.error("Failed to delete sheet:",Qt.error)}catch(ft){console.error("Failed to delete sheet:",ft)}finally{bt(!1),ge(!1),Ln(null)}},[_,k,Ot,Mn,N,nn]),Dr=ae.useCallback(Ie=>{ct("rename"),xn(j(Ie)),wn(Ie),Ye(!0)},[Tt]),W=ae.useCallback(()=>{Ye(!1),xn(""),wn(null)},[]),D=ae.useCallback(async(Ie="")=>{if(!_||tn)return;const gt=Ut.trim();if(!gt)return;const ft=De==="create"?nr():hn,Qt=`{${ft}:title}${gt}`;Hn(!0);try{const En={text:Qt,author_key:k,color_index:Sl,post_passcode:Ie};De==="create"&&(En.is_new_sheet=!0);const Un=await(await fetch(`/api/boards/${_}/notes`,{method:"POST",headers:{"Content-Type":"application/json"},body:JSON.stringify(En)})).json();Un.success?(W(),Yt(!1),sn(""),Ct(""),Se(null),De==="create"&&Fe(Un.sheet_id||ft)):Ie?Ct(Un.error||"通關碼錯誤"):console.error("Failed to post sheet title note:",Un.error)}catch(En){console.error("Failed to post sheet title note:",En)}finally{Hn(!1)}},[_,k,De,Ut,hn,tn,W]),L=ae.useCallback(()=>{if(!(!_||tn||!Ut.trim())){if(!d&&$){Se("sheet"),sn(""),Ct(""),Yt(!0);return}D("")}},[_,tn,Ut,d,$,D]),j=Ie=>{const gt=Tt[Ie];return gt&&gt.title?gt.title:Ie},Z=ae.useCallback((Ie,gt,ft,Qt)=>{if(Ae)return;let En=Sl;if(Qt&&w.length>0){const zn=w.findIndex(Un=>Un.toLowerCase()===Qt.toLowerCase());zn!==-1&&(En=zn)}He({sheetId:Ie,cellId:gt}),nt(ft),rn(ft),At(En),_t(En),st(!1)},[Ae,w]),re=ae.useCallback(()=>{He(null),nt(""),rn(""),At(Sl),_t(Sl),st(!1)},[]),le=ae.useCallback(async(Ie="")=>{if(!Ae||!_||Oe)return;const gt=Be.trim(),ft=`{${Ae.sheetId}:${Ae.cellId}}${gt}`;ze(!0);try{const En=await(await fetch(`/api/boards/${_}/notes`,{method:"POST",headers:{"Content-Type":"application/json"},body:JSON.stringify({text:ft,author_key:k,color_index:Lt,post_passcode:Ie})})).json();En.success?(re(),Yt(!1),sn(""),Ct(""),Se(null)):Ie?Ct(En.error||"通關碼錯誤"):console.error("Failed to post table cell note:",En.error)}catch(Qt){console.error("Failed to post table cell note:",Qt)}finally{ze(!1)}},[Ae,Be,Lt,_,k,Oe,re]),pe=ae.useCallback(()=>{if(!Ae||!_||Oe)return;if(Be.trim()===Pt.trim()&&Lt===Dt){re();return}if(!d&&$){Se("cell"),sn(""),Ct(""),Yt(!0);return}le("")},[Ae,Be,Pt,Lt,Dt,_,Oe,re,d,$,le]),J=ae.useCallback(()=>{const Ie=jt.trim();if(!Ie){Ct("請輸入資料輸入密碼");return}Wt==="cell"?le(Ie):Wt==="sheet"&&D(Ie)},[jt,Wt,le,D]),xe=ae.useCallback(()=>{Yt(!1),sn(""),Ct(""),Se(null)},[]);if(nn.length===0)return O.jsxs("div",{className:"tv-empty",children:[O.jsxs("svg",{className:"tv-empty-icon",width:"56",height:"56",viewBox:"0 0 56 56",fill:"none",xmlns:"http://www.w3.org/2000/svg",children:[O.jsx("rect",{x:"6",y:"10",width:"44",height:"36",rx:"4",stroke:"#bdc1c6",strokeWidth:"2.2"}),O.jsx("line",{x1:"6",y1:"20",x2:"50",y2:"20",stroke:"#bdc1c6",strokeWidth:"2.2"}),O.jsx("line",{x1:"6",y1:"30",x2:"50",y2:"30",stroke:"#dadce0",strokeWidth:"1.5"}),O.jsx("line",{x1:"6",y1:"38",x2:"50",y2:"38",stroke:"#dadce0",strokeWidth:"1.5"}),O.jsx("line",{x1:"20",y1:"20",x2:"20",y2:"46",stroke:"#dadce0",strokeWidth:"1.5"}),O.jsx("line",{x1:"36",y1:"20",x2:"36",y2:"46",stroke:"#dadce0",strokeWidth:"1.5"})]}),O.jsx("div",{className:"tv-empty-msg",children:"暫無表格資料，可等待接收其他節點資料，或以管理者身份建立新工作表.."}),d&&O.jsx("button",{className:"tv-empty-btn",onClick:Rt,children:"建立新工作表"}),lt&&O.jsx("div",{className:"modal-overlay",onClick:W,children:O.jsxs("div",{className:"modal-content",onClick:Ie=>Ie.stopPropagation(),children:[O.jsx("div",{className:"modal-header",children:De==="create"?"新建立工作表":"工作表名稱異動"}),O.jsxs("div",{className:"modal-body",children:[O.jsx("label",{className:"tv-sheet-modal-label",children:"工作表名稱"}),O.jsx("input",{type:"text",className:"admin-passcode-input tv-sheet-name-input",value:Ut,onChange:Ie=>xn(Ie.target.value),maxLength:50,onKeyDown:Ie=>{Ie.key==="Enter"&&L()},autoFocus:!0})]}),O.jsxs("div",{className:"modal-actions",children:[O.jsx("button",{className:"modal-btn modal-btn-cancel",onClick:W,children:"取消"}),O.jsx("button",{className:"modal-btn modal-btn-confirm",onClick:L,disabled:tn||!Ut.trim(),children:"確定"})]})]})}),_n&&Mn&&O.jsx("div",{className:"modal-overlay",onClick:Tr,children:O.jsxs("div",{className:"modal-content",onClick:Ie=>Ie.stopPropagation(),children:[O.jsx("div",{className:"modal-header",children:"刪除工作表"}),O.jsx("div",{className:"modal-body",children:O.jsxs("p",{children:["確認要刪除工作表「",j(Mn),"」？刪除後無法復原，並會同步影響其他節點中的內容。"]})}),O.jsxs("div",{className:"modal-actions",children:[O.jsx("button",{className:"modal-btn modal-btn-cancel",onClick:Tr,children:"取消"}),O.jsx("button",{className:"modal-btn modal-btn-confirm",onClick:jr,disabled:Ot,style:{background:"#d32f2f"},children:"刪除"})]})]})})]});const Pe=N?Tt[N]:null,ve=Pe&&Pe.cells||{},Ue=Object.keys(ve);let pt=0,vt=0;Ue.forEach(Ie=>{const gt=Ie.charCodeAt(0)-65,ft=parseInt(Ie.substring(1),10);gt>pt&&(pt=gt),ft>vt&&(vt=ft)});const Vt=Math.max(Ue.length>0?pt+1:0,10)+Mt,dn=Vt+3,On=Math.max(vt,20)+Ne,pn=40,Kt=(Ie,gt)=>Ie?Ie.length>gt?Ie.substring(0,gt)+"…":Ie:"",Tn=()=>{Ze(Ie=>Ie+1)},An=()=>{he(Ie=>Ie+1)},lr=(Ie,gt)=>Ae&&Ae.sheetId===Ie&&Ae.cellId===gt,rr=(Ie,gt,ft)=>{const Qt=ve[Ie],En=Qt?Qt.content:"",zn=Qt&&Qt.bgColor?{width:120,minWidth:120,backgroundColor:Qt.bgColor}:{width:120,minWidth:120},Un=lr(N,Ie),Ms=!Un&&Bt&&(Bt.type==="row"&&ft===Bt.index||Bt.type==="col"&&gt===Bt.index),Vr=Qt&&Qt.bgColor&&!BC(Qt.bgColor);return Un?O.jsxs("td",{className:"tv-cell tv-cell-editing",style:{...zn,position:"relative",overflow:"visible"},ref:Ve,children:[O.jsx("textarea",{className:"tv-cell-input",style:w[Lt]?{backgroundColor:w[Lt]}:void 0,value:Be,onChange:$n=>nt($n.target.value),autoFocus:!0,onKeyDown:$n=>{$n.key==="Escape"&&re()}}),O.jsxs("div",{className:"tv-cell-toolbar",ref:tt,children:[O.jsx("button",{className:"tv-toolbar-btn tv-toolbar-confirm",onClick:pe,disabled:Oe,title:"確認",children:"✓"}),O.jsx("button",{className:"tv-toolbar-btn tv-toolbar-cancel",onClick:re,title:"取消",children:"✕"}),O.jsxs("div",{className:"tv-toolbar-color-wrapper",children:[O.jsx("button",{className:"tv-toolbar-btn tv-toolbar-color",onClick:$n=>{const li=$n.currentTarget.getBoundingClientRect();Ce(li.top<200),st(!rt)},title:"變更顏色",children:"🎨"}),rt&&w.length>0&&O.jsx("div",{className:`tv-color-dropdown${ht?" drop-down":""}`,children:w.map(($n,li)=>O.jsx("div",{className:`tv-color-option ${Lt===li?"selected":""}`,style:{backgroundColor:$n},onClick:()=>{At(li),st(!1)}},li))})]})]})]},gt):O.jsx("td",{className:`tv-cell${Ms?" tv-cell-hl":""}${Ms&&!Vr?" tv-cell-hl-nobg":""}`,title:En,style:zn,onClick:()=>Z(N,Ie,En,Qt?Qt.bgColor:""),children:En},gt)};return O.jsxs("div",{className:`tv-wrapper ${p?"header-visible":"header-hidden"}`,children:[O.jsx("div",{className:"tv-grid-area",children:O.jsxs("table",{className:"tv-grid",style:{"--row-header-width":`${pn}px`},children:[O.jsxs("colgroup",{children:[O.jsx("col",{style:{width:pn}}),Array.from({length:dn},(Ie,gt)=>O.jsx("col",{style:{width:"120px"}},gt))]}),O.jsx("thead",{children:O.jsxs("tr",{children:[O.jsx("th",{className:"tv-corner",style:{width:pn,minWidth:pn,maxWidth:pn}}),Array.from({length:Vt},(Ie,gt)=>O.jsx("th",{style:{width:120,minWidth:120},className:Bt&&Bt.type==="col"&&Bt.index===gt?"tv-hl-active":"",onClick:()=>Ht(ft=>ft&&ft.type==="col"&&ft.index===gt?null:{type:"col",index:gt}),children:String.fromCharCode(65+gt)},gt)),Array.from({length:3},(Ie,gt)=>O.jsx("th",{className:"tv-blank-col-header",style:{width:120,minWidth:120},children:gt===0?O.jsx("button",{className:"tv-add-col-btn",onClick:An,title:"新增一欄",children:"+"}):null},`blank-col-${gt}`))]})}),O.jsxs("tbody",{children:[Array.from({length:On},(Ie,gt)=>{const ft=gt+1;return O.jsxs("tr",{children:[O.jsx("th",{className:`tv-row-header${Bt&&Bt.type==="row"&&Bt.index===ft?" tv-hl-active":""}`,style:{width:pn,minWidth:pn,maxWidth:pn},onClick:()=>Ht(Qt=>Qt&&Qt.type==="row"&&Qt.index===ft?null:{type:"row",index:ft}),children:ft}),Array.from({length:Vt},(Qt,En)=>{const zn=String.fromCharCode(65+En)+ft;return rr(zn,En,ft)}),Array.from({length:3},(Qt,En)=>O.jsx("td",{className:"tv-cell tv-blank-cell",style:{width:120,minWidth:120}},`blank-${En}`))]},ft)}),Array.from({length:3},(Ie,gt)=>{const ft=On+gt+1,Qt=gt===0;return O.jsxs("tr",{className:"tv-blank-row",children:[O.jsx("th",{className:"tv-row-header tv-blank-header",style:{width:pn,minWidth:pn,maxWidth:pn},children:Qt?O.jsx("button",{className:"tv-add-row-btn",onClick:Tn,title:"新增一行",children:"+"}):null}),Array.from({length:Vt},(En,zn)=>O.jsx("td",{className:"tv-cell tv-blank-cell",style:{width:120,minWidth:120}},zn)),Array.from({length:3},(En,zn)=>O.jsx("td",{className:"tv-cell tv-blank-cell",style:{width:120,minWidth:120}},`blank-col-${zn}`))]},`blank-${ft}`)})]})]})}),O.jsxs("div",{className:"tv-sheet-tabs",ref:Ee,children:[nn.map(Ie=>O.jsxs("div",{className:`tv-tab ${Ie===N?"is-active":""}`,onClick:()=>Fe(Ie),children:[O.jsx("span",{className:"tv-tab-label",children:Kt(j(Ie),12)}),d&&O.jsx("button",{className:"tv-tab-edit-btn",title:"重新命名",onClick:gt=>{gt.stopPropagation(),Dr(Ie)},children:O.jsxs("svg",{width:"12",height:"12",viewBox:"0 0 24 24",fill:"none",stroke:"currentColor",strokeWidth:"2.5",strokeLinecap:"round",strokeLinejoin:"round",children:[O.jsx("path",{d:"M17 3a2.83 2.83 0 0 1 4 4L7.5 20.5 2 22l1.5-5.5Z"}),O.jsx("path",{d:"m15 5 4 4"})]})}),d&&O.jsx("button",{className:"tv-tab-delete-btn",title:"刪除工作表",onClick:gt=>{gt.stopPropagation(),xr(Ie)},disabled:Ot,children:O.jsxs("svg",{width:"12",height:"12",viewBox:"0 0 24 24",fill:"none",stroke:"currentColor",strokeWidth:"2.5",strokeLinecap:"round",strokeLinejoin:"round",children:[O.jsx("polyline",{points:"3 6 5 6 21 6"}),O.jsx("path",{d:"M19 6v14a2 2 0 0 1-2 2H7a2 2 0 0 1-2-2V6m3 0V4a2 2 0 0 1 2-2h4a2 2 0 0 1 2 2v2"})]})})]},Ie)),d&&O.jsx("button",{className:"tv-tab tv-tab-add",title:"新建立工作表",onClick:Rt,children:O.jsxs("svg",{width:"16",height:"16",viewBox:"0 0 24 24",fill:"none",stroke:"currentColor",strokeWidth:"2.5",strokeLinecap:"round",strokeLinejoin:"round",children:[O.jsx("line",{x1:"12",y1:"5",x2:"12",y2:"19"}),O.jsx("line",{x1:"5",y1:"12",x2:"19",y2:"12"})]})}),je&&O.jsxs("div",{className:"tv-send-countdown",title:"資料完成送出時間倒數",children:[O.jsxs("svg",{className:"tv-countdown-icon",width:"14",height:"14",viewBox:"0 0 24 24",fill:"none",stroke:"currentColor",strokeWidth:"2",strokeLinecap:"round",strokeLinejoin:"round",children:[O.jsx("circle",{cx:"12",cy:"12",r:"10"}),O.jsx("polyline",{points:"12 6 12 12 16 14"})]}),O.jsx("span",{className:"tv-countdown-time",children:$t(un)})]})]}),lt&&O.jsx("div",{className:"modal-overlay",onClick:W,children:O.jsxs("div",{className:"modal-content",onClick:Ie=>Ie.stopPropagation(),children:[O.jsx("div",{className:"modal-header",children:De==="create"?"新建立工作表":"工作表名稱異動"}),O.jsxs("div",{className:"modal-body",children:[O.jsx("label",{className:"tv-sheet-modal-label",children:"工作表名稱"}),O.jsx("input",{type:"text",className:"admin-passcode-input tv-sheet-name-input",value:Ut,onChange:Ie=>xn(Ie.target.value),maxLength:50,onKeyDown:Ie=>{Ie.key==="Enter"&&L()},autoFocus:!0})]}),O.jsxs("div",{className:"modal-actions",children:[O.jsx("button",{className:"modal-btn modal-btn-cancel",onClick:W,children:"取消"}),O.jsx("button",{className:"modal-btn modal-btn-confirm",onClick:L,disabled:tn||!Ut.trim(),children:"確定"})]})]})}),_n&&Mn&&O.jsx("div",{className:"modal-overlay",onClick:Tr,children:O.jsxs("div",{className:"modal-content",onClick:Ie=>Ie.stopPropagation(),children:[O.jsx("div",{className:"modal-header",children:"刪除工作表"}),O.jsx("div",{className:"modal-body",children:O.jsxs("p",{children:["確認要刪除工作表「",j(Mn),"」？刪除後無法復原，並會同步影響其他節點中的內容。"]})}),O.jsxs("div",{className:"modal-actions",children:[O.jsx("button",{className:"modal-btn modal-btn-cancel",onClick:Tr,children:"取消"}),O.jsx("button",{className:"modal-btn modal-btn-confirm",onClick:jr,disabled:Ot,style:{background:"#d32f2f"},children:"刪除"})]})]})}),vn&&O.jsx("div",{className:"modal-overlay",onClick:xe,children:O.jsxs("div",{className:"modal-content",onClick:Ie=>Ie.stopPropagation(),children:[O.jsx("div",{className:"modal-header",children:"資料輸入密碼"}),O.jsxs("div",{className:"modal-body",children:[O.jsx("p",{children:"請輸入發送用通關碼以送出資料："}),O.jsx("input",{type:"password",className:"admin-passcode-input",placeholder:"輸入發送用通關碼",value:jt,onChange:Ie=>{sn(Ie.target.value),Ct("")},onKeyDown:Ie=>{Ie.key==="Enter"&&J()},autoFocus:!0}),Xt&&O.jsx("div",{className:"tv-passcode-error",children:Xt})]}),O.jsxs("div",{className:"modal-actions",children:[O.jsx("button",{className:"modal-btn modal-btn-cancel",onClick:xe,children:"取消"}),O.jsx("button",{className:"modal-btn modal-btn-confirm",onClick:J,disabled:Oe||tn,children:"確定"})]})]})})]})}const Yd="YourChannelName",af=typeof window<"u"&&window.APP_META?window.APP_META:{},OC=af.serviceName||"Mesh資訊站",jC=af.projectName||"meshBridge/meshNoteboard",VC=af.version||"-",UC=af.sendIntervalSecond||30,xs=["hsl(0, 70%, 85%)","hsl(30, 70%, 85%)","hsl(60, 70%, 85%)","hsl(90, 70%, 85%)","hsl(120, 70%, 85%)","hsl(150, 70%, 85%)","hsl(180, 70%, 85%)","hsl(210, 70%, 85%)","hsl(240, 70%, 85%)","hsl(270, 70%, 85%)","hsl(300, 70%, 85%)","hsl(330, 70%, 85%)","hsl(0, 0%, 85%)","hsl(0, 0%, 75%)","hsl(45, 80%, 85%)","hsl(0, 0%, 100%)"];function mergeNotesDelta(n,i){const l=new Set(i.removed||[]),p=new Map;i.notes.forEach(k=>{p.set(k.noteId,k),l.add(k.noteId),(k.replyNotes||[]).forEach(w=>l.add(w.noteId))});const _=[];return n.forEach(k=>{if(p.has(k.noteId))_.push(p.get(k.noteId)),p.delete(k.noteId);else if(!l.has(k.noteId)){const w=(k.replyNotes||[]).filter(x=>!l.has(x.noteId));_.push(w.length===(k.replyNotes||[]).length?k:{...k,replyNotes:w})}}),_.push(...p.values()),_.sort((k,w)=>Number(!!w.isPinedNote)-Number(!!k.isPinedNote)||(w.timestamp||0)-(k.timestamp||0)),_}function zx(){const n="abcdefghijklmnopqrstuvwxyz0123456789",i=crypto.getRandomValues(new Uint8Array(8));let l="";for(let p=0;p<8;p++)l+=n[i[p]%36];return l}function $C(n){let i=0;for(let p=0;p<n.length;p++)i=n.charCodeAt(p)+((i<<5)-i);return{bg:`hsl(${Math.abs(i)%360}, 70%, 85%)`,text:"#333"}}function ws(n){return new Blob([n]).size}const Ar=150;function qC(){const[n,i]=ae.useState(null),[l,p]=ae.useState([]),[_,k]=ae.useState(!1),[w,d]=ae.useState(!1),[$,ie]=ae.useState(null),[ce,te]=ae.useState(!1),[N,Fe]=ae.useState(Yd),[Ne,Ze]=ae.useState([]),[Mt,he]=ae.useState(!1),[ne,de]=ae.useState({}),[Ee,Ae]=ae.useState(!1),[He,Be]=ae.useState(null),[nt,Lt]=ae.useState(""),[At,Pt]=ae.useState(""),[rn,Dt]=ae.useState(""),[_t,rt]=ae.useState(!1),[st,ht]=ae.useState(""),[Ce,Oe]=ae.useState(0),[ze,Ve]=ae.useState(null),[tt,Bt]=ae.useState(""),[Ht,lt]=ae.useState(0),[Ye,De]=ae.useState({show:!1,type:"alert",title:"",message:"",onConfirm:null}),[ct,Ut]=ae.useState(null),[xn,hn]=ae.useState(0),[wn,tn]=ae.useState("newest"),[Hn,_n]=ae.useState(""),[ge,Mn]=ae.useState(!1),[Ln,Ot]=ae.useState(!1),[bt,vn]=ae.useState(!1),[Yt,jt]=ae.useState(!0),sn=ae.useRef(0),Xt=ae.useRef(null),Ct=ae.useRef(null),[Wt,Se]=ae.useState(0),[Dn,un]=ae.useState(0),[bn,Cr]=ae.useState(!1),[je,$t]=ae.useState(!1),Tt=ae.useRef(wn),[nn,nr]=ae.useState(null),[Rt,xr]=ae.useState(""),[Tr,jr]=ae.useState(0),[Dr,W]=ae.useState(0),D=ae.useRef(null),[L,j]=ae.useState(null),Z=ae.useRef({}),[re,le]=ae.useState({}),[pe,J]=ae.useState(null),[xe,Pe]=ae.useState({top:0,left:0}),ve=ae.useRef(null),Ue=ae.useRef({}),pt=ae.useRef({x:0,y:0}),[vt,ln]=ae.useState(null),[Vt,dn]=ae.useState({top:0,left:0}),[Jt,On]=ae.useState(null),pn=ae.useRef(null),Kt=ae.useRef({}),[Tn,An]=ae.useState([]),[lr,rr]=ae.useState(!1),[Ie,gt]=ae.useState(""),[ft,Qt]=ae.useState({}),[En,zn]=ae.useState(""),[Un,Ms]=ae.useState(""),[Vr,$n]=ae.useState(!1),[li,ds]=ae.useState({}),[Wn,so]=ae.useState(!1),[ci,ir]=ae.useState(!0),[oo,wi]=ae.useState(!1),ao=ae.useRef(null),Ur=ae.useRef(!1),Nl=ae.useRef({}),notesSyncRef=ae.useRef({key:null,cursor:null,date:null}),[lo,ps]=ae.useState(!1),[Gi,Sn]=ae.useState(!1),[jo,Vo]=ae.useState(!1),[fr,fs]=ae.useState(()=>{try{return sessionStorage.getItem("viewMode")||"sticky"}catch{return"sticky"}}),[Uo,co]=ae.useState(0),Er=Tn.includes(N),Ai=ft[N]||!1;ae.useEffect(()=>{(async()=>{if(rn)try{const ke=await(await fetch(`/api/user/${rn}/last-location`)).json();ke.success&&ke.location&&ds($e=>({...$e,[rn]:ke.location}))}catch(be){console.error("Failed to fetch user last location:",be)}})()},[rn]);const Ga=async()=>{try{const be=await(await fetch("/api/global/lan-only-count")).json();be.success&&co(be.count)}catch(K){console.error("Failed to fetch global LAN-only count:",K)}},Ol=async(K=!1,be=null,ke=!1,Sd=!1)=>{try{const $e=be||N,Sk=`${$e}|${K}`,St=new Date().toDateString(),Sy=notesSyncRef.current,Sp=Sd&&Sy.key===Sk&&Sy.cursor!==null&&Sy.date===St?`&since=${Sy.cursor}`:"",Ge=await(await fetch(`/api/boards/${$e}/notes?is_include_deleted=${K}&include_acks=true${Sp}`)).json();if(Ge.success){if(Ge.delta){if(notesSyncRef.current.key!==Sk)return;notesSyncRef.current={key:Sk,cursor:Ge.cursor,date:St},(Ge.notes.length>0||Ge.removed.length>0)&&(p(zt=>mergeNotesDelta(zt,Ge)),mergeAcks(Ge.notes,Ge.removed))}else notesSyncRef.current={key:Sk,cursor:Ge.cursor??null,date:St},p(Ge.notes),jl(Ge.notes,$e);if(ke){const zt=Nl.current[$e];fs(zt||"sticky")}}}catch($e){console.error("Failed to fetch notes:",$e)}},mergeAcks=(K,be=[])=>{le(ke=>{const $e={...ke};return be.forEach(Le=>{delete $e[Le]}),K.forEach(Le=>{[Le,...Le.replyNotes||[]].forEach(Ge=>{Ge.noteId&&Array.isArray(Ge.acks)&&($e[Ge.noteId]=Ge.acks)})}),$e})},jl=async(K,be=null)=>{const ke=be||N,$e={},Le=[];K.forEach(Ge=>{Le.push(Ge),Ge.replyNotes&&Le.push(...Ge.replyNotes)});const Ft=[];for(const Ge of Le)Ge.noteId&&(Array.isArray(Ge.acks)?$e[Ge.noteId]=Ge.acks:Ft.push(Ge.noteId));if(Ft.length>0)try{const qr=await(await fetch(`/api/boards/${ke}/acks`,{method:"POST",headers:{"Content-Type":"application/json"},body:JSON.stringify({note_ids:Ft})})).json();qr.success&&Ft.forEach(zt=>{$e[zt]=qr.acks[zt]||[]})}catch(zt){console.error("Failed to fetch ACKs:",zt)}le($e)},ou=async K=>{try{const ke=await(await fetch(`/api/boards/${N}/notes/${K}/acks`)).json();ke.success&&le($e=>({...$e,[K]:ke.acks}))}catch(be){console.error(`Failed to fetch ACKs for note ${K}:`,be)}};ae.useEffect(()=>((async()=>{try{const Le=localStorage.getItem("activeChannels");if(Le){const Ge=JSON.parse(Le);Array.isArray(Ge)&&Ge.length>0&&(Ze(Ge),console.log("已從快取載入頻道清單:",Ge))}}catch(Le){console.error("Failed to load cached channels:",Le)}try{const Ge=await(await fetch("/api/user/uuid")).json();if(Ge.success)Dt(Ge.uuid);else{const zt=zx();Dt(zt)}}catch(Le){console.error("Failed to fetch UUID from backend:",Le);const Ge=zx();Dt(Ge)}try{const Ge=await(await fetch("/api/user/admin/status",{credentials:"include"})).json();Ge.success&&Ge.admin_channels&&An(Ge.admin_channels)}catch(Le){console.error("Failed to fetch admin status:",Le)}try{const Ge=await(await fetch("/api/config/post_passcode_required")).json();Ge.success&&Ge.channels_post_passcode&&Qt(Ge.channels_post_passcode)}catch(Le){console.error("Failed to fetch post passcode config:",Le)}try{const Ge=await(await fetch("/api/config/features")).json();Ge.success&&Ge.features&&(so(Ge.features.map_enabled||!1),wi(Ge.features.reauth_on_channel_switch||!1))}catch(Le){console.error("Failed to fetch features config:",Le)}let be=null;try{const Ge=await(await fetch("/api/session/current_board")).json();Ge.success&&Ge.board_id&&(be=Ge.board_id,Fe(be))}catch(Le){console.error("Failed to fetch current board:",Le)}let ke={};try{const Ge=await(await fetch("/api/channel/verified_status")).json();Ge.success&&Ge.channels&&(Ge.channels.forEach(zt=>{ke[zt.name]={requiresPassword:zt.requires_password,isVerified:zt.is_verified}}),de(ke))}catch(Le){console.error("Failed to fetch verified status:",Le)}if(be&&ke[be]){const Le=ke[be];Le.requiresPassword&&!Le.isVerified&&(Be(be),Lt(""),Pt(""),Ae(!0))}Ga();const $e=fp();i($e),$e.on("lora_status",Le=>{k(Le.online),d(Le.channel_validated!==!1),ie(Le.error_message||null),te(Le.power_issue||!1),Le.active_channels&&Le.active_channels.length>0?(Ze(Le.active_channels),Fe(Ge=>Ge===Yd&&Le.active_channels.length>0?Le.active_channels[0]:Ge!==Yd&&Le.active_channels.length>0&&!Le.active_channels.includes(Ge)?(console.log(`⚠️ 先前選擇的頻道 "${Ge}" 已不在可用頻道中，自動切換至 "${Le.active_channels[0]}"`),Le.active_channels[0]):Ge)):Le.active_channels&&Le.active_channels.length===0&&console.log("LoRa 斷線，保留快取的頻道清單以供切換"),Le.online&&Le.channel_validated===!1&&(console.log("⚠️ LoRa 已連線，但 Channel 名稱不符合設定"),Le.error_message&&console.log("   "+Le.error_message))})})(),()=>{n&&n.close()}),[]),ae.useEffect(()=>{if(Ne.length>0)try{localStorage.setItem("activeChannels",JSON.stringify(Ne)),console.log("已儲存頻道清單到快取:",Ne)}catch(K){console.error("Failed to cache channels:",K)}},[Ne]),ae.useEffect(()=>{try{sessionStorage.setItem("viewMode",fr)}catch{}},[fr]),ae.useEffect(()=>{if(!Mt)return;const K=be=>{be.target.closest(".header-left")||he(!1)};return document.addEventListener("mousedown",K),()=>document.removeEventListener("mousedown",K)},[Mt]),ae.useEffect(()=>{if(!n)return;let cancelled=!1;const K=$e=>{Ol(ge,N,!1,!0),Ga()},handleNotesDelta=$e=>{if($e.board_id!==N)return;const Le=notesSyncRef.current,Ut=new Date().toDateString();!ge&&$e.cursor!==void 0&&Le.key===`${N}|false`&&Le.cursor===$e.since&&Le.date===Ut?(notesSyncRef.current={...Le,cursor:$e.cursor},p(Zt=>mergeNotesDelta(Zt,$e)),mergeAcks($e.notes,$e.removed)):($e.cursor===void 0||Le.cursor===null||Le.cursor<$e.cursor)&&Ol(ge,N,!1,!0)},joinBoard=async()=>{if(N===Yd)return;let $e=null;try{const Le=await(await fetch(`/api/boards/${N}/join-token`)).json();Le.success&&($e=Le.token)}catch(Le){console.error("Failed to fetch join token:",Le)}cancelled||n.emit("join_board",{board_id:N,token:$e})},handleJoinBoardResult=$e=>{$e.success||$e.board_id!==N||(console.warn("join_board failed:",$e.error),Ol(ge,N,!1,!0))},handleLanOnlyCount=$e=>{co($e.count)},Sr=()=>{joinBoard(),notesSyncRef.current.cursor!==null&&Ol(ge,N,!1,!0)},be=$e=>{$e.note_id&&(Array.isArray($e.acks)?le(Le=>({...Le,[$e.note_id]:$e.acks})):ou($e.note_id))},ke=$e=>{console.error("USB connection error:",$e.message),De({show:!0,type:"alert",title:"連線錯誤",message:$e.message,onConfirm:()=>De(Le=>({...Le,show:!1}))})};return joinBoard(),n.on("connect",Sr),n.on("refresh_notes",K),n.on("notes_delta",handleNotesDelta),n.on("join_board_result",handleJoinBoardResult),n.on("lan_only_count",handleLanOnlyCount),n.on("ack_received",be),n.on("usb_connection_error",ke),()=>{cancelled=!0,n.off("connect",Sr),n.off("refresh_notes",K),n.off("notes_delta",handleNotesDelta),n.off("join_board_result",handleJoinBoardResult),n.off("lan_only_count",handleLanOnlyCount),n.off("ack_received",be),n.off("usb_connection_error",ke)}},[n,ge,N]),ae.useEffect(()=>{if(N!==Yd){const K=Ur.current;Ol(ge,null,K),Ur.current=!1}},[ge,N]),ae.useEffect(()=>{if(Tt.current!==wn){$t(!0);const K=setTimeout(()=>{$t(!1)},600);return Tt.current=wn,()=>clearTimeout(K)}},[wn]),ae.useEffect(()=>{const K=be=>{pe&&ve.current&&!ve.current.contains(be.target)&&(be.target.closest(".ack-counter")||J(null))};if(pe)return document.addEventListener("mousedown",K),()=>{document.removeEventListener("mousedown",K)}},[pe]),ae.useEffect(()=>{const K=be=>{vt&&pn.current&&!pn.current.contains(be.target)&&(be.target.closest(".note-status.sender-clickable")||(ln(null),On(null)))};if(vt)return document.addEventListener("mousedown",K),()=>{document.removeEventListener("mousedown",K)}},[vt]),ae.useEffect(()=>{const K=()=>{if(window.innerWidth>768){jt(!0);return}const be=window.scrollY,ke=be-sn.current,$e=document.documentElement.scrollHeight,Le=window.innerHeight,Ge=be+Le>=$e-50;be<10?jt(!0):ke>5&&be>50&&!Ge?jt(!1):ke<-5&&!Ge&&jt(!0),sn.current=be};return window.addEventListener("scroll",K,{passive:!0}),()=>window.removeEventListener("scroll",K)},[]),ae.useEffect(()=>{_t&&Ct.current&&setTimeout(()=>{if(Ct.current){const K=Ct.current.getBoundingClientRect(),ke=window.scrollY+K.top-100;window.scrollTo({top:ke,behavior:"smooth"}),Ct.current.focus(),Ct.current.value&&Ct.current.setSelectionRange(0,0)}},150)},[_t]),ae.useEffect(()=>{if(L){let K=!1;const be=()=>{const zt=Z.current[L];if(zt&&!K){const qr=zt.getBoundingClientRect(),jn=window.scrollY+qr.top-100;return window.scrollTo({top:jn,behavior:"smooth"}),K=!0,setTimeout(()=>{zt&&zt.classList.add("note-paste-animation")},500),!0}return!1};let ke=0;const $e=10,Le=setInterval(()=>{ke++,(be()||ke>=$e)&&clearInterval(Le)},100),Ge=setTimeout(()=>{j(null)},3e3);return()=>{clearInterval(Le),clearTimeout(Ge)}}},[L,l]);const on=(K,be="提示")=>{De({show:!0,type:"alert",title:be,message:K,onConfirm:()=>De({...Ye,show:!1})})},Hi=(K,be="確認")=>new Promise(ke=>{De({show:!0,type:"confirm",title:be,message:K,onConfirm:()=>{De({...Ye,show:!1}),ke(!0)},onCancel:()=>{De({...Ye,show:!1}),ke(!1)}})}),$r=async()=>{Er?await Hi(`確定要登出頻道 "${N}" 的管理者身份，切換為一般使用者嗎？`,"登出管理者")&&$o():(rr(!0),gt(""))},Rr=async()=>{if(!Ie.trim()){on("請輸入管理者密碼！");return}try{const be=await(await fetch("/api/user/admin/authenticate",{method:"POST",credentials:"include",headers:{"Content-Type":"application/json"},body:JSON.stringify({passcode:Ie,board_id:N})})).json();be.success&&be.is_admin?(An(ke=>ke.includes(N)?ke:[...ke,N]),rr(!1),gt(""),on(`已切換至頻道 "${N}" 的管理者身份`,"成功")):(on("密碼錯誤，請重新輸入","錯誤"),gt(""))}catch(K){console.error("Failed to authenticate admin:",K),on("認證失敗："+K.message,"錯誤")}},uo=()=>{rr(!1),gt("")},$o=async()=>{try{const be=await(await fetch("/api/user/admin/logout",{method:"POST",credentials:"include",headers:{"Content-Type":"application/json"},body:JSON.stringify({board_id:N})})).json();be.success?(An(ke=>ke.filter($e=>$e!==N)),on(`已登出頻道 "${N}" 的管理者身份`,"成功")):on("登出失敗："+(be.error||"未知錯誤"),"錯誤")}catch(K){console.error("Failed to logout admin:",K),on("登出失敗："+K.message,"錯誤")}},ho=async K=>{if(await Hi("是否將此便利貼置頂？一次僅能有一則置頂。","置頂便利貼"))try{const $e=await(await fetch(`/api/boards/${N}/notes/${K}/pin`,{method:"POST",headers:{"Content-Type":"application/json"}})).json();$e.success?on("已成功置頂便利貼","成功"):on("置頂失敗："+($e.error||"未知錯誤"),"錯誤")}catch(ke){console.error("Failed to pin note:",ke),on("置頂失敗："+ke.message,"錯誤")}},Ha=async K=>{if(await Hi("確認重新發送置頂指令？","重送置頂"))try{const $e=await(await fetch(`/api/boards/${N}/notes/${K}/pin`,{method:"POST",headers:{"Content-Type":"application/json"}})).json();$e.success?on("已重新發送置頂指令","成功"):on("重送置頂失敗："+($e.error||"未知錯誤"),"錯誤")}catch(ke){console.error("Failed to resend pin:",ke),on("重送置頂失敗："+ke.message,"錯誤")}},As=K=>{const be=typeof K=="string"?K:"";rt(!0),ht(be),Oe(0),Se(ws(be)),zn("")},po=()=>{rt(!1),ht(""),Oe(0),Se(0),zn("")},Vl=K=>{nr(K),xr(""),jr(0),W(0),Ms("")},qo=()=>{Nl.current[N]=fr},au=async K=>{_t&&po(),nn&&Wi();const be=ne[K];if(be&&be.requiresPassword&&!be.isVerified){if(oo&&N!==K){try{await fetch("/api/session/select_board",{method:"POST",headers:{"Content-Type":"application/json"},body:JSON.stringify({board_id:K})})}catch{}de(ke=>{const $e=ke[N];return $e&&$e.requiresPassword?{...ke,[N]:{...$e,isVerified:!1}}:ke}),An(ke=>ke.filter($e=>$e!==N))}qo(),Be(K),Lt(""),Pt(""),Ae(!0),he(!1);return}try{const ke=N;(await(await fetch("/api/session/select_board",{method:"POST",headers:{"Content-Type":"application/json"},body:JSON.stringify({board_id:K})})).json()).success&&(oo&&ke!==K&&(de(Ge=>{const zt=Ge[ke];return zt&&zt.requiresPassword?{...Ge,[ke]:{...zt,isVerified:!1}}:Ge}),An(Ge=>Ge.filter(zt=>zt!==ke))),qo(),Ur.current=!0,Fe(K),he(!1))}catch(ke){console.error("Failed to switch channel:",ke)}},Ul=async()=>{if(He){Pt("");try{const be=await(await fetch("/api/channel/verify_password",{method:"POST",headers:{"Content-Type":"application/json"},body:JSON.stringify({channel_name:He,password:nt})})).json();if(be.success&&be.verified){if(de(Le=>({...Le,[He]:{...Le[He],isVerified:!0}})),(await(await fetch("/api/session/select_board",{method:"POST",headers:{"Content-Type":"application/json"},body:JSON.stringify({board_id:He})})).json()).success){const Le=He;qo(),Ur.current=!0,Fe(Le),Ae(!1),Be(null),Lt("")}}else Pt("密碼錯誤，請重試")}catch(K){console.error("Failed to verify password:",K),Pt("驗證失敗，請重試")}}},Wa=()=>{Ae(!1),Be(null),Lt(""),Pt("")},Wi=()=>{nr(null),xr(""),jr(0),W(0),Ms("")},Xa=async()=>{const K=Rt.trim();if(!K){on("請輸入回覆內容！");return}if(!Er&&Ai&&!Un.trim()){on("請輸入發送用通關碼！");return}if(!Gi){Sn(!0);try{const ke=await(await fetch(`/api/boards/${N}/notes`,{method:"POST",headers:{"Content-Type":"application/json"},body:JSON.stringify({text:K,author_key:rn,color_index:Tr,parent_note_id:nn,post_passcode:Un})})).json();ke.success?(nr(null),xr(""),jr(0),W(0),Ms(""),ke.note&&ke.note.noteId&&j(ke.note.noteId)):on("張貼回覆失敗："+(ke.error||"未知錯誤"),"錯誤")}catch(be){console.error("Failed to create reply:",be),on("張貼回覆失敗："+be.message,"錯誤")}finally{Sn(!1)}}},Zo=K=>{const be=K.target.value,ke=ws(be);!bn&&ke>Ar||(xr(be),W(ke))},Ka=async()=>{const K=st.trim();if(!K){on("請輸入便利貼內容！");return}if(!Er&&Ai&&!En.trim()){on("請輸入發送用通關碼！");return}if(!lo){ps(!0);try{const ke=await(await fetch(`/api/boards/${N}/notes`,{method:"POST",headers:{"Content-Type":"application/json"},body:JSON.stringify({text:K,author_key:rn,color_index:Ce,post_passcode:En})})).json();ke.success?(rt(!1),ht(""),Oe(0),Se(0),zn(""),ke.note&&ke.note.noteId&&j(ke.note.noteId)):on("建立便利貼失敗："+(ke.error||"未知錯誤"),"錯誤")}catch(be){console.error("Failed to create note:",be),on("建立便利貼失敗："+be.message,"錯誤")}finally{ps(!1)}}},Ya=K=>{Ve(K.noteId),Bt(K.text),un(ws(K.text));const be=xs.findIndex(ke=>ke===K.bgColor);lt(be>=0?be:0)},zi=()=>{Ve(null),Bt(""),lt(0),un(0)},lu=async K=>{const be=tt.trim();if(!be){on("請輸入便利貼內容！");return}if(!jo){Vo(!0);try{const $e=await(await fetch(`/api/boards/${N}/notes/${K}`,{method:"PUT",headers:{"Content-Type":"application/json"},body:JSON.stringify({text:be,author_key:rn,color_index:Ht})})).json();$e.success?(Ve(null),Bt(""),lt(0),un(0)):on("更新便利貼失敗："+($e.error||"未知錯誤"),"錯誤")}catch(ke){console.error("Failed to update note:",ke),on("更新便利貼失敗："+ke.message,"錯誤")}finally{Vo(!1)}}},fo=async(K,be=!1,ke=null)=>{let $e=!1,Le=l.find(er=>er.noteId===K);if(Le)$e=!0;else for(const er of l)if(er.replyNotes&&(Le=er.replyNotes.find(jn=>jn.noteId===K),Le)){$e=!1;break}let Ge="確定要封存這個便利貼嗎？";if($e&&(Ge+=`
 
 ⚠️ 會自動連帶隱藏整串便利貼內容`),!await Hi(Ge,"確認封存"))return;const qr=ke||rn;try{let er;be?er=await fetch(`/api/boards/${N}/notes/${K}`,{method:"DELETE",headers:{"Content-Type":"application/json"},body:JSON.stringify({author_key:qr})}):er=await fetch(`/api/boards/${N}/notes/${K}/archive`,{method:"POST",headers:{"Content-Type":"application/json"},body:JSON.stringify({author_key:qr,is_admin:Er&&ke!==null})});const jn=await er.json();jn.success||on("封存便利貼失敗："+(jn.error||"未知錯誤"),"錯誤")}catch(er){console.error("Failed to delete note:",er),on("封存便利貼失敗："+er.message,"錯誤")}},zs=async(K,be=null)=>{if(!await Hi("確認重新發送訊息？","重新發送"))return;const $e=Er&&be&&be!==rn;try{const Ge=await(await fetch(`/api/boards/${N}/notes/${K}/resend`,{method:"POST",headers:{"Content-Type":"application/json"},body:JSON.stringify({author_key:rn,is_admin:$e})})).json();Ge.success?on(`已重新發送訊息 (第 ${Ge.resent_count} 次)`,"成功"):on("重新發送失敗："+(Ge.error||"未知錯誤"),"錯誤")}catch(Le){console.error("Failed to resend note:",Le),on("重新發送失敗："+Le.message,"錯誤")}},Xi=K=>{const be=xs.findIndex(ke=>ke===K.bgColor);hn(be>=0?be:0),Ut(K)},kn=()=>{Ut(null),hn(0)},Go=async()=>{if(!ct)return;const K=ct.userId===rn,be=Er&&!K;try{const $e=await(await fetch(`/api/boards/${N}/notes/${ct.noteId}/color`,{method:"POST",headers:{"Content-Type":"application/json"},body:JSON.stringify({author_key:rn,color_index:xn,is_admin:be})})).json();$e.success?kn():on("變更顏色失敗："+($e.error||"未知錯誤"),"錯誤")}catch(ke){console.error("Failed to change color:",ke),on("變更顏色失敗："+ke.message,"錯誤")}},Ho=K=>{switch(K){case"LoRa received":return"LoRa接收";case"sent":case"LoRa sent":return"LoRa送出";case"local":return"⚠️ 僅區網";case"LAN only":return"⚠️ 僅區網";default:return K}},Gs=()=>[...l.filter(ke=>{if(!Ln){const $e=(ke.text||"").trim();if(Vp.test($e)||/^\{[a-z0-9]{6}:delete\}$/.test($e))return!1}if(Hn.trim()){const $e=Hn.toLowerCase(),Le=(ke.text||"").toLowerCase(),Ge=(ke.sender||"").toLowerCase();return Le.includes($e)||Ge.includes($e)?!0:(ke.replyNotes||[]).some(er=>{const jn=(er.text||"").toLowerCase(),ui=(er.sender||"").toLowerCase();return jn.includes($e)||ui.includes($e)})}return!0})].sort((ke,$e)=>{if(ke.isPinedNote&&!$e.isPinedNote)return-1;if(!ke.isPinedNote&&$e.isPinedNote)return 1;if(wn==="newest")return new Date($e.timestamp||0)-new Date(ke.timestamp||0);if(wn==="oldest")return new Date(ke.timestamp||0)-new Date($e.timestamp||0);if(wn==="color"){const Le=xs.indexOf(ke.bgColor),Ge=xs.indexOf($e.bgColor);return Le-Ge}return 0}),cu=K=>{const be=K.target.value,ke=ws(be);!bn&&ke>Ar||(ht(be),Se(ke))},$l=K=>{const be=K.target.value,ke=ws(be);!bn&&ke>Ar||(Bt(be),un(ke))},Ja=()=>{Cr(!0)},Wo=(K,be=!1)=>{Cr(!1);const ke=K.target.value;if(ws(ke)>Ar){let Le=ke;for(;ws(Le)>Ar;)Le=Le.slice(0,-1);be?(Bt(Le),un(ws(Le))):(ht(Le),Se(ws(Le)))}},mo=()=>{$n(!0)},ql=()=>{$n(!1)},Xo=async K=>{if(!(!K||!rn))try{await fetch(`/api/user/${rn}/last-location`,{method:"POST",headers:{"Content-Type":"application/json"},body:JSON.stringify({lat:K.center.lat,lng:K.center.lng,zoom:K.zoom})}),ds(be=>({...be,[rn]:{lat:K.center.lat,lng:K.center.lng,zoom:K.zoom}}))}catch(be){console.error("Failed to save user last location:",be)}},Zl=(K,be)=>{const ke=/([\u4e00-\u9fa5a-zA-Z0-9_\-]+)?@\(([-+]?\d*\.?\d+)\s*,\s*([-+]?\d*\.?\d+)\)/g;if(ze){const Le=tt.replace(ke,"").trim(),Ge=Le?`${Le} ${K}`:K,zt=ws(Ge);zt<=Ar?(Bt(Ge),un(zt),$n(!1),Xo(be),Ct.current&&Ct.current.focus()):on("加入座標後會超過字數限制！","錯誤")}else if(nn){const Le=Rt.replace(ke,"").trim(),Ge=Le?`${Le} ${K}`:K,zt=ws(Ge);zt<=Ar?(xr(Ge),W(zt),$n(!1),Xo(be),D.current&&D.current.focus()):on("加入座標後會超過字數限制！","錯誤")}else{const Le=st.replace(ke,"").trim(),Ge=Le?`${Le} ${K}`:K,zt=ws(Ge);zt<=Ar?(ht(Ge),Se(zt),$n(!1),Xo(be),Ct.current&&Ct.current.focus()):on("加入座標後會超過字數限制！","錯誤")}},Qa=K=>{const be=/([\u4e00-\u9fa5a-zA-Z0-9_\-]+)?@\(([-+]?\d*\.?\d+)\s*,\s*([-+]?\d*\.?\d+)\)/g,ke=[];let $e;for(;($e=be.exec(K))!==null;){const Le={lat:parseFloat($e[2]),lng:parseFloat($e[3])};$e[1]&&$e[1].trim()&&(Le.label=$e[1].trim()),ke.push(Le)}return ke.length>0?ke:null},Ls=(K,be)=>{if(!be.trim())return K;const ke=K.toLowerCase(),$e=be.toLowerCase(),Le=[];let Ge=0,zt=ke.indexOf($e);for(;zt!==-1;)zt>Ge&&Le.push(K.substring(Ge,zt)),Le.push(O.jsx("mark",{style:{backgroundColor:"yellow",color:"#333"},children:K.substring(zt,zt+be.length)},`${zt}-${Ge}`)),Ge=zt+be.length,zt=ke.indexOf($e,Ge);return Ge<K.length&&Le.push(K.substring(Ge)),Le.length>0?Le:K},el=(K,be,ke=!1)=>{K.sender;const $e=K.userId||"unknown-id",Le=K.text,Ge=K.time||"",zt=K.status||"local",qr=K.bgColor||$C($e).bg,er=$e===rn,jn=er&&zt==="LAN only"&&!K.archived,ui=er&&zt!=="LAN only"&&!K.archived,Ko=Er&&!er&&!K.archived&&zt!=="LAN only",Li=(Le||"").trim(),Yo=Vp.test(Li)||/^\{[a-z0-9]{6}:delete\}$/.test(Li);return ze===K.noteId?O.jsxs("div",{className:"sticky-note draft-note",style:{backgroundColor:xs[Ht],color:"#333"},children:[O.jsx("div",{className:"draft-header",children:"編輯便利貼"}),O.jsx("textarea",{className:"draft-textarea",value:tt,onChange:$l,onCompositionStart:Ja,onCompositionEnd:an=>Wo(an,!0),placeholder:"輸入內容...",autoFocus:!0}),Wn&&O.jsx("div",{className:"draft-tools",children:O.jsx("button",{className:"btn-location-picker",onClick:mo,title:"地圖座標",children:"📍 地圖座標"})}),O.jsxs("div",{className:"byte-counter-container",children:[O.jsx("div",{className:"byte-counter-bar",children:O.jsx("div",{className:"byte-counter-fill",style:{width:`${Math.min(Dn/Ar*100,100)}%`,backgroundColor:Dn>Ar?"#d32f2f":"#3498db"}})}),O.jsxs("div",{className:"byte-counter-text",style:{color:Dn>Ar?"#d32f2f":"#666"},children:[Dn,"/",Ar]})]}),O.jsx("div",{className:"color-picker",children:xs.map((an,mr)=>O.jsx("div",{className:`color-option ${Ht===mr?"selected":""}`,style:{backgroundColor:an},onClick:()=>lt(mr)},mr))}),O.jsxs("div",{className:"draft-actions",children:[O.jsx("button",{className:"btn-cancel",onClick:zi,children:"取消"}),O.jsx("button",{className:"btn-submit",onClick:()=>lu(K.noteId),disabled:jo,children:"更新"})]})]},K.noteId||be):O.jsxs("div",{ref:an=>{K.noteId&&(Z.current[K.noteId]=an)},className:`sticky-note ${zt==="local"?"note-failed":""} ${je?"reordering":""} ${ke?"reply-note":""}`,style:{backgroundColor:qr,color:"#333"},children:[(K.archived||K.isTempParentNote||K.isPinedNote)&&O.jsx("div",{className:"note-label",children:K.archived?"已封存":K.isPinedNote?"置頂":"暫無法取得前張便利貼"}),O.jsx("div",{className:"note-content",children:Ls(Le,Hn)}),Wn&&Qa(Le)&&O.jsx("div",{style:{marginTop:"10px",marginBottom:"10px"},children:O.jsx(AC,{locations:Qa(Le)})}),O.jsxs("div",{className:"note-footer",children:[O.jsx("span",{className:"note-time",children:Ge}),O.jsx("span",{className:"note-footer-right",children:(zt==="sent"||zt==="LoRa sent")&&(K.userId===rn||Er)&&!K.archived?O.jsxs("span",{className:"note-status clickable",onClick:an=>{an.stopPropagation(),zs(K.noteId,K.userId)},title:"點擊重新發送",children:[Ho(zt),O.jsxs("span",{className:"ack-counter-wrapper",children:[O.jsx("span",{ref:an=>{K.noteId&&(Ue.current[K.noteId]=an)},className:"ack-counter",onClick:an=>{if(an.stopPropagation(),pe===K.noteId)J(null);else{const mr=an.currentTarget.getBoundingClientRect();Pe({top:mr.bottom+8,left:mr.right-150}),J(K.noteId)}},children:re[K.noteId]&&re[K.noteId].length||"-"}),O.jsx("span",{className:"ack-counter-touch-overlay",onTouchStart:an=>{pt.current={x:an.touches[0].clientX,y:an.touches[0].clientY}},onTouchEnd:an=>{const mr=an.changedTouches[0].clientX,go=an.changedTouches[0].clientY,Ki=Math.abs(mr-pt.current.x),yo=Math.abs(go-pt.current.y);if(Ki<10&&yo<10)if(an.preventDefault(),an.stopPropagation(),pe===K.noteId)J(null);else{const _o=Ue.current[K.noteId].getBoundingClientRect();Pe({top:_o.bottom+8,left:_o.right-150}),J(K.noteId)}}})]})]}):zt==="sent"||zt==="LoRa sent"?O.jsxs("span",{className:"note-status",children:[Ho(zt),O.jsxs("span",{className:"ack-counter-wrapper",children:[O.jsx("span",{ref:an=>{K.noteId&&(Ue.current[K.noteId]=an)},className:"ack-counter",onClick:an=>{if(an.stopPropagation(),pe===K.noteId)J(null);else{const mr=an.currentTarget.getBoundingClientRect();Pe({top:mr.bottom+8,left:mr.right-150}),J(K.noteId)}},children:re[K.noteId]&&re[K.noteId].length||"-"}),O.jsx("span",{className:"ack-counter-touch-overlay",onTouchStart:an=>{pt.current={x:an.touches[0].clientX,y:an.touches[0].clientY}},onTouchEnd:an=>{const mr=an.changedTouches[0].clientX,go=an.changedTouches[0].clientY,Ki=Math.abs(mr-pt.current.x),yo=Math.abs(go-pt.current.y);if(Ki<10&&yo<10)if(an.preventDefault(),an.stopPropagation(),pe===K.noteId)J(null);else{const _o=Ue.current[K.noteId].getBoundingClientRect();Pe({top:_o.bottom+8,left:_o.right-150}),J(K.noteId)}}})]})]}):zt==="LoRa received"&&K.senderNodeDisplay?O.jsx("span",{ref:an=>{K.noteId&&(Kt.current[K.noteId]=an)},className:"note-status sender-clickable",onClick:an=>{if(an.stopPropagation(),vt===K.noteId)ln(null),On(null);else{const mr=an.currentTarget.getBoundingClientRect();dn({top:mr.bottom+8,left:mr.right-150}),ln(K.noteId),On(K)}},children:Ho(zt)}):O.jsx("span",{className:"note-status",children:Ho(zt)})})]}),jn&&O.jsxs("div",{className:"note-actions",children:[O.jsx("button",{className:"btn-edit",onClick:()=>Ya(K),children:"✏️"}),O.jsx("button",{className:"btn-delete",onClick:()=>fo(K.noteId,!0),children:"🗑️"})]}),ui&&O.jsxs("div",{className:"note-actions",children:[O.jsx("button",{className:"btn-delete",onClick:()=>fo(K.noteId,!1),children:"🗑️"}),O.jsx("button",{className:"btn-color",onClick:()=>Xi(K),children:"🎨"}),Er&&!ke&&!K.replyLoraMessageId&&!K.isTempParentNote&&!K.archived&&K.status!=="Sending"&&!Yo&&(K.isPinedNote?O.jsx("button",{className:"btn-resend-pin",onClick:()=>Ha(K.noteId),title:"重送置頂",children:"📌"}):O.jsx("button",{className:"btn-pin",onClick:()=>ho(K.noteId),children:"📌"}))]}),Ko&&O.jsxs("div",{className:"note-actions",children:[O.jsx("button",{className:"btn-delete",onClick:()=>fo(K.noteId,!1,$e),children:"🗑️"}),O.jsx("button",{className:"btn-color",onClick:()=>Xi(K),children:"🎨"}),!ke&&!K.replyLoraMessageId&&!K.isTempParentNote&&K.status!=="Sending"&&!Yo&&(K.isPinedNote?O.jsx("button",{className:"btn-resend-pin",onClick:()=>Ha(K.noteId),title:"重送置頂",children:"📌"}):O.jsx("button",{className:"btn-pin",onClick:()=>ho(K.noteId),children:"📌"}))]})]},K.noteId||be)},uu=(K,be)=>{const $e=[...K.replyNotes||[]].sort((jn,ui)=>new Date(jn.timestamp||0)-new Date(ui.timestamp||0)),Le=[K,...$e].filter(jn=>jn.loraMessageId),Ge=nn&&Le.some(jn=>jn.loraMessageId===nn),zt=$e.length>0?$e[$e.length-1]:K,qr=zt.loraMessageId,er=zt.status;return O.jsxs("div",{className:"note-with-replies",children:[el(K,be,!1),$e.length>0&&O.jsx("div",{className:"reply-notes-container",children:$e.map((jn,ui)=>el(jn,`${be}-reply-${ui}`,!0))}),Ge?O.jsx("div",{className:"reply-notes-container",children:O.jsxs("div",{className:"sticky-note draft-note reply-note",style:{backgroundColor:xs[Tr],color:"#333"},children:[O.jsx("div",{className:"draft-header",children:"張貼回覆"}),O.jsx("textarea",{ref:D,className:"draft-textarea",value:Rt,onChange:Zo,onCompositionStart:Ja,onCompositionEnd:jn=>Wo(jn,!1),placeholder:"輸入回覆內容...",autoFocus:!0}),Wn&&O.jsx("div",{className:"draft-tools",children:O.jsx("button",{className:"btn-location-picker",onClick:mo,title:"加入地圖座標",children:"📍 地圖座標"})}),O.jsxs("div",{className:"byte-counter-container",children:[O.jsx("div",{className:"byte-counter-bar",children:O.jsx("div",{className:"byte-counter-fill",style:{width:`${Math.min(Dr/Ar*100,100)}%`,backgroundColor:Dr>Ar?"#d32f2f":"#3498db"}})}),O.jsxs("div",{className:"byte-counter-text",style:{color:Dr>Ar?"#d32f2f":"#666"},children:[Dr,"/",Ar]})]}),O.jsx("div",{className:"color-picker",children:xs.map((jn,ui)=>O.jsx("div",{className:`color-option ${Tr===ui?"selected":""}`,style:{backgroundColor:jn},onClick:()=>jr(ui)},ui))}),!Er&&Ai&&O.jsx("div",{className:"passcode-input-container",children:O.jsx("input",{type:"password",className:"passcode-input",placeholder:"發送用通關碼",value:Un,onChange:jn=>Ms(jn.target.value)})}),O.jsxs("div",{className:"draft-actions",children:[O.jsx("button",{className:"btn-cancel",onClick:Wi,children:"取消"}),O.jsx("button",{className:"btn-submit",onClick:Xa,disabled:Gi,children:"送出"})]})]})}):!nn&&qr&&er!=="LAN only"?O.jsx("div",{className:"reply-notes-container",children:O.jsx("button",{className:"add-reply-btn",onClick:()=>Vl(qr),disabled:_t||nn!==null,children:"+"})}):null]},K.noteId||be)};return O.jsxs(O.Fragment,{children:[O.jsxs("header",{className:Yt?"header-visible":"header-hidden",children:[O.jsxs("div",{className:"header-left",children:[O.jsxs("div",{className:"board-name",onClick:()=>{Ne.length>1&&he(!Mt)},style:{cursor:Ne.length>1?"pointer":"default"},children:[N,ne[N]&&ne[N].requiresPassword&&O.jsx("span",{style:{marginLeft:"4px"},children:ne[N].isVerified?"🔓":"🔒"}),Ne.length>1&&O.jsx("span",{className:"channel-arrow",children:Mt?"▲":"▼"})]}),Mt&&Ne.length>1&&O.jsx("div",{className:"channel-dropdown",children:Ne.filter(K=>K!==N).map(K=>O.jsxs("div",{className:"channel-dropdown-item",onClick:()=>au(K),children:[K,ne[K]&&ne[K].requiresPassword&&O.jsx("span",{style:{marginLeft:"4px"},children:ne[K].isVerified?"🔓":"🔒"})]},K))}),O.jsx("div",{className:"app-label",children:OC})]}),O.jsxs("div",{className:"status-container",style:{position:"relative"},children:[O.jsx("div",{className:`status-dot ${_?w?"online":"warning":""}`}),O.jsx("div",{className:"status-text",children:_?"LoRa 連線":ce?"LoRa 斷線 (RPi供電不足)":"LoRa 斷線"}),_&&!w&&$&&O.jsx("div",{className:"status-tooltip",children:$})]}),O.jsx("div",{className:"user-role-container",onClick:$r,style:{cursor:"pointer"},children:O.jsx("div",{className:"user-role-label",children:Er?"👑頻道管理者":"一般用戶"})})]}),O.jsxs("div",{className:`noteboard-container ${fr==="map"?"mapview-mode":fr==="table"?"tableview-mode":""}`,children:[fr==="sticky"&&O.jsxs(O.Fragment,{children:[O.jsxs("div",{className:`filter-bar ${_t?"disabled":""}`,children:[O.jsxs("div",{className:"filter-group",children:[O.jsx("label",{className:"filter-label",children:"排序："}),O.jsxs("select",{className:"filter-select",value:wn,onChange:K=>tn(K.target.value),disabled:_t,children:[O.jsx("option",{value:"newest",children:"日期時間由新到舊"}),O.jsx("option",{value:"oldest",children:"日期時間由舊到新"}),O.jsx("option",{value:"color",children:"顏色"})]})]}),O.jsxs("div",{className:"filter-group",children:[O.jsx("label",{className:"filter-label",children:"關鍵字："}),O.jsx("input",{ref:ao,type:"text",className:"filter-input",placeholder:"",value:Hn,onChange:K=>_n(K.target.value),disabled:_t,readOnly:ci,onClick:()=>{ci&&(ir(!1),setTimeout(()=>{ao.current&&ao.current.focus()},0))}}),Hn&&O.jsx("button",{className:"clear-btn",onClick:()=>_n(""),disabled:_t,children:"✕"})]}),O.jsx("div",{className:"filter-group",children:O.jsx("button",{className:`filter-advanced-toggle ${bt?"active":""}`,onClick:()=>vn(K=>!K),disabled:_t,title:"更多篩選",children:O.jsx("svg",{width:"16",height:"16",viewBox:"0 0 24 24",fill:"none",stroke:"currentColor",strokeWidth:"2",strokeLinecap:"round",strokeLinejoin:"round",children:O.jsx("path",{d:"M14.7 6.3a1 1 0 0 0 0 1.4l1.6 1.6a1 1 0 0 0 1.4 0l3.77-3.77a6 6 0 0 1-7.94 7.94l-6.91 6.91a2.12 2.12 0 0 1-3-3l6.91-6.91a6 6 0 0 1 7.94-7.94l-3.76 3.76z"})})})}),bt&&O.jsxs("div",{className:"filter-advanced-panel",children:[O.jsxs("label",{className:"filter-checkbox",children:[O.jsx("input",{type:"checkbox",checked:ge,onChange:K=>Mn(K.target.checked),disabled:_t}),O.jsx("span",{children:"顯示已封存"})]}),O.jsxs("label",{className:"filter-checkbox",children:[O.jsx("input",{type:"checkbox",checked:Ln,onChange:K=>Ot(K.target.checked),disabled:_t}),O.jsx("span",{children:"顯示表格指令"})]})]})]}),O.jsxs("div",{className:"notes-grid",children:[Gs().map((K,be)=>uu(K,be)),_t&&O.jsxs("div",{ref:Xt,className:"sticky-note draft-note",style:{backgroundColor:xs[Ce],color:"#333"},children:[O.jsx("div",{className:"draft-header",children:"張貼便利貼"}),O.jsx("textarea",{ref:Ct,className:"draft-textarea",value:st,onChange:cu,onCompositionStart:Ja,onCompositionEnd:K=>Wo(K,!1),placeholder:"輸入內容...",autoFocus:!0}),Wn&&O.jsx("div",{className:"draft-tools",children:O.jsx("button",{className:"btn-location-picker",onClick:mo,title:"加入地圖座標",children:"📍 地圖座標"})}),O.jsxs("div",{className:"byte-counter-container",children:[O.jsx("div",{className:"byte-counter-bar",children:O.jsx("div",{className:"byte-counter-fill",style:{width:`${Math.min(Wt/Ar*100,100)}%`,backgroundColor:Wt>Ar?"#d32f2f":"#3498db"}})}),O.jsxs("div",{className:"byte-counter-text",style:{color:Wt>Ar?"#d32f2f":"#666"},children:[Wt,"/",Ar]})]}),O.jsx("div",{className:"color-picker",children:xs.map((K,be)=>O.jsx("div",{className:`color-option ${Ce===be?"selected":""}`,style:{backgroundColor:K},onClick:()=>Oe(be)},be))}),!Er&&Ai&&O.jsx("div",{className:"passcode-input-container",children:O.jsx("input",{type:"password",className:"passcode-input",placeholder:"發送用通關碼",value:En,onChange:K=>zn(K.target.value)})}),O.jsxs("div",{className:"draft-actions",children:[O.jsx("button",{className:"btn-cancel",onClick:po,children:"取消"}),O.jsx("button",{className:"btn-submit",onClick:Ka,disabled:lo,children:"送出"})]})]})]})]}),O.jsx("div",{style:{display:fr==="map"?"contents":"none"},children:O.jsx(DC,{notes:l,boardId:N,isActive:fr==="map",onNavigateToNote:K=>{fs("sticky"),setTimeout(()=>{bs.triggerScan();const be=Z.current[K];be&&(be.scrollIntoView({behavior:"smooth",block:"center"}),be.classList.add("note-highlight"),setTimeout(()=>be.classList.remove("note-highlight"),2e3))},150)},onCreateNoteFromMap:(K,be)=>{const ke=`@(${K.toFixed(4)},${be.toFixed(4)})`;fs("sticky"),As(ke),setTimeout(()=>bs.triggerScan(),150)}})}),fr==="table"&&O.jsx(NC,{notes:l,isActive:fr==="table",headerVisible:Yt,boardId:N,myUUID:rn,colorPalette:xs,isAdmin:Er,postPasscodeRequired:Ai,loraOnline:_,sendIntervalSecond:UC,globalLanOnlyCount:Uo})]}),fr==="sticky"&&!_t&&!nn&&O.jsx("button",{className:"fab",onClick:As,children:"+"}),O.jsxs("footer",{className:"app-footer",children:[O.jsx("div",{className:"footer-left",children:O.jsxs("div",{className:"view-mode-tabs",children:[O.jsx("button",{className:`view-mode-tab ${fr==="sticky"?"active":""}`,onClick:()=>{_t&&po(),nn&&Wi(),fs("sticky"),setTimeout(()=>bs.triggerScan(),150)},title:"便利貼模式",children:O.jsxs("svg",{width:"16",height:"16",viewBox:"0 0 24 24",fill:"none",stroke:"currentColor",strokeWidth:"2",strokeLinecap:"round",strokeLinejoin:"round",children:[O.jsx("rect",{x:"3",y:"3",width:"7",height:"7",rx:"1"}),O.jsx("rect",{x:"14",y:"3",width:"7",height:"7",rx:"1"}),O.jsx("rect",{x:"3",y:"14",width:"7",height:"7",rx:"1"}),O.jsx("rect",{x:"14",y:"14",width:"7",height:"7",rx:"1"})]})}),Wn&&O.jsx("button",{className:`view-mode-tab ${fr==="map"?"active":""}`,onClick:()=>{_t&&po(),nn&&Wi(),fs("map")},title:"地圖模式",children:O.jsxs("svg",{width:"16",height:"16",viewBox:"0 0 24 24",fill:"none",stroke:"currentColor",strokeWidth:"2",strokeLinecap:"round",strokeLinejoin:"round",children:[O.jsx("path",{d:"M12 2C8.13 2 5 5.13 5 9c0 5.25 7 13 7 13s7-7.75 7-13c0-3.87-3.13-7-7-7z"}),O.jsx("circle",{cx:"12",cy:"9",r:"2.5"})]})}),O.jsx("button",{className:`view-mode-tab ${fr==="table"?"active":""}`,onClick:()=>{_t&&po(),nn&&Wi(),fs("table")},title:"表格模式",children:O.jsxs("svg",{width:"16",height:"16",viewBox:"0 0 24 24",fill:"none",stroke:"currentColor",strokeWidth:"2",strokeLinecap:"round",strokeLinejoin:"round",children:[O.jsx("rect",{x:"3",y:"3",width:"18",height:"18",rx:"1"}),O.jsx("line",{x1:"3",y1:"9",x2:"21",y2:"9"}),O.jsx("line",{x1:"3",y1:"15",x2:"21",y2:"15"}),O.jsx("line",{x1:"9",y1:"3",x2:"9",y2:"21"})]})})]})}),O.jsxs("div",{className:"footer-right",children:[jC," ",VC]})]}),Ye.show&&O.jsx("div",{className:"modal-overlay modal-overlay-top",onClick:()=>Ye.type==="alert"&&Ye.onConfirm(),children:O.jsxs("div",{className:"modal-content",onClick:K=>K.stopPropagation(),children:[O.jsx("div",{className:"modal-header",children:Ye.title}),O.jsx("div",{className:"modal-body",children:Ye.message}),O.jsxs("div",{className:"modal-actions",children:[Ye.type==="confirm"&&O.jsx("button",{className:"modal-btn modal-btn-cancel",onClick:Ye.onCancel,children:"取消"}),O.jsx("button",{className:"modal-btn modal-btn-confirm",onClick:Ye.onConfirm,children:(Ye.type==="confirm","確定")})]})]})}),ct&&O.jsx("div",{className:"modal-overlay",onClick:kn,children:O.jsxs("div",{className:"modal-content color-picker-modal",onClick:K=>K.stopPropagation(),children:[O.jsx("div",{className:"modal-header",children:"變更便利貼顏色"}),O.jsx("div",{className:"modal-body",children:O.jsx("div",{className:"color-picker",children:xs.map((K,be)=>O.jsx("div",{className:`color-option ${xn===be?"selected":""}`,style:{backgroundColor:K},onClick:()=>hn(be)},be))})}),O.jsxs("div",{className:"modal-actions",children:[O.jsx("button",{className:"modal-btn modal-btn-cancel",onClick:kn,children:"取消"}),O.jsx("button",{className:"modal-btn modal-btn-confirm",onClick:Go,children:"確定"})]})]})}),pe&&re[pe]&&O.jsxs("div",{className:"ack-tooltip",ref:ve,style:{top:`${xe.top}px`,left:`${xe.left}px`},children:[O.jsx("button",{className:"ack-tooltip-close",onClick:K=>{K.stopPropagation(),J(null)},children:"✕"}),O.jsx("div",{className:"ack-tooltip-header",children:"已確認接收"}),O.jsx("div",{className:"ack-tooltip-list",children:re[pe].map((K,be)=>O.jsx("div",{className:"ack-tooltip-item",children:K.displayId},K.ackId||be))})]}),vt&&(Jt==null?void 0:Jt.senderNodeDisplay)&&O.jsxs("div",{className:"ack-tooltip",ref:pn,style:{top:`${Vt.top}px`,left:`${Vt.left}px`},children:[O.jsx("button",{className:"ack-tooltip-close",onClick:K=>{K.stopPropagation(),ln(null),On(null)},children:"✕"}),O.jsx("div",{className:"ack-tooltip-header",children:"發送節點"}),O.jsx("div",{className:"ack-tooltip-list",children:O.jsx("div",{className:"ack-tooltip-item",children:Jt.senderNodeDisplay})})]}),lr&&O.jsx("div",{className:"modal-overlay",onClick:uo,children:O.jsxs("div",{className:"modal-content",onClick:K=>K.stopPropagation(),children:[O.jsxs("div",{className:"modal-header",children:["管理者認證 - ",N]}),O.jsxs("div",{className:"modal-body",children:[O.jsxs("p",{children:['請輸入頻道 "',N,'" 的管理者密碼：']}),O.jsx("input",{type:"password",className:"admin-passcode-input",placeholder:"輸入管理者密碼",value:Ie,onChange:K=>gt(K.target.value),onKeyPress:K=>{K.key==="Enter"&&Rr()},autoFocus:!0})]}),O.jsxs("div",{className:"modal-actions",children:[O.jsx("button",{className:"modal-btn modal-btn-cancel",onClick:uo,children:"取消"}),O.jsx("button",{className:"modal-btn modal-btn-confirm",onClick:Rr,children:"確定"})]})]})}),Ee&&O.jsx("div",{className:"modal-overlay",onClick:Wa,children:O.jsxs("div",{className:"modal-content",onClick:K=>K.stopPropagation(),children:[O.jsx("div",{className:"modal-header",children:"頻道密碼驗證"}),O.jsxs("div",{className:"modal-body",children:[O.jsxs("p",{children:['頻道 "',He,'" 需要密碼才能進入：']}),O.jsx("input",{type:"password",className:"admin-passcode-input",placeholder:"輸入頻道密碼",value:nt,onChange:K=>Lt(K.target.value),onKeyPress:K=>{K.key==="Enter"&&Ul()},autoFocus:!0}),At&&O.jsx("p",{style:{color:"#e74c3c",marginTop:"8px",fontSize:"0.9em"},children:At})]}),O.jsxs("div",{className:"modal-actions",children:[O.jsx("button",{className:"modal-btn modal-btn-cancel",onClick:Wa,children:"取消"}),O.jsx("button",{className:"modal-btn modal-btn-confirm",onClick:Ul,children:"確定"})]})]})}),Vr&&O.jsx(LC,{onConfirm:Zl,onCancel:ql,initialText:ze?tt:nn?Rt:st,lastLocation:rn?li[rn]:null})]})}(function(){function n(){return!!document.querySelector(".mapview-mode")}function i(){if(n()){var p=document.scrollingElement||document.documentElement;p.scrollTop<=0&&(p.scrollTop=1)}}function l(){var p=document.createElement("div");p.style.cssText="height:3px;width:1px;pointer-events:none;visibility:hidden;position:relative;z-index:-1;",p.setAttribute("aria-hidden","true"),document.body.appendChild(p)}document.body?l():document.addEventListener("DOMContentLoaded",function(){l()}),window.addEventListener("scroll",function(){i()},{passive:!0}),document.addEventListener("touchstart",function(){i()},{passive:!0})})();Fm.createRoot(document.getElementById("root")).render(O.jsx(y2.StrictMode,{children:O.jsx(qC,{})}));
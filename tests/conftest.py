@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+# 測試直接匯入專案根目錄的 app_noteboard* 模組
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def noteboard_db(tmp_path, monkeypatch):
+    """在暫存目錄以 init_database() / migrate_database() 建立 noteboard.db，回傳資料庫路徑"""
+    import app_noteboard
+    import app_noteboard_db
+
+    app_noteboard_db.close_db_pool()
+    db_path = str(tmp_path / 'noteboard.db')
+    monkeypatch.setattr(app_noteboard_db, 'DB_PATH', db_path)
+    monkeypatch.setattr(app_noteboard_db, '_wal_initialized', False)
+    app_noteboard.init_database()
+    app_noteboard.migrate_database()
+    yield db_path
+    app_noteboard_db.close_db_pool()
@@ -0,0 +1,89 @@
+import sqlite3
+
+import pytest
+
+import app_noteboard_db
+from app_noteboard_db import batch_transaction, get_db_connection
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    app_noteboard_db.close_db_pool()
+    monkeypatch.setattr(app_noteboard_db, 'DB_PATH', str(tmp_path / 'batch.db'))
+    monkeypatch.setattr(app_noteboard_db, '_wal_initialized', False)
+    conn = get_db_connection()
+    conn.execute('CREATE TABLE items (name TEXT)')
+    conn.commit()
+    conn.close()
+    yield
+    app_noteboard_db.close_db_pool()
+
+
+def insert(name, commit=True, fail=False):
+    """模擬資料庫輔助函式：寫入後 commit，fail 時在 close() 前拋出例外"""
+    conn = get_db_connection()
+    conn.execute('INSERT INTO items (name) VALUES (?)', (name,))
+    if fail:
+        raise RuntimeError('helper failed')
+    if commit:
+        conn.commit()
+    conn.close()
+
+
+def item_names():
+    conn = sqlite3.connect(app_noteboard_db.DB_PATH)
+    names = [row[0] for row in conn.execute('SELECT name FROM items ORDER BY rowid')]
+    conn.close()
+    return names
+
+
+def test_helper_raising_without_close_is_rolled_back(db):
+    with batch_transaction():
+        insert('first')
+        with pytest.raises(RuntimeError):
+            insert('partial', fail=True)
+        insert('second')
+    assert item_names() == ['first', 'second']
+
+
+def test_savepoint_still_open_at_batch_exit_is_rolled_back(db):
+    with batch_transaction():
+        insert('first')
+        leaked = get_db_connection()
+        leaked.execute("INSERT INTO items (name) VALUES ('leaked')")
+        leaked.commit()
+        leaked.execute("INSERT INTO items (name) VALUES ('uncommitted')")
+    # commit() 之前的部分與一般連線相同會寫入，未 commit 的部分 rollback
+    assert item_names() == ['first', 'leaked']
+    with pytest.raises(sqlite3.ProgrammingError):
+        leaked.execute('SELECT 1')
+
+
+def test_failed_batch_detaches_open_connections(db):
+    with pytest.raises(RuntimeError):
+        with batch_transaction():
+            leaked = get_db_connection()
+            leaked.execute("INSERT INTO items (name) VALUES ('leaked')")
+            raise RuntimeError('batch failed')
+    del leaked
+    insert('after')
+    assert item_names() == ['after']
+
+
+def test_write_after_read_is_not_invalidated_by_other_writer(db):
+    other = sqlite3.connect(app_noteboard_db.DB_PATH, timeout=0)
+    with batch_transaction():
+        conn = get_db_connection()
+        assert conn.execute('SELECT COUNT(*) FROM items').fetchone()[0] == 0
+        conn.close()
+        # batch 開始時已取得寫入鎖，其他連線無法在 batch 讀取後、寫入前提交
+        # （deferred 交易時其他連線可提交，batch 之後的寫入會以 SQLITE_BUSY_SNAPSHOT 失敗）
+        with pytest.raises(sqlite3.OperationalError, match='locked'):
+            other.execute("INSERT INTO items (name) VALUES ('other')")
+            other.commit()
+        other.rollback()
+        insert('batch')
+    other.execute("INSERT INTO items (name) VALUES ('other')")
+    other.commit()
+    other.close()
+    assert item_names() == ['batch', 'other']
@@ -0,0 +1,91 @@
+import pytest
+
+import app_noteboard
+
+
+@pytest.fixture
+def clients(monkeypatch):
+    """Flask session 模式、含一個需要 user_passcode 的頻道，回傳 (HTTP client, socket client)"""
+    channels = [
+        {'name': 'Open', 'user_passcode': '', 'admin_passcode': '', 'post_passcode': ''},
+        {'name': 'Secret', 'user_passcode': '1234', 'admin_passcode': '', 'post_passcode': ''},
+    ]
+    monkeypatch.setattr(app_noteboard, 'BOARD_MESSAGE_CHANNELS', channels)
+    monkeypatch.setattr(app_noteboard, 'CONFIGURED_CHANNEL_NAMES', [ch['name'] for ch in channels])
+    monkeypatch.setattr(app_noteboard, 'UID_SOURCE', 'flask')
+    http_client = app_noteboard.app.test_client()
+    socket_client = app_noteboard.socketio.test_client(app_noteboard.app, flask_test_client=http_client)
+    socket_client.get_received()
+    yield http_client, socket_client
+    socket_client.disconnect()
+
+
+def join(socket_client, board_id, token=None):
+    socket_client.emit('join_board', {'board_id': board_id, 'token': token})
+    results = [event['args'][0] for event in socket_client.get_received() if event['name'] == 'join_board_result']
+    assert len(results) == 1
+    return results[0]
+
+
+def received_rooms(socket_client, board_ids):
+    """對 legacy room 與各頻道 room 各推播一次，回傳 client 收到的 room"""
+    app_noteboard.socketio.emit('probe', {'room': 'legacy'}, to=app_noteboard.NOTES_LEGACY_ROOM)
+    for board_id in board_ids:
+        app_noteboard.socketio.emit('probe', {'room': board_id}, to=app_noteboard.get_board_room(board_id))
+    return {event['args'][0]['room'] for event in socket_client.get_received() if event['name'] == 'probe'}
+
+
+def test_join_open_board_leaves_legacy_room(clients):
+    _, socket_client = clients
+    assert join(socket_client, 'Open')['success']
+    assert received_rooms(socket_client, ['Open', 'Secret']) == {'Open'}
+
+
+def test_rejected_join_keeps_current_rooms(clients):
+    _, socket_client = clients
+    assert join(socket_client, 'Open')['success']
+
+    result = join(socket_client, 'Secret')
+    assert not result['success']
+    assert result['error'] == 'Channel password verification required'
+    # 失敗時不離開原本的 room，並回到 legacy room 讓 client 仍能收到 refresh_notes
+    assert received_rooms(socket_client, ['Open', 'Secret']) == {'Open', 'legacy'}
+
+
+def test_board_verified_after_connect_joins_with_token(clients):
+    http_client, socket_client = clients
+    assert http_client.get('/api/boards/Secret/join-token').status_code == 403
+
+    response = http_client.post('/api/channel/verify_password', json={'channel_name': 'Secret', 'password': '1234'})
+    assert response.get_json()['verified']
+    # socket 的 session 是連線當下的副本，沒有 token 仍無法加入
+    assert not join(socket_client, 'Secret')['success']
+
+    token = http_client.get('/api/boards/Secret/join-token').get_json()['token']
+    assert join(socket_client, 'Secret', token)['success']
+    assert received_rooms(socket_client, ['Open', 'Secret']) == {'Secret'}
+
+
+def test_join_token_is_bound_to_board_and_expires(clients, monkeypatch):
+    http_client, socket_client = clients
+    http_client.post('/api/channel/verify_password', json={'channel_name': 'Secret', 'password': '1234'})
+    token = http_client.get('/api/boards/Secret/join-token').get_json()['token']
+
+    assert app_noteboard.verify_join_board_token(token, 'Secret')
+    assert not app_noteboard.verify_join_board_token(token, 'Open')
+    assert not app_noteboard.verify_join_board_token(token + 'x', 'Secret')
+    monkeypatch.setattr(app_noteboard, 'JOIN_BOARD_TOKEN_MAX_AGE', -1)
+    assert not app_noteboard.verify_join_board_token(token, 'Secret')
+    assert not join(socket_client, 'Secret', token)['success']
+
+
+def test_flush_emits_lan_only_count_to_other_board_rooms(clients, noteboard_db, monkeypatch):
+    _, socket_client = clients
+    assert join(socket_client, 'Open')['success']
+    monkeypatch.setattr(app_noteboard.socketio, 'sleep', lambda seconds: None)
+    monkeypatch.setattr(app_noteboard, '_notes_event_pending', {'Secret'})
+    monkeypatch.setattr(app_noteboard, '_notes_event_cursors', {})
+
+    app_noteboard._flush_notes_events()
+    events = {event['name']: event['args'][0] for event in socket_client.get_received()}
+    assert events == {'lan_only_count': {'count': 0}}
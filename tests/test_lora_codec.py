@@ -0,0 +1,108 @@
+import os
+import random
+
+import pytest
+
+from app_noteboard_lora_codec import (
+    encode_command, decode_command, COMPACT_MAGIC, MAX_ACK_IDS,
+    OP_MSG_NEW, OP_MSG, OP_REPLY_NEW, OP_REPLY, OP_COLOR, OP_AUTHOR, OP_ARCHIVE, OP_PIN,
+    OP_ACK, OP_PACK, OP_ACK_MULTI,
+)
+from app_noteboard_send_queue import pack_lora_messages, unpack_lora_messages
+
+LONG_BODY = '請注意安全，下午三點在集合地點確認物資，需要協助的請回覆。' * 3
+
+COMMANDS = [
+    (OP_MSG_NEW, '/msg [new,3,lora-!a1b2c3d4]你好'),
+    (OP_MSG_NEW, '/msg [new,15,k3x9q2ab]' + LONG_BODY),
+    (OP_MSG_NEW, '/msg [new,0,]'),
+    (OP_MSG, '/msg [1234567,7,user-abc12345]{a1b2c3:A1}內容'),
+    (OP_MSG, '/msg [0,255,作者]line1\nline2'),
+    (OP_REPLY_NEW, '/reply <new,2,lora-!0000ffff>[42]收到'),
+    (OP_REPLY, '/reply <4294967295,9,zz>[1]' + LONG_BODY),
+    (OP_COLOR, '/color [88]lora-!deadbeef, 12'),
+    (OP_COLOR, '/color [88], 0'),
+    (OP_AUTHOR, '/author [5]abc123'),
+    (OP_ARCHIVE, '/archive [6]lora-!12345678'),
+    (OP_PIN, '/pin [7]user-xyz'),
+    (OP_ACK, '/ack 0'),
+    (OP_ACK, '/ack 987654321'),
+    (OP_ACK_MULTI, '/ack 1,22,333'),
+    (OP_ACK_MULTI, '/ack ' + ','.join(str(i) for i in range(MAX_ACK_IDS))),
+]
+
+PACK = pack_lora_messages([
+    '/msg [10,1,lora-!a1b2c3d4]第一則',
+    '/reply <11,2,k3x9q2ab>[10]' + LONG_BODY,
+    '/msg [12,3,]',
+])
+
+# 舊版或不合規範的格式，encode_command 回傳 None，呼叫端改以文字發送
+LEGACY_COMMANDS = [
+    '/msg [new]舊版新留言',
+    '/msg [12]舊版重送',
+    '/reply <new>[3]舊版回覆',
+    '/reply <5>[3]舊版回覆重送',
+    '/color [5]author,3',
+    '/color [5]author, 256',
+    '/msg [new,300,a]色碼超出範圍',
+    '/msg [007,1,a]前導零的 id',
+    '/ack 01',
+    '/ack abc',
+    '/ack 1,,2',
+    '/ack ' + ','.join(str(i) for i in range(MAX_ACK_IDS + 1)),
+    '/author [5]含 空白',
+    'hello',
+    pack_lora_messages(['/msg [1]舊版格式']),
+]
+
+
+@pytest.mark.parametrize('opcode, msg', COMMANDS)
+def test_round_trip(opcode, msg):
+    encoded = encode_command(msg)
+    assert encoded[:2] == bytes([COMPACT_MAGIC, opcode])
+    assert decode_command(encoded) == msg
+
+
+def test_pack_round_trip():
+    encoded = encode_command(PACK, unpack=unpack_lora_messages)
+    assert encoded[:2] == bytes([COMPACT_MAGIC, OP_PACK])
+    assert decode_command(encoded, pack=pack_lora_messages) == PACK
+    # 未提供 pack / unpack 時不處理 /pack
+    assert encode_command(PACK) is None
+    assert decode_command(encoded) is None
+
+
+@pytest.mark.parametrize('msg', LEGACY_COMMANDS)
+def test_legacy_formats_are_not_encoded(msg):
+    assert encode_command(msg, unpack=unpack_lora_messages) is None
+
+
+def test_encoded_size_is_smaller_than_text():
+    msgs = [msg for _, msg in COMMANDS] + [PACK]
+    text_size = sum(len(msg.encode('utf-8')) for msg in msgs)
+    encoded_size = sum(len(encode_command(msg, unpack=unpack_lora_messages)) for msg in msgs)
+    for msg in msgs:
+        assert len(encode_command(msg, unpack=unpack_lora_messages)) < len(msg.encode('utf-8'))
+    assert encoded_size < text_size * 0.5
+
+
+def test_decode_random_bytes_never_raises():
+    rng = random.Random(0)
+    for _ in range(5000):
+        data = os.urandom(rng.randint(0, 64))
+        for payload in (data, bytes([COMPACT_MAGIC]) + data, bytes([COMPACT_MAGIC, OP_PACK]) + data):
+            result = decode_command(payload, pack=pack_lora_messages)
+            assert result is None or isinstance(result, str)
+
+
+def test_decode_corrupted_packets_never_raises():
+    rng = random.Random(1)
+    packets = [encode_command(msg) for _, msg in COMMANDS] + [encode_command(PACK, unpack=unpack_lora_messages)]
+    for _ in range(5000):
+        data = bytearray(rng.choice(packets))
+        for _ in range(rng.randint(1, 4)):
+            data[rng.randrange(len(data))] = rng.randrange(256)
+        data = data[:rng.randint(0, len(data))]
+        result = decode_command(bytes(data), pack=pack_lora_messages)
+        assert result is None or isinstance(result, str)
@@ -0,0 +1,94 @@
+import random
+
+import pytest
+
+from app_noteboard_lora_commands import (
+    parse_lora_command, NewNote, ResendNote, NewReply, ResendReply, SetColor, SetAuthor,
+    ArchiveNote, PinNote, UserAck, PackedCommands, InvalidCommand, UnknownCommand,
+    MSG_NEW_USAGE, MSG_RESEND_USAGE, REPLY_NEW_USAGE, REPLY_RESEND_USAGE, REPLY_RESEND_FORMAT_ERROR, COLOR_USAGE,
+)
+from app_noteboard_send_queue import pack_lora_messages
+
+COMMAND_TYPES = (NewNote, ResendNote, NewReply, ResendReply, SetColor, SetAuthor,
+                 ArchiveNote, PinNote, UserAck, PackedCommands, InvalidCommand, UnknownCommand)
+
+PACKED = pack_lora_messages(['/msg [10,1,a]第一則', '/reply <11,2,b>[10]回覆'])
+
+COMMANDS = [
+    # /msg
+    ('/msg [new]舊版新留言', NewNote(None, '', '舊版新留言')),
+    ('/msg [new,3,lora-!a1b2c3d4]你好', NewNote('3', 'lora-!a1b2c3d4', '你好')),
+    ('/msg [new, 3 , abc ]body', NewNote('3', 'abc', 'body')),
+    ('/msg [new,3,]', NewNote('3', '', '')),
+    ('/msg [new,3]缺少作者', InvalidCommand('/msg [new,3]缺少作者', MSG_NEW_USAGE)),
+    ('/msg [12]舊版重送', ResendNote('12', None, '', '舊版重送')),
+    ('/msg [12,7,user-abc]line1\nline2', ResendNote('12', '7', 'user-abc', 'line1\nline2')),
+    ('/msg [12,7]缺少作者', InvalidCommand('/msg [12,7]缺少作者', MSG_RESEND_USAGE)),
+    ('/msg [12]含 ] 的內容', ResendNote('12', None, '', '含 ] 的內容')),
+    ('/msg 沒有括號', UnknownCommand('/msg 沒有括號')),
+    # /reply
+    ('/reply <new>[3]舊版回覆', NewReply('3', None, '', '舊版回覆')),
+    ('/reply <new,2,lora-!0000ffff>[42]收到', NewReply('42', '2', 'lora-!0000ffff', '收到')),
+    ('/reply <new,2>[42]缺少作者', InvalidCommand('/reply <new,2>[42]缺少作者', REPLY_NEW_USAGE)),
+    ('/reply <new,2,a[42]缺少結尾', InvalidCommand('/reply <new,2,a[42]缺少結尾', REPLY_NEW_USAGE)),
+    ('/reply <5>[3]舊版回覆重送', ResendReply('5', '3', None, '', '舊版回覆重送')),
+    ('/reply <5,9,zz>[1]重送', ResendReply('5', '1', '9', 'zz', '重送')),
+    ('/reply <5,9>[1]缺少作者', InvalidCommand('/reply <5,9>[1]缺少作者', REPLY_RESEND_USAGE)),
+    ('/reply <5>[1', UnknownCommand('/reply <5>[1')),
+    ('/reply <5>x>[1]格式錯誤', InvalidCommand('/reply <5>x>[1]格式錯誤', REPLY_RESEND_FORMAT_ERROR)),
+    ('/reply 沒有括號', UnknownCommand('/reply 沒有括號')),
+    # /color
+    ('/color [88]lora-!deadbeef, 12', SetColor('88', 'lora-!deadbeef', '12')),
+    ('/color [88], 0', SetColor('88', '', '0')),
+    ('/color [88]a,b,c', SetColor('88', 'a', 'b,c')),
+    ('/color [88]缺少色碼', InvalidCommand('/color [88]缺少色碼', COLOR_USAGE)),
+    ('/color 88', UnknownCommand('/color 88')),
+    # /author、/archive、/pin
+    ('/author [5]abc123', SetAuthor('5', 'abc123')),
+    ('/author [5] abc123 ', SetAuthor('5', 'abc123')),
+    ('/archive [6]lora-!12345678', ArchiveNote('6', 'lora-!12345678')),
+    ('/archive [6]', ArchiveNote('6', '')),
+    ('/pin [7]user-xyz', PinNote('7', 'user-xyz')),
+    ('/pin 7', UnknownCommand('/pin 7')),
+    # /ack
+    ('/ack 987654321', UserAck(['987654321'])),
+    ('/ack 1, 22 ,,333', UserAck(['1', '22', '333'])),
+    ('/ack ', UserAck([])),
+    # /pack
+    (PACKED, PackedCommands(['/msg [10,1,a]第一則', '/reply <11,2,b>[10]回覆'])),
+    ('/pack ²:x', InvalidCommand('/pack ²:x', '[格式錯誤] /pack 訊息無法解析: /pack ²:x')),
+    ('/pack ', InvalidCommand('/pack ', '[格式錯誤] /pack 訊息無法解析: /pack ')),
+    # 非 noteboard 命令
+    ('hello', UnknownCommand('hello')),
+    ('', UnknownCommand('')),
+    ('/msg', UnknownCommand('/msg')),
+    ('/msg[new]沒有空白', UnknownCommand('/msg[new]沒有空白')),
+    ('/unknown [1]a', UnknownCommand('/unknown [1]a')),
+    (' /msg [new]前導空白', UnknownCommand(' /msg [new]前導空白')),
+]
+
+
+@pytest.mark.parametrize('msg, expected', COMMANDS)
+def test_parse_command(msg, expected):
+    command = parse_lora_command(msg)
+    assert type(command) is type(expected)
+    assert command == expected
+
+
+def test_random_input_never_raises():
+    rng = random.Random(0)
+    prefixes = ['', '/msg ', '/reply ', '/color ', '/author ', '/archive ', '/pin ', '/ack ', '/pack ']
+    alphabet = '0123456789new,[]<>:/ ²١ 中\n'
+    for _ in range(20000):
+        msg = rng.choice(prefixes) + ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 30)))
+        assert type(parse_lora_command(msg)) in COMMAND_TYPES
+
+
+def test_garbage_is_unknown_or_invalid():
+    rng = random.Random(1)
+    prefixes = ['', '/', '/msg ', '/reply ', '/color ', '/author ', '/archive ', '/pin ', '/pack ']
+    for _ in range(20000):
+        # 不含參數括號的隨機內容，不可能是合法命令
+        body = ''.join(chr(rng.randint(0, 0x3000)) for _ in range(rng.randint(0, 30)))
+        msg = rng.choice(prefixes) + body.replace('[', '').replace('<', '')
+        assert type(parse_lora_command(msg)) in (InvalidCommand, UnknownCommand)
@@ -0,0 +1,27 @@
+import app_noteboard
+
+
+def test_map_json_cache_is_bounded_per_kind():
+    cache = {}
+    builds = []
+
+    def builder(host):
+        builds.append(host)
+        return {'tiles': [app_noteboard.tile_url_template(host, 'base', 'v1')]}
+
+    with app_noteboard.app.test_request_context('/'):
+        for i in range(20):
+            host = f'host-{i}.local'
+            response = app_noteboard.cached_json_response(cache, ('style', host), lambda: builder(host))
+            assert host in response.get_json()['tiles'][0]
+        app_noteboard.cached_json_response(cache, ('tilejson', 'host-0.local'), lambda: builder('host-0.local'))
+
+        assert sorted(key for key in cache if key[0] == 'style') == \
+            [('style', f'host-{i}.local') for i in range(app_noteboard.MAP_JSON_CACHE_MAX_HOSTS)]
+        assert ('tilejson', 'host-0.local') in cache
+
+        # 已快取的 host 不重新建立，超過上限的 host 每次重新建立
+        builds.clear()
+        app_noteboard.cached_json_response(cache, ('style', 'host-0.local'), lambda: builder('host-0.local'))
+        app_noteboard.cached_json_response(cache, ('style', 'host-19.local'), lambda: builder('host-19.local'))
+        assert builds == ['host-19.local']
@@ -0,0 +1,41 @@
+import pytest
+
+import app_noteboard
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    monkeypatch.setattr(app_noteboard, '_notes_cache', {})
+    monkeypatch.setattr(app_noteboard, '_notes_cache_versions', {})
+    monkeypatch.setattr(app_noteboard, '_notes_cache_build_locks', {})
+
+
+def build(board_id, data):
+    return app_noteboard.get_cached_notes_response(board_id, False, True, lambda: data)
+
+
+def test_build_lock_is_dropped_with_cache_entry():
+    assert build('A', b'a1') == b'a1'
+    assert build('B', b'b1') == b'b1'
+    assert build('A', b'ignored') == b'a1'
+    assert set(app_noteboard._notes_cache_build_locks) == {('A', False, True), ('B', False, True)}
+
+    app_noteboard.invalidate_notes_cache('A')
+    assert set(app_noteboard._notes_cache_build_locks) == {('B', False, True)}
+    assert build('A', b'a2') == b'a2'
+
+    app_noteboard.invalidate_notes_cache()
+    assert app_noteboard._notes_cache_build_locks == {}
+    assert app_noteboard._notes_cache == {}
+
+
+def test_build_lock_in_use_is_kept():
+    def builder():
+        # 重建期間資料異動：等待中的請求仍使用同一個 lock，重建結果不寫入快取
+        app_noteboard.invalidate_notes_cache('A')
+        assert ('A', False, True) in app_noteboard._notes_cache_build_locks
+        return b'stale'
+
+    assert app_noteboard.get_cached_notes_response('A', False, True, builder) == b'stale'
+    assert app_noteboard._notes_cache == {}
+    assert build('A', b'fresh') == b'fresh'
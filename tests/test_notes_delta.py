@@ -0,0 +1,88 @@
+import copy
+import random
+import time
+
+import pytest
+
+import app_noteboard
+from app_noteboard_db import get_db_connection
+from test_reply_tree import random_notes
+
+
+def thread_snapshot(threads):
+    """討論串內容（含 acks 與巢狀 temp parent 的 replyNotes），巢狀部分只展開一層，避免循環參照"""
+    def fields(note):
+        return {key: value for key, value in note.items() if key != 'replyNotes'}
+    return [
+        (fields(thread), [
+            (fields(reply), [nested['noteId'] for nested in reply.get('replyNotes', [])])
+            for reply in thread['replyNotes']
+        ])
+        for thread in threads
+    ]
+
+
+def full_tree_delta(notes, changed_ids, is_include_deleted):
+    """以完整討論串篩選出異動討論串（重構前的 delta 做法），作為比對基準"""
+    parent_notes = app_noteboard.build_board_notes_tree('board', is_include_deleted, include_acks=True)
+    changed_threads = []
+    visible_ids = set()
+    for parent in parent_notes:
+        thread_ids = {parent['noteId']}
+        thread_ids.update(reply['noteId'] for reply in parent['replyNotes'])
+        visible_ids.update(thread_ids)
+        if not thread_ids.isdisjoint(changed_ids):
+            changed_threads.append(parent)
+    return changed_threads, sorted(changed_ids - visible_ids)
+
+
+@pytest.mark.parametrize('seed', range(200))
+def test_delta_matches_full_tree_filter(monkeypatch, seed):
+    notes = random_notes(seed)
+    rng = random.Random(seed)
+    note_ids = [note['noteId'] for note in notes]
+    changed_ids = set(rng.sample(note_ids, rng.randint(1, len(note_ids)))) | {'note-gone'}
+
+    monkeypatch.setattr(app_noteboard, 'get_notes_from_db',
+                        lambda board_id, include_deleted=False: copy.deepcopy(notes))
+    monkeypatch.setattr(app_noteboard, 'get_changed_note_ids', lambda board_id, since: set(changed_ids))
+    monkeypatch.setattr(app_noteboard, 'get_notes_sync_cursor', lambda: 42)
+    monkeypatch.setattr(app_noteboard, 'get_acks_grouped_by_note',
+                        lambda board_id, note_ids=None: {note_id: [{'ackId': note_id}] for note_id in note_ids})
+
+    for is_include_deleted in (False, True):
+        expected_threads, expected_removed = full_tree_delta(notes, changed_ids, is_include_deleted)
+        delta = app_noteboard.build_board_notes_delta('board', 1, is_include_deleted, include_acks=True)
+        assert thread_snapshot(delta['notes']) == thread_snapshot(expected_threads)
+        assert delta['removed'] == expected_removed
+        assert delta['cursor'] == 42
+
+
+def insert_note(note_id, board_id='board', reply_lora_msg_id=None, lora_msg_id=None):
+    now = int(time.time() * 1000)
+    conn = get_db_connection()
+    conn.execute('''
+        INSERT INTO notes (note_id, reply_lora_msg_id, board_id, body, bg_color, status,
+                           created_at, updated_at, author_key, lora_msg_id)
+        VALUES (?, ?, ?, 'body', '', 'LoRa sent', ?, ?, 'user-test', ?)
+    ''', (note_id, reply_lora_msg_id, board_id, now, now, lora_msg_id))
+    conn.commit()
+    conn.close()
+
+
+def test_ack_records_bump_note_sync_seq(noteboard_db):
+    insert_note('parent', lora_msg_id='m1')
+    insert_note('reply', reply_lora_msg_id='m1', lora_msg_id='m2')
+    cursor = app_noteboard.get_notes_sync_cursor()
+
+    assert app_noteboard.save_ack_records(['reply'], 'lora-1234')
+    assert app_noteboard.get_changed_note_ids('board', cursor) == {'reply'}
+
+    delta = app_noteboard.build_board_notes_delta('board', cursor, False, include_acks=True)
+    assert [thread['noteId'] for thread in delta['notes']] == ['parent']
+    assert [ack['loraNodeId'] for ack in delta['notes'][0]['replyNotes'][0]['acks']] == ['lora-1234']
+
+    # 同一節點再次 ACK（更新 updated_at）也會送出
+    cursor = delta['cursor']
+    assert app_noteboard.save_ack_records(['reply'], 'lora-1234')
+    assert app_noteboard.get_changed_note_ids('board', cursor) == {'reply'}
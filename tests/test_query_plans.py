@@ -0,0 +1,88 @@
+import pytest
+
+import app_noteboard
+import app_noteboard_db
+
+BOARD_ID = 'MQBoardTest'
+
+# 熱門查詢路徑：實際呼叫 app_noteboard 的函式，檢查其執行的每一句 SQL
+HOT_PATHS = {
+    'board_note_list': lambda: app_noteboard.get_notes_from_db(BOARD_ID),
+    'board_note_list_with_deleted': lambda: app_noteboard.get_notes_from_db(BOARD_ID, include_deleted=True),
+    'sheet_id_lookup': lambda: app_noteboard.sheet_id_exists_in_db('abc123'),
+    'sheet_cells': lambda: app_noteboard.get_sheet_cells(BOARD_ID),
+    'board_acks': lambda: app_noteboard.get_acks_grouped_by_note(BOARD_ID),
+    'note_acks': lambda: app_noteboard.get_acks_grouped_by_note(BOARD_ID, ['note-1', 'note-2']),
+    'save_ack_records': lambda: app_noteboard.save_ack_records(['note-1'], 'lora-1234'),
+    'auto_resend_candidate': lambda: app_noteboard.find_auto_resend_candidate(),
+    'notes_delta': lambda: app_noteboard.get_changed_note_ids(BOARD_ID, 0),
+    # lora_msg_id 查詢（收到 LoRa 重發、回覆、/ack 與更新命令時）
+    'lora_msg_id_exists': lambda: app_noteboard.lora_msg_id_exists('1234'),
+    'note_id_by_lora_msg_id': lambda: app_noteboard.get_note_id_by_lora_msg_id('1234'),
+    'note_ids_by_lora_msg_ids': lambda: app_noteboard.get_note_ids_by_lora_msg_ids(['1234', '5678']),
+    'lora_color_update': lambda: app_noteboard.update_note_color('1234', 'user-test', 1),
+    'lora_color_update_need_lora': lambda: app_noteboard.update_note_color('1234', 'user-test', 1, need_lora_update=True),
+    'lora_archive': lambda: app_noteboard.archive_note_by_lora_msg_id('1234', 'user-test'),
+    'lora_pin': lambda: app_noteboard.pin_note_by_lora_msg_id('1234', 'user-test'),
+    # 暫存父留言
+    'lora_reply_save': lambda: app_noteboard.save_lora_reply('5678', BOARD_ID, '1234', 'body', is_temp_parent_note=1),
+    'clear_temp_parent_flag': lambda: app_noteboard.clear_temp_parent_flag('1234'),
+    # 發送佇列與 LAN only 數量
+    'global_lan_only_count': lambda: app_noteboard.count_global_lan_only_notes(),
+    'refill_send_queue': lambda: app_noteboard.refill_send_queue([BOARD_ID, 'OtherBoard']),
+    'note_need_update_lora': lambda: app_noteboard.get_note_need_update_lora(BOARD_ID),
+    'note_need_update_lora_by_id': lambda: app_noteboard.get_note_need_update_lora(BOARD_ID, 'note-1'),
+}
+
+
+@pytest.fixture
+def traced_statements(noteboard_db, monkeypatch):
+    """記錄連線池連線執行的 SQL（參數已代入）
+
+    預先建立一筆符合各查詢條件的 note，讓置頂、待更新等路徑執行到查詢之後的 UPDATE。
+    """
+    # close_db_pool() 會執行 PRAGMA optimize，需在建立資料前呼叫，避免只有一筆資料的統計影響查詢規劃
+    app_noteboard_db.close_db_pool()
+    conn = app_noteboard_db._open_connection()
+    conn.execute('''
+        INSERT INTO notes (note_id, board_id, body, bg_color, status, created_at, updated_at,
+                           author_key, lora_msg_id, is_need_update_lora)
+        VALUES ('note-1', ?, 'body', '', 'LoRa sent', 0, 0, 'user-test', '1234', 1)
+    ''', (BOARD_ID,))
+    conn.commit()
+    conn.close()
+    statements = []
+    open_connection = app_noteboard_db._open_connection
+
+    def open_traced_connection():
+        conn = open_connection()
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    monkeypatch.setattr(app_noteboard_db, '_open_connection', open_traced_connection)
+    monkeypatch.setattr(app_noteboard, 'active_channels', [{'name': BOARD_ID}])
+    monkeypatch.setattr(app_noteboard, 'AUTO_RESEND_ADAPTIVE', True)
+    monkeypatch.setattr(app_noteboard, '_resend_ack_stats_at', 0)
+    return statements
+
+
+def query_plans(statements):
+    conn = app_noteboard_db._open_connection()
+    try:
+        for sql in statements:
+            if not sql.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+                continue
+            yield sql, [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql)]
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize('path', sorted(HOT_PATHS))
+def test_hot_queries_use_indexes(traced_statements, path):
+    HOT_PATHS[path]()
+    plans = list(query_plans(traced_statements))
+    assert plans
+    for sql, plan in plans:
+        # 查詢中 notes / ack_records 可能使用別名（n / a），因此任何 SCAN 都視為全表掃描
+        assert not any(row.startswith('SCAN') for row in plan), (' '.join(sql.split()), plan)
+        assert not any('SCAN notes' in row or 'SCAN ack_records' in row for row in plan)
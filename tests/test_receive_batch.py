@@ -0,0 +1,85 @@
+import pytest
+from eventlet import tpool
+
+import app_noteboard
+from app_noteboard_db import get_db_connection
+
+CHANNEL = 'Channel-0'
+
+
+@pytest.fixture
+def receive_env(noteboard_db, monkeypatch):
+    """啟用 Channel-0，記錄提交後才應執行的推播與 ACK 排程"""
+    started = []
+    monkeypatch.setattr(app_noteboard, 'active_channels', [{'name': CHANNEL}])
+    monkeypatch.setattr(app_noteboard, 'pending_ack', {})
+    monkeypatch.setattr(app_noteboard, 'inflight_slots', {})
+    monkeypatch.setattr(app_noteboard, 'pending_ack_deadlines', app_noteboard.DeadlineHeap())
+    monkeypatch.setattr(app_noteboard.socketio, 'start_background_task', lambda func, *args: started.append(func))
+    return started
+
+
+def text_packet(packet_id, text):
+    return ({'id': packet_id, 'from': 0x1234abcd, 'channel': 0,
+             'decoded': {'portnum': 'TEXT_MESSAGE_APP', 'text': text}}, None)
+
+
+def note_rows():
+    conn = get_db_connection()
+    rows = conn.execute('SELECT lora_msg_id, status FROM notes ORDER BY lora_msg_id').fetchall()
+    conn.close()
+    return rows
+
+
+def test_batch_runs_in_native_thread_and_defers_ui_updates(receive_env):
+    batch = [text_packet(101, '/msg [new]第一則'), text_packet(102, '/msg [new]第二則')]
+    deferred = tpool.execute(app_noteboard._process_receive_batch, batch, {})
+
+    assert [row[0] for row in note_rows()] == ['101', '102']
+    # 批次中不推播、不排程 ACK，提交後由 receive_worker_loop 於 eventlet hub 執行（相同呼叫只保留一次）
+    assert receive_env == []
+    assert (app_noteboard.notify_notes_changed, (CHANNEL,)) in deferred
+    assert (app_noteboard.invalidate_notes_cache, (CHANNEL,)) in deferred
+    assert sum(func is app_noteboard._spawn_ack_delayed for func, _ in deferred) == 2
+    assert tpool.execute(getattr, app_noteboard._receive_local, 'deferred', None) is None
+
+
+def test_device_ack_is_claimed_before_batch(receive_env):
+    conn = get_db_connection()
+    conn.execute('''
+        INSERT INTO notes (note_id, board_id, body, bg_color, status, created_at, updated_at, author_key)
+        VALUES ('note-1', ?, 'body', '', 'LAN only', 0, 0, 'user-test')
+    ''', (CHANNEL,))
+    conn.commit()
+    conn.close()
+    app_noteboard.register_pending_ack(77, {'note_id': 'note-1', 'board_id': CHANNEL})
+    packet = {'id': 500, 'decoded': {'portnum': 'ROUTING_APP', 'requestId': 77}}
+
+    device_acks = dict([app_noteboard.claim_device_ack(packet)])
+    assert 77 not in app_noteboard.inflight_slots
+    deferred = tpool.execute(app_noteboard._process_receive_batch, [(packet, None)], device_acks)
+
+    assert note_rows() == [('77', 'LoRa sent')]
+    assert (app_noteboard.notify_notes_changed, (CHANNEL,)) in deferred
+    conn = get_db_connection()
+    assert conn.execute('SELECT COUNT(*) FROM pending_acks').fetchone()[0] == 0
+    conn.close()
+    # 記憶體中的項目由 receive_worker_loop 在提交後移除；已被超時處理的 ACK 不再認領
+    assert 77 in app_noteboard.pending_ack
+    assert app_noteboard.claim_device_ack(packet) is None
+
+
+def test_failed_batch_rolls_back_without_ui_updates(receive_env, monkeypatch):
+    on_receive = app_noteboard.onReceive
+
+    def failing_on_receive(packet, interface):
+        on_receive(packet, interface)
+        raise RuntimeError('batch failed')
+
+    monkeypatch.setattr(app_noteboard, 'onReceive', failing_on_receive)
+    with pytest.raises(RuntimeError):
+        tpool.execute(app_noteboard._process_receive_batch, [text_packet(103, '/msg [new]失敗')], {})
+
+    assert note_rows() == []
+    assert receive_env == []
+    assert tpool.execute(getattr, app_noteboard._receive_local, 'deferred', None) is None
@@ -0,0 +1,195 @@
+import copy
+import random
+
+import pytest
+
+import app_noteboard
+
+
+def collect_replies_oracle(all_notes_raw, is_include_deleted):
+    """舊版以遞迴 collect_replies 組出討論串的實作，作為比對基準"""
+    if not is_include_deleted:
+        lora_msg_id_to_note = {}
+        for note in all_notes_raw:
+            if note.get('loraMessageId'):
+                lora_msg_id_to_note[note['loraMessageId']] = note
+
+        deleted_lora_msg_ids = set()
+        for note in all_notes_raw:
+            if note.get('archived') and note.get('loraMessageId'):
+                deleted_lora_msg_ids.add(note['loraMessageId'])
+
+        def find_valid_parent_lora_msg_id(reply_lora_msg_id, visited=None):
+            if visited is None:
+                visited = set()
+            if reply_lora_msg_id in visited:
+                return None
+            visited.add(reply_lora_msg_id)
+            if reply_lora_msg_id not in deleted_lora_msg_ids:
+                return reply_lora_msg_id
+            parent_note = lora_msg_id_to_note.get(reply_lora_msg_id)
+            if parent_note and parent_note.get('replyLoraMessageId'):
+                return find_valid_parent_lora_msg_id(parent_note['replyLoraMessageId'], visited)
+            return None
+
+        all_notes = []
+        for note in all_notes_raw:
+            if not note.get('archived'):
+                if note.get('replyLoraMessageId') in deleted_lora_msg_ids:
+                    valid_parent = find_valid_parent_lora_msg_id(note['replyLoraMessageId'])
+                    if valid_parent is None:
+                        continue
+                    note['replyLoraMessageId'] = valid_parent
+                all_notes.append(note)
+    else:
+        all_notes = all_notes_raw
+
+    parent_notes = []
+    reply_notes_pool = []
+    for note in all_notes:
+        if note.get('replyLoraMessageId') is None:
+            note['replyNotes'] = []
+            parent_notes.append(note)
+        elif note.get('isTempParentNote'):
+            note['replyNotes'] = []
+            parent_notes.append(note)
+            reply_notes_pool.append(note)
+        else:
+            reply_notes_pool.append(note)
+
+    for parent in parent_notes:
+        parent_lora_msg_id = parent.get('loraMessageId')
+        if not parent_lora_msg_id:
+            continue
+
+        def collect_replies(target_lora_msg_id, collected_ids=None):
+            if collected_ids is None:
+                collected_ids = set()
+            if target_lora_msg_id in collected_ids:
+                return []
+            collected_ids.add(target_lora_msg_id)
+            found_replies = []
+            for reply_note in reply_notes_pool:
+                if reply_note.get('replyLoraMessageId') == target_lora_msg_id:
+                    found_replies.append(reply_note)
+                    child_lora_msg_id = reply_note.get('loraMessageId')
+                    if child_lora_msg_id:
+                        found_replies.extend(collect_replies(child_lora_msg_id, collected_ids))
+            return found_replies
+
+        replies = collect_replies(parent_lora_msg_id)
+        replies.sort(key=lambda x: x.get('timestamp', 0))
+        parent['replyNotes'] = replies
+
+    parent_notes.sort(key=lambda x: (not x.get('isPinedNote', False), -x.get('timestamp', 0)))
+    return parent_notes
+
+
+def thread_shape(parent_notes):
+    return [
+        (parent['noteId'], parent.get('replyLoraMessageId'), [reply['noteId'] for reply in parent['replyNotes']])
+        for parent in parent_notes
+    ]
+
+
+def make_note(index, lora_msg_id, reply_lora_msg_id=None, archived=False, temp_parent=False,
+              timestamp=None, pinned=False):
+    return {
+        'noteId': f'note-{index}',
+        'loraMessageId': lora_msg_id,
+        'replyLoraMessageId': reply_lora_msg_id,
+        'archived': archived,
+        'isTempParentNote': temp_parent,
+        'isPinedNote': pinned,
+        'timestamp': index if timestamp is None else timestamp,
+    }
+
+
+def random_notes(seed):
+    rng = random.Random(seed)
+    count = rng.randint(1, 60)
+    lora_ids = [f'm{i}' for i in range(count)]
+    notes = []
+    for index in range(count):
+        # 部分 note 沒有 lora_msg_id（LAN only）或與其他 note 重複
+        lora_msg_id = rng.choice([lora_ids[index]] * 6 + [None, rng.choice(lora_ids)])
+        roll = rng.random()
+        if roll < 0.3:
+            reply_to = None
+        elif roll < 0.9:
+            reply_to = rng.choice(lora_ids)  # 可能指向較新的 note，形成循環
+        else:
+            reply_to = f'orphan{index}'      # parent 不存在
+        notes.append(make_note(
+            index, lora_msg_id, reply_to,
+            archived=rng.random() < 0.25,
+            temp_parent=reply_to is not None and rng.random() < 0.1,
+            timestamp=rng.randint(0, 10),    # 時間相同的回覆需維持原本的相對順序
+            pinned=rng.random() < 0.05,
+        ))
+    return notes
+
+
+def build_tree(monkeypatch, notes, is_include_deleted):
+    monkeypatch.setattr(app_noteboard, 'get_notes_from_db',
+                        lambda board_id, include_deleted=False: copy.deepcopy(notes))
+    return app_noteboard.build_board_notes_tree('board', is_include_deleted)
+
+
+def assert_same_as_oracle(monkeypatch, notes):
+    for is_include_deleted in (False, True):
+        expected = collect_replies_oracle(copy.deepcopy(notes), is_include_deleted)
+        actual = build_tree(monkeypatch, notes, is_include_deleted)
+        assert thread_shape(actual) == thread_shape(expected)
+
+
+def test_deleted_parent_chain_reattaches_to_first_visible_ancestor(monkeypatch):
+    notes = [
+        make_note(0, 'root'),
+        make_note(1, 'mid1', 'root', archived=True),
+        make_note(2, 'mid2', 'mid1', archived=True),
+        make_note(3, 'leaf', 'mid2'),
+        make_note(4, 'leaf-child', 'leaf'),
+    ]
+    tree = build_tree(monkeypatch, notes, False)
+    assert thread_shape(tree) == [('note-0', None, ['note-3', 'note-4'])]
+    assert_same_as_oracle(monkeypatch, notes)
+
+
+def test_deleted_root_hides_whole_thread(monkeypatch):
+    notes = [
+        make_note(0, 'root', archived=True),
+        make_note(1, 'reply', 'root'),
+        make_note(2, 'reply2', 'reply'),
+        make_note(3, 'other'),
+    ]
+    tree = build_tree(monkeypatch, notes, False)
+    assert thread_shape(tree) == [('note-3', None, [])]
+    assert_same_as_oracle(monkeypatch, notes)
+
+
+def test_orphaned_and_temp_parent_replies(monkeypatch):
+    notes = [
+        make_note(0, 'a', 'missing'),
+        make_note(1, 'b', 'missing', temp_parent=True),
+        make_note(2, 'c', 'b'),
+        make_note(3, None),
+    ]
+    assert_same_as_oracle(monkeypatch, notes)
+
+
+def test_reply_cycle_terminates(monkeypatch):
+    notes = [
+        make_note(0, 'x', 'y', archived=True),
+        make_note(1, 'y', 'x', archived=True),
+        make_note(2, 'z', 'x'),
+        make_note(3, 'p'),
+        make_note(4, 'q', 'r'),
+        make_note(5, 'r', 'q', temp_parent=True),
+    ]
+    assert_same_as_oracle(monkeypatch, notes)
+
+
+@pytest.mark.parametrize('seed', range(300))
+def test_random_trees_match_recursive_collect_replies(monkeypatch, seed):
+    assert_same_as_oracle(monkeypatch, random_notes(seed))
@@ -0,0 +1,69 @@
+import time
+
+import app_noteboard
+from app_noteboard_db import get_db_connection
+from app_noteboard_resend import resend_target_nodes, RESEND_STATS_MIN_SAMPLES
+from test_notes_delta import insert_note
+
+
+def test_target_nodes_needs_enough_samples():
+    stats = {'samples': RESEND_STATS_MIN_SAMPLES - 1, 'nodes': {'lora-1'}}
+    assert resend_target_nodes(stats, 3) == 3
+    stats['samples'] = RESEND_STATS_MIN_SAMPLES
+    assert resend_target_nodes(stats, 3) == 1
+    assert resend_target_nodes(None, 3) == 3
+
+
+def set_transmit_st_at(note_id, seconds_ago):
+    conn = get_db_connection()
+    conn.execute('UPDATE notes SET transmit_st_at = ? WHERE note_id = ?',
+                 (int((time.time() - seconds_ago) * 1000), note_id))
+    conn.commit()
+    conn.close()
+
+
+def ack_latencies(note_id):
+    conn = get_db_connection()
+    rows = conn.execute('SELECT lora_node_id, latency_ms FROM ack_records WHERE note_id = ?', (note_id,)).fetchall()
+    conn.close()
+    return dict(rows)
+
+
+def test_ack_latency_excludes_ack_delay_and_is_kept_after_resend(noteboard_db):
+    insert_note('note', lora_msg_id='m1')
+    set_transmit_st_at('note', app_noteboard.ACK_DELAY_SECONDS + 5)
+    assert app_noteboard.save_ack_records(['note'], 'lora-1')
+    latency_ms = ack_latencies('note')['lora-1']
+    assert 4500 <= latency_ms <= 6000
+
+    # 重發後 transmit_st_at 被覆寫，已記錄的往返時間不變；同一節點再次 ACK 也不重新計算
+    set_transmit_st_at('note', 1)
+    assert app_noteboard.save_ack_records(['note'], 'lora-1')
+    assert ack_latencies('note')['lora-1'] == latency_ms
+
+    # 最後一次傳輸距今不足最短 ACK 延遲，ACK 回應的是更早的傳輸，不列入樣本
+    assert app_noteboard.save_ack_records(['note'], 'lora-2')
+    assert ack_latencies('note')['lora-2'] is None
+
+
+def test_resend_usb_disconnect_releases_inflight_slots(noteboard_db, monkeypatch):
+    insert_note('note', lora_msg_id='m1')
+    emitted = []
+
+    def send_lora_command(interface, board_id, msg):
+        raise RuntimeError('device disconnected')
+
+    monkeypatch.setattr(app_noteboard, 'interface', object())
+    monkeypatch.setattr(app_noteboard, 'lora_connected', True)
+    monkeypatch.setattr(app_noteboard, 'LORA_MAX_INFLIGHT', 2)
+    monkeypatch.setattr(app_noteboard, 'inflight_slots', {'other-request': 'other-board'})
+    monkeypatch.setattr(app_noteboard, 'send_lora_command', send_lora_command)
+    monkeypatch.setattr(app_noteboard, 'update_epaper_display', lambda: None)
+    monkeypatch.setattr(app_noteboard.socketio, 'emit', lambda event, *args, **kwargs: emitted.append(event))
+
+    success, _, _ = app_noteboard._execute_resend_note('board', 'note')
+    assert not success
+    # 與排程器相同：USB 中斷時標記離線並釋放所有發送視窗
+    assert not app_noteboard.lora_connected
+    assert app_noteboard.inflight_slots == {}
+    assert emitted == ['usb_connection_error', 'lora_status']
@@ -0,0 +1,64 @@
+import random
+
+import pytest
+
+from app_noteboard_send_queue import AirtimeBucket, pack_lora_messages, unpack_lora_messages
+
+
+def test_zero_rate_bucket_is_unlimited():
+    bucket = AirtimeBucket(0, 5)
+    for _ in range(10):
+        bucket.consume(3)
+    assert bucket.is_ready()
+    assert bucket.wait_time() == 0
+
+
+def test_exhausted_bucket_waits_for_refill():
+    bucket = AirtimeBucket(0.1, 1)
+    assert bucket.is_ready()
+    bucket.consume(2)
+    assert not bucket.is_ready()
+    # 欠 1 秒 airtime，以每秒 0.1 秒補充約需 10 秒
+    assert 9.5 < bucket.wait_time() <= 10.01
+
+
+PACKED_MSGS = [
+    ['/msg [10,1,lora-!a1b2c3d4]第一則'],
+    ['/msg [10,1,lora-!a1b2c3d4]含 : 冒號與 12: 數字', '/reply <11,2,k3x9q2ab>[10]回覆\n第二行', '/msg [12,3,]'],
+    ['/reply <0,0,>[1]'],
+]
+
+
+@pytest.mark.parametrize('msgs', PACKED_MSGS)
+def test_pack_round_trip(msgs):
+    packed = pack_lora_messages(msgs)
+    assert packed.startswith('/pack ')
+    assert unpack_lora_messages(packed) == msgs
+
+
+@pytest.mark.parametrize('msg', [
+    '/msg [1]不是 pack',
+    '/pack ',
+    '/pack 5',
+    '/pack 5/msg [',
+    '/pack x:/msg [1]',
+    '/pack -6:/msg [',
+    '/pack ²:x',
+    '/pack ١٠:/msg [1,2,a]',
+    '/pack 99:/msg [1,2,a]長度不足',
+    '/pack 9:/msg [1,2,a]長度過多',
+    '/pack 10:/color [1]a',
+    '/pack 13:/pack 6:/msg [',
+    pack_lora_messages(['/msg [1,2,a]']) + '4:/ack',
+])
+def test_unpack_rejects_malformed_frames(msg):
+    assert unpack_lora_messages(msg) is None
+
+
+def test_unpack_random_input_never_raises():
+    rng = random.Random(0)
+    alphabet = '0123456789:/msg [reply<>²³١٠٣٫ 中文' + '\n'
+    for _ in range(20000):
+        body = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 40)))
+        result = unpack_lora_messages('/pack ' + body)
+        assert result is None or all(isinstance(sub_msg, str) for sub_msg in result)
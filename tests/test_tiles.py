@@ -0,0 +1,170 @@
+import os
+import sqlite3
+
+import pytest
+
+import app_noteboard_tiles
+from app_noteboard_tiles import TileBlob, TileCache, MissingTileMap, read_tile, close_mbtiles_connections
+
+TILESET = 'streamtest'
+
+
+def write_mbtiles(path, tile_data):
+    """建立只有一個 tile（z=0）的 .mbtiles；替換檔案時先寫到暫存檔再 rename，與實際更新地圖的方式相同"""
+    tmp_path = path + '.tmp'
+    conn = sqlite3.connect(tmp_path)
+    conn.execute('CREATE TABLE metadata (name TEXT, value TEXT)')
+    conn.execute("INSERT INTO metadata VALUES ('format', 'png')")
+    conn.execute('CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB)')
+    conn.execute('INSERT INTO tiles VALUES (0, 0, 0, ?)', (tile_data,))
+    conn.commit()
+    conn.close()
+    os.replace(tmp_path, path)
+
+
+@pytest.fixture
+def mbtiles_path(tmp_path):
+    close_mbtiles_connections()
+    path = str(tmp_path / f'{TILESET}.mbtiles')
+    yield path
+    close_mbtiles_connections()
+
+
+def large_tile(fill):
+    return bytes([fill]) * (app_noteboard_tiles.TILE_STREAM_MIN_BYTES * 2)
+
+
+def test_stream_survives_file_replacement(mbtiles_path):
+    write_mbtiles(mbtiles_path, large_tile(1))
+    tile = read_tile(TILESET, mbtiles_path, 0, 0, 0)
+    assert isinstance(tile.data, TileBlob)
+    chunks = tile.data.iter_chunks()
+    first = next(chunks)
+
+    write_mbtiles(mbtiles_path, large_tile(2) + b'new')
+    app_noteboard_tiles._get_connection_entry(TILESET, mbtiles_path, force_check=True)
+    # 舊連線在回應結束前仍保持開啟，回應內容為取得 tile 當下的檔案
+    assert first + b''.join(chunks) == large_tile(1)
+    with pytest.raises(sqlite3.ProgrammingError):
+        tile.data.conn.execute('SELECT 1')
+
+    new_tile = read_tile(TILESET, mbtiles_path, 0, 0, 0)
+    assert b''.join(new_tile.data.iter_chunks()) == large_tile(2) + b'new'
+
+
+def test_unread_blob_releases_connection(mbtiles_path):
+    write_mbtiles(mbtiles_path, large_tile(1))
+    tile = read_tile(TILESET, mbtiles_path, 0, 0, 0)
+    conn = tile.data.conn
+
+    close_mbtiles_connections()
+    conn.execute('SELECT 1')
+    # 例如回應 304 時不會讀取 TileBlob，物件被回收時釋放連線
+    del tile
+    with pytest.raises(sqlite3.ProgrammingError):
+        conn.execute('SELECT 1')
+
+
+def test_missing_tile_map_column_extent_and_bitmap():
+    missing = MissingTileMap((10, 12), (100, 101))
+    assert missing.contains(9, 100) and missing.contains(13, 100)
+    assert not missing.contains(10, 100)
+    missing.add(10, 100)
+    missing.add(12, 101)
+    assert missing.contains(10, 100) and missing.contains(12, 101)
+    assert not missing.contains(11, 100) and not missing.contains(12, 100)
+    # 點陣圖列範圍外（例如 bounds 之外）不記錄，也不視為不存在
+    missing.add(11, 102)
+    assert not missing.contains(11, 102)
+    assert missing.size_bytes() == 1
+
+
+def test_missing_tile_map_without_tiles_or_bitmap():
+    assert MissingTileMap(None, (0, 0)).contains(0, 0)
+    missing = MissingTileMap((0, 3), (0, app_noteboard_tiles.MISSING_TILE_BITMAP_MAX_BITS))
+    assert missing.size_bytes() == 0
+    missing.add(1, 1)
+    assert not missing.contains(1, 1)
+    assert missing.contains(4, 1)
+
+
+def test_tile_cache_shares_buffers_and_accounts_bytes():
+    cache = TileCache(100)
+    cache.put(('a', 0, 0, 0), (b'x' * 30, 'e1'))
+    cache.put(('a', 0, 0, 1), (b'x' * 30, 'e1'))
+    assert cache.size_bytes == 30
+    assert cache.stats()['buffers'] == 1 and cache.stats()['shared'] == 1
+
+    # 同一 key 換成新內容：舊 buffer 仍被另一個 key 參照，不扣除大小
+    cache.put(('a', 0, 0, 1), (b'y' * 20, 'e2'))
+    assert cache.size_bytes == 50
+    assert cache.get(('a', 0, 0, 0)) == (b'x' * 30, 'e1')
+    assert cache.get(('a', 0, 0, 1)) == (b'y' * 20, 'e2')
+
+    # 超過上限時移除最久未使用的 key（a/0/0/0），其 buffer 參照數歸零後扣除大小
+    cache.put(('b', 0, 0, 0), (b'z' * 40, 'e3'))
+    cache.put(('b', 0, 0, 1), (b'w' * 40, 'e4'))
+    assert cache.size_bytes == 100
+    assert cache.evictions == 1
+    assert cache.get(('a', 0, 0, 0)) is None
+    assert cache.get(('a', 0, 0, 1)) == (b'y' * 20, 'e2')
+    assert cache.size_bytes == sum(len(data) for data, _ in cache._buffers.values())
+
+    cache.invalidate('b')
+    assert cache.get(('b', 0, 0, 0)) is None and cache.get(('b', 0, 0, 1)) is None
+    assert cache.size_bytes == sum(len(data) for data, _ in cache._buffers.values())
+    cache.invalidate('a')
+    assert cache.size_bytes == 0 and cache.stats()['buffers'] == 0 and cache.stats()['tiles'] == 0
+
+
+def test_tile_cache_skips_oversized_tiles():
+    cache = TileCache(10)
+    cache.put(('a', 0, 0, 0), (b'x' * 11, 'e1'))
+    assert cache.get(('a', 0, 0, 0)) is None
+    assert cache.size_bytes == 0
+
+
+def write_zoom_mbtiles(path, columns, rows, bounds=None):
+    """建立 z=10、指定欄列範圍都有 tile 的 .mbtiles（含 MBTiles 規範的 tile_index）"""
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE metadata (name TEXT, value TEXT)')
+    conn.execute("INSERT INTO metadata VALUES ('format', 'png')")
+    if bounds:
+        conn.execute("INSERT INTO metadata VALUES ('bounds', ?)", (bounds,))
+    conn.execute('CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB)')
+    conn.execute('CREATE UNIQUE INDEX tile_index ON tiles (zoom_level, tile_column, tile_row)')
+    conn.executemany('INSERT INTO tiles VALUES (10, ?, ?, ?)',
+                     ((col, row, b'png') for col in columns for row in rows))
+    conn.commit()
+    conn.close()
+
+
+def test_missing_tile_extent_is_index_seek(mbtiles_path, monkeypatch):
+    write_zoom_mbtiles(mbtiles_path, range(100, 300), range(200, 400))
+    entry = app_noteboard_tiles._get_connection_entry(TILESET, mbtiles_path)
+    steps = []
+    entry['conn'].set_progress_handler(lambda: steps.append(1), 1)
+    missing = app_noteboard_tiles._get_missing_tile_map(entry, 10)
+    entry['conn'].set_progress_handler(None, 1)
+    assert missing.columns == (100, 299)
+    # 逐筆掃描 40000 個 tile 需要數十萬個 VM 指令，索引 seek 只需數十個
+    assert len(steps) < 200
+
+
+def test_read_tile_uses_bounds_for_missing_bitmap(mbtiles_path):
+    # 台灣附近的 bounds，z=10 約為欄 853~859、TMS 列 575~586
+    write_zoom_mbtiles(mbtiles_path, range(853, 860), range(575, 587), bounds='120.0,21.9,122.0,25.3')
+    conn = sqlite3.connect(mbtiles_path)
+    conn.execute('INSERT INTO tiles VALUES (10, 855, 700, ?)', (b'png',))
+    conn.commit()
+    conn.close()
+    y = (2 ** 10) - 1 - 580
+    assert read_tile(TILESET, mbtiles_path, 10, 855, y) is not None
+    assert read_tile(TILESET, mbtiles_path, 10, 900, y) is None
+    # bounds 外的列查詢 SQLite 後不記錄為不存在，bounds 不準確時 tile 仍可讀出
+    assert read_tile(TILESET, mbtiles_path, 10, 855, 0) is None
+    assert read_tile(TILESET, mbtiles_path, 10, 855, (2 ** 10) - 1 - 700) is not None
+    missing = app_noteboard_tiles._connections[TILESET]['missing'][10]
+    assert missing.columns == (853, 859)
+    assert missing.rows[0] <= 575 and missing.rows[1] >= 586
+    assert 0 < missing.size_bytes() < 16